@@ -6,7 +6,7 @@ A Flask application module for initializing and running a web service.
 
 This module contains the Flask application factory `create_app` which sets
 up the application with necessary configurations, initializes the database
-connection using Flask-SQLAlchemy, and defines routes for the application.
+connection using Flask-SQLAlchemy, and registers the blueprints of ``routes``.
 The database models are imported to ensure they are registered with SQLAlchemy.
 
 It fetches database configurations from the environment variables and sets up
@@ -16,21 +16,13 @@ The application defines multiple routes, including the home page, movie data ret
 and adding trailers to the database via interaction with the YouTube API.
 
 Attributes:
-    db_user (str): Database username fetched from environment variables.
-    db_pass (str): Database password fetched from environment variables.
-    db_host (str): Database host fetched from environment variables.
-    db_port (str): Database port fetched from environment variables.
-    db_name (str): Database name fetched from environment variables.
-    database_url (str): Full database connection URL constructed from the above credentials.
-    app (Flask): The Flask application instance.
     flask_app (Flask): The Flask application instance when the script is run directly.
 
 Functions:
-    create_app(): Flask application factory function for setting up and returning a Flask app.
-    search_trailers(): Route function to fetch and add trailers from YouTube API.
-    add_trailer(item): Helper function to add individual trailer to the database.
-    hello_world(): Route function to serve the home page.
-    get_movies(): Route function to fetch and return all movies from the database.
+    create_app(config): Flask application factory function for setting up and returning a Flask app.
+    environment_config(instance_path): Settings read from the environment variables.
+    init_extensions(app): Initializes the extensions and services with an app.
+    register_blueprints(app): Registers the route blueprints with an app.
 
 Usage:
     Run this file directly using Python to start the Flask application server:
@@ -38,21 +30,25 @@ Usage:
     python app.py
     ```
 """
+import os
 from os import environ
-import requests
-import logging
 
-from flask import Flask, jsonify
-from sqlalchemy.exc import SQLAlchemyError
+from flask import Flask
 from extensions import db
 from flask_cors import CORS  # pylint: disable=import-error
-from googleapiclient.errors import HttpError
-from googleapiclient.discovery import build
-from requests.exceptions import (
-    ConnectionError as RequestsConnectionError,
-    Timeout,
-    RequestException,
-)
+from routes import catalog, jobs, ops
+from services.catalog_version import track_table_changes
+from services.http_client import http_client
+from services.ingestion import DEFAULT_MAX_WORKERS
+from services.jobs import job_queue
+from services.metrics import metrics
+from services.query_profiler import query_profiler
+from services.quota import youtube_quota
+from services.resilience import providers
+from services.response_cache import response_cache
+from services.similar_movies import similar_movies
+from services.trailer_cache import trailer_cache
+from services.youtube import youtube_client
 
 # Import models to ensure they are registered with SQLAlchemy
 from models.database import Movie  # pylint: disable=unused-import
@@ -64,223 +60,150 @@ from models.database import Review  # pylint: disable=unused-import
 from models.database import Recommendation  # pylint: disable=unused-import
 from models.database import Notification  # pylint: disable=unused-import
 from models.database import Watchlist  # pylint: disable=unused-import
+from models.database import Job  # pylint: disable=unused-import
 
 
-def create_app():
+def environment_config(instance_path):
     """
-    Creates and configures an instance of the Flask application.
+    Reads the application settings from the environment variables.
 
-    Fetches database connection parameters from the environment, constructs a database URL,
-    and initializes the SQLAlchemy plugin with this app instance. It defines routes for
-    various operations including fetching movie data and adding new trailers.
+    Each lowercase variable, e.g. ``http_read_timeout``, sets the config key of
+    the same name in uppercase; unset variables fall back to their defaults.
 
-    Returns:
-        Flask: A Flask application instance with routes and configurations set up.
+    Parameters:
+        instance_path (str): The app's instance folder, where the files it
+            writes are kept by default.
 
-    Note:
-        Ensure that all required environment variables are set before calling this function.
+    Returns:
+        dict: The config keys and their values.
     """
-    app = Flask(__name__)
-    CORS(app)
-
     # Fetching Database connection parameters from the environment
     db_user = environ.get("db_user")
     db_pass = environ.get("db_pass")
     db_host = environ.get("db_host")
     db_port = environ.get("db_port")
     db_name = environ.get("db_name")
-    youtube_api_key = environ.get("youtube_api_key")
-    tmdb_api_key = environ.get("tmdb_api_key")
-
-    # Creating the SQLAlchemy engine
-    database_url = f"postgresql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
-
-    # Configure the app, including database URI and any other settings
-    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    ingest_max_workers = int(environ.get("ingest_max_workers", DEFAULT_MAX_WORKERS))
+
+    settings = {
+        # Creating the SQLAlchemy engine
+        "SQLALCHEMY_DATABASE_URI": (
+            f"postgresql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
+        ),
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        "TMDB_API_KEY": environ.get("tmdb_api_key"),
+        "INGEST_MAX_WORKERS": ingest_max_workers,
+        "BACKFILL_CURSOR_PATH": environ.get(
+            "backfill_cursor_path", os.path.join(instance_path, "backfill_cursor.json")
+        ),
+        "RESPONSE_CACHE_ENABLED": (
+            environ.get("response_cache_enabled", "true").lower() == "true"
+        ),
+        "RESPONSE_CACHE_LOCAL_ENTRIES": int(
+            environ.get("response_cache_local_entries", 1024)
+        ),
+        "RESPONSE_CACHE_DIR": environ.get("response_cache_dir"),
+        "TRAILER_CACHE_TTL_DAYS": int(environ.get("trailer_cache_ttl_days", 30)),
+        "TRAILER_CACHE_NEGATIVE_TTL_HOURS": int(
+            environ.get("trailer_cache_negative_ttl_hours", 24)
+        ),
+        "TRAILER_CACHE_SIZE": int(environ.get("trailer_cache_size", 10000)),
+        "SIMILAR_INDEX_DIR": environ.get(
+            "similar_index_dir", os.path.join(instance_path, "similar_index")
+        ),
+        "JOB_MAX_ATTEMPTS": int(environ.get("job_max_attempts", 5)),
+        "JOB_BACKOFF_SECONDS": float(environ.get("job_backoff_seconds", 30)),
+        "JOB_LEASE_SECONDS": float(environ.get("job_lease_seconds", 600)),
+        # The YouTube client is built from this discovery document on first use;
+        # unset, the copy packaged with google-api-python-client is used
+        "YOUTUBE_API_KEY": environ.get("youtube_api_key"),
+        "YOUTUBE_DISCOVERY_PATH": environ.get("youtube_discovery_path"),
+        "HTTP_CONNECT_TIMEOUT": float(environ.get("http_connect_timeout", 3.05)),
+        "HTTP_READ_TIMEOUT": float(environ.get("http_read_timeout", 10)),
+        "HTTP_MAX_RETRIES": int(environ.get("http_max_retries", 3)),
+        "HTTP_POOL_SIZE": int(environ.get("http_pool_size", ingest_max_workers)),
+        # e.g. "api.themoviedb.org=http://127.0.0.1:9001" to use local stand-ins
+        "HTTP_HOST_OVERRIDES": environ.get("http_host_overrides"),
+        "BREAKER_FAILURE_THRESHOLD": int(environ.get("breaker_failure_threshold", 5)),
+        "BREAKER_RESET_SECONDS": float(environ.get("breaker_reset_seconds", 30)),
+        "HEDGE_REQUESTS": environ.get("hedge_requests", "true").lower() == "true",
+        "YOUTUBE_DAILY_QUOTA": int(environ.get("youtube_daily_quota", 10000)),
+        "YOUTUBE_QUOTA_RESERVE": int(environ.get("youtube_quota_reserve", 1000)),
+        "YOUTUBE_QUOTA_RATE": float(environ.get("youtube_quota_rate", 100)),
+        "YOUTUBE_QUOTA_BURST": int(environ.get("youtube_quota_burst", 1000)),
+        "METRICS_ENABLED": environ.get("metrics_enabled", "true").lower() == "true",
+        # Where every worker process writes its samples, so /metrics can sum them
+        "METRICS_MULTIPROC_DIR": environ.get("metrics_multiproc_dir"),
+        # Development only: per-request query counts, N+1 warnings and budgets
+        "QUERY_PROFILER_ENABLED": (
+            environ.get("query_profiler_enabled", "false").lower() == "true"
+        ),
+    }
+    if environ.get("query_budget"):
+        settings["QUERY_BUDGET"] = int(environ["query_budget"])
+    return settings
+
+
+def init_extensions(app):
+    """
+    Initializes the extensions and the services configured from the app config.
 
-    # Initialize plugins
+    Parameters:
+        app (Flask): The configured application.
+    """
+    metrics.init_app(app)
+    query_profiler.init_app(app)
     db.init_app(app)
+    response_cache.init_app(app)
+    trailer_cache.init_app(app)
+    similar_movies.init_app(app)
+    job_queue.init_app(app)
+    youtube_quota.init_app(app)
+    youtube_client.init_app(app)
+    http_client.init_app(app)
+    providers.init_app(app)
+    # Every YouTube search spends quota, so a hedge would double its cost
+    providers.register("youtube", hedge=False)
+    track_table_changes()
+
+
+def register_blueprints(app):
+    """
+    Registers the blueprints of ``routes`` with an app.
 
-    # YouTube API setup
-    youtube = build("youtube", "v3", developerKey=youtube_api_key)
-
-    @app.route("/trigger_search", methods=["POST"])
-    def trigger_search():
-        """
-        A route to trigger the search for movie trailers.
-        Fetches horror movie details from TMDB and then fetches trailers from YouTube.
-        Updates the Movie object with the fetched data.
-        """
-
-        try:
-            tmdb_movies = fetch_horror_movies_from_tmdb()
-
-            if not tmdb_movies:  # Check if tmdb_movies is empty
-                logging.error("No movies fetched from TMDB.")
-                return jsonify({"error": "No movies fetched from TMDB."}), 500
-
-            for movie_details in tmdb_movies:
-                # Fetch trailer"
-                cname = movie_details["title"]
-                poster = movie_details["poster_url"]
-                youtube_trailer_url = fetch_youtube_trailer(movie_details["title"])
-                movie_details["trailer_url"] = youtube_trailer_url
-
-                # Update Movie object here
-                msg = update_movie_object(movie_details)
-
-            return (
-                jsonify(
-                    {"message": "Search and update completed successfully: " + msg}
-                ),
-                200,
-            )
-
-        except Exception as e:
-            logging.exception("An error occurred: ")  # Log the exception with traceback
-            return jsonify({"error": str(e)}), 500
-
-    def fetch_horror_movies_from_tmdb():
-        """
-        Fetches horror movies from The Movie Database (TMDB).
-        Filters for specific fields and returns a list of movie details.
-        """
-
-        # Ensure tmdb_api_key is defined or imported elsewhere in your code
-        url = f"https://api.themoviedb.org/3/discover/movie?api_key={tmdb_api_key}&with_genres=27&page=1&year=2023&with_original_language=en"
-        response = requests.get(url)
-
-        movies = []
-
-        if response.status_code == 200:
-            data = response.json()
-            for movie in data.get("results", []):  # Use .get to avoid KeyError
-                movies.append(
-                    {
-                        "id": movie["id"],
-                        "title": movie["title"],
-                        "poster_url": f"https://image.tmdb.org/t/p/original{movie['poster_path']}",
-                    }
-                )
-        else:
-            logging.error(
-                f"Failed to fetch movies, Status Code: {response.status_code}, Response: {response.text}"
-            )
-
-        return movies
-
-    def fetch_youtube_trailer(movie_title):
-        """
-        A function to fetch and add movie trailers from the YouTube API to the database.
-        Searches for trailers published in the current year and adds them to the database.
-
-        Returns:
-            Response: A success or error response.
-        """
-        try:
-            request = youtube.search().list(
-                q=f"{movie_title} trailer",
-                part="snippet",
-                type="video",
-                maxResults=1,  # Assuming you want only the most relevant result
-            )
-            response = request.execute()
-
-            first_video = response["items"][0]  # Access the first item in the list
-            video_id = first_video["id"]["videoId"]
-            url = f"https://www.youtube.com/watch?v={video_id}"
-
-            # url = (
-            #     f"https://www.youtube.com/watch?v={response['items']['id']['videoId']}"
-            # )
-            return url
-
-        except HttpError as e:
-            print(f"HTTP error occurred: {e}")
-            return (
-                jsonify({"error": "Failed to add trailers due to an HTTP error"}),
-                500,
-            )
-        except RequestsConnectionError as e:
-            # Handle connection errors specifically
-            app.logger.error("Connection failed: %s", e)
-            return jsonify({"error": "Server connection failed"}), 500
-        except Timeout:
-            # Handle timeout errors specifically
-            app.logger.error("The request to the server timed out.")
-            return jsonify({"error": "Server request timed out"}), 500
-        except RequestException as e:
-            # Handle other request-related errors
-            app.logger.error("An unexpected request error occurred: %s", e)
-            return (
-                jsonify({"error": "Failed to add trailers due to a request error"}),
-                500,
-            )
-
-    def update_movie_object(movie_details):
-        """
-        Update or create a Movie object with the provided details, including the fetched trailer URL.
-        """
-
-        return "heelo"
+    Parameters:
+        app (Flask): The application.
+    """
+    for module in (catalog, jobs, ops):
+        app.register_blueprint(module.blueprint)
 
-        # Update Movie object here)
-        # db.session.rollback()
 
-        # new_movie = Movie(title=title, url=url)
+def create_app(config=None):
+    """
+    Creates and configures an instance of the Flask application.
 
-        # try:
-        #     db.session.add(new_movie)
-        #     db.session.commit()
-        #     return jsonify(message="The movies added successfully"), 201
-        # except SQLAlchemyError as e:
-        #     db.session.rollback()
-        #     error_info = str(e.__dict__.get("orig", e))
-        #     return jsonify(error=error_info), 400
+    Reads the settings from the environment, initializes the extensions with
+    them and registers the route blueprints. The job handlers of
+    ``routes.jobs`` are registered with the job queue on import.
 
-    @app.route("/")
-    def hello_world():
-        """
-        A simple route serving the home page with a greeting message.
+    Parameters:
+        config (dict): Settings applied over the ones read from the environment,
+            e.g. the database URI of the test suite.
 
-        Returns:
-            str: A welcome message.
-        """
-        return "Hello, World! This is the home page."
+    Returns:
+        Flask: A Flask application instance with routes and configurations set up.
 
-    @app.route("/api/movies", methods=["GET"])
-    def get_movies():
-        """
-        A route to fetch and return all movies from the database.
+    Note:
+        Ensure that all required environment variables are set before calling this function.
+    """
+    app = Flask(__name__)
+    CORS(app)
 
-        Returns:
-            Response: A list of all movies or an error message.
-        """
-        try:
-            movies = Movie.query.all()
-            movies_list = [
-                {
-                    "id": movie.id,
-                    "title": movie.title,
-                    "director": movie.director,
-                    "cast": movie.cast,
-                    "release_date": movie.release_date,
-                    "length": movie.length,
-                    "rating": movie.rating,
-                    "age_restriction": movie.age_restriction,
-                    "summary": movie.summary,
-                    "trailer_url": movie.url,
-                }
-                for movie in movies
-            ]
-            return jsonify(movies_list), 200
-        except SQLAlchemyError as e:
-            app.logger.error(
-                "Error fetching movies: %s", e
-            )  # Using %s for lazy formatting
-            return jsonify(error="An error occurred fetching movies"), 500
+    app.config.update(environment_config(app.instance_path))
+    app.config.update(config or {})
 
+    init_extensions(app)
+    register_blueprints(app)
     return app
 
 
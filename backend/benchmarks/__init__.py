@@ -0,0 +1,72 @@
+"""
+benchmarks
+----------
+
+Scripts measuring the performance of the backend. Run them from the backend
+directory, e.g. ``python -m benchmarks.startup_time``; each prints its results
+as JSON so runs on different commits can be compared.
+
+``python -m benchmarks.suite`` runs the load-test suite end to end: it seeds
+the database (``benchmarks.seed``), starts the fake TMDB and YouTube APIs and
+gunicorn, drives the route mixes of ``benchmarks.load`` and times an ingest.
+``python -m benchmarks.compare`` lists the regressions between two results.
+
+Functions:
+    benchmark_parser(doc): Build a benchmark's command line parser.
+    migrated_app(): Create the app and migrate the database it is configured for.
+    print_report(report, output): Print a benchmark's results as JSON.
+"""
+import argparse
+import contextlib
+import json
+
+
+def benchmark_parser(doc):
+    """
+    Builds the command line parser of a benchmark, with its ``--output`` option.
+
+    Parameters:
+        doc (str): The module docstring; its second paragraph describes the
+            benchmark.
+
+    Returns:
+        ArgumentParser: The parser, for the benchmark to add its own options to.
+    """
+    parser = argparse.ArgumentParser(description=doc.split("\n\n")[1])
+    parser.add_argument("--output", help="Also write the results to this file.")
+    return parser
+
+
+@contextlib.contextmanager
+def migrated_app():
+    """
+    Creates the app from the environment and migrates its database, for the
+    benchmarks that read or write the catalog directly.
+
+    Yields:
+        Flask: The app, within its app context.
+    """
+    # pylint: disable=import-outside-toplevel
+    from app import create_app
+    from extensions import db
+    from migrations import upgrade
+
+    app = create_app()
+    with app.app_context():
+        upgrade(db.engine)
+        yield app
+
+
+def print_report(report, output=None):
+    """
+    Prints the results of a benchmark as JSON.
+
+    Parameters:
+        report (dict): The results.
+        output (str): A file to also write them to, e.g. to compare runs later.
+    """
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
@@ -0,0 +1,103 @@
+"""
+benchmarks/compare.py
+---------------------
+
+Compares two result files of the same benchmark, e.g. from two commits.
+
+Every latency, throughput, duration and error count found at the same place
+in both files is listed with its relative change. Latencies, durations and
+errors are better when lower, throughput when higher; a change beyond
+``--threshold`` percent in the wrong direction is marked as a regression, and
+``--fail-on-regression`` turns that into a non-zero exit status for CI.
+
+Usage:
+    python -m benchmarks.compare baseline.json current.json [--threshold 10]
+        [--fail-on-regression]
+"""
+import argparse
+import json
+import sys
+
+DEFAULT_THRESHOLD = 10.0
+LOWER_IS_BETTER = ("_ms", "_seconds", "errors")
+HIGHER_IS_BETTER = ("_rps",)
+
+
+def _leaves(tree, path=()):
+    if isinstance(tree, dict):
+        for key, value in tree.items():
+            yield from _leaves(value, path + (str(key),))
+    elif isinstance(tree, (int, float)) and not isinstance(tree, bool):
+        yield path, tree
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Lists the comparable measurements of two results.
+
+    Parameters:
+        baseline (dict): The earlier result.
+        current (dict): The later result.
+        threshold (float): Percent change counted as a regression.
+
+    Returns:
+        list of dict: Path, both values, percent change and whether it is a
+        regression, for every measurement present in both.
+    """
+    before = dict(_leaves(baseline))
+    rows = []
+    for path, value in _leaves(current):
+        name = path[-1]
+        if path not in before:
+            continue
+        if name.endswith(HIGHER_IS_BETTER):
+            sign = -1
+        elif name.endswith(LOWER_IS_BETTER):
+            sign = 1
+        else:
+            continue
+        old = before[path]
+        change = (value - old) / old * 100 if old else None
+        rows.append(
+            {
+                "path": ".".join(path),
+                "baseline": old,
+                "current": value,
+                "change_pct": round(change, 1) if change is not None else None,
+                "regression": change is not None and sign * change > threshold,
+            }
+        )
+    return rows
+
+
+def main():
+    """Parses the arguments, prints the comparison and sets the exit status."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    with open(args.current, encoding="utf-8") as file:
+        current = json.load(file)
+    rows = compare(baseline, current, args.threshold)
+
+    width = max((len(row["path"]) for row in rows), default=10)
+    for row in rows:
+        change = row["change_pct"]
+        print(
+            f"{row['path']:<{width}}  {row['baseline']:>12}  {row['current']:>12}"
+            f"  {'' if change is None else f'{change:+.1f}%':>8}"
+            f"{'  REGRESSION' if row['regression'] else ''}"
+        )
+    regressions = sum(row["regression"] for row in rows)
+    print(f"{len(rows)} measurements compared, {regressions} regression(s)")
+    if args.fail_on_regression and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+benchmarks/fake_upstreams.py
+----------------------------
+
+A local stand-in for the TMDB and YouTube APIs, with injectable faults.
+
+One threaded HTTP server answers the TMDB discover endpoint and the YouTube
+search endpoint with synthetic data. Point the app at it with
+``http_host_overrides``, e.g.
+``api.themoviedb.org=http://127.0.0.1:9001,youtube.googleapis.com=http://127.0.0.1:9001``.
+
+Faults are set per service, at start-up or while running through
+``POST /_faults`` with a JSON body such as
+``{"tmdb": {"error_rate": 0.5}, "youtube": {"latency_ms": 200}}``:
+
+    latency_ms:   Delay added to every answer.
+    slow_rate:    Share of answers delayed by ``slow_ms`` instead.
+    slow_ms:      Delay of the slow answers.
+    error_rate:   Share of answers replaced by ``error_status``.
+    error_status: Status of the injected errors (default 503).
+    retry_after:  ``Retry-After`` header of the injected errors, e.g. "0".
+    hang_rate:    Share of requests never answered until the client gives up.
+
+The API endpoints answer any method the same way, so the retry rules of
+non-idempotent requests can be tested too. ``GET /_stats`` returns the requests
+served per service and outcome.
+
+Usage:
+    python -m benchmarks.fake_upstreams --port 9001 [--faults '{"tmdb": {...}}']
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_PORT = 9001
+PAGE_SIZE = 20
+TOTAL_PAGES = 50
+# Seconds a hung request is held open; longer than any client read timeout
+HANG_SECONDS = 60
+FAULT_NAMES = (
+    "latency_ms",
+    "slow_rate",
+    "slow_ms",
+    "error_rate",
+    "error_status",
+    "retry_after",
+    "hang_rate",
+)
+
+
+def discover_page(year, page):
+    """Synthetic TMDB discover results for a year and page."""
+    first = (year * TOTAL_PAGES + page - 1) * PAGE_SIZE
+    return {
+        "page": page,
+        "total_pages": TOTAL_PAGES,
+        "results": [
+            {
+                "id": first + offset,
+                "title": f"Fake Horror {year} #{first + offset}",
+                "poster_path": f"/poster{first + offset}.jpg",
+                "release_date": f"{year}-10-31",
+                "overview": f"Synthetic movie {first + offset} for load tests.",
+            }
+            for offset in range(PAGE_SIZE)
+        ],
+    }
+
+
+def search_results(query):
+    """Synthetic YouTube search results; the video id is derived from the query."""
+    video_id = f"v{zlib.crc32(query.encode()):010d}"
+    return {"items": [{"id": {"kind": "youtube#video", "videoId": video_id}}]}
+
+
+class FakeUpstreams:
+    """
+    The fault settings and request counters shared by the server's threads.
+
+    Attributes:
+        faults: Fault settings per service ("tmdb", "youtube").
+        served: Requests answered per (service, outcome).
+    """
+
+    def __init__(self, faults=None):
+        self.faults = {"tmdb": {}, "youtube": {}}
+        self.served = {}
+        self._lock = threading.Lock()
+        self.set_faults(faults or {})
+
+    def set_faults(self, faults):
+        """
+        Replaces the fault settings of the services named in ``faults``.
+
+        Parameters:
+            faults (dict): Settings per service; unknown names are rejected.
+        """
+        for service, settings in faults.items():
+            if service not in self.faults:
+                raise ValueError(f"Unknown service {service!r}")
+            unknown = set(settings) - set(FAULT_NAMES)
+            if unknown:
+                raise ValueError(f"Unknown faults {sorted(unknown)}")
+            with self._lock:
+                self.faults[service] = dict(settings)
+
+    def count(self, service, outcome):
+        """Counts one answered request."""
+        with self._lock:
+            key = f"{service}:{outcome}"
+            self.served[key] = self.served.get(key, 0) + 1
+
+    def fault(self, service):
+        """
+        Draws the fault, if any, of one request to a service.
+
+        Returns:
+            tuple: Seconds to wait, and the error status to answer with or None.
+            A wait of None means the request hangs.
+        """
+        with self._lock:
+            settings = dict(self.faults[service])
+        if random.random() < settings.get("hang_rate", 0):
+            return None, None
+        delay = settings.get("latency_ms", 0) / 1000
+        if random.random() < settings.get("slow_rate", 0):
+            delay = settings.get("slow_ms", 1000) / 1000
+        status = None
+        if random.random() < settings.get("error_rate", 0):
+            status = settings.get("error_status", 503)
+        return delay, status
+
+
+def make_handler(upstreams):
+    """Builds the request handler class serving ``upstreams``."""
+
+    class Handler(BaseHTTPRequestHandler):
+        """Serves the fake endpoints and the control endpoints."""
+
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately; don't let Nagle delay the body
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            pass
+
+        def _send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _serve(self, service, build):
+            delay, status = upstreams.fault(service)
+            if delay is None:
+                upstreams.count(service, "hung")
+                time.sleep(HANG_SECONDS)
+                return
+            time.sleep(delay)
+            if status is not None:
+                upstreams.count(service, str(status))
+                retry_after = upstreams.faults[service].get("retry_after")
+                headers = {"Retry-After": retry_after} if retry_after else None
+                self._send_json(status, {"error": "injected fault"}, headers)
+                return
+            upstreams.count(service, "200")
+            self._send_json(200, build())
+
+        def _serve_api(self):
+            """Answers the fake API endpoints; returns False for other paths."""
+            url = urlsplit(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if url.path == "/3/discover/movie":
+                year = int(query.get("year", 2023))
+                page = int(query.get("page", 1))
+                if page > TOTAL_PAGES:
+                    empty = {"page": page, "total_pages": TOTAL_PAGES, "results": []}
+                    self._send_json(200, empty)
+                    return True
+                self._serve("tmdb", lambda: discover_page(year, page))
+            elif url.path == "/youtube/v3/search":
+                self._serve("youtube", lambda: search_results(query.get("q", "")))
+            else:
+                return False
+            return True
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Answers the fake API endpoints and the stats endpoint."""
+            if self._serve_api():
+                return
+            if urlsplit(self.path).path == "/_stats":
+                self._send_json(200, upstreams.served)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):  # pylint: disable=invalid-name
+            """Answers the fake API endpoints, or updates the fault settings."""
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            if self._serve_api():
+                return
+            if urlsplit(self.path).path != "/_faults":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                upstreams.set_faults(json.loads(body or b"{}"))
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            self._send_json(200, upstreams.faults)
+
+    return Handler
+
+
+def start(port=0, faults=None):
+    """
+    Starts the fake server on a background thread.
+
+    Parameters:
+        port (int): Port to listen on; 0 picks a free one.
+        faults (dict): Initial fault settings per service.
+
+    Returns:
+        tuple: The server, its FakeUpstreams state and its base URL.
+    """
+    upstreams = FakeUpstreams(faults)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(upstreams))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, upstreams, f"http://127.0.0.1:{server.server_port}"
+
+
+def host_overrides(base_url):
+    """The ``http_host_overrides`` value sending TMDB and YouTube to ``base_url``."""
+    return f"api.themoviedb.org={base_url},youtube.googleapis.com={base_url}"
+
+
+def main():
+    """Parses the arguments and serves until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--faults", type=json.loads, default={})
+    args = parser.parse_args()
+    server, _, base_url = start(args.port, args.faults)
+    print(f"Serving fake TMDB and YouTube at {base_url}")
+    print(f"http_host_overrides={host_overrides(base_url)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
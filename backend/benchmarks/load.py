@@ -0,0 +1,264 @@
+"""
+benchmarks/load.py
+------------------
+
+A concurrent load generator for the read routes of a running backend.
+
+``--concurrency`` threads, each with its own keep-alive session, send requests
+back to back for ``--duration`` seconds. Every request picks a route from a
+weighted mix of the catalog, detail, search and similarity routes, with movie
+ids and search terms drawn from the catalog the server holds. Requests sent
+during the ``--warmup`` seconds are not counted.
+
+The report gives, per route and overall, the requests sent, errors (5xx
+answers and failed connections), throughput, and p50/p95/p99/max latency.
+
+Usage:
+    python -m benchmarks.load --url http://127.0.0.1:8000 [--concurrency 8]
+        [--duration 30] [--warmup 5] [--mix catalog] [--output results.json]
+"""
+import collections
+import random
+import threading
+import time
+
+import requests
+
+from benchmarks import benchmark_parser, print_report
+
+DEFAULT_URL = "http://127.0.0.1:8000"
+DEFAULT_CONCURRENCY = 8
+DEFAULT_DURATION = 30.0
+DEFAULT_WARMUP = 5.0
+REQUEST_TIMEOUT = 30
+SEARCH_TERMS = ("night", "house", "blood", "witch", "haunting", "grave", "mirror")
+SORTS = ("id", "title", "release_date", "-rating")
+
+
+def _listing(rng, _ids):
+    return f"/api/movies?limit=50&sort={rng.choice(SORTS)}"
+
+
+def _listing_page(rng, _ids):
+    return f"/api/movies?limit=50&min_rating={rng.randint(1, 9)}"
+
+
+def _detail(rng, ids):
+    return f"/api/movies/{rng.choice(ids)}"
+
+
+def _details_batch(rng, ids):
+    return "/api/movies/details?ids=" + ",".join(
+        str(movie_id) for movie_id in rng.sample(ids, min(20, len(ids)))
+    )
+
+
+def _search(rng, _ids):
+    return f"/api/search?q={rng.choice(SEARCH_TERMS)}"
+
+
+def _suggest(rng, _ids):
+    term = rng.choice(SEARCH_TERMS)
+    return f"/api/search/suggest?q={term[: rng.randint(2, len(term))]}"
+
+
+def _similar(rng, ids):
+    return f"/api/movies/{rng.choice(ids)}/similar"
+
+
+# Route name -> (weight, path builder) per mix
+MIXES = {
+    "catalog": {
+        "listing": (30, _listing),
+        "listing_filtered": (10, _listing_page),
+        "detail": (30, _detail),
+        "details_batch": (10, _details_batch),
+        "search": (10, _search),
+        "suggest": (10, _suggest),
+    },
+    "detail": {
+        "detail": (70, _detail),
+        "details_batch": (30, _details_batch),
+    },
+    "search": {
+        "search": (60, _search),
+        "suggest": (40, _suggest),
+    },
+    "similar": {
+        "similar": (100, _similar),
+    },
+}
+
+
+def percentiles(latencies):
+    """p50/p95/p99 and maximum of a list of seconds, in milliseconds."""
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(latencies)
+    summary = {}
+    for name, fraction in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+        index = min(len(ordered) - 1, int(fraction * len(ordered)))
+        summary[name] = round(ordered[index] * 1000, 2)
+    summary["max_ms"] = round(ordered[-1] * 1000, 2)
+    return summary
+
+
+def catalog_ids(base_url, limit=500):
+    """
+    Reads movie ids to request details of, from the first catalog page.
+
+    Raises:
+        RuntimeError: If the catalog is empty.
+    """
+    response = requests.get(
+        f"{base_url}/api/movies",
+        params={"fields": "id", "limit": limit},
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    ids = [movie["id"] for movie in response.json()]
+    if not ids:
+        raise RuntimeError("The catalog is empty; seed it with benchmarks.seed.")
+    return ids
+
+
+class Recorder:
+    """
+    Latencies and outcomes of the counted requests, shared by the threads.
+
+    Attributes:
+        latencies: Seconds taken per route.
+        statuses: Answers per route and status (or "error").
+    """
+
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.statuses = collections.defaultdict(collections.Counter)
+        self._lock = threading.Lock()
+
+    def record(self, route, status, seconds):
+        """Counts one request."""
+        with self._lock:
+            self.latencies[route].append(seconds)
+            self.statuses[route][status] += 1
+
+    def summary(self, seconds):
+        """
+        Summarizes the requests counted over ``seconds`` of load.
+
+        Returns:
+            dict: Per route and overall: requests, errors, requests per second,
+            answers per status and latency percentiles.
+        """
+
+        def summarize(latencies, statuses):
+            errors = sum(
+                count
+                for status, count in statuses.items()
+                if status == "error" or int(status) >= 500
+            )
+            return {
+                "requests": len(latencies),
+                "errors": errors,
+                "throughput_rps": round(len(latencies) / seconds, 2),
+                "statuses": dict(sorted(statuses.items())),
+                **percentiles(latencies),
+            }
+
+        with self._lock:
+            routes = {
+                route: summarize(self.latencies[route], self.statuses[route])
+                for route in sorted(self.latencies)
+            }
+            overall = summarize(
+                [s for latencies in self.latencies.values() for s in latencies],
+                sum(self.statuses.values(), collections.Counter()),
+            )
+        return {"overall": overall, "routes": routes}
+
+
+# pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+def run_load(base_url, mix, concurrency, duration, warmup=0.0, seed=0):
+    """
+    Sends requests from ``concurrency`` threads for ``warmup + duration`` seconds.
+
+    Parameters:
+        base_url (str): Base URL of the server.
+        mix (str): Name of the route mix, a key of ``MIXES``.
+        concurrency (int): Threads sending requests.
+        duration (float): Seconds of counted load.
+        warmup (float): Seconds of uncounted load first.
+        seed (int): Seed of the route and parameter choices.
+
+    Returns:
+        dict: ``Recorder.summary`` of the counted requests.
+    """
+    routes = MIXES[mix]
+    names = list(routes)
+    weights = [routes[name][0] for name in names]
+    ids = catalog_ids(base_url)
+    recorder = Recorder()
+    started = time.perf_counter()
+    counted_from = started + warmup
+    deadline = counted_from + duration
+
+    def worker(number):
+        rng = random.Random(seed * 1000 + number)
+        session = requests.Session()
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            name = rng.choices(names, weights)[0]
+            path = routes[name][1](rng, ids)
+            try:
+                status = str(
+                    session.get(base_url + path, timeout=REQUEST_TIMEOUT).status_code
+                )
+            except requests.RequestException:
+                status = "error"
+            if now >= counted_from:
+                recorder.record(name, status, time.perf_counter() - now)
+        session.close()
+
+    threads = [
+        threading.Thread(target=worker, args=(number,), daemon=True)
+        for number in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(time.perf_counter() - counted_from)
+
+
+def main():
+    """Parses the arguments, runs the load and prints its results."""
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="catalog")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION)
+    parser.add_argument("--warmup", type=float, default=DEFAULT_WARMUP)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = {
+        "benchmark": "load",
+        "mix": args.mix,
+        "concurrency": args.concurrency,
+        "duration_seconds": args.duration,
+        **run_load(
+            args.url,
+            args.mix,
+            args.concurrency,
+            args.duration,
+            args.warmup,
+            args.seed,
+        ),
+    }
+    print_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+benchmarks/pagination.py
+------------------------
+
+Compares keyset pagination of the movie listing with OFFSET pagination.
+
+For each sort key and each ``--depths`` position, the page starting at that
+position is fetched both ways: with ``OFFSET depth LIMIT page_size``, which
+reads and discards every row before the page, and with ``MovieListing.fetch``
+and the cursor of the row just before the page, which starts an index range
+scan right at it. Keyset latency should be the same at every depth; OFFSET
+latency grows with it.
+
+The catalog must hold more movies than the deepest position. ``--reset``
+replaces it with a synthetic catalog of movies only (``benchmarks.seed``) that
+is just large enough, so only point it at a database meant for benchmarks.
+
+Usage:
+    python -m benchmarks.pagination [--reset] [--depths 1000 1000000]
+        [--page-size 50] [--repeat 20] [--output results.json]
+"""
+import statistics
+import time
+
+from sqlalchemy import func, select
+
+from benchmarks import benchmark_parser, migrated_app, print_report
+from benchmarks.seed import DEFAULT_SCALE, seed_catalog
+from extensions import db
+from models.database import Movie
+from services.catalog import (
+    DEFAULT_FIELDS,
+    DEFAULT_PAGE_SIZE,
+    MOVIE_FIELDS,
+    SORT_KEYS,
+    MovieListing,
+    encode_cursor,
+)
+
+DEFAULT_DEPTHS = (1000, 1000000)
+DEFAULT_REPEAT = 20
+SORTS = ("id", "release_date")
+
+
+def median_ms(run, repeat):
+    """Runs ``run`` ``repeat`` times; returns the median duration in milliseconds."""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        durations.append(time.perf_counter() - started)
+    return round(statistics.median(durations) * 1000, 3)
+
+
+def offset_page(session, sort, depth, page_size):
+    """The rows of a page read with OFFSET, as the listing did before cursors."""
+    columns = [SORT_KEYS[sort]] if sort == "id" else [SORT_KEYS[sort], Movie.id]
+    return session.execute(
+        select(*(MOVIE_FIELDS[f] for f in DEFAULT_FIELDS))
+        .order_by(*columns)
+        .offset(depth)
+        .limit(page_size)
+    ).all()
+
+
+def cursor_at(session, sort, depth):
+    """The cursor a client holds after reading the first ``depth`` rows."""
+    columns = [SORT_KEYS[sort]] if sort == "id" else [SORT_KEYS[sort], Movie.id]
+    values = session.execute(
+        select(*columns).order_by(*columns).offset(depth - 1).limit(1)
+    ).one()
+    return encode_cursor(list(values))
+
+
+def measure(session, depths, page_size, repeat):
+    """
+    Times both kinds of pagination at every depth, for every sort key.
+
+    Returns:
+        dict: Per sort key and depth, the median latency of each kind.
+    """
+    results = {}
+    for sort in SORTS:
+        results[sort] = {}
+        for depth in depths:
+            listing = MovieListing(
+                {
+                    "sort": sort,
+                    "limit": str(page_size),
+                    "cursor": cursor_at(session, sort, depth),
+                }
+            )
+            keyset_rows, _ = listing.fetch(session)
+            offset_rows = offset_page(session, sort, depth, page_size)
+            # Both must return the same page for the comparison to mean anything
+            assert [row["id"] for row in keyset_rows] == [row.id for row in offset_rows]
+            results[sort][str(depth)] = {
+                "offset_ms": median_ms(
+                    lambda s=sort, d=depth: offset_page(session, s, d, page_size),
+                    repeat,
+                ),
+                "keyset_ms": median_ms(
+                    lambda listing=listing: listing.fetch(session), repeat
+                ),
+            }
+    return results
+
+
+def main():
+    """Parses the arguments, prepares the catalog and prints the comparison."""
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--depths", type=int, nargs="+", default=list(DEFAULT_DEPTHS))
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--reset", action="store_true")
+    args = parser.parse_args()
+    if min(args.depths) < 1:
+        parser.error("Depths must be positive.")
+    needed = max(args.depths) + args.page_size
+
+    with migrated_app():
+        if args.reset:
+            scale = {name: 0 for name in DEFAULT_SCALE}
+            seed_catalog(db.session, {**scale, "movies": needed}, reset=True)
+        movies = db.session.scalar(select(func.count()).select_from(Movie))
+        if movies < needed:
+            parser.error(
+                f"The catalog has {movies} movies but {needed} are needed;"
+                " pass --reset to generate them."
+            )
+        report = {
+            "benchmark": "pagination",
+            "movies": movies,
+            "page_size": args.page_size,
+            "sorts": measure(db.session, args.depths, args.page_size, args.repeat),
+        }
+
+    shallow, deep = str(min(args.depths)), str(max(args.depths))
+    report["deep_over_shallow"] = {
+        sort: {
+            kind: round(depths[deep][f"{kind}_ms"] / depths[shallow][f"{kind}_ms"], 2)
+            for kind in ("offset", "keyset")
+        }
+        for sort, depths in report["sorts"].items()
+    }
+    print_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
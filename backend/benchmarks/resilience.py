@@ -0,0 +1,182 @@
+"""
+benchmarks/resilience.py
+------------------------
+
+Exercises the circuit breakers and hedged requests against fake upstreams.
+
+Starts ``benchmarks.fake_upstreams`` on a free port, points the outbound
+client at it, and runs TMDB discover calls through ``fetch_discover_page``
+in two scenarios:
+
+* ``slow_tail``: every answer takes ``--latency-ms``, except a ``--slow-rate``
+  share that takes ``--slow-ms``. The calls run once with hedging off and once
+  with it on; the report compares their p50/p95/p99 and counts the hedges.
+* ``outage``: every answer is a 503. The report shows the calls it took to
+  open the breaker, how fast the calls that followed were rejected, and the
+  first successful call after the cool-down once the faults are cleared.
+
+Retries of the outbound client are turned off, so that what is measured is the
+breaker and the hedging alone.
+
+Usage:
+    python -m benchmarks.resilience [--scenario slow_tail|outage|all]
+        [--calls 300] [--latency-ms 10] [--slow-rate 0.05] [--slow-ms 500]
+        [--output results.json]
+"""
+import time
+
+from flask import Flask
+
+from benchmarks import benchmark_parser, fake_upstreams, print_report
+from benchmarks.load import percentiles
+from services.http_client import http_client
+from services.resilience import providers
+from services.tmdb import TMDBError, fetch_discover_page
+
+DEFAULT_CALLS = 300
+DEFAULT_LATENCY_MS = 10
+DEFAULT_SLOW_RATE = 0.05
+DEFAULT_SLOW_MS = 500
+FAILURE_THRESHOLD = 5
+RESET_SECONDS = 1.0
+
+
+def configure(base_url, hedge):
+    """
+    Points the outbound client and the providers at the fake upstreams.
+
+    Parameters:
+        base_url (str): Base URL of the fake server.
+        hedge (bool): Whether slow calls are hedged.
+    """
+    app = Flask("benchmark")
+    app.config.update(
+        HTTP_HOST_OVERRIDES=fake_upstreams.host_overrides(base_url),
+        HTTP_MAX_RETRIES=0,
+        HTTP_READ_TIMEOUT=5.0,
+        BREAKER_FAILURE_THRESHOLD=FAILURE_THRESHOLD,
+        BREAKER_RESET_SECONDS=RESET_SECONDS,
+        HEDGE_REQUESTS=hedge,
+    )
+    http_client.init_app(app)
+    providers.init_app(app)
+
+
+def try_fetch(page):
+    """Fetches a discover page; returns its movies, or None if the call failed."""
+    try:
+        movies, _ = fetch_discover_page("benchmark", 2000, page)
+    except TMDBError:
+        return None
+    return movies
+
+
+def timed_calls(calls):
+    """
+    Fetches ``calls`` discover pages one after the other.
+
+    Returns:
+        tuple: Seconds taken by each call, and how many failed.
+    """
+    latencies = []
+    failed = 0
+    for number in range(calls):
+        page = number % fake_upstreams.TOTAL_PAGES + 1
+        started = time.perf_counter()
+        movies = try_fetch(page)
+        latencies.append(time.perf_counter() - started)
+        failed += movies is None
+    return latencies, failed
+
+
+def slow_tail(base_url, upstreams, args):
+    """Compares the latency percentiles of unhedged and hedged calls."""
+    upstreams.set_faults(
+        {
+            "tmdb": {
+                "latency_ms": args.latency_ms,
+                "slow_rate": args.slow_rate,
+                "slow_ms": args.slow_ms,
+            }
+        }
+    )
+    report = {
+        "faults": upstreams.faults["tmdb"],
+        "calls": args.calls,
+    }
+    for hedge in (False, True):
+        configure(base_url, hedge)
+        latencies, failed = timed_calls(args.calls)
+        stats = providers.stats()["tmdb"]
+        report["hedged" if hedge else "unhedged"] = {
+            **percentiles(latencies),
+            "failed_calls": failed,
+            "hedges": stats["hedges"],
+            "hedge_wins": stats["hedge_wins"],
+            "hedge_delay_ms": stats["hedge_delay_ms"],
+        }
+    return report
+
+
+def outage(base_url, upstreams):
+    """Opens the breaker with failing calls, then lets it recover."""
+    configure(base_url, hedge=False)
+    provider = providers.get("tmdb")
+    upstreams.set_faults({"tmdb": {"latency_ms": 50, "error_rate": 1.0}})
+
+    failing = []
+    while provider.breaker.state != "open":
+        started = time.perf_counter()
+        try_fetch(1)
+        failing.append(time.perf_counter() - started)
+
+    rejected = []
+    for _ in range(100):
+        started = time.perf_counter()
+        try_fetch(1)
+        rejected.append(time.perf_counter() - started)
+    served_while_open = upstreams.served.get("tmdb:503", 0)
+
+    upstreams.set_faults({"tmdb": {}})
+    opened = time.perf_counter()
+    while try_fetch(1) is None:
+        time.sleep(0.05)
+    return {
+        "calls_to_open": len(failing),
+        "failing_call": percentiles(failing),
+        "rejected_calls": len(rejected),
+        "rejected_call": percentiles(rejected),
+        "upstream_requests_while_open": served_while_open - len(failing),
+        "recovered_after_ms": round((time.perf_counter() - opened) * 1000, 2),
+        "reset_seconds": RESET_SECONDS,
+        "breaker": providers.stats()["tmdb"],
+    }
+
+
+def main():
+    """Parses the arguments, runs the scenarios and prints their results."""
+    parser = benchmark_parser(__doc__)
+    parser.add_argument(
+        "--scenario", choices=("slow_tail", "outage", "all"), default="all"
+    )
+    parser.add_argument("--calls", type=int, default=DEFAULT_CALLS)
+    parser.add_argument("--latency-ms", type=int, default=DEFAULT_LATENCY_MS)
+    parser.add_argument("--slow-rate", type=float, default=DEFAULT_SLOW_RATE)
+    parser.add_argument("--slow-ms", type=int, default=DEFAULT_SLOW_MS)
+    args = parser.parse_args()
+
+    server, upstreams, base_url = fake_upstreams.start()
+    report = {"benchmark": "resilience"}
+    try:
+        if args.scenario in ("slow_tail", "all"):
+            report["slow_tail"] = slow_tail(base_url, upstreams, args)
+        if args.scenario in ("outage", "all"):
+            report["outage"] = outage(base_url, upstreams)
+    finally:
+        server.shutdown()
+
+    print_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+benchmarks/search.py
+--------------------
+
+Compares the indexed movie search with an ILIKE scan, as the catalog grows.
+
+For each ``--sizes`` catalog size, the database is reseeded with that many
+movies (``benchmarks.seed``) and every query of ``QUERIES`` is run both ways:
+through ``services.search.search_movies``, which uses the full-text GIN index
+and falls back to the trigram index on titles, and as the search a
+``Movie.query`` filter would be, every word matched with ``ILIKE '%word%'``
+against the title, director, cast and summary. Besides the median latencies,
+the scan nodes of both plans are reported, to show which index answers the
+query and where the ILIKE search falls back to a sequential scan.
+
+Looking up a title should stay fast at every size while the scan grows with
+the catalog. Words that many movies share cost the indexed search more as the
+catalog grows, because every match is ranked; the ILIKE search only looks for
+the first matches in id order, unranked, and wins there when they come early.
+
+The benchmark replaces the catalog, so it only runs with ``--reset``; only
+point it at a database meant for benchmarks.
+
+Usage:
+    python -m benchmarks.search --reset [--sizes 10000 100000 1000000]
+        [--repeat 10] [--output results.json]
+"""
+import json
+
+from sqlalchemy import and_, or_, select, text
+from sqlalchemy.dialects import postgresql
+
+from benchmarks import benchmark_parser, migrated_app, print_report
+from benchmarks.pagination import median_ms
+from benchmarks.seed import seed_sizes
+from extensions import db
+from models.database import Movie
+from services.search import (
+    DEFAULT_LIMIT,
+    RESULT_COLUMNS,
+    SEARCH_CONFIG,
+    _escape_like,
+    search_movies,
+)
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+DEFAULT_REPEAT = 10
+# A seeded title, the same title with typos, and words shared by a sixteenth
+# (or, together, a 256th) of the seeded movies, which every search must rank
+QUERIES = ("Dead Hollow 7777", "Ded Holow 7777", "witch", "silent mirror")
+
+# The filters of the two ``search_movies`` statements, to explain
+FULLTEXT_PLAN = (
+    "SELECT id FROM movies WHERE search_vector @@ websearch_to_tsquery(:config, :q)"
+)
+FUZZY_PLAN = "SELECT id FROM movies WHERE title % :q"
+
+
+def ilike_statement(query, limit=DEFAULT_LIMIT):
+    """The search a ``Movie.query`` filter would be: every word, in any column."""
+    columns = (Movie.title, Movie.director, Movie.cast, Movie.summary)
+    words = [
+        or_(*(column.ilike(f"%{_escape_like(word)}%") for column in columns))
+        for word in query.split()
+    ]
+    return select(*RESULT_COLUMNS).where(and_(*words)).order_by(Movie.id).limit(limit)
+
+
+def scan_nodes(plan):
+    """The node types of a plan that read a table or an index, outermost first."""
+    found = [plan["Node Type"]] if "Scan" in plan["Node Type"] else []
+    for child in plan.get("Plans", ()):
+        found.extend(scan_nodes(child))
+    return found
+
+
+def explain(session, statement, params=None):
+    """The scan nodes of the plan of an SQL string."""
+    plan = session.execute(text(f"EXPLAIN (FORMAT JSON) {statement}"), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return scan_nodes(plan[0]["Plan"])
+
+
+def measure(session, repeat):
+    """
+    Times both searches for every query on the current catalog.
+
+    Returns:
+        dict: Per query, the median latency, hit count and plan of each search.
+    """
+    results = {}
+    for query in QUERIES:
+        hits = search_movies(session, query)
+        match = hits[0]["match"] if hits else None
+        ilike = ilike_statement(query)
+        literal = ilike.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+        results[query] = {
+            "indexed": {
+                "latency_ms": median_ms(
+                    lambda q=query: search_movies(session, q), repeat
+                ),
+                "hits": len(hits),
+                "match": match,
+                "plan": explain(
+                    session,
+                    FUZZY_PLAN if match == "fuzzy" else FULLTEXT_PLAN,
+                    {"config": SEARCH_CONFIG, "q": query},
+                ),
+            },
+            "ilike": {
+                "latency_ms": median_ms(lambda s=ilike: session.execute(s).all(), repeat),
+                "hits": len(session.execute(ilike).all()),
+                "plan": explain(session, str(literal)),
+            },
+        }
+    return results
+
+
+def main():
+    """Parses the arguments, seeds each catalog size and prints the comparison."""
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--reset", action="store_true")
+    args = parser.parse_args()
+    if not args.reset:
+        parser.error("The benchmark replaces the catalog; pass --reset.")
+
+    report = {"benchmark": "search", "sizes": {}}
+    with migrated_app():
+        for size in seed_sizes(db.session, args.sizes):
+            report["sizes"][str(size)] = measure(db.session, args.repeat)
+
+    print_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+benchmarks/seed.py
+------------------
+
+Fills the configured database with a synthetic catalog for load tests.
+
+Movies, trailers, streaming platforms, users, reviews and watchlists are
+generated inside PostgreSQL with ``generate_series``, one set-based statement
+per table, so a catalog of a million reviews takes seconds rather than an ORM
+round trip per row. The data is deterministic for a given ``--seed``: titles,
+people and summaries are drawn from small word lists, so full-text and fuzzy
+search have realistic matches, and ratings spread over the whole scale.
+
+Review aggregates are kept by the review triggers as the reviews go in, and
+the catalog versions are bumped, so cached responses of an earlier catalog are
+not served.
+
+``--reset`` empties the catalog tables first. Only point this at a database
+meant for benchmarks.
+
+Usage:
+    python -m benchmarks.seed --reset [--movies 10000] [--trailers-per-movie 2]
+        [--platforms 8] [--users 2000] [--reviews 50000]
+        [--watchlist-per-user 10] [--seed 0.42]
+"""
+import time
+
+from sqlalchemy import text
+
+from benchmarks import benchmark_parser, migrated_app, print_report
+from extensions import db
+from services.catalog_version import TRACKED_TABLES, bump_versions
+
+DEFAULT_SCALE = {
+    "movies": 10000,
+    "trailers_per_movie": 2,
+    "platforms": 8,
+    "users": 2000,
+    "reviews": 50000,
+    "watchlist_per_user": 10,
+}
+SEEDED_TABLES = (
+    "notifications",
+    "recommendations",
+    "watchlists",
+    "reviews",
+    "platform_trailers",
+    "trailers",
+    "streaming_platforms",
+    "users",
+    "movies",
+    "trailer_lookups",
+)
+
+TITLE_WORDS = (
+    "Night",
+    "Dead",
+    "House",
+    "Blood",
+    "Shadow",
+    "Curse",
+    "Hollow",
+    "Silent",
+    "Witch",
+    "Grave",
+    "Hunger",
+    "Mirror",
+    "Haunting",
+    "Possession",
+    "Ritual",
+    "Asylum",
+)
+NAMES = (
+    "Carpenter",
+    "Craven",
+    "Romero",
+    "Peele",
+    "Aster",
+    "Flanagan",
+    "Wan",
+    "Raimi",
+    "Hooper",
+    "Cronenberg",
+    "Argento",
+    "Kubrick",
+)
+
+# Each statement takes the scale as bind parameters; :words and :names are
+# Postgres arrays of the word lists above
+SEED_STATEMENTS = (
+    (
+        "movies",
+        """
+        INSERT INTO movies (id, tmdb_id, title, director, "cast", release_date,
+            length, age_restriction, summary, trailer_url, poster_url)
+        SELECT i, 1000000 + i,
+            (:words)[1 + i % 16] || ' ' || (:words)[1 + (i / 16) % 16]
+                || ' ' || i,
+            (:names)[1 + i % 12],
+            (:names)[1 + (i * 7) % 12] || ', ' || (:names)[1 + (i * 5) % 12],
+            DATE '1960-01-01' + (i * 37 % 23000),
+            80 + i % 70,
+            CASE WHEN i % 3 = 0 THEN 18 ELSE 13 END,
+            'A ' || lower((:words)[1 + (i * 3) % 16]) || ' haunts a '
+                || lower((:words)[1 + (i * 11) % 16]) || ' in movie ' || i || '.',
+            'https://www.youtube.com/watch?v=bench' || i,
+            'https://image.tmdb.org/t/p/original/bench' || i || '.jpg'
+        FROM generate_series(1, :movies) AS i
+        """,
+    ),
+    (
+        "trailers",
+        """
+        INSERT INTO trailers (movie_id, url, duration, release_date, description)
+        SELECT m, 'https://www.youtube.com/watch?v=bench' || m || '-' || k,
+            60 + (m + k) % 120,
+            DATE '1960-01-01' + (m * 37 % 23000),
+            'Trailer ' || k || ' of movie ' || m
+        FROM generate_series(1, :movies) AS m,
+            generate_series(1, :trailers_per_movie) AS k
+        """,
+    ),
+    (
+        "streaming_platforms",
+        """
+        INSERT INTO streaming_platforms (id, name, url)
+        SELECT p, 'Platform ' || p, 'https://platform' || p || '.example'
+        FROM generate_series(1, :platforms) AS p
+        """,
+    ),
+    (
+        "platform_trailers",
+        """
+        INSERT INTO platform_trailers (trailer_id, platform_id)
+        SELECT t.id, 1 + (t.id + s) % :platforms
+        FROM trailers t, generate_series(0, LEAST(:platforms, 3) - 1) AS s
+        WHERE (t.id + s) % 2 = 0 OR s = 0
+        """,
+    ),
+    (
+        "users",
+        """
+        INSERT INTO users (id, username, email, password_hash)
+        SELECT u, 'bench_user_' || u, 'bench' || u || '@example.com', 'x'
+        FROM generate_series(1, :users) AS u
+        """,
+    ),
+    (
+        "reviews",
+        """
+        INSERT INTO reviews (user_id, trailer_id, rating, review_text)
+        SELECT 1 + floor(random() * :users)::integer,
+            t.first_id + floor(random() * t.total)::integer,
+            round((0.5 + random() * 9.5)::numeric, 1),
+            'Review ' || r || ': ' || (:words)[1 + r % 16] || ' was terrifying.'
+        FROM generate_series(1, :reviews) AS r,
+            (SELECT min(id) AS first_id, count(*) AS total FROM trailers) AS t
+        """,
+    ),
+    (
+        "watchlists",
+        """
+        INSERT INTO watchlists (user_id, movie_id, date_added)
+        SELECT DISTINCT u, 1 + floor(random() * :movies)::integer,
+            DATE '2024-01-01' + (u % 365)
+        FROM generate_series(1, :users) AS u,
+            generate_series(1, :watchlist_per_user) AS k
+        ON CONFLICT DO NOTHING
+        """,
+    ),
+)
+
+
+def seed_catalog(session, scale, seed=0.42, reset=False):
+    """
+    Generates a synthetic catalog in the session's database.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to write with.
+        scale (dict): Row counts, with the keys of ``DEFAULT_SCALE``.
+        seed (float): Seed of the random ratings and picks, in [-1, 1].
+        reset (bool): Empty the catalog tables first.
+
+    Returns:
+        dict: Seconds taken and rows in each seeded table.
+
+    Raises:
+        RuntimeError: If the catalog already has movies and ``reset`` is False.
+    """
+    params = {
+        **DEFAULT_SCALE,
+        **scale,
+        "words": list(TITLE_WORDS),
+        "names": list(NAMES),
+    }
+    timings = {}
+    if reset:
+        session.execute(
+            text(f"TRUNCATE {', '.join(SEEDED_TABLES)} RESTART IDENTITY CASCADE")
+        )
+    elif session.execute(text("SELECT EXISTS (SELECT 1 FROM movies)")).scalar():
+        # Generated ids start at 1 and would collide with the existing rows
+        raise RuntimeError("The catalog is not empty; pass --reset to replace it.")
+    session.execute(text("SELECT setseed(:seed)"), {"seed": seed})
+    for table, statement in SEED_STATEMENTS:
+        started = time.perf_counter()
+        session.execute(text(statement), params)
+        timings[table] = round(time.perf_counter() - started, 3)
+
+    # Explicit ids leave the sequences behind; later inserts must not collide
+    for table in ("movies", "streaming_platforms", "users"):
+        session.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'),"
+                f" (SELECT coalesce(max(id), 1) FROM {table}))"
+            )
+        )
+    bump_versions(session, TRACKED_TABLES)
+    session.commit()
+
+    counts = {
+        table: session.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+        for table, _ in SEED_STATEMENTS
+    }
+    session.execute(text(f"ANALYZE {', '.join(table for table, _ in SEED_STATEMENTS)}"))
+    session.commit()
+    return {"seconds": timings, "rows": counts}
+
+
+def seed_sizes(session, sizes):
+    """
+    Replaces the catalog with one of each size in turn, of movies only.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to write with.
+        sizes (list of int): Numbers of movies.
+
+    Yields:
+        int: The size just seeded, smallest first.
+    """
+    scale = {name: 0 for name in DEFAULT_SCALE}
+    for size in sorted(sizes):
+        seed_catalog(session, {**scale, "movies": size}, reset=True)
+        yield size
+
+
+def main():
+    """Parses the arguments, seeds the database and prints what was written."""
+    parser = benchmark_parser(__doc__)
+    for name, default in DEFAULT_SCALE.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+    parser.add_argument("--seed", type=float, default=0.42)
+    parser.add_argument("--reset", action="store_true")
+    args = parser.parse_args()
+
+    with migrated_app():
+        report = seed_catalog(
+            db.session,
+            {name: getattr(args, name) for name in DEFAULT_SCALE},
+            seed=args.seed,
+            reset=args.reset,
+        )
+    print_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
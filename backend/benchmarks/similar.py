@@ -0,0 +1,98 @@
+"""
+benchmarks/similar.py
+---------------------
+
+Measures the build, query latency and recall of the similar movies index.
+
+For each ``--sizes`` catalog size, the database is reseeded with that many
+movies (``benchmarks.seed``) and an index is built into a temporary directory
+with ``services.similar_movies.build_index``. ``--queries`` movies spread over
+the catalog are then looked up, probing ``--probes`` inverted lists;
+catalogs up to ``EXACT_SEARCH_LIMIT`` movies are searched exhaustively, larger
+ones through the IVF lists. Recall@10 is the share of the exhaustive top 10
+over the same vectors that the probed search finds, ties at the cut-off
+counting as found.
+
+The benchmark replaces the catalog, so it only runs with ``--reset``; only
+point it at a database meant for benchmarks.
+
+Usage:
+    python -m benchmarks.similar --reset [--sizes 100000 500000]
+        [--queries 200] [--probes 8] [--output results.json]
+"""
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks import benchmark_parser, migrated_app, print_report
+from benchmarks.load import percentiles
+from benchmarks.seed import seed_sizes
+from extensions import db
+from services.similar_movies import (
+    DEFAULT_LIMIT,
+    DEFAULT_PROBES,
+    SimilarMovieIndex,
+    build_index,
+)
+
+DEFAULT_SIZES = (100000, 500000)
+DEFAULT_QUERIES = 200
+
+
+def measure(session, queries, probes=DEFAULT_PROBES):
+    """
+    Builds an index of the current catalog and queries it.
+
+    Returns:
+        dict: Build seconds, list count, query latency percentiles and recall@10.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        stats = build_index(session, directory)
+        build_seconds = time.perf_counter() - started
+
+        index = SimilarMovieIndex(directory, probes)
+        exhaustive = SimilarMovieIndex(directory, probes=stats["lists"])
+        movie_ids = np.linspace(1, stats["movies"], queries, dtype=np.int64)
+
+        latencies, found = [], 0
+        for movie_id in movie_ids.tolist():
+            started = time.perf_counter()
+            matches = index.similar(movie_id, DEFAULT_LIMIT)
+            latencies.append(time.perf_counter() - started)
+            cut_off = exhaustive.similar(movie_id, DEFAULT_LIMIT)[-1][1]
+            found += sum(score >= cut_off - 1e-5 for _, score in matches)
+
+    return {
+        "build_seconds": round(build_seconds, 2),
+        "lists": stats["lists"],
+        "probes": index.probes,
+        "latency": percentiles(latencies),
+        "recall_at_10": round(found / (queries * DEFAULT_LIMIT), 3),
+    }
+
+
+def main():
+    """Parses the arguments, seeds each catalog size and prints the measurements."""
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES)
+    parser.add_argument("--probes", type=int, default=DEFAULT_PROBES)
+    parser.add_argument("--reset", action="store_true")
+    args = parser.parse_args()
+    if not args.reset:
+        parser.error("The benchmark replaces the catalog; pass --reset.")
+
+    report = {"benchmark": "similar", "sizes": {}}
+    with migrated_app():
+        for size in seed_sizes(db.session, args.sizes):
+            report["sizes"][str(size)] = measure(
+                db.session, args.queries, args.probes
+            )
+
+    print_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
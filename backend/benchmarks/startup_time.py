@@ -0,0 +1,180 @@
+"""
+benchmarks/startup_time.py
+--------------------------
+
+Measures the time-to-first-request of web workers.
+
+Every worker imports the app, runs ``create_app`` and serves one request through
+the test client, without a network socket in the way. Workers are started the
+two ways gunicorn starts them:
+
+* ``--fresh``: each worker is a new interpreter that does all of the above,
+  like gunicorn without ``--preload``. The time counts from process start.
+* default (preload): the app is created once in this process, which then forks
+  the workers, like ``gunicorn --preload``. The time counts from the fork.
+
+``--eager`` adds what ``create_app`` used to do at boot, importing
+``googleapiclient`` and calling ``discovery.build("youtube", "v3")``, so the
+same command measures the startup path before and after the lazy client. The
+first request does not need a database unless ``--path`` points at a route
+that reads one.
+
+Usage:
+    python -m benchmarks.startup_time --workers 4 [--fresh] [--eager]
+        [--path /] [--output results.json]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import benchmark_parser, print_report
+
+DEFAULT_WORKERS = 4
+
+
+def build_eagerly():
+    """Builds the YouTube client the way ``create_app`` used to, at boot."""
+    # pylint: disable=import-outside-toplevel
+    from googleapiclient.discovery import build
+
+    build("youtube", "v3", developerKey=os.environ.get("youtube_api_key"))
+
+
+def first_request(app, path):
+    """Serves one request and fails loudly if the route did not answer."""
+    response = app.test_client().get(path)
+    if response.status_code >= 500:
+        raise RuntimeError(f"GET {path} answered {response.status_code}")
+    return response.status_code
+
+
+def run_fresh_worker(started, eager, path):
+    """
+    Starts a worker from scratch, in this newly spawned interpreter.
+
+    Parameters:
+        started (float): ``time.time()`` just before the interpreter was spawned.
+        eager (bool): Build the YouTube client at boot.
+        path (str): Route of the first request.
+
+    Returns:
+        dict: Seconds spent in each step, and in total since the spawn.
+    """
+    # Interpreter start-up happened before this line
+    imported_at = time.time()
+    from app import create_app  # pylint: disable=import-outside-toplevel
+
+    created_at = time.time()
+    app = create_app()
+    if eager:
+        build_eagerly()
+    served_at = time.time()
+    first_request(app, path)
+    finished = time.time()
+    return {
+        "interpreter_seconds": imported_at - started,
+        "import_seconds": created_at - imported_at,
+        "create_app_seconds": served_at - created_at,
+        "first_request_seconds": finished - served_at,
+        "total_seconds": finished - started,
+    }
+
+
+def fresh_workers(workers, eager, path):
+    """Spawns ``workers`` interpreters one after the other and collects their timings."""
+    results = []
+    for _ in range(workers):
+        command = [sys.executable, "-m", "benchmarks.startup_time", "--child"]
+        command += [str(time.time()), path] + (["--eager"] if eager else [])
+        output = subprocess.run(command, check=True, capture_output=True, text=True)
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def preloaded_workers(workers, eager, path):
+    """
+    Creates the app once, then forks ``workers`` children that serve a request.
+
+    Returns:
+        tuple: Seconds the parent spent preloading, and each child's timings.
+    """
+    started = time.perf_counter()
+    from app import create_app  # pylint: disable=import-outside-toplevel
+    from services.youtube import youtube_client  # pylint: disable=import-outside-toplevel
+
+    app = create_app()
+    if eager:
+        build_eagerly()
+    else:
+        # What gunicorn.conf.py does in the master under --preload
+        youtube_client.preload()
+    preload_seconds = time.perf_counter() - started
+
+    results = []
+    for _ in range(workers):
+        reader, writer = os.pipe()
+        forked = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(reader)
+            first_request(app, path)
+            timing = {"total_seconds": time.perf_counter() - forked}
+            os.write(writer, json.dumps(timing).encode())
+            os._exit(0)  # pylint: disable=protected-access
+        os.close(writer)
+        with os.fdopen(reader) as pipe:
+            results.append(json.loads(pipe.read()))
+        os.waitpid(pid, 0)
+    return preload_seconds, results
+
+
+def summarize(results):
+    """Median and maximum of every timing across workers, in milliseconds."""
+    return {
+        name: {
+            "median_ms": round(statistics.median(r[name] for r in results) * 1000, 2),
+            "max_ms": round(max(r[name] for r in results) * 1000, 2),
+        }
+        for name in results[0]
+    }
+
+
+def main():
+    """Parses the arguments, runs the benchmark and prints its results."""
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--fresh", action="store_true")
+    parser.add_argument("--eager", action="store_true")
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--child", nargs=2, metavar=("STARTED", "PATH"))
+    args = parser.parse_args()
+
+    if args.child:
+        started, path = args.child
+        print(json.dumps(run_fresh_worker(float(started), args.eager, path)))
+        return
+
+    report = {
+        "benchmark": "startup_time",
+        "mode": "fresh" if args.fresh else "preload",
+        "youtube_client": "eager" if args.eager else "lazy",
+        "workers": args.workers,
+        "path": args.path,
+    }
+    if args.fresh:
+        results = fresh_workers(args.workers, args.eager, args.path)
+    else:
+        preload_seconds, results = preloaded_workers(
+            args.workers, args.eager, args.path
+        )
+        report["preload_ms"] = round(preload_seconds * 1000, 2)
+    report["time_to_first_request"] = summarize(results)
+
+    print_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
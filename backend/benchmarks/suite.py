@@ -0,0 +1,291 @@
+"""
+benchmarks/suite.py
+-------------------
+
+Runs the whole load-test suite against a real server and records the results.
+
+In order, the suite:
+
+1. seeds the configured database with a synthetic catalog, with ``--seed``
+   (see ``benchmarks.seed``; this empties the catalog tables first);
+2. starts the fake TMDB and YouTube APIs of ``benchmarks.fake_upstreams`` with
+   the latency given by ``--upstream-latency-ms``;
+3. starts gunicorn with ``gunicorn.conf.py``, pointed at the fake APIs;
+4. drives every route mix of ``benchmarks.load`` in turn;
+5. with ``--ingest-years``, queues a backfill of those years, runs it with a
+   job worker, and times it end to end, TMDB and YouTube calls included.
+
+The results, with the commit they were measured on, go to ``--output`` as JSON;
+``--compare`` prints how they differ from an earlier file (see
+``benchmarks.compare``). The database comes from the usual db_* variables.
+
+Usage:
+    python -m benchmarks.suite [--seed] [--movies 10000] [--reviews 50000]
+        [--workers 2] [--threads 4] [--concurrency 8] [--duration 20]
+        [--mixes catalog,detail] [--upstream-latency-ms 20]
+        [--ingest-years 2000-2001] [--output results.json]
+        [--compare baseline.json]
+"""
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from benchmarks import benchmark_parser, fake_upstreams, print_report
+from benchmarks.compare import compare
+from benchmarks.load import MIXES, run_load
+from benchmarks.seed import DEFAULT_SCALE
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_TIMEOUT = 60
+JOB_POLL_INTERVAL = 0.5
+JOB_TIMEOUT = 1800
+
+
+def git_revision():
+    """The commit checked out, and whether the tree has uncommitted changes."""
+
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=False
+        ).stdout.strip()
+
+    return {
+        "commit": git("rev-parse", "HEAD") or None,
+        "dirty": bool(git("status", "--porcelain")),
+    }
+
+
+def free_port():
+    """A TCP port nothing listens on right now."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def wait_until_up(base_url, process):
+    """
+    Waits for the server to answer its home page.
+
+    Raises:
+        RuntimeError: If the server exits or does not answer in time.
+    """
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with status {process.returncode}")
+        try:
+            if requests.get(base_url, timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"The server did not answer within {STARTUP_TIMEOUT}s")
+
+
+def seed(args, env):
+    """Seeds the database in a child process; returns what it reported."""
+    command = [sys.executable, "-m", "benchmarks.seed", "--reset"]
+    for name in DEFAULT_SCALE:
+        command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    output = subprocess.run(
+        command, cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output)
+
+
+def ingest(base_url, env, start_year, end_year):
+    """
+    Queues a backfill, runs it with a job worker and times it.
+
+    Returns:
+        dict: Seconds from queuing to completion, the job status, movies
+        ingested per second, and the job's lookup and write totals.
+    """
+    started = time.perf_counter()
+    response = requests.post(
+        f"{base_url}/trigger_search",
+        json={"mode": "backfill", "start_year": start_year, "end_year": end_year},
+        timeout=30,
+    )
+    response.raise_for_status()
+    status_url = base_url + response.json()["status_url"]
+    deadline = time.monotonic() + JOB_TIMEOUT
+    with subprocess.Popen(
+        [sys.executable, "worker.py", "--burst"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    ) as worker:
+        try:
+            while True:
+                job = requests.get(status_url, timeout=30).json()
+                if (
+                    job["status"] in ("succeeded", "failed")
+                    or time.monotonic() > deadline
+                ):
+                    break
+                time.sleep(JOB_POLL_INTERVAL)
+        finally:
+            worker.wait(timeout=60)
+    elapsed = time.perf_counter() - started
+
+    result = job.get("result") or {}
+    written = result.get("written", {})
+    movies = sum(written.get(key, 0) for key in ("inserted", "updated", "unchanged"))
+    return {
+        "status": job["status"],
+        "duration_seconds": round(elapsed, 2),
+        "movies_per_second_rps": round(movies / elapsed, 2) if elapsed else None,
+        "result": {
+            key: result[key]
+            for key in ("total", "succeeded", "failed", "written", "providers")
+            if key in result
+        },
+    }
+
+
+def parse_args():
+    """Parses the command line; returns the arguments and the mixes to run."""
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--seed", action="store_true")
+    for name, default in DEFAULT_SCALE.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--mixes", default="catalog,detail")
+    parser.add_argument("--upstream-latency-ms", type=int, default=20)
+    parser.add_argument("--no-response-cache", action="store_true")
+    parser.add_argument("--ingest-years", metavar="START-END")
+    parser.add_argument("--compare", metavar="BASELINE")
+    args = parser.parse_args()
+    mixes = [mix for mix in args.mixes.split(",") if mix]
+    for mix in mixes:
+        if mix not in MIXES:
+            parser.error(f"Unknown mix {mix!r}; choose from {', '.join(MIXES)}")
+    return args, mixes
+
+
+def server_env(args, upstream_url, port, workdir):
+    """The environment of the server, the seeder and the job worker."""
+    return {
+        **os.environ,
+        "gunicorn_bind": f"127.0.0.1:{port}",
+        "gunicorn_workers": str(args.workers),
+        "gunicorn_threads": str(args.threads),
+        "http_host_overrides": fake_upstreams.host_overrides(upstream_url),
+        "metrics_multiproc_dir": os.path.join(workdir, "metrics"),
+        "backfill_cursor_path": os.path.join(workdir, "backfill_cursor.json"),
+        "response_cache_enabled": "false" if args.no_response_cache else "true",
+        # The fake YouTube API costs nothing, so its quota must not end the ingest
+        "youtube_daily_quota": str(10**9),
+        "youtube_quota_rate": str(10**6),
+        "youtube_quota_burst": str(10**6),
+    }
+
+
+def measure(args, mixes, env, base_url, server_log):
+    """
+    Starts gunicorn, runs the load mixes and the ingest against it, and stops it.
+
+    Returns:
+        dict: The ``load`` results per mix, and the ``ingest`` results if one ran.
+    """
+    results = {"load": {}}
+    command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"]
+    with open(server_log, "wb") as log, subprocess.Popen(
+        command + ["app:create_app()"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=log,
+        stderr=log,
+    ) as server:
+        try:
+            wait_until_up(base_url, server)
+            for mix in mixes:
+                print(f"Running the {mix} mix for {args.duration:g}s", file=sys.stderr)
+                results["load"][mix] = run_load(
+                    base_url, mix, args.concurrency, args.duration, args.warmup
+                )
+            if args.ingest_years:
+                start_year, _, end_year = args.ingest_years.partition("-")
+                print("Running the ingest", file=sys.stderr)
+                results["ingest"] = ingest(
+                    base_url, env, int(start_year), int(end_year or start_year)
+                )
+        except RuntimeError:
+            print(f"See the server log in {server_log}", file=sys.stderr)
+            raise
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return results
+
+
+def print_comparison(baseline_path, report):
+    """Prints the changes from the results in ``baseline_path``, regressions flagged."""
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = json.load(file)
+    for row in compare(baseline, report):
+        if row["change_pct"] is not None:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"{row['path']}: {row['change_pct']:+.1f}%{flag}")
+
+
+def main():
+    """Parses the arguments, runs the suite and writes its results."""
+    args, mixes = parse_args()
+    report = {
+        "benchmark": "suite",
+        **git_revision(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "compare")
+        },
+    }
+
+    fake_server, _, upstream_url = fake_upstreams.start(
+        faults={
+            "tmdb": {"latency_ms": args.upstream_latency_ms},
+            "youtube": {"latency_ms": args.upstream_latency_ms},
+        }
+    )
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix="scarescreen-bench-")
+    env = server_env(args, upstream_url, port, workdir)
+    try:
+        if args.seed:
+            report["seed"] = seed(args, env)
+        report.update(
+            measure(
+                args,
+                mixes,
+                env,
+                f"http://127.0.0.1:{port}",
+                os.path.join(workdir, "gunicorn.log"),
+            )
+        )
+    finally:
+        fake_server.shutdown()
+
+    print_report(report, args.output)
+    if args.compare:
+        print_comparison(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+benchmarks/writer.py
+--------------------
+
+Compares the set-based movie writer with a per-row ORM write.
+
+Both writers store ``--movies`` synthetic movies, half of them with a trailer,
+in three rounds: into an empty catalog, again unchanged, and again with
+``--changed`` percent of the titles renamed. The per-row writer is what the
+old ``update_movie_object`` stub described: look each movie up by its TMDB id,
+add or modify it and its trailer through the ORM, and commit, one movie at a
+time. The set-based writer is ``services.writer.upsert_movies``.
+
+The movie and trailer tables are emptied before each writer runs (and their
+dependents with them), so the database must be meant for benchmarks: a
+catalog that is not empty is only replaced with ``--reset``.
+
+Usage:
+    python -m benchmarks.writer --reset [--movies 10000] [--changed 10]
+        [--output results.json]
+"""
+import time
+
+from sqlalchemy import select, text
+
+from benchmarks import benchmark_parser, migrated_app, print_report
+from extensions import db
+from models.database import Movie, Trailer
+from services.writer import WriteCounts, movie_row, upsert_movies
+
+DEFAULT_MOVIES = 10000
+DEFAULT_CHANGED = 10
+
+
+def synthetic_movies(count, renamed=0):
+    """Movie details as ``services.tmdb.parse_movie`` builds them."""
+    return [
+        {
+            "id": 2_000_000 + number,
+            "title": f"Benchmark Horror {number}" + (" II" if number < renamed else ""),
+            "poster_url": f"https://image.tmdb.org/t/p/original/bench{number}.jpg",
+            "release_date": f"{1960 + number % 60}-10-31",
+            "summary": f"Synthetic movie {number} for the writer benchmark.",
+            "trailer_url": (
+                f"https://www.youtube.com/watch?v=w{number}" if number % 2 else None
+            ),
+        }
+        for number in range(count)
+    ]
+
+
+def per_row_write(session, movies):
+    """
+    Writes movies one at a time through the ORM, committing after each.
+
+    Returns:
+        WriteCounts: What the write did, counted the same way as the writer.
+    """
+    counts = WriteCounts()
+    for movie in movies:
+        row = movie_row(movie)
+        stored = session.scalar(select(Movie).where(Movie.tmdb_id == row["tmdb_id"]))
+        if row["trailer_url"] is None and stored is not None:
+            row["trailer_url"] = stored.trailer_url
+        if stored is None:
+            stored = Movie(**row)
+            session.add(stored)
+            counts.inserted += 1
+        elif any(getattr(stored, name) != value for name, value in row.items()):
+            for name, value in row.items():
+                setattr(stored, name, value)
+            counts.updated += 1
+        else:
+            counts.unchanged += 1
+
+        if movie.get("trailer_url"):
+            session.flush()
+            trailer = session.scalar(
+                select(Trailer).where(
+                    Trailer.movie_id == stored.id, Trailer.url == movie["trailer_url"]
+                )
+            )
+            if trailer is None:
+                session.add(Trailer(movie_id=stored.id, url=movie["trailer_url"]))
+                counts.trailers_inserted += 1
+            else:
+                counts.trailers_unchanged += 1
+        session.commit()
+    return counts
+
+
+def run_rounds(session, write, count, changed):
+    """
+    Runs the three rounds with one writer, on an emptied catalog.
+
+    Returns:
+        dict: Seconds, movies per second and write counts per round.
+    """
+    session.execute(text("TRUNCATE movies, trailers RESTART IDENTITY CASCADE"))
+    session.commit()
+    rounds = {}
+    for name, movies in (
+        ("insert", synthetic_movies(count)),
+        ("unchanged", synthetic_movies(count)),
+        ("changed", synthetic_movies(count, renamed=count * changed // 100)),
+    ):
+        started = time.perf_counter()
+        counts = write(session, movies)
+        elapsed = time.perf_counter() - started
+        rounds[name] = {
+            "duration_seconds": round(elapsed, 3),
+            "movies_per_second_rps": round(count / elapsed, 1),
+            "counts": counts.as_dict(),
+        }
+    return rounds
+
+
+def main():
+    """Parses the arguments, runs both writers and prints the comparison."""
+    parser = benchmark_parser(__doc__)
+    parser.add_argument("--movies", type=int, default=DEFAULT_MOVIES)
+    parser.add_argument("--changed", type=int, default=DEFAULT_CHANGED)
+    parser.add_argument("--reset", action="store_true")
+    args = parser.parse_args()
+
+    with migrated_app():
+        if not args.reset and db.session.scalar(select(Movie.id).limit(1)):
+            parser.error("The catalog is not empty; pass --reset to replace it.")
+        report = {
+            "benchmark": "writer",
+            "movies": args.movies,
+            "changed_percent": args.changed,
+            "per_row": run_rounds(db.session, per_row_write, args.movies, args.changed),
+            "set_based": run_rounds(
+                db.session, upsert_movies, args.movies, args.changed
+            ),
+        }
+        db.session.execute(text("TRUNCATE movies, trailers RESTART IDENTITY CASCADE"))
+        db.session.commit()
+
+    report["speedup"] = {
+        name: round(
+            report["per_row"][name]["duration_seconds"]
+            / report["set_based"][name]["duration_seconds"],
+            1,
+        )
+        for name in report["per_row"]
+    }
+    print_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
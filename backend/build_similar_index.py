@@ -0,0 +1,23 @@
+"""
+build_similar_index.py
+------
+
+A Python script to rebuild the "similar movies" index from the movie catalog.
+
+The new index is published atomically; running workers switch to it on their
+next query.
+
+"""
+import json
+
+from app import create_app
+from extensions import db
+from services.similar_movies import build_index
+
+app = create_app()
+
+with app.app_context():
+    print("Building the similar movies index...")
+    stats = build_index(db.session, app.config["SIMILAR_INDEX_DIR"])
+    db.session.commit()
+    print(json.dumps(stats))
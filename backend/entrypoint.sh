@@ -11,7 +11,14 @@ echo "Waiting for DB to be ready..."
 echo "Initializing the database..."
 python /backend/init_db.py
 
+# Run background jobs instead of serving requests
+if [ "$1" = "worker" ]; then
+    shift
+    echo "Starting the job worker..."
+    exec python /backend/worker.py "$@"
+fi
+
 # Start the main application
 echo "Starting the application with Gunicorn..."
-gunicorn --bind 0.0.0.0:8000 "app:create_app()"
+gunicorn -c /backend/gunicorn.conf.py "app:create_app()"
 
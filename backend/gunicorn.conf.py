@@ -0,0 +1,59 @@
+"""
+gunicorn.conf.py
+----------------
+
+Gunicorn settings for the backend, read by ``gunicorn -c gunicorn.conf.py``.
+
+The app is preloaded by default: the master imports it and runs ``create_app``
+once, then forks the workers, which start serving without repeating that work
+and share the master's memory pages. Whatever the master opened that must not
+cross a fork is reset in ``post_fork``.
+
+Every worker writes its metrics to files in metrics_multiproc_dir, which is
+emptied when the server starts, so that ``/metrics`` sums all the workers.
+
+Settings come from lowercase environment variables, like the rest of the app:
+gunicorn_bind, gunicorn_workers, gunicorn_threads, gunicorn_timeout and
+gunicorn_preload.
+"""
+from os import environ
+
+from services.metrics import prepare_multiprocess_dir
+
+bind = environ.get("gunicorn_bind", "0.0.0.0:8000")
+workers = int(environ.get("gunicorn_workers", 1))
+threads = int(environ.get("gunicorn_threads", 1))
+timeout = int(environ.get("gunicorn_timeout", 30))
+preload_app = environ.get("gunicorn_preload", "true").lower() == "true"
+metrics_dir = environ.setdefault("metrics_multiproc_dir", "/tmp/scarescreen-metrics")
+
+
+def on_starting(server):  # pylint: disable=unused-argument
+    """Forgets the metrics of earlier runs."""
+    prepare_multiprocess_dir(metrics_dir)
+
+
+def when_ready(server):
+    """Imports the YouTube client library once in the master, for every worker."""
+    if server.cfg.preload_app:
+        # pylint: disable=import-outside-toplevel
+        from services.youtube import youtube_client
+
+        youtube_client.preload()
+
+
+def post_fork(server, worker):  # pylint: disable=unused-argument
+    """Drops database and outbound connections inherited from the master."""
+    if not server.cfg.preload_app:
+        return
+
+    # pylint: disable=import-outside-toplevel
+    from extensions import db
+    from services.http_client import http_client
+
+    app = worker.app.wsgi()
+    with app.app_context():
+        # close=False leaves the master's sockets alone; the worker just stops
+        # using them and opens its own
+        db.engine.dispose(close=False)
+    http_client.reset()
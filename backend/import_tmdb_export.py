@@ -0,0 +1,47 @@
+"""
+import_tmdb_export.py
+------
+
+A Python script to seed the movie catalog from a TMDB daily ID export, e.g.
+``movie_ids_05_15_2024.json.gz``, without calling the TMDB API.
+
+The export lists about a million movies, so ``--min-popularity``, ``--ids-file``
+(one TMDB id per line) or both must be given. Movies already in the catalog are
+kept as they are. Progress is logged per
+batch; the totals, with rows per second, are printed as JSON at the end.
+
+"""
+import argparse
+import json
+import logging
+
+from app import create_app
+from extensions import db
+from services.tmdb_export import DEFAULT_BATCH_SIZE, import_export, read_ids
+
+parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+parser.add_argument("path")
+parser.add_argument("--min-popularity", type=float)
+parser.add_argument("--ids-file")
+parser.add_argument("--include-adult", action="store_true")
+parser.add_argument("--include-video", action="store_true")
+parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+args = parser.parse_args()
+if args.min_popularity is None and args.ids_file is None:
+    parser.error("give --min-popularity, --ids-file or both")
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+app = create_app()
+
+with app.app_context(), db.engine.connect() as connection:
+    print(f"Importing {args.path}...")
+    stats = import_export(
+        connection,
+        args.path,
+        min_popularity=args.min_popularity,
+        ids=read_ids(args.ids_file) if args.ids_file else None,
+        include_adult=args.include_adult,
+        include_video=args.include_video,
+        batch_size=args.batch_size,
+    )
+    print(json.dumps(stats.as_dict()))
@@ -2,17 +2,18 @@
 init_db.py
 ------
 
-A Python script to create the database tables.
+A Python script to create the database tables and bring them up to date.
 
 """
 from app import create_app
 from extensions import db
+from migrations import upgrade
 
 app = create_app()
 
 with app.app_context():
-    print("Creating database tables...")
+    print("Applying database migrations...")
 
-    # Now creates tables for all imported models
-    db.create_all()
-    print("Tables created successfully")
+    # Creates missing tables, then applies every migration not recorded yet
+    applied = upgrade(db.engine)
+    print(f"Applied {len(applied)} migration(s)")
@@ -0,0 +1,125 @@
+"""
+migrations
+----------
+
+Versioned schema migrations for the application database.
+
+Each migration is a module named ``mNNNN_<description>.py`` exposing ``VERSION``
+and ``upgrade(connection)``. Applied versions are recorded in the
+``schema_migrations`` table, and every migration runs in its own transaction,
+so a failed migration leaves the database at the previous version.
+
+A PostgreSQL advisory lock is held while migrating, so several containers
+starting at once apply each migration exactly once.
+
+Migrations hold their DDL as SQL rather than building it from the models, so
+applying them always gives the same schema however the models change later. The
+first one creates the tables as ``db.create_all()`` did before migrations
+existed; the others bring those tables up to date, and are written to be no-ops
+on a database that already has their changes. A model change therefore always
+comes with a new migration, and ``tests/test_migrations.py`` checks the two
+agree.
+
+Functions:
+    applied_versions(connection): Versions already applied.
+    upgrade(engine): Apply every pending migration.
+"""
+from sqlalchemy import text
+
+from migrations import (
+    m0001_initial_schema,
+    m0002_ingest_columns,
+    m0003_updated_at_columns,
+    m0004_listing_and_search_indexes,
+    m0005_foreign_key_indexes,
+    m0006_rating_aggregates,
+    m0007_notification_dedupe_key,
+    m0008_jobs,
+    m0009_quota_and_job_priority,
+    m0010_shared_rate_limit,
+    m0011_movie_source,
+)
+
+MIGRATIONS = (
+    m0001_initial_schema,
+    m0002_ingest_columns,
+    m0003_updated_at_columns,
+    m0004_listing_and_search_indexes,
+    m0005_foreign_key_indexes,
+    m0006_rating_aggregates,
+    m0007_notification_dedupe_key,
+    m0008_jobs,
+    m0009_quota_and_job_priority,
+    m0010_shared_rate_limit,
+    m0011_movie_source,
+)
+
+# Arbitrary application-wide key for pg_advisory_lock
+MIGRATION_LOCK_KEY = 727_310_001
+
+
+def _name(migration):
+    return migration.__name__.rsplit(".", 1)[-1]
+
+
+def applied_versions(connection):
+    """
+    Reads the versions already applied, creating the bookkeeping table if needed.
+
+    Parameters:
+        connection (Connection): An open SQLAlchemy connection.
+
+    Returns:
+        set of int: The applied migration versions.
+    """
+    connection.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " version integer PRIMARY KEY,"
+            " name varchar(200) NOT NULL,"
+            " applied_at timestamptz NOT NULL DEFAULT now())"
+        )
+    )
+    return set(connection.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def upgrade(engine):
+    """
+    Applies every pending migration in version order.
+
+    Parameters:
+        engine (Engine): The SQLAlchemy engine of the database to migrate.
+
+    Returns:
+        list of str: Names of the migrations applied by this call.
+    """
+    applied = []
+    with engine.connect() as connection:
+        connection.execute(
+            text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY}
+        )
+        connection.commit()
+        try:
+            done = applied_versions(connection)
+            connection.commit()
+
+            for migration in MIGRATIONS:
+                if migration.VERSION in done:
+                    continue
+                with connection.begin():
+                    migration.upgrade(connection)
+                    connection.execute(
+                        text(
+                            "INSERT INTO schema_migrations (version, name)"
+                            " VALUES (:version, :name)"
+                        ),
+                        {"version": migration.VERSION, "name": _name(migration)},
+                    )
+                applied.append(_name(migration))
+        finally:
+            connection.rollback()
+            connection.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY}
+            )
+            connection.commit()
+    return applied
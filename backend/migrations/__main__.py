@@ -0,0 +1,64 @@
+"""
+migrations/__main__.py
+----------------------
+
+Command line entry point: ``python -m migrations [upgrade|status|check-plans]``.
+
+upgrade:      Apply the pending migrations (the default).
+status:       List every migration and whether it is applied.
+check-plans:  Explain the hot queries and exit non-zero if any of them would
+              fall back to a sequential scan.
+"""
+import sys
+
+from app import create_app
+from extensions import db
+from migrations import MIGRATIONS, applied_versions, upgrade
+from migrations.check_plans import check_plans
+
+
+def main(argv):
+    """
+    Runs a migration command.
+
+    Parameters:
+        argv (list of str): Command line arguments without the program name.
+
+    Returns:
+        int: The process exit status.
+    """
+    command = argv[0] if argv else "upgrade"
+    app = create_app()
+    with app.app_context():
+        if command == "upgrade":
+            applied = upgrade(db.engine)
+            print(f"Applied {len(applied)} migration(s).")
+            for name in applied:
+                print(f"  {name}")
+            return 0
+
+        if command == "status":
+            with db.engine.connect() as connection:
+                done = applied_versions(connection)
+                connection.commit()
+            for migration in MIGRATIONS:
+                state = "applied" if migration.VERSION in done else "pending"
+                print(f"{migration.__name__.rsplit('.', 1)[-1]}: {state}")
+            return 0
+
+        if command == "check-plans":
+            with db.engine.connect() as connection:
+                failures = check_plans(connection)
+            for name, tables in failures:
+                print(f"Sequential scan in '{name}': {', '.join(tables)}")
+            if failures:
+                return 1
+            print("Every hot query uses an index.")
+            return 0
+
+    print(f"Unknown command '{command}'. Use upgrade, status or check-plans.")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,111 @@
+"""
+migrations/check_plans.py
+-------------------------
+
+Plan regression check for the hot queries.
+
+Each query is explained with sequential scans disabled, which makes the planner
+use an index whenever one can answer the query. A plan that still contains a
+sequential scan therefore means the index the query relies on is missing, for
+example because a migration was not applied or a model index was renamed.
+
+Functions:
+    seq_scans(plan): Tables read with a sequential scan in a plan.
+    check_plans(connection): Explain every hot query and report the offenders.
+"""
+import json
+
+from sqlalchemy import text
+
+# (name, query); literal values keep the plans independent of bind parameters
+HOT_QUERIES = (
+    ("movie by tmdb id", "SELECT id FROM movies WHERE tmdb_id = 1"),
+    (
+        "listing by release date",
+        "SELECT id, title FROM movies WHERE (release_date, id) > ('2000-01-01', 0)"
+        " ORDER BY release_date, id LIMIT 51",
+    ),
+    (
+        "listing by rating",
+        "SELECT id, title FROM movies WHERE (rating, id) > (5, 0)"
+        " ORDER BY rating, id LIMIT 51",
+    ),
+    (
+        "listing by title",
+        "SELECT id, title FROM movies WHERE (title, id) > ('A', 0)"
+        " ORDER BY title, id LIMIT 51",
+    ),
+    (
+        "full-text search",
+        "SELECT id FROM movies"
+        " WHERE search_vector @@ websearch_to_tsquery('english', 'haunted house')",
+    ),
+    ("fuzzy title search", "SELECT id FROM movies WHERE title % 'halloweeen'"),
+    (
+        "trailer by movie and url",
+        "SELECT id FROM trailers WHERE movie_id = 1 AND url = 'x'",
+    ),
+    ("trailers of a movie", "SELECT id FROM trailers WHERE movie_id = 1"),
+    ("reviews of a trailer", "SELECT id FROM reviews WHERE trailer_id = 1"),
+    ("reviews of a user", "SELECT id FROM reviews WHERE user_id = 1"),
+    ("watchlist of a user", "SELECT movie_id FROM watchlists WHERE user_id = 1"),
+    ("watchers of a movie", "SELECT user_id FROM watchlists WHERE movie_id = 1"),
+    (
+        "platforms of a trailer",
+        "SELECT platform_id FROM platform_trailers WHERE trailer_id = 1",
+    ),
+    (
+        "trailers on a platform",
+        "SELECT trailer_id FROM platform_trailers WHERE platform_id = 1",
+    ),
+    ("recommendations of a user", "SELECT movie_id FROM recommendations WHERE user_id = 1"),
+    ("recommendations of a movie", "SELECT user_id FROM recommendations WHERE movie_id = 1"),
+    ("notifications of a user", "SELECT id FROM notifications WHERE user_id = 1"),
+    ("trailer lookup by key", "SELECT video_id FROM trailer_lookups WHERE lookup_key = 'x'"),
+)
+
+
+def seq_scans(plan):
+    """
+    Lists the tables a plan reads with a sequential scan.
+
+    Parameters:
+        plan (dict): A plan node as returned by ``EXPLAIN (FORMAT JSON)``.
+
+    Returns:
+        list of str: The relation names of the sequential scan nodes.
+    """
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", ()):
+        found.extend(seq_scans(child))
+    return found
+
+
+def check_plans(connection):
+    """
+    Explains every hot query and reports the ones planned with a sequential scan.
+
+    Runs in a transaction that is rolled back, so the planner settings do not
+    leak into the connection.
+
+    Parameters:
+        connection (Connection): An open SQLAlchemy connection.
+
+    Returns:
+        list of tuple: (query name, tables scanned sequentially) for each offending
+        query; empty when every query uses an index.
+    """
+    failures = []
+    with connection.begin() as transaction:
+        connection.execute(text("SET LOCAL enable_seqscan = off"))
+        for name, query in HOT_QUERIES:
+            plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {query}")).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            tables = seq_scans(plan[0]["Plan"])
+            if tables:
+                failures.append((name, tables))
+        transaction.rollback()
+    return failures
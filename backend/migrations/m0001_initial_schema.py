@@ -0,0 +1,151 @@
+"""
+migrations/m0001_initial_schema.py
+----------------------------------
+
+Creates the extensions the schema relies on, the tables as the application
+first created them with ``db.create_all()``, and the ``catalog_versions`` and
+``trailer_lookups`` tables that were added to the models before migrations
+existed.
+
+The DDL is frozen here rather than generated from the models, so a new database
+goes through exactly the same steps as one created by that first version, and
+later model changes only ever reach a database through a later migration.
+Tables a database already has are left as they are.
+"""
+from sqlalchemy import text
+
+VERSION = 1
+
+STATEMENTS = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE TABLE IF NOT EXISTS movies (
+        id SERIAL NOT NULL,
+        title VARCHAR(200) NOT NULL,
+        director VARCHAR(100),
+        "cast" VARCHAR(500),
+        release_date DATE,
+        length INTEGER,
+        rating FLOAT,
+        age_restriction INTEGER,
+        trailer_url VARCHAR(500) NOT NULL,
+        poster_url VARCHAR(500),
+        summary VARCHAR(1000),
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS streaming_platforms (
+        id SERIAL NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        url VARCHAR(500),
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL NOT NULL,
+        username VARCHAR(50) NOT NULL,
+        email VARCHAR(100) NOT NULL,
+        password_hash VARCHAR(128) NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (username),
+        UNIQUE (email)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS notifications (
+        id SERIAL NOT NULL,
+        user_id INTEGER,
+        type VARCHAR(100),
+        message VARCHAR(500),
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS recommendations (
+        id SERIAL NOT NULL,
+        user_id INTEGER,
+        movie_id INTEGER,
+        score FLOAT,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(movie_id) REFERENCES movies (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trailers (
+        id SERIAL NOT NULL,
+        movie_id INTEGER,
+        url VARCHAR(500) NOT NULL,
+        duration INTEGER,
+        release_date DATE,
+        description VARCHAR(500),
+        PRIMARY KEY (id),
+        FOREIGN KEY(movie_id) REFERENCES movies (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS watchlists (
+        id SERIAL NOT NULL,
+        user_id INTEGER,
+        movie_id INTEGER,
+        date_added DATE,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(movie_id) REFERENCES movies (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS platform_trailers (
+        id SERIAL NOT NULL,
+        trailer_id INTEGER,
+        platform_id INTEGER,
+        PRIMARY KEY (id),
+        FOREIGN KEY(trailer_id) REFERENCES trailers (id),
+        FOREIGN KEY(platform_id) REFERENCES streaming_platforms (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reviews (
+        id SERIAL NOT NULL,
+        user_id INTEGER,
+        trailer_id INTEGER,
+        rating FLOAT,
+        review_text VARCHAR(1000),
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(trailer_id) REFERENCES trailers (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS catalog_versions (
+        table_name VARCHAR(64) NOT NULL,
+        version BIGINT NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        PRIMARY KEY (table_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trailer_lookups (
+        id SERIAL NOT NULL,
+        lookup_key VARCHAR(300) NOT NULL,
+        video_id VARCHAR(32),
+        fetched_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (lookup_key)
+    )
+    """,
+)
+
+
+def upgrade(connection):
+    """
+    Applies the migration.
+
+    Parameters:
+        connection (Connection): Connection with an open transaction.
+    """
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
@@ -0,0 +1,30 @@
+"""
+migrations/m0002_ingest_columns.py
+----------------------------------
+
+Adds what the bulk ingest writer needs: a unique TMDB id on movies, a nullable
+trailer URL so movies can be stored before their trailer is found, and a unique
+(movie_id, url) pair on trailers.
+"""
+from sqlalchemy import text
+
+VERSION = 2
+
+STATEMENTS = (
+    "ALTER TABLE movies ADD COLUMN IF NOT EXISTS tmdb_id integer",
+    "CREATE UNIQUE INDEX IF NOT EXISTS movies_tmdb_id_key ON movies (tmdb_id)",
+    "ALTER TABLE movies ALTER COLUMN trailer_url DROP NOT NULL",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_trailers_movie_id_url"
+    " ON trailers (movie_id, url)",
+)
+
+
+def upgrade(connection):
+    """
+    Applies the migration.
+
+    Parameters:
+        connection (Connection): Connection with an open transaction.
+    """
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
@@ -0,0 +1,26 @@
+"""
+migrations/m0003_updated_at_columns.py
+--------------------------------------
+
+Adds the ``updated_at`` columns behind Last-Modified on movies and trailers.
+"""
+from sqlalchemy import text
+
+VERSION = 3
+
+STATEMENTS = tuple(
+    f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS"
+    " updated_at timestamptz NOT NULL DEFAULT now()"
+    for table in ("movies", "trailers")
+)
+
+
+def upgrade(connection):
+    """
+    Applies the migration.
+
+    Parameters:
+        connection (Connection): Connection with an open transaction.
+    """
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
@@ -0,0 +1,42 @@
+"""
+migrations/m0004_listing_and_search_indexes.py
+----------------------------------------------
+
+Adds the (sort column, id) indexes used by keyset pagination of /api/movies,
+the generated full-text search column with its GIN index, and the trigram index
+on titles.
+"""
+from sqlalchemy import text
+
+VERSION = 4
+
+# Weighted full-text document of a movie: title first, then people, then summary
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', "
+    "coalesce(director, '') || ' ' || coalesce(\"cast\", '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(summary, '')), 'C')"
+)
+
+STATEMENTS = (
+    "CREATE INDEX IF NOT EXISTS ix_movies_release_date_id ON movies (release_date, id)",
+    "CREATE INDEX IF NOT EXISTS ix_movies_rating_id ON movies (rating, id)",
+    "CREATE INDEX IF NOT EXISTS ix_movies_title_id ON movies (title, id)",
+    "ALTER TABLE movies ADD COLUMN IF NOT EXISTS search_vector tsvector"
+    f" GENERATED ALWAYS AS ({SEARCH_DOCUMENT}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_movies_search_vector"
+    " ON movies USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_movies_title_trgm"
+    " ON movies USING gin (title gin_trgm_ops)",
+)
+
+
+def upgrade(connection):
+    """
+    Applies the migration.
+
+    Parameters:
+        connection (Connection): Connection with an open transaction.
+    """
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
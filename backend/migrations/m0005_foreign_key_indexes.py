@@ -0,0 +1,82 @@
+"""
+migrations/m0005_foreign_key_indexes.py
+---------------------------------------
+
+Indexes the foreign keys of the user-facing tables and adds the composite unique
+constraints that stop duplicate watchlist entries, platform links and
+recommendations.
+
+Existing duplicates are removed first, keeping the oldest row of each group;
+nothing references these three tables, so no other rows are affected. How many
+rows were removed from each table is logged as a warning.
+"""
+import logging
+
+from sqlalchemy import text
+
+VERSION = 5
+
+logger = logging.getLogger(__name__)
+
+# (table, unique index name, columns)
+UNIQUE_PAIRS = (
+    ("watchlists", "uq_watchlists_user_id_movie_id", ("user_id", "movie_id")),
+    (
+        "platform_trailers",
+        "uq_platform_trailers_trailer_id_platform_id",
+        ("trailer_id", "platform_id"),
+    ),
+    (
+        "recommendations",
+        "uq_recommendations_user_id_movie_id",
+        ("user_id", "movie_id"),
+    ),
+)
+
+# (table, column); leading columns of the unique pairs above are already covered
+FOREIGN_KEYS = (
+    ("reviews", "user_id"),
+    ("reviews", "trailer_id"),
+    ("watchlists", "movie_id"),
+    ("platform_trailers", "platform_id"),
+    ("recommendations", "movie_id"),
+    ("notifications", "user_id"),
+)
+
+
+def upgrade(connection):
+    """
+    Applies the migration.
+
+    Parameters:
+        connection (Connection): Connection with an open transaction.
+    """
+    for table, name, columns in UNIQUE_PAIRS:
+        matches = " AND ".join(f"a.{column} = b.{column}" for column in columns)
+        removed = connection.execute(
+            text(
+                f"DELETE FROM {table} a USING {table} b"
+                f" WHERE {matches} AND a.id > b.id"
+            )
+        ).rowcount
+        if removed:
+            logger.warning(
+                "Removed %s duplicate %s rows before creating %s",
+                removed,
+                table,
+                name,
+            )
+        connection.execute(
+            text(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {name}"
+                f" ON {table} ({', '.join(columns)})"
+            )
+        )
+
+    for table, column in FOREIGN_KEYS:
+        connection.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_{column}"
+                f" ON {table} ({column})"
+            )
+        )
@@ -0,0 +1,158 @@
+"""
+migrations/m0006_rating_aggregates.py
+-------------------------------------
+
+Adds the running rating aggregates of movies, installs the review triggers that
+maintain them, and fills them in from the existing reviews.
+
+The trigger DDL is a copy of ``services.rating_aggregates.TRIGGER_DDL`` as it
+was when the aggregates were added; a later change to the triggers comes with a
+migration of its own.
+"""
+from sqlalchemy import text
+
+# The copied DDL is meant to stay as it was
+# pylint: disable=duplicate-code
+
+VERSION = 6
+
+STATEMENTS = (
+    "ALTER TABLE movies ADD COLUMN IF NOT EXISTS"
+    " rating_sum double precision NOT NULL DEFAULT 0",
+    "ALTER TABLE movies ADD COLUMN IF NOT EXISTS"
+    " rating_count integer NOT NULL DEFAULT 0",
+    "ALTER TABLE movies ADD COLUMN IF NOT EXISTS"
+    " rating_histogram integer[] NOT NULL DEFAULT '{0,0,0,0,0,0,0,0,0,0}'",
+    """
+    CREATE OR REPLACE FUNCTION apply_movie_rating_deltas(
+        trailer_ids integer[], ratings double precision[], signs integer[]
+    ) RETURNS void LANGUAGE sql AS $$
+        WITH changes AS (
+            SELECT t.movie_id, c.rating, c.sign,
+                   least(greatest(ceil(c.rating)::integer, 1), 10) AS bucket
+            FROM unnest(trailer_ids, ratings, signs) AS c(trailer_id, rating, sign)
+            JOIN trailers t ON t.id = c.trailer_id
+            WHERE c.rating IS NOT NULL AND t.movie_id IS NOT NULL
+        ),
+        buckets AS (
+            SELECT movie_id, bucket, sum(sign) AS n, sum(sign * rating) AS total
+            FROM changes
+            GROUP BY movie_id, bucket
+        ),
+        deltas AS (
+            SELECT m.movie_id,
+                   coalesce(sum(b.total), 0) AS rating_sum,
+                   coalesce(sum(b.n), 0)::integer AS rating_count,
+                   array_agg(coalesce(b.n, 0)::integer ORDER BY s.bucket) AS histogram
+            FROM (SELECT DISTINCT movie_id FROM changes) m
+            CROSS JOIN generate_series(1, 10) AS s(bucket)
+            LEFT JOIN buckets b ON b.movie_id = m.movie_id AND b.bucket = s.bucket
+            GROUP BY m.movie_id
+        )
+        UPDATE movies AS m
+        SET rating_sum = m.rating_sum + d.rating_sum,
+            rating_count = m.rating_count + d.rating_count,
+            rating = (m.rating_sum + d.rating_sum)
+                / nullif(m.rating_count + d.rating_count, 0),
+            rating_histogram = ARRAY(
+                SELECT u.stored + u.delta
+                FROM unnest(m.rating_histogram, d.histogram)
+                    WITH ORDINALITY AS u(stored, delta, ordinal)
+                ORDER BY u.ordinal
+            ),
+            updated_at = now()
+        FROM deltas d
+        WHERE m.id = d.movie_id
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION reviews_rating_changed() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM apply_movie_rating_deltas(
+                array_agg(trailer_id), array_agg(rating), array_agg(1)
+            ) FROM new_reviews;
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM apply_movie_rating_deltas(
+                array_agg(trailer_id), array_agg(rating), array_agg(-1)
+            ) FROM old_reviews;
+        ELSE
+            PERFORM apply_movie_rating_deltas(
+                array_agg(c.trailer_id), array_agg(c.rating), array_agg(c.sign)
+            )
+            FROM (
+                SELECT o.trailer_id, o.rating, -1 AS sign
+                FROM old_reviews o JOIN new_reviews n USING (id)
+                WHERE (o.trailer_id, o.rating) IS DISTINCT FROM (n.trailer_id, n.rating)
+                UNION ALL
+                SELECT n.trailer_id, n.rating, 1
+                FROM old_reviews o JOIN new_reviews n USING (id)
+                WHERE (o.trailer_id, o.rating) IS DISTINCT FROM (n.trailer_id, n.rating)
+            ) c;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS reviews_rating_insert ON reviews",
+    "CREATE TRIGGER reviews_rating_insert AFTER INSERT ON reviews"
+    " REFERENCING NEW TABLE AS new_reviews"
+    " FOR EACH STATEMENT EXECUTE FUNCTION reviews_rating_changed()",
+    "DROP TRIGGER IF EXISTS reviews_rating_update ON reviews",
+    "CREATE TRIGGER reviews_rating_update AFTER UPDATE ON reviews"
+    " REFERENCING OLD TABLE AS old_reviews NEW TABLE AS new_reviews"
+    " FOR EACH STATEMENT EXECUTE FUNCTION reviews_rating_changed()",
+    "DROP TRIGGER IF EXISTS reviews_rating_delete ON reviews",
+    "CREATE TRIGGER reviews_rating_delete AFTER DELETE ON reviews"
+    " REFERENCING OLD TABLE AS old_reviews"
+    " FOR EACH STATEMENT EXECUTE FUNCTION reviews_rating_changed()",
+    # The triggers hold off review writes until this transaction ends, so the
+    # aggregates below cannot miss one
+    """
+    WITH buckets AS (
+        SELECT t.movie_id, least(greatest(ceil(r.rating)::integer, 1), 10) AS bucket,
+               count(*) AS n, sum(r.rating) AS total
+        FROM reviews r JOIN trailers t ON t.id = r.trailer_id
+        WHERE r.rating IS NOT NULL AND t.movie_id IS NOT NULL
+        GROUP BY 1, 2
+    ),
+    totals AS (
+        SELECT m.id AS movie_id,
+               coalesce(sum(b.total), 0) AS rating_sum,
+               coalesce(sum(b.n), 0)::integer AS rating_count,
+               array_agg(coalesce(b.n, 0)::integer ORDER BY s.bucket) AS histogram
+        FROM movies m
+        CROSS JOIN generate_series(1, 10) AS s(bucket)
+        LEFT JOIN buckets b ON b.movie_id = m.id AND b.bucket = s.bucket
+        GROUP BY m.id
+    )
+    UPDATE movies AS m
+    SET rating_sum = t.rating_sum,
+        rating_count = t.rating_count,
+        rating = t.rating_sum / nullif(t.rating_count, 0),
+        rating_histogram = t.histogram,
+        updated_at = now()
+    FROM totals t
+    WHERE m.id = t.movie_id
+      AND (t.rating_count > 0 OR m.rating IS NOT NULL)
+    """,
+    # Cached listings still show the ratings from before the backfill
+    """
+    INSERT INTO catalog_versions (table_name, version, updated_at)
+    VALUES ('movies', 1, now())
+    ON CONFLICT (table_name)
+    DO UPDATE SET version = catalog_versions.version + 1, updated_at = now()
+    """,
+)
+
+
+def upgrade(connection):
+    """
+    Applies the migration.
+
+    Parameters:
+        connection (Connection): Connection with an open transaction.
+    """
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
@@ -0,0 +1,27 @@
+"""
+migrations/m0007_notification_dedupe_key.py
+-------------------------------------------
+
+Adds the dedupe key that keeps the watchlist fan-out from notifying a user of
+the same event twice.
+"""
+from sqlalchemy import text
+
+VERSION = 7
+
+STATEMENTS = (
+    "ALTER TABLE notifications ADD COLUMN IF NOT EXISTS dedupe_key varchar(200)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_notifications_user_id_dedupe_key"
+    " ON notifications (user_id, dedupe_key)",
+)
+
+
+def upgrade(connection):
+    """
+    Applies the migration.
+
+    Parameters:
+        connection (Connection): Connection with an open transaction.
+    """
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
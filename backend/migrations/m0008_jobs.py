@@ -0,0 +1,47 @@
+"""
+migrations/m0008_jobs.py
+------------------------
+
+Creates the ``jobs`` table backing the background job queue.
+"""
+from sqlalchemy import text
+
+VERSION = 8
+
+STATEMENTS = (
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id SERIAL NOT NULL,
+        kind VARCHAR(64) NOT NULL,
+        payload JSON NOT NULL,
+        dedupe_key VARCHAR(200),
+        status VARCHAR(16) NOT NULL,
+        attempts INTEGER NOT NULL,
+        max_attempts INTEGER NOT NULL,
+        run_after TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        locked_by VARCHAR(200),
+        heartbeat_at TIMESTAMP WITH TIME ZONE,
+        progress JSON NOT NULL,
+        result JSON,
+        error TEXT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        started_at TIMESTAMP WITH TIME ZONE,
+        finished_at TIMESTAMP WITH TIME ZONE,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_jobs_status_run_after ON jobs (status, run_after)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_jobs_dedupe_key_active ON jobs (dedupe_key)"
+    " WHERE status IN ('queued', 'running')",
+)
+
+
+def upgrade(connection):
+    """
+    Applies the migration.
+
+    Parameters:
+        connection (Connection): Connection with an open transaction.
+    """
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
@@ -0,0 +1,33 @@
+"""
+migrations/m0009_quota_and_job_priority.py
+------------------------------------------
+
+Creates the table the YouTube daily quota is tracked in, and gives jobs a
+priority so interactive ingests start ahead of backfills.
+"""
+from sqlalchemy import text
+
+VERSION = 9
+
+STATEMENTS = (
+    """
+    CREATE TABLE IF NOT EXISTS api_quota_usage (
+        api VARCHAR(64) NOT NULL,
+        quota_day DATE NOT NULL,
+        units_used INTEGER NOT NULL,
+        PRIMARY KEY (api, quota_day)
+    )
+    """,
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS priority integer NOT NULL DEFAULT 0",
+)
+
+
+def upgrade(connection):
+    """
+    Applies the migration.
+
+    Parameters:
+        connection (Connection): Connection with an open transaction.
+    """
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
@@ -0,0 +1,29 @@
+"""
+migrations/m0010_shared_rate_limit.py
+-------------------------------------
+
+Moves the YouTube rate limit into the database: the token bucket every process
+draws from is kept on the ``api_quota_usage`` row of the day, next to the daily
+budget.
+"""
+from sqlalchemy import text
+
+VERSION = 10
+
+STATEMENTS = (
+    "ALTER TABLE api_quota_usage"
+    " ADD COLUMN IF NOT EXISTS bucket_tokens double precision",
+    "ALTER TABLE api_quota_usage"
+    " ADD COLUMN IF NOT EXISTS bucket_updated_at timestamp with time zone",
+)
+
+
+def upgrade(connection):
+    """
+    Applies the migration.
+
+    Parameters:
+        connection (Connection): Connection with an open transaction.
+    """
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
@@ -0,0 +1,25 @@
+"""
+migrations/m0011_movie_source.py
+--------------------------------
+
+Records where each movie came from, so movies seeded from a TMDB daily export
+can be told apart from the ones the API ingest added.
+"""
+from sqlalchemy import text
+
+VERSION = 11
+
+STATEMENTS = (
+    "ALTER TABLE movies ADD COLUMN IF NOT EXISTS source varchar(32)",
+)
+
+
+def upgrade(connection):
+    """
+    Applies the migration.
+
+    Parameters:
+        connection (Connection): Connection with an open transaction.
+    """
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
@@ -19,9 +19,29 @@ Classes:
     Recommendation: Represents recommendations with attributes like score.
     Notification: Represents notifications with attributes like type and message.
     Watchlist: Represents a user's watchlist with attributes like date added.
+    TrailerLookup: Caches YouTube trailer searches by normalized title and year.
+    CatalogVersion: Tracks a version counter per table for cache validation.
+    Job: A unit of background work queued for the worker processes.
+    ApiQuotaUsage: Quota units spent per external API and quota day.
 """
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from sqlalchemy.orm import deferred
+
 from extensions import db
 
+EMPTY_HISTOGRAM = "{0,0,0,0,0,0,0,0,0,0}"
+
+# Jobs that are waiting or running; only one of these may share a dedupe key
+ACTIVE_JOB_PREDICATE = "status IN ('queued', 'running')"
+
+# Weighted full-text document of a movie: title first, then people, then summary
+MOVIE_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', "
+    "coalesce(director, '') || ' ' || coalesce(\"cast\", '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(summary, '')), 'C')"
+)
+
 
 # pylint: disable=too-few-public-methods
 class Movie(db.Model):
@@ -30,30 +50,70 @@ class Movie(db.Model):
 
     Attributes:
         id: Primary key.
+        tmdb_id: Id of the movie on The Movie Database, used to match re-ingests.
         title: Title of the movie.
         director: Director of the movie.
         cast: Cast of the movie.
         release_date: Release date of the movie.
         length: Length of the movie in minutes.
-        rating: Average rating of the movie.
+        rating: Average rating of the movie, kept in sync with reviews by triggers.
+        rating_sum: Sum of the review ratings of the movie.
+        rating_count: Number of rated reviews of the movie.
+        rating_histogram: Review counts per rating bucket (0, 1], (1, 2] ... (9, 10].
         age_restriction: Age restriction for the movie.
         summary: Brief summary of the movie.
+        source: How the movie first entered the catalog, e.g. "tmdb_export" for
+            the bulk import; None for movies added by the API ingest or by hand.
+        updated_at: When the row was last written.
+        search_vector: Generated full-text document of title, people and summary.
         trailers: Relationship to associated trailers.
     """
 
     __tablename__ = "movies"
+    __table_args__ = (
+        # Keyset pagination walks (sort column, id) in either direction
+        db.Index("ix_movies_release_date_id", "release_date", "id"),
+        db.Index("ix_movies_rating_id", "rating", "id"),
+        db.Index("ix_movies_title_id", "title", "id"),
+        # Ranked full-text search and typo-tolerant title matching (needs pg_trgm)
+        db.Index("ix_movies_search_vector", "search_vector", postgresql_using="gin"),
+        db.Index(
+            "ix_movies_title_trgm",
+            "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
+    tmdb_id = db.Column(db.Integer, unique=True)
     title = db.Column(db.String(200), nullable=False)
     director = db.Column(db.String(100))
     cast = db.Column(db.String(500))
     release_date = db.Column(db.Date)
     length = db.Column(db.Integer)  # length in minutes
     rating = db.Column(db.Float)  # average rating
+    # Maintained by the triggers installed in services/rating_aggregates.py
+    rating_sum = db.Column(db.Float, nullable=False, server_default="0")
+    rating_count = db.Column(db.Integer, nullable=False, server_default="0")
+    rating_histogram = db.Column(
+        ARRAY(db.Integer), nullable=False, server_default=EMPTY_HISTOGRAM
+    )
     age_restriction = db.Column(db.Integer)
-    trailer_url = db.Column(db.String(500), nullable=False)
+    trailer_url = db.Column(db.String(500))  # None until a trailer is found
     poster_url = db.Column(db.String(500))
     summary = db.Column(db.String(1000))
+    source = db.Column(db.String(32))
+    updated_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=db.func.now(),
+        onupdate=db.func.now(),
+    )
+    # Generated by PostgreSQL; deferred so loading a Movie does not fetch it
+    search_vector = deferred(
+        db.Column(TSVECTOR, db.Computed(MOVIE_SEARCH_DOCUMENT, persisted=True))
+    )
 
     trailers = db.relationship("Trailer", back_populates="movie")
 
@@ -70,11 +130,16 @@ class Trailer(db.Model):
         duration: Duration of the trailer in seconds.
         release_date: Release date of the trailer.
         description: Description of the trailer.
+        updated_at: When the row was last written.
         movie: Relationship to the associated movie.
         platform_trailers: Relationship to the associated platforms.
     """
 
     __tablename__ = "trailers"
+    # Also serves lookups by movie_id, so that column needs no index of its own
+    __table_args__ = (
+        db.UniqueConstraint("movie_id", "url", name="uq_trailers_movie_id_url"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     movie_id = db.Column(db.Integer, db.ForeignKey("movies.id"))
@@ -82,6 +147,12 @@ class Trailer(db.Model):
     duration = db.Column(db.Integer)  # duration in seconds
     release_date = db.Column(db.Date)
     description = db.Column(db.String(500))
+    updated_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=db.func.now(),
+        onupdate=db.func.now(),
+    )
 
     movie = db.relationship("Movie", back_populates="trailers")
     platform_trailers = db.relationship("PlatformTrailer", back_populates="trailer")
@@ -122,10 +193,17 @@ class PlatformTrailer(db.Model):
     """
 
     __tablename__ = "platform_trailers"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "trailer_id", "platform_id", name="uq_platform_trailers_trailer_id_platform_id"
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     trailer_id = db.Column(db.Integer, db.ForeignKey("trailers.id"))
-    platform_id = db.Column(db.Integer, db.ForeignKey("streaming_platforms.id"))
+    platform_id = db.Column(
+        db.Integer, db.ForeignKey("streaming_platforms.id"), index=True
+    )
 
     trailer = db.relationship("Trailer", back_populates="platform_trailers")
     platform = db.relationship("StreamingPlatform", back_populates="platform_trailers")
@@ -174,8 +252,8 @@ class Review(db.Model):
     __tablename__ = "reviews"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
-    trailer_id = db.Column(db.Integer, db.ForeignKey("trailers.id"))
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), index=True)
+    trailer_id = db.Column(db.Integer, db.ForeignKey("trailers.id"), index=True)
     rating = db.Column(db.Float)
     review_text = db.Column(db.String(1000))
 
@@ -198,10 +276,15 @@ class Recommendation(db.Model):
     """
 
     __tablename__ = "recommendations"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "user_id", "movie_id", name="uq_recommendations_user_id_movie_id"
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
-    movie_id = db.Column(db.Integer, db.ForeignKey("movies.id"))
+    movie_id = db.Column(db.Integer, db.ForeignKey("movies.id"), index=True)
     score = db.Column(db.Float)
 
     user = db.relationship("User")
@@ -218,15 +301,22 @@ class Notification(db.Model):
         user_id: ForeignKey to the user who received the notification.
         type: Type or category of the notification.
         message: Content of the notification.
+        dedupe_key: Identifies the event notified about, so it is notified once.
         user: Relationship to the user.
     """
 
     __tablename__ = "notifications"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "user_id", "dedupe_key", name="uq_notifications_user_id_dedupe_key"
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), index=True)
     type = db.Column(db.String(100))
     message = db.Column(db.String(500))
+    dedupe_key = db.Column(db.String(200))
 
     user = db.relationship("User")
 
@@ -246,11 +336,138 @@ class Watchlist(db.Model):
     """
 
     __tablename__ = "watchlists"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "movie_id", name="uq_watchlists_user_id_movie_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
-    movie_id = db.Column(db.Integer, db.ForeignKey("movies.id"))
+    movie_id = db.Column(db.Integer, db.ForeignKey("movies.id"), index=True)
     date_added = db.Column(db.Date)
 
     user = db.relationship("User")
     movie = db.relationship("Movie")
+
+
+# pylint: disable=too-few-public-methods
+class TrailerLookup(db.Model):
+    """
+    Caches the outcome of YouTube trailer searches so repeated ingests do not
+    spend API quota on titles that were already resolved.
+
+    Attributes:
+        id: Primary key.
+        lookup_key: Normalized title and release year the search was made for.
+        video_id: YouTube video id of the trailer, or None if nothing was found.
+        fetched_at: When the search was made.
+    """
+
+    __tablename__ = "trailer_lookups"
+
+    id = db.Column(db.Integer, primary_key=True)
+    lookup_key = db.Column(db.String(300), nullable=False, unique=True)
+    video_id = db.Column(db.String(32))
+    fetched_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+
+# pylint: disable=too-few-public-methods
+class CatalogVersion(db.Model):
+    """
+    Holds a version counter per table, bumped whenever the table's rows change.
+
+    Read endpoints derive their ETag and Last-Modified headers from these rows,
+    which is far cheaper than inspecting the tables themselves.
+
+    Attributes:
+        table_name: Name of the tracked table.
+        version: Counter incremented on every change to the table.
+        updated_at: When the table last changed.
+    """
+
+    __tablename__ = "catalog_versions"
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+
+# pylint: disable=too-few-public-methods
+class Job(db.Model):
+    """
+    A unit of background work, queued in the database and run by worker processes.
+
+    Attributes:
+        id: Primary key.
+        kind: Name of the handler that runs the job.
+        payload: JSON arguments of the handler.
+        dedupe_key: Jobs sharing a key are not queued twice while one is active.
+        status: queued, running, succeeded or failed.
+        priority: Due jobs with lower values are started first.
+        attempts: Number of times a worker has started the job.
+        max_attempts: Attempts allowed before the job is marked failed.
+        run_after: The job is not started before this time; pushed back by retries.
+        locked_by: Worker running the job.
+        heartbeat_at: When the running worker last reported progress.
+        progress: JSON counters reported by the running attempt.
+        result: JSON summary returned by the handler.
+        error: Error of the last failed attempt.
+        created_at: When the job was queued.
+        started_at: When the last attempt started.
+        finished_at: When the job succeeded or finally failed.
+    """
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        db.Index("ix_jobs_status_run_after", "status", "run_after"),
+        db.Index(
+            "uq_jobs_dedupe_key_active",
+            "dedupe_key",
+            unique=True,
+            postgresql_where=db.text(ACTIVE_JOB_PREDICATE),
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    dedupe_key = db.Column(db.String(200))
+    status = db.Column(db.String(16), nullable=False, default="queued")
+    priority = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_after = db.Column(
+        db.DateTime(timezone=True), nullable=False, server_default=db.func.now()
+    )
+    locked_by = db.Column(db.String(200))
+    heartbeat_at = db.Column(db.DateTime(timezone=True))
+    progress = db.Column(db.JSON, nullable=False, default=dict)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    created_at = db.Column(
+        db.DateTime(timezone=True), nullable=False, server_default=db.func.now()
+    )
+    started_at = db.Column(db.DateTime(timezone=True))
+    finished_at = db.Column(db.DateTime(timezone=True))
+
+
+# pylint: disable=too-few-public-methods
+class ApiQuotaUsage(db.Model):
+    """
+    Quota units spent on an external API during one quota day, shared by every
+    process calling the API.
+
+    Attributes:
+        api: Name of the API.
+        quota_day: The day, in the API's own quota timezone.
+        units_used: Units spent so far that day.
+        bucket_tokens: Tokens in the shared rate-limit bucket when last updated.
+        bucket_updated_at: When the bucket was last updated.
+    """
+
+    __tablename__ = "api_quota_usage"
+
+    api = db.Column(db.String(64), primary_key=True)
+    quota_day = db.Column(db.Date, primary_key=True)
+    units_used = db.Column(db.Integer, nullable=False, default=0)
+    bucket_tokens = db.Column(db.Float)
+    bucket_updated_at = db.Column(db.DateTime(timezone=True))
@@ -0,0 +1,74 @@
+"""
+recommend.py
+------
+
+A Python script to recompute the movie recommendations of every user.
+
+Users can be split into shards processed by separate processes, e.g. four
+processes running ``python recommend.py --shard 0 --shards 4`` through
+``--shard 3 --shards 4``.
+
+With ``--follow`` the script instead keeps running: it loads the current
+reviews once, then every ``--interval`` seconds applies the reviews written
+since and replaces the recommendations of their authors. ``--verify`` checks
+each update against a full recompute of the same ratings and exits with an
+error if they differ by more than ``--tolerance``.
+
+"""
+import argparse
+import json
+import sys
+import time
+
+from app import create_app
+from extensions import db
+from services.incremental_recommender import DEFAULT_TOLERANCE, IncrementalRecommender
+from services.recommender import (
+    DEFAULT_NEIGHBOURS,
+    DEFAULT_TOP_K,
+    refresh_recommendations,
+)
+
+parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+parser.add_argument("--neighbours", type=int, default=DEFAULT_NEIGHBOURS)
+parser.add_argument("--shard", type=int, default=0)
+parser.add_argument("--shards", type=int, default=1)
+parser.add_argument("--follow", action="store_true")
+parser.add_argument("--interval", type=float, default=5.0)
+parser.add_argument("--verify", action="store_true")
+parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+args = parser.parse_args()
+if not 0 <= args.shard < args.shards:
+    parser.error("--shard must be between 0 and --shards - 1")
+if args.follow and args.shards != 1:
+    parser.error("--follow cannot be combined with --shards")
+
+app = create_app()
+
+with app.app_context():
+    if not args.follow:
+        print("Computing recommendations...")
+        stats = refresh_recommendations(
+            db.session, args.top_k, args.neighbours, args.shard, args.shards
+        )
+        print(json.dumps(stats))
+        sys.exit(0)
+
+    print("Loading reviews...")
+    recommender = IncrementalRecommender.from_session(
+        db.session, args.top_k, args.neighbours
+    )
+    db.session.commit()
+    print(f"Following reviews after id {recommender.last_review_id}")
+    while True:
+        stats = recommender.poll(db.session)
+        db.session.commit()
+        if stats["reviews"]:
+            if args.verify:
+                stats["verify"] = recommender.verify(tolerance=args.tolerance)
+            print(json.dumps(stats))
+            if args.verify and not stats["verify"]["ok"]:
+                sys.exit(1)
+        else:
+            time.sleep(args.interval)
@@ -0,0 +1,36 @@
+"""
+reconcile_ratings.py
+------
+
+A Python script to check the rating aggregates of movies against their reviews
+and repair any drift.
+
+Run with ``--check`` to only report drifted movies; the script then exits with
+status 1 if there are any.
+
+"""
+import argparse
+import json
+import sys
+
+from app import create_app
+from extensions import db
+from services.rating_aggregates import DEFAULT_CHUNK_SIZE, find_drift, reconcile
+
+parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+parser.add_argument("--check", action="store_true")
+parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    if args.check:
+        drifted = find_drift(db.session, args.chunk_size)
+        db.session.commit()
+        print(json.dumps({"drifted": len(drifted), "movie_ids": drifted[:100]}))
+        sys.exit(1 if drifted else 0)
+
+    print("Reconciling rating aggregates...")
+    repaired = reconcile(db.session, args.chunk_size)
+    print(json.dumps({"repaired": len(repaired), "movie_ids": repaired[:100]}))
@@ -0,0 +1,13 @@
+"""
+routes
+------
+
+The blueprints ``create_app`` registers, one per group of routes.
+
+Modules:
+    catalog: The home page and the movie listing, export, detail, similar
+        movies and search routes.
+    jobs: The routes queuing background jobs and reporting on them, and the
+        handlers the worker runs those jobs with.
+    ops: The metrics and cache statistics routes.
+"""
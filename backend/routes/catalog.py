@@ -0,0 +1,347 @@
+"""
+routes/catalog.py
+-----------------
+
+The read routes of the movie catalog: the home page, the paginated listing and
+its streamed export, movie details one at a time or in batches, similar movies
+and search.
+
+Every route reading the catalog revalidates with the catalog versions
+(``services.catalog_version``) and, but for the streamed export, answers from
+the response cache while those versions are unchanged.
+
+Functions:
+    hello_world(): Route function to serve the home page.
+    get_movies(): Route function returning one page of movies.
+    export_movies(): Route function streaming the whole catalog.
+    get_movie(movie_id): Route function returning one movie with its trailers,
+        platforms and reviews.
+    get_movie_details(): Route function returning the details of several movies.
+    get_similar_movies(movie_id): Route function listing similar movies.
+    search(): Route function for ranked movie search.
+    suggest(): Route function completing movie titles.
+
+Attributes:
+    blueprint (Blueprint): The blueprint holding the routes.
+"""
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    jsonify,
+    request,
+    stream_with_context,
+    url_for,
+)
+from sqlalchemy.exc import SQLAlchemyError
+
+from extensions import db
+from models.database import Movie
+from services.catalog import CatalogQueryError, MovieListing
+from services.catalog_version import conditional_get
+from services.movie_details import (
+    DEFAULT_REVIEW_LIMIT,
+    MAX_REVIEW_LIMIT,
+    movie_details,
+    parse_ids,
+)
+from services.query_profiler import query_profiler
+from services.response_cache import response_cache
+from services.search import (
+    DEFAULT_LIMIT as DEFAULT_SEARCH_LIMIT,
+    MAX_LIMIT as MAX_SEARCH_LIMIT,
+    search_movies,
+    suggest_titles,
+)
+from services.similar_movies import (
+    DEFAULT_LIMIT as DEFAULT_SIMILAR_LIMIT,
+    MAX_LIMIT as MAX_SIMILAR_LIMIT,
+    similar_movies,
+    with_details,
+)
+
+blueprint = Blueprint("catalog", __name__)
+
+# Every table a movie detail document is built from
+DETAIL_TABLES = (
+    Movie.__tablename__,
+    "trailers",
+    "platform_trailers",
+    "streaming_platforms",
+    "reviews",
+)
+
+
+@blueprint.route("/")
+def hello_world():
+    """
+    A simple route serving the home page with a greeting message.
+
+    Returns:
+        str: A welcome message.
+    """
+    return "Hello, World! This is the home page."
+
+
+@blueprint.route("/api/movies", methods=["GET"])
+@conditional_get(Movie.__tablename__)
+@response_cache.cached(Movie.__tablename__)
+def get_movies():
+    """
+    A route to fetch one page of movies from the database.
+
+    Query parameters:
+        fields: Comma-separated columns to return (default: all public ones).
+        sort: id, title, release_date or rating, "-" prefixed for descending.
+        limit: Page size, at most 500 (default 50).
+        cursor: The cursor of the page to fetch, from a previous response.
+        title, director, year, min_rating: Optional filters.
+
+    The cursor of the next page is sent in the ``X-Next-Cursor`` header and
+    as a ``Link: <...>; rel="next"`` header; both are absent on the last page.
+    Responses carry an ETag and Last-Modified derived from the catalog version,
+    and revalidation requests are answered with 304 without reading any movies.
+
+    Returns:
+        Response: A list of movies or an error message.
+    """
+    try:
+        listing = MovieListing(request.args)
+    except CatalogQueryError as e:
+        return jsonify(error=str(e)), 400
+
+    try:
+        movies_list, next_cursor = listing.fetch(db.session)
+    except SQLAlchemyError as e:
+        current_app.logger.error(
+            "Error fetching movies: %s", e
+        )  # Using %s for lazy formatting
+        return jsonify(error="An error occurred fetching movies"), 500
+
+    response = jsonify(movies_list)
+    if next_cursor is not None:
+        next_url = url_for(
+            "catalog.get_movies", **{**request.args.to_dict(), "cursor": next_cursor}
+        )
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response, 200
+
+
+@blueprint.route("/api/movies/export", methods=["GET"])
+@conditional_get(Movie.__tablename__)
+def export_movies():
+    """
+    A route streaming the whole movie catalog as newline-delimited JSON.
+
+    Accepts the ``fields`` and filter parameters of ``/api/movies``. Each movie
+    is written as soon as it is read from a server-side cursor, so the first
+    byte goes out immediately and worker memory stays flat.
+
+    The status and headers are sent before the first movie is read, so an
+    error while streaming cannot change the 200. Instead the body then ends
+    with an ``{"error": ...}`` line, which no movie line has; a body that
+    ends without one holds the whole export.
+
+    Returns:
+        Response: A streamed ``application/x-ndjson`` body or an error message.
+    """
+    try:
+        listing = MovieListing(request.args)
+    except CatalogQueryError as e:
+        return jsonify(error=str(e)), 400
+
+    def generate():
+        try:
+            for row in listing.stream(db.session):
+                yield current_app.json.dumps(row) + "\n"
+        except SQLAlchemyError as e:
+            current_app.logger.error("Error exporting movies: %s", e)
+            yield current_app.json.dumps(
+                {"error": "An error occurred exporting movies"}
+            ) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def review_limit():
+    """Reads the ``reviews`` query parameter, or returns None if invalid."""
+    limit = request.args.get("reviews", DEFAULT_REVIEW_LIMIT, type=int)
+    if limit is None or not 0 <= limit <= MAX_REVIEW_LIMIT:
+        return None
+    return limit
+
+
+@blueprint.route("/api/movies/<int:movie_id>", methods=["GET"])
+@query_profiler.budget(5)
+@conditional_get(*DETAIL_TABLES)
+@response_cache.cached(*DETAIL_TABLES)
+def get_movie(movie_id):
+    """
+    A route returning one movie with its trailers, the platforms streaming
+    them, its review statistics and its most recent reviews.
+
+    Query parameters:
+        reviews: Reviews to include, most recent first (default 10, at most
+            50).
+
+    The document is built in at most four SQL statements, however many
+    trailers and reviews the movie has.
+
+    Returns:
+        Response: The movie's details, or an error message.
+    """
+    limit = review_limit()
+    if limit is None:
+        return (
+            jsonify(error=f"'reviews' must be between 0 and {MAX_REVIEW_LIMIT}."),
+            400,
+        )
+    try:
+        details = movie_details(db.session, [movie_id], limit)
+    except SQLAlchemyError as e:
+        current_app.logger.error("Error fetching movie %s: %s", movie_id, e)
+        return jsonify(error="An error occurred fetching the movie"), 500
+    if movie_id not in details:
+        return jsonify(error="Movie not found."), 404
+    return jsonify(details[movie_id]), 200
+
+
+@blueprint.route("/api/movies/details", methods=["GET"])
+@query_profiler.budget(5)
+@conditional_get(*DETAIL_TABLES)
+@response_cache.cached(*DETAIL_TABLES)
+def get_movie_details():
+    """
+    A route returning the details of several movies in one round trip, as
+    ``/api/movies/<id>`` would, in the same at most four SQL statements.
+
+    Query parameters:
+        ids: Comma-separated movie ids, at most 100.
+        reviews: Reviews to include per movie (default 10, at most 50).
+
+    Returns:
+        Response: The details of the movies found, in the order of ``ids``,
+        and the ids that were not found; or an error message.
+    """
+    try:
+        ids = parse_ids(request.args.get("ids"))
+    except CatalogQueryError as e:
+        return jsonify(error=str(e)), 400
+    limit = review_limit()
+    if limit is None:
+        return (
+            jsonify(error=f"'reviews' must be between 0 and {MAX_REVIEW_LIMIT}."),
+            400,
+        )
+    try:
+        details = movie_details(db.session, ids, limit)
+    except SQLAlchemyError as e:
+        current_app.logger.error("Error fetching movie details: %s", e)
+        return jsonify(error="An error occurred fetching the movies"), 500
+    return (
+        jsonify(
+            movies=[details[movie_id] for movie_id in ids if movie_id in details],
+            missing=[movie_id for movie_id in ids if movie_id not in details],
+        ),
+        200,
+    )
+
+
+@blueprint.route("/api/movies/<int:movie_id>/similar", methods=["GET"])
+def get_similar_movies(movie_id):
+    """
+    A route listing the movies whose summary, cast and director are most
+    like a movie's, for users without reviews to recommend from.
+
+    Query parameters:
+        limit: Maximum number of movies (default 10, at most 100).
+
+    Returns:
+        Response: The similar movies, most similar first, or an error message.
+    """
+    limit = request.args.get("limit", DEFAULT_SIMILAR_LIMIT, type=int)
+    if limit is None or not 1 <= limit <= MAX_SIMILAR_LIMIT:
+        return (
+            jsonify(error=f"'limit' must be between 1 and {MAX_SIMILAR_LIMIT}."),
+            400,
+        )
+
+    matches = similar_movies.similar(movie_id, limit)
+    if matches is None:
+        if not similar_movies.available():
+            return jsonify(error="The similarity index has not been built."), 503
+        return jsonify(error="Movie not found in the similarity index."), 404
+
+    try:
+        return jsonify(with_details(db.session, matches)), 200
+    except SQLAlchemyError as e:
+        current_app.logger.error("Error fetching similar movies: %s", e)
+        return jsonify(error="An error occurred fetching similar movies"), 500
+
+
+def search_arguments():
+    """
+    Reads the ``q`` and ``limit`` parameters shared by the search routes.
+
+    Returns:
+        tuple: The query text and the limit, or None and an error response.
+    """
+    query = request.args.get("q", "").strip()
+    if not query:
+        return None, (jsonify(error="The 'q' parameter is required."), 400)
+    limit = request.args.get("limit", DEFAULT_SEARCH_LIMIT, type=int)
+    if limit is None or not 1 <= limit <= MAX_SEARCH_LIMIT:
+        return None, (
+            jsonify(error=f"'limit' must be between 1 and {MAX_SEARCH_LIMIT}."),
+            400,
+        )
+    return (query, limit), None
+
+
+@blueprint.route("/api/search", methods=["GET"])
+@conditional_get(Movie.__tablename__)
+@response_cache.cached(Movie.__tablename__)
+def search():
+    """
+    A route for ranked full-text movie search with a fuzzy title fallback.
+
+    Query parameters:
+        q: The search text.
+        limit: Maximum number of hits (default 20, at most 100).
+
+    Returns:
+        Response: The hits, best first, or an error message.
+    """
+    arguments, error = search_arguments()
+    if error:
+        return error
+    try:
+        return jsonify(search_movies(db.session, *arguments)), 200
+    except SQLAlchemyError as e:
+        current_app.logger.error("Error searching movies: %s", e)
+        return jsonify(error="An error occurred searching movies"), 500
+
+
+@blueprint.route("/api/search/suggest", methods=["GET"])
+@conditional_get(Movie.__tablename__)
+@response_cache.cached(Movie.__tablename__)
+def suggest():
+    """
+    A route completing partially typed movie titles.
+
+    Query parameters:
+        q: What the user typed so far.
+        limit: Maximum number of suggestions (default 20, at most 100).
+
+    Returns:
+        Response: The suggested titles, or an error message.
+    """
+    arguments, error = search_arguments()
+    if error:
+        return error
+    try:
+        return jsonify(suggest_titles(db.session, *arguments)), 200
+    except SQLAlchemyError as e:
+        current_app.logger.error("Error suggesting titles: %s", e)
+        return jsonify(error="An error occurred suggesting titles"), 500
@@ -0,0 +1,479 @@
+"""
+routes/jobs.py
+--------------
+
+The routes queuing background jobs and reporting their status, and the
+handlers ``worker.py`` runs those jobs with.
+
+An ingest job fetches horror movies from TMDB, looks their trailers up on
+YouTube through the trailer cache, the YouTube quota and the shared outbound
+HTTP client, and writes the movies in batches. A platform job links a trailer
+to streaming platforms and notifies the users watching its movie.
+
+Functions:
+    trigger_search(): Route function queuing a job that ingests movies and trailers.
+    get_job(job_id): Route function reporting the status and progress of a job.
+    add_trailer_platforms(trailer_id): Route function queuing a job that makes a
+        trailer available on streaming platforms and notifies its watchers.
+    run_ingest(options, progress): Handler of ingest jobs.
+    run_platform_availability(options, progress): Handler of platform jobs.
+    ingest_batch(movies, report, progress, priority): Look up trailers for a
+        batch of movies and write it.
+    fetch_horror_movies_from_tmdb(year, page): Fetch one page of horror movies.
+    fetch_youtube_trailer(movie_title, release_date, priority): Search YouTube
+        for a movie's trailer.
+
+Attributes:
+    blueprint (Blueprint): The blueprint holding the routes.
+    youtube_http (Httplib2Adapter): The transport of YouTube API calls.
+"""
+import logging
+from datetime import date
+
+from flask import Blueprint, current_app, jsonify, request, url_for
+from sqlalchemy.exc import SQLAlchemyError
+
+from extensions import db
+from models.database import Job
+from services.http_client import Httplib2Adapter, http_client
+from services.ingestion import IngestReport, TrailerLookupResult, lookup_trailers
+from services.jobs import JobDeferred, job_as_dict, job_queue
+from services.notifications import add_platform_availability
+from services.quota import (
+    BACKGROUND,
+    INTERACTIVE,
+    SEARCH_COST,
+    QuotaExhausted,
+    youtube_quota,
+)
+from services.resilience import providers
+from services.tmdb import (
+    MAX_DISCOVER_PAGE,
+    BackfillCursor,
+    backfill,
+    fetch_discover_page,
+)
+from services.trailer_cache import (
+    lookup_key,
+    search_query,
+    trailer_cache,
+    video_id_from_url,
+    watch_url,
+)
+from services.writer import WriteCounts, upsert_movies
+from services.youtube import youtube_client
+
+BACKFILL_START_YEAR = 1960
+INGEST_JOB = "ingest"
+PLATFORM_JOB = "platform_availability"
+
+logger = logging.getLogger(__name__)
+
+blueprint = Blueprint("jobs", __name__)
+
+# YouTube requests share the pooled outbound session, from any thread. The
+# quota is charged once per search, so a retry would spend it unaccounted;
+# a failed search counts against the breaker and the job retries it later
+youtube_http = Httplib2Adapter(http_client, retries=0)
+
+
+@blueprint.route("/trigger_search", methods=["POST"])
+def trigger_search():
+    """
+    A route queuing a search for movie trailers.
+    The ingest job fetches horror movie details from TMDB and then fetches
+    trailers from YouTube; a worker process (``worker.py``) runs it.
+
+    By default the first page of this year's horror movies is ingested;
+    ``{"year": 1985, "page": 2}`` picks another page. Posting
+    ``{"mode": "backfill", "start_year": 1980, "end_year": 2023}`` walks every
+    page of every year in the range instead, resuming after the last page a
+    previous, interrupted backfill wrote.
+
+    While a search (or a backfill) is queued or running, triggering another
+    returns the active job instead of queuing a second one. Searches start
+    ahead of backfills and may spend the YouTube quota reserved for them;
+    a job that runs out of quota is deferred until the quota resets.
+
+    Returns:
+        Response: 202 with the job id and its status URL, or an error message.
+    """
+    options = request.get_json(silent=True) or {}
+
+    if options.get("mode") == "backfill":
+        try:
+            start_year = int(options.get("start_year", BACKFILL_START_YEAR))
+            end_year = int(options.get("end_year", date.today().year))
+        except (TypeError, ValueError):
+            return jsonify({"error": "Years must be integers."}), 400
+        payload = {
+            "mode": "backfill",
+            "start_year": start_year,
+            "end_year": end_year,
+        }
+    else:
+        try:
+            year = int(options.get("year", date.today().year))
+            page = int(options.get("page", 1))
+        except (TypeError, ValueError):
+            return jsonify({"error": "Year and page must be integers."}), 400
+        if not 1 <= page <= MAX_DISCOVER_PAGE:
+            error = f"Page must be between 1 and {MAX_DISCOVER_PAGE}."
+            return jsonify({"error": error}), 400
+        payload = {"mode": "search", "year": year, "page": page}
+    priority = BACKGROUND if payload["mode"] == "backfill" else INTERACTIVE
+
+    try:
+        job_id, created = job_queue.enqueue(
+            db.session,
+            INGEST_JOB,
+            payload,
+            # Backfills share one cursor, so only one may be active at a time
+            dedupe_key=f"{INGEST_JOB}:{payload['mode']}",
+            priority=priority,
+        )
+    except SQLAlchemyError as e:
+        current_app.logger.error("Error queuing the ingest job: %s", e)
+        return jsonify({"error": "An error occurred queuing the search"}), 500
+
+    status_url = url_for("jobs.get_job", job_id=job_id)
+    response = jsonify(
+        {
+            "message": "Search queued" if created else "Search already queued",
+            "job_id": job_id,
+            "deduplicated": not created,
+            "status_url": status_url,
+        }
+    )
+    response.headers["Location"] = status_url
+    return response, 202
+
+
+@blueprint.route("/api/jobs/<int:job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    A route reporting the status of a background job.
+
+    Progress counters of ingest jobs include ``movies_fetched``,
+    ``trailers_resolved``, ``trailer_lookups_failed`` and ``rows_written``.
+
+    Returns:
+        Response: The job's status, progress and outcome, or an error message.
+    """
+    try:
+        job = db.session.get(Job, job_id)
+    except SQLAlchemyError as e:
+        current_app.logger.error("Error fetching job %s: %s", job_id, e)
+        return jsonify(error="An error occurred fetching the job"), 500
+    if job is None:
+        return jsonify(error="Job not found."), 404
+    return jsonify(job_as_dict(job)), 200
+
+
+@blueprint.route("/api/trailers/<int:trailer_id>/platforms", methods=["POST"])
+def add_trailer_platforms(trailer_id):
+    """
+    A route making a trailer available on streaming platforms.
+
+    Expects ``{"platform_ids": [1, 2]}``. A job records the new links and
+    notifies every user with the trailer's movie on their watchlist, in
+    one transaction; platforms the trailer was already on notify nobody.
+
+    Returns:
+        Response: 202 with the job id and its status URL, or an error message.
+    """
+    options = request.get_json(silent=True) or {}
+    platform_ids = options.get("platform_ids")
+    if (
+        not isinstance(platform_ids, list)
+        or not platform_ids
+        or not all(
+            isinstance(platform_id, int) and not isinstance(platform_id, bool)
+            for platform_id in platform_ids
+        )
+    ):
+        return (
+            jsonify({"error": "platform_ids must be a list of platform ids."}),
+            400,
+        )
+
+    pairs = [[trailer_id, platform_id] for platform_id in platform_ids]
+    try:
+        job_id, _ = job_queue.enqueue(db.session, PLATFORM_JOB, {"pairs": pairs})
+    except SQLAlchemyError as e:
+        current_app.logger.error("Error queuing the platform job: %s", e)
+        return jsonify({"error": "An error occurred queuing the update"}), 500
+
+    status_url = url_for("jobs.get_job", job_id=job_id)
+    response = jsonify(
+        {"message": "Update queued", "job_id": job_id, "status_url": status_url}
+    )
+    response.headers["Location"] = status_url
+    return response, 202
+
+
+@job_queue.handler(INGEST_JOB)
+def run_ingest(options, progress):
+    """
+    Runs an ingest job queued by ``/trigger_search``.
+
+    Parameters:
+        options (dict): ``mode`` ("search" or "backfill"), plus ``year``
+            and ``page`` for a search, or ``start_year`` and ``end_year`` for
+            a backfill.
+        progress (JobProgress): Progress counters of the job.
+
+    Returns:
+        dict: Lookup totals, write totals and trailer cache counters.
+    """
+    report = IngestReport()
+    written = WriteCounts()
+
+    if options.get("mode") == "backfill":
+        pages = backfill(
+            current_app.config["TMDB_API_KEY"],
+            options["start_year"],
+            options["end_year"],
+            lambda movies: written.add(
+                ingest_batch(movies, report, progress, BACKGROUND)
+            ),
+            BackfillCursor(current_app.config["BACKFILL_CURSOR_PATH"]),
+        )
+        message = f"Backfill completed: {pages} pages ingested"
+    else:
+        tmdb_movies = fetch_horror_movies_from_tmdb(
+            options.get("year", date.today().year), options.get("page", 1)
+        )
+        if not tmdb_movies:
+            # Raising makes the queue retry the search later
+            raise RuntimeError("No movies fetched from TMDB.")
+        written.add(ingest_batch(tmdb_movies, report, progress, INTERACTIVE))
+        message = "Search and update completed successfully"
+
+    totals = report.as_dict()
+    del totals["movies"]
+    return {
+        "message": message,
+        **totals,
+        "written": written.as_dict(),
+        "trailer_cache": trailer_cache.stats(),
+        "youtube_quota": youtube_quota.stats(),
+        "outbound_http": http_client.stats(),
+        "providers": providers.stats(),
+    }
+
+
+@job_queue.handler(PLATFORM_JOB)
+def run_platform_availability(options, progress):
+    """
+    Runs a job queued by ``/api/trailers/<trailer_id>/platforms``.
+
+    A failed attempt rolls back the links with the notifications, so the
+    retry notifies the same watchers.
+
+    Parameters:
+        options (dict): ``pairs``, the (trailer id, platform id) pairs.
+        progress (JobProgress): Progress counters of the job.
+
+    Returns:
+        dict: The totals of ``add_platform_availability``.
+    """
+    totals = add_platform_availability(
+        db.session, [tuple(pair) for pair in options["pairs"]]
+    )
+    progress.add(**totals)
+    return totals
+
+
+def cached_trailers(movies, keys):
+    """
+    Answers the trailer lookups of a batch from the trailer cache.
+
+    Parameters:
+        movies (list of dict): Movie details as returned by TMDB.
+        keys (dict): The trailer cache key of each movie, by ``id(movie)``.
+
+    Returns:
+        tuple: The lookup results of the cached movies, and the movies that
+        still have to be searched for.
+    """
+    cached = trailer_cache.get_many(keys.values())
+    results = []
+    misses = []
+    for movie in movies:
+        key = keys[id(movie)]
+        if key not in cached:
+            misses.append(movie)
+            continue
+        video_id = cached[key]
+        results.append(
+            TrailerLookupResult(
+                movie,
+                trailer_url=watch_url(video_id) if video_id else None,
+                cached=True,
+            )
+        )
+    return results, misses
+
+
+def search_trailers(movies, keys, progress, priority):
+    """
+    Searches YouTube for the trailers of movies and caches what it finds.
+
+    Parameters:
+        movies (list of dict): Movie details as returned by TMDB.
+        keys (dict): The trailer cache key of each movie, by ``id(movie)``.
+        progress (JobProgress): Progress counters of the ingest job.
+        priority (int): Quota priority of the lookups.
+
+    Returns:
+        tuple: The lookup results, and the QuotaExhausted errors raised. Once
+        the quota ran out, failed lookups are left out of the results; they are
+        made again when the job resumes with fresh quota.
+    """
+    exhausted = []
+
+    def lookup(movie):
+        try:
+            return fetch_youtube_trailer(
+                movie["title"], movie.get("release_date"), priority
+            )
+        except QuotaExhausted as e:
+            exhausted.append(e)
+            raise
+
+    results = []
+    resolved = {}
+    for result in lookup_trailers(
+        movies, lookup, max_workers=current_app.config["INGEST_MAX_WORKERS"]
+    ):
+        if exhausted and not result.ok:
+            continue
+        results.append(result)
+        if result.ok:
+            resolved[keys[id(result.movie)]] = (
+                video_id_from_url(result.trailer_url) if result.trailer_url else None
+            )
+            progress.add(trailers_resolved=1)
+        else:
+            progress.add(trailer_lookups_failed=1)
+    trailer_cache.put_many(resolved)
+    return results, exhausted
+
+
+def ingest_batch(movies, report, progress, priority):
+    """
+    Looks up trailers for a batch of movies and writes the batch.
+
+    Parameters:
+        movies (list of dict): Movie details as returned by TMDB.
+        report (IngestReport): Collects the per-movie lookup results.
+        progress (JobProgress): Progress counters of the ingest job.
+        priority (int): Quota priority of the lookups.
+
+    Returns:
+        WriteCounts: What the write did to the stored movies and trailers.
+
+    Raises:
+        JobDeferred: If the YouTube quota ran out before every lookup was
+            made. The batch is not written, so a backfill does not move its
+            cursor past it; the lookups that were made are cached.
+    """
+    progress.add(movies_fetched=len(movies))
+    keys = {
+        id(movie): lookup_key(movie["title"], movie.get("release_date"))
+        for movie in movies
+    }
+    results, misses = cached_trailers(movies, keys)
+    progress.add(trailers_resolved=len(results))
+
+    searched, exhausted = search_trailers(misses, keys, progress, priority)
+    if exhausted:
+        progress.flush()
+        raise JobDeferred(str(exhausted[0]), exhausted[0].retry_at)
+
+    for result in results + searched:
+        report.add(result)
+        if result.ok:
+            result.movie["trailer_url"] = result.trailer_url
+
+    # Movies whose lookup failed are still written; they keep any trailer
+    # an earlier ingest found
+    counts = upsert_movies(db.session, movies)
+    progress.add(
+        rows_written=counts.inserted + counts.updated + counts.trailers_inserted
+    )
+    progress.flush()
+    return counts
+
+
+def fetch_horror_movies_from_tmdb(year, page):
+    """
+    Fetches horror movies from The Movie Database (TMDB).
+    Filters for specific fields and returns a list of movie details.
+
+    Parameters:
+        year (int): Release year to search.
+        page (int): 1-based page of the year's results.
+
+    Raises:
+        TMDBError: If TMDB cannot be reached; the job queue retries the job.
+    """
+    movies, _ = fetch_discover_page(
+        current_app.config["TMDB_API_KEY"], year=year, page=page
+    )
+    return movies
+
+
+def fetch_youtube_trailer(movie_title, release_date=None, priority=INTERACTIVE):
+    """
+    Searches YouTube for the trailer of a movie.
+
+    Runs on the ingestion worker threads and goes through the shared,
+    pooled HTTP client and the YouTube circuit breaker; reports failures by
+    raising instead of building a response. The search is charged to the
+    YouTube quota once the breaker lets it through, and is never hedged or
+    retried, so each lookup spends the cost of one search.
+
+    Parameters:
+        movie_title (str): Title of the movie to search for.
+        release_date (str): ISO release date of the movie; its year is
+            searched for too, as it is part of the trailer cache key.
+        priority (int): INTERACTIVE or BACKGROUND; decides whether the
+            headroom of the rate limit and the reserved quota may be used.
+
+    Returns:
+        str: URL of the most relevant trailer, or None if nothing was found.
+
+    Raises:
+        QuotaExhausted: If today's YouTube quota cannot cover the search.
+        ProviderError: If the search failed, or YouTube's circuit is open.
+    """
+
+    def search():
+        # The client's resources are built from the discovery document at runtime
+        # pylint: disable=no-member
+        search_request = youtube_client.get().search().list(
+            q=search_query(movie_title, release_date),
+            part="snippet",
+            type="video",
+            maxResults=1,  # Assuming you want only the most relevant result
+        )
+        return search_request.execute(http=youtube_http)
+
+    result = providers.get("youtube").call(
+        search, reserve=lambda: youtube_quota.acquire(SEARCH_COST, priority)
+    )
+    if not result.ok:
+        # Worker threads have no app context, so no current_app.logger
+        logger.error(
+            "YouTube search for %r %s: %s", movie_title, result.status, result.error
+        )
+        result.unwrap()
+
+    items = result.value.get("items", [])
+    if not items:
+        return None
+
+    video_id = items[0]["id"]["videoId"]  # Access the first item in the list
+    return f"https://www.youtube.com/watch?v={video_id}"
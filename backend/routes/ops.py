@@ -0,0 +1,57 @@
+"""
+routes/ops.py
+-------------
+
+The routes operators and Prometheus read: metrics and cache statistics.
+
+Functions:
+    prometheus_metrics(): Route function exposing metrics in the Prometheus format.
+    cache_stats(): Route function reporting this worker's cache counters.
+
+Attributes:
+    blueprint (Blueprint): The blueprint holding the routes.
+"""
+from flask import Blueprint, Response, jsonify
+
+from services.metrics import metrics
+from services.response_cache import response_cache
+from services.trailer_cache import trailer_cache
+
+blueprint = Blueprint("ops", __name__)
+
+
+@blueprint.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """
+    A route exposing request, SQL and provider-call metrics to Prometheus.
+
+    Under gunicorn the metrics of every worker process are summed, whichever
+    worker answers.
+
+    Returns:
+        Response: The metrics in the Prometheus text format, or 404 when
+        metrics are disabled.
+    """
+    if not metrics.enabled:
+        return jsonify(error="Metrics are disabled"), 404
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
+@blueprint.route("/api/cache/stats", methods=["GET"])
+def cache_stats():
+    """
+    A route reporting the hit ratio and eviction counters of this worker's caches.
+
+    Returns:
+        Response: The response cache and trailer lookup cache counters.
+    """
+    return (
+        jsonify(
+            {
+                "responses": response_cache.stats(),
+                "trailer_lookups": trailer_cache.stats(),
+            }
+        ),
+        200,
+    )
@@ -0,0 +1,7 @@
+"""
+services
+--------
+
+Helpers used by the routes in ``routes`` for talking to external providers
+and moving ingested data into the database.
+"""
@@ -0,0 +1,321 @@
+"""
+services/catalog.py
+-------------------
+
+Queries for listing the movie catalog.
+
+Listings are paginated with keyset ("cursor") pagination instead of offsets:
+every page continues strictly after the sort key of the last row of the previous
+page, so fetching page 1000 costs the same index range scan as fetching page 1.
+Only the requested columns are selected, and rows come back as plain tuples
+rather than ORM entities. Bulk consumers can instead stream the whole catalog
+through a server-side cursor.
+
+Sorting on a nullable column puts NULLs last in ascending order and first in
+descending order, which is exactly one (column, id) index walked in either
+direction. Each page is fetched as at most two index-friendly segments: the
+rows with a value, and the rows without one.
+
+Classes:
+    CatalogQueryError: Raised for invalid listing parameters.
+    MovieListing: A parsed listing request that can fetch its page.
+
+Functions:
+    encode_cursor(values): Build the opaque cursor for a sort position.
+    decode_cursor(cursor): Read a cursor back.
+"""
+import base64
+import json
+from datetime import date
+
+from sqlalchemy import select, tuple_
+
+from models.database import Movie
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+
+MOVIE_FIELDS = {
+    "id": Movie.id,
+    "title": Movie.title,
+    "director": Movie.director,
+    "cast": Movie.cast,
+    "release_date": Movie.release_date,
+    "length": Movie.length,
+    "rating": Movie.rating,
+    "rating_count": Movie.rating_count,
+    "rating_histogram": Movie.rating_histogram,
+    "age_restriction": Movie.age_restriction,
+    "summary": Movie.summary,
+    "trailer_url": Movie.trailer_url,
+    "poster_url": Movie.poster_url,
+}
+
+DEFAULT_FIELDS = (
+    "id",
+    "title",
+    "director",
+    "cast",
+    "release_date",
+    "length",
+    "rating",
+    "age_restriction",
+    "summary",
+    "trailer_url",
+)
+
+SORT_KEYS = {
+    "id": Movie.id,
+    "title": Movie.title,
+    "release_date": Movie.release_date,
+    "rating": Movie.rating,
+}
+
+
+class CatalogQueryError(ValueError):
+    """Raised when a listing request has invalid parameters."""
+
+
+def encode_cursor(values):
+    """
+    Builds the opaque cursor for a sort position.
+
+    Parameters:
+        values (list): The sort key values of the last row of a page.
+
+    Returns:
+        str: A URL-safe cursor string.
+    """
+    payload = [value.isoformat() if isinstance(value, date) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Reads a cursor built by ``encode_cursor``.
+
+    Parameters:
+        cursor (str): The cursor string.
+
+    Returns:
+        list: The sort key values it encodes.
+
+    Raises:
+        CatalogQueryError: If the cursor is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise CatalogQueryError("Invalid cursor.") from e
+    if not isinstance(values, list):
+        raise CatalogQueryError("Invalid cursor.")
+    return values
+
+
+def _parse_int(args, name, default=None):
+    value = args.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except ValueError as e:
+        raise CatalogQueryError(f"'{name}' must be an integer.") from e
+
+
+def _parse_float(args, name):
+    value = args.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError as e:
+        raise CatalogQueryError(f"'{name}' must be a number.") from e
+
+
+class MovieListing:
+    """
+    A parsed movie listing request.
+
+    Attributes:
+        fields: Names of the columns to return, in output order.
+        sort: Name of the sort key.
+        descending: True for a descending sort.
+        limit: Maximum number of rows per page.
+        after: Decoded cursor values, or None for the first page.
+        filters: SQL conditions built from the filter parameters.
+    """
+
+    def __init__(self, args):
+        """
+        Parses listing parameters.
+
+        Parameters:
+            args (Mapping): Query string arguments. Supported keys are ``fields``
+                (comma-separated column names), ``sort`` (a sort key, prefixed with
+                "-" for descending order), ``limit``, ``cursor`` and the filters
+                ``title`` (case-insensitive prefix), ``director``, ``year`` and
+                ``min_rating``.
+
+        Raises:
+            CatalogQueryError: If a parameter is invalid.
+        """
+        requested = args.get("fields")
+        self.fields = (
+            tuple(dict.fromkeys(f.strip() for f in requested.split(",") if f.strip()))
+            if requested
+            else DEFAULT_FIELDS
+        )
+        unknown = [f for f in self.fields if f not in MOVIE_FIELDS]
+        if unknown or not self.fields:
+            raise CatalogQueryError(
+                f"Unknown fields: {', '.join(unknown)}." if unknown else "No fields."
+            )
+
+        sort = args.get("sort") or "id"
+        self.descending = sort.startswith("-")
+        self.sort = sort.lstrip("-")
+        if self.sort not in SORT_KEYS:
+            raise CatalogQueryError(f"Cannot sort by '{self.sort}'.")
+
+        self.limit = _parse_int(args, "limit", DEFAULT_PAGE_SIZE)
+        if not 1 <= self.limit <= MAX_PAGE_SIZE:
+            raise CatalogQueryError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}.")
+
+        self.after = None
+        if args.get("cursor"):
+            self.after = decode_cursor(args["cursor"])
+            expected = 1 if self.sort == "id" else 2
+            if len(self.after) != expected:
+                raise CatalogQueryError("Cursor does not match the sort order.")
+            if self.sort == "release_date" and self.after[0] is not None:
+                try:
+                    self.after[0] = date.fromisoformat(self.after[0])
+                except (TypeError, ValueError) as e:
+                    raise CatalogQueryError("Invalid cursor.") from e
+
+        self.filters = self._build_filters(args)
+
+    @staticmethod
+    def _build_filters(args):
+        filters = []
+        if args.get("title"):
+            prefix = args["title"].replace("\\", "\\\\").replace("%", "\\%")
+            filters.append(Movie.title.ilike(prefix.replace("_", "\\_") + "%"))
+        if args.get("director"):
+            filters.append(Movie.director == args["director"])
+        year = _parse_int(args, "year")
+        if year is not None:
+            if not 1 <= year < 9999:
+                raise CatalogQueryError("'year' is out of range.")
+            filters.append(Movie.release_date >= date(year, 1, 1))
+            filters.append(Movie.release_date < date(year + 1, 1, 1))
+        min_rating = _parse_float(args, "min_rating")
+        if min_rating is not None:
+            filters.append(Movie.rating >= min_rating)
+        return filters
+
+    def _sort_columns(self):
+        if self.sort == "id":
+            return (Movie.id,)
+        return (SORT_KEYS[self.sort], Movie.id)
+
+    def _segments(self):
+        """
+        Returns the (conditions, order_by) of the segments the page is read from.
+
+        Every segment is a plain range over the (sort, id) index, in the order
+        the segments appear in the listing.
+        """
+        columns = self._sort_columns()
+        order = [c.desc() if self.descending else c.asc() for c in columns]
+
+        if self.sort == "id":
+            conditions = []
+            if self.after is not None:
+                conditions.append(
+                    Movie.id < self.after[0] if self.descending else Movie.id > self.after[0]
+                )
+            return [(conditions, order)]
+
+        column = columns[0]
+        value, last_id = self.after if self.after is not None else (None, None)
+        with_value = [column.isnot(None)]
+        without_value = [column.is_(None)]
+        if self.after is not None:
+            if value is None:
+                with_value = None if not self.descending else with_value
+                without_value.append(
+                    Movie.id < last_id if self.descending else Movie.id > last_id
+                )
+            else:
+                key = tuple_(column, Movie.id)
+                with_value.append(
+                    key < tuple_(value, last_id)
+                    if self.descending
+                    else key > tuple_(value, last_id)
+                )
+                without_value = None if self.descending else without_value
+
+        segments = [(with_value, order), (without_value, order[1:])]
+        if self.descending:
+            segments.reverse()
+        return [segment for segment in segments if segment[0] is not None]
+
+    def fetch(self, session):
+        """
+        Fetches one page of the listing.
+
+        Parameters:
+            session (Session): The SQLAlchemy session to query with.
+
+        Returns:
+            tuple: The list of rows as dicts of the requested fields, and the cursor
+            of the next page, or None if this is the last page.
+        """
+        columns = self._sort_columns()
+        selected = list(dict.fromkeys([*(MOVIE_FIELDS[f] for f in self.fields), *columns]))
+
+        rows = []
+        for conditions, order in self._segments():
+            remaining = self.limit + 1 - len(rows)
+            if remaining <= 0:
+                break
+            statement = (
+                select(*selected)
+                .where(*self.filters, *conditions)
+                .order_by(*order)
+                .limit(remaining)
+            )
+            rows.extend(session.execute(statement).mappings().all())
+
+        next_cursor = None
+        if len(rows) > self.limit:
+            rows = rows[: self.limit]
+            last = rows[-1]
+            next_cursor = encode_cursor([last[c.key] for c in columns])
+
+        return [{f: row[f] for f in self.fields} for row in rows], next_cursor
+
+    def stream(self, session, batch_size=EXPORT_BATCH_SIZE):
+        """
+        Streams every matching row, ignoring the sort, limit and cursor.
+
+        Rows are read in id order through a server-side cursor, ``batch_size`` at
+        a time, so memory use does not depend on the size of the catalog.
+
+        Parameters:
+            session (Session): The SQLAlchemy session to query with.
+            batch_size (int): Number of rows fetched from the server per round trip.
+
+        Yields:
+            dict: One row at a time, holding the requested fields.
+        """
+        statement = (
+            select(*(MOVIE_FIELDS[f] for f in self.fields))
+            .where(*self.filters)
+            .order_by(Movie.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for row in session.execute(statement).mappings():
+            yield dict(row)
@@ -0,0 +1,308 @@
+"""
+services/catalog_version.py
+---------------------------
+
+Catalog version counters and conditional GET support.
+
+Each table that read endpoints depend on has a row in ``catalog_versions``.
+Session hooks notice every ORM flush and bulk statement touching a tracked table
+and bump its version just before the transaction commits, so the bump commits or
+rolls back together with the change. Read endpoints turn the versions into a
+strong ETag and a Last-Modified date, and answer ``If-None-Match`` /
+``If-Modified-Since`` with ``304 Not Modified`` without reading any rows.
+
+Versions are read through a per-process memo that is refreshed at most once per
+``max_age`` seconds, and immediately after this process commits a change. Other
+processes therefore see a change after at most ``max_age`` seconds.
+
+Classes:
+    VersionCache: Per-process memo of the version rows.
+
+Functions:
+    bump_versions(session, tables): Record that tables changed.
+    current_versions(session, tables): Read the versions of tables.
+    track_table_changes(): Install the session hooks that bump versions.
+    discard_table_changes(session, tables): Forget statements that changed nothing.
+    conditional_get(*tables): Decorator adding conditional GET to a route.
+"""
+import functools
+import hashlib
+import threading
+import time
+from datetime import timezone
+
+from flask import make_response, request
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models.database import CatalogVersion
+
+# Tables whose changes invalidate cached read responses
+TRACKED_TABLES = frozenset(
+    {"movies", "trailers", "reviews", "streaming_platforms", "platform_trailers"}
+)
+# Tables that database triggers update when another table changes
+TRIGGERED_TABLES = {"reviews": frozenset({"movies"})}
+DEFAULT_MAX_AGE = 1.0
+
+
+def bump_versions(session, tables):
+    """
+    Increments the version of each table, creating missing version rows.
+
+    Runs inside the caller's transaction, so the bump commits or rolls back
+    together with the change it describes. Writers do not normally call this
+    themselves; the hooks installed by ``track_table_changes`` do, and so does
+    anything writing a tracked table with plain SQL, which the hooks cannot see.
+
+    Parameters:
+        session (Session or Connection): Where the write is done.
+        tables (iterable of str): Names of the tables that changed.
+    """
+    rows = [
+        {"table_name": table, "version": 1, "updated_at": func.now()}
+        for table in sorted(set(tables))
+    ]
+    if not rows:
+        return
+
+    statement = insert(CatalogVersion).values(rows)
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[CatalogVersion.table_name],
+            set_={
+                "version": CatalogVersion.version + 1,
+                "updated_at": statement.excluded.updated_at,
+            },
+        )
+    )
+
+
+def current_versions(session, tables):
+    """
+    Reads the versions of a set of tables with a single primary-key query.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to query with.
+        tables (iterable of str): Names of the tables to read.
+
+    Returns:
+        tuple: A tuple of (table, version) pairs in the order of ``tables``, and
+        the most recent change time among them, or None if none changed yet.
+    """
+    tables = tuple(tables)
+    rows = {
+        row.table_name: row
+        for row in session.execute(
+            select(
+                CatalogVersion.table_name,
+                CatalogVersion.version,
+                CatalogVersion.updated_at,
+            ).where(CatalogVersion.table_name.in_(tables))
+        )
+    }
+    versions = tuple(
+        (table, rows[table].version if table in rows else 0) for table in tables
+    )
+    changed = [row.updated_at for row in rows.values()]
+    return versions, max(changed) if changed else None
+
+
+class VersionCache:
+    """
+    Per-process memo of the ``catalog_versions`` rows.
+
+    The table only has a handful of rows, so the memo loads all of them at once.
+
+    Attributes:
+        max_age: Seconds a loaded memo is trusted before it is read again.
+    """
+
+    def __init__(self, max_age=DEFAULT_MAX_AGE):
+        self.max_age = max_age
+        self._rows = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, session, tables):
+        """
+        Returns the versions of tables, reading the database only if the memo is stale.
+
+        Parameters:
+            session (Session): The SQLAlchemy session to query with.
+            tables (iterable of str): Names of the tables to read.
+
+        Returns:
+            tuple: The same (versions, changed_at) pair as ``current_versions``.
+        """
+        with self._lock:
+            rows = self._rows
+            if rows is None or time.monotonic() - self._loaded_at > self.max_age:
+                rows = {
+                    row.table_name: (row.version, row.updated_at)
+                    for row in session.execute(
+                        select(
+                            CatalogVersion.table_name,
+                            CatalogVersion.version,
+                            CatalogVersion.updated_at,
+                        )
+                    )
+                }
+                self._rows = rows
+                self._loaded_at = time.monotonic()
+
+        tables = tuple(tables)
+        versions = tuple((table, rows.get(table, (0, None))[0]) for table in tables)
+        changed = [rows[table][1] for table in tables if table in rows]
+        return versions, max(changed) if changed else None
+
+    def invalidate(self):
+        """Forgets the memo so the next read goes to the database."""
+        with self._lock:
+            self._rows = None
+
+
+version_cache = VersionCache()
+
+
+def _changed_tables(session):
+    return session.info.setdefault("changed_tables", set())
+
+
+def _record_change(session, table):
+    changed = _changed_tables(session)
+    for name in (table, *TRIGGERED_TABLES.get(table, ())):
+        if name in TRACKED_TABLES:
+            changed.add(name)
+
+
+def _track_flush(session, flush_context, instances):  # pylint: disable=unused-argument
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(instance, "__tablename__", None)
+        if table is not None:
+            _record_change(session, table)
+
+
+def _track_statement(orm_execute_state):
+    if not (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if table is not None:
+        _record_change(orm_execute_state.session, table.name)
+
+
+def discard_table_changes(session, tables):
+    """
+    Tells the hooks that statements against tables did not change any row.
+
+    Bulk statements are recorded before they run, so writers that can tell from
+    the result that nothing changed (an upsert that returned no rows, say) call
+    this to avoid a needless version bump.
+
+    Parameters:
+        session (Session): The session the statements ran in.
+        tables (iterable of str): Names of the tables to forget.
+    """
+    _changed_tables(session).difference_update(tables)
+
+
+def _bump_before_commit(session):
+    session.flush()
+    tables = session.info.pop("changed_tables", None)
+    if tables:
+        bump_versions(session, tables)
+        session.info["committed_tables"] = tables
+
+
+def _after_commit(session):
+    if session.info.pop("committed_tables", None):
+        version_cache.invalidate()
+
+
+def _after_rollback(session):
+    session.info.pop("changed_tables", None)
+    session.info.pop("committed_tables", None)
+
+
+def track_table_changes():
+    """
+    Installs the session hooks that bump table versions on commit.
+
+    The hooks apply to every SQLAlchemy session in the process, including the
+    Flask-SQLAlchemy one, and are only installed once.
+    """
+    hooks = (
+        ("before_flush", _track_flush),
+        ("do_orm_execute", _track_statement),
+        ("before_commit", _bump_before_commit),
+        ("after_commit", _after_commit),
+        ("after_rollback", _after_rollback),
+    )
+    for name, hook in hooks:
+        if not event.contains(Session, name, hook):
+            event.listen(Session, name, hook)
+
+
+def _http_date(value):
+    """Normalizes a timestamp to the whole-second UTC precision of HTTP dates."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    return since is not None and last_modified is not None and last_modified <= since
+
+
+def conditional_get(*tables):
+    """
+    Adds ETag / Last-Modified validation to a GET route.
+
+    The ETag combines the versions of ``tables`` with the request path and query
+    string, since different pages of the same listing have different bodies. When
+    the client already holds the current representation the view is not called at
+    all and an empty ``304 Not Modified`` is returned.
+
+    Parameters:
+        *tables (str): Names of the tables the route's response is built from.
+
+    Returns:
+        callable: The route decorator.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            versions, changed_at = version_cache.get(db.session, tables)
+            etag = hashlib.sha256(
+                f"{request.full_path}|{versions}".encode()
+            ).hexdigest()[:32]
+            last_modified = _http_date(changed_at) if changed_at else None
+
+            if _not_modified(etag, last_modified):
+                response = make_response("", 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Caches may keep the response but must revalidate it before use
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        return wrapper
+
+    return decorator
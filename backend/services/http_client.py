@@ -0,0 +1,392 @@
+"""
+services/http_client.py
+-----------------------
+
+The shared outbound HTTP layer for calls to TMDB and YouTube.
+
+All outbound calls go through one ``requests.Session`` per process, which
+keeps a pool of keep-alive connections per host, so only the first call to a
+host pays for the TCP and TLS handshakes. Every call has a connect and a read
+timeout, responses are requested gzip-compressed, and idempotent requests
+answered with 429 or a 5xx status, or failing to connect, are retried after
+an exponential, jittered backoff that honours ``Retry-After``.
+
+Per host the client records request, retry and error counts, recent latency
+percentiles, and how many of the pool's connections are in use, opened and
+idle.
+
+Hosts can be redirected, e.g. ``api.themoviedb.org=http://127.0.0.1:9001``, to
+run against local stand-in servers; metrics stay keyed by the original host.
+
+The YouTube client library speaks httplib2, so ``Httplib2Adapter`` gives it the
+same session through httplib2's ``request`` interface.
+
+Classes:
+    HostMetrics: Counters and recent latencies of one host.
+    HttpClient: Flask extension owning the session, retries and metrics.
+    Httplib2Adapter: httplib2-compatible front end for googleapiclient.
+
+Attributes:
+    http_client (HttpClient): The client outbound calls go through.
+"""
+import collections
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 0.5
+DEFAULT_MAX_BACKOFF_SECONDS = 30.0
+# Connections kept per host; lookups run on up to this many threads at once
+DEFAULT_POOL_SIZE = 16
+# Hosts whose pools the session keeps, closing the least recently used one
+# beyond that; outbound calls only go to TMDB and YouTube
+POOLED_HOSTS = 8
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Headers describing the encoded body, which requests has already decoded
+DECODED_HEADERS = frozenset(
+    {"content-encoding", "content-length", "transfer-encoding"}
+)
+# Latencies kept per host for the percentiles
+LATENCY_SAMPLES = 1024
+
+logger = logging.getLogger(__name__)
+
+
+def parse_overrides(value):
+    """
+    Parses ``host=base_url`` pairs separated by commas.
+
+    Parameters:
+        value (str): The pairs, e.g. "api.themoviedb.org=http://127.0.0.1:9001".
+
+    Returns:
+        dict: Base URL per host.
+    """
+    overrides = {}
+    for pair in (value or "").split(","):
+        if "=" in pair:
+            host, base_url = pair.split("=", 1)
+            overrides[host.strip()] = base_url.strip().rstrip("/")
+    return overrides
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# pylint: disable=too-few-public-methods
+class HostMetrics:
+    """
+    Counters and recent latencies of the calls to one host.
+
+    Attributes:
+        requests: Calls made, retries included.
+        retries: Calls that were retries of an earlier one.
+        errors: Calls that raised or answered with a retryable status.
+        in_flight: Calls currently waiting for a response.
+        peak_in_flight: Most calls ever in flight at once.
+        latencies: Seconds taken by the most recent calls.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def as_dict(self):
+        """
+        Returns the counters and latency percentiles.
+
+        Returns:
+            dict: Counts, plus p50/p95/p99 latency in milliseconds.
+        """
+        summary = {
+            "requests": self.requests,
+            "retries": self.retries,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+        }
+        ordered = sorted(self.latencies)
+        for name, fraction in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            summary[name] = (
+                round(_percentile(ordered, fraction) * 1000, 2) if ordered else None
+            )
+        return summary
+
+
+# pylint: disable=too-many-instance-attributes
+class HttpClient:
+    """
+    Flask extension sending outbound requests through pooled keep-alive sessions.
+
+    Attributes:
+        connect_timeout: Seconds allowed to open a connection.
+        read_timeout: Seconds allowed between bytes of the response.
+        max_retries: Retries of a failed idempotent request.
+        backoff: Seconds before the first retry; doubled for each later one.
+        max_backoff: Upper bound of a retry delay in seconds.
+        pool_size: Connections kept open per host.
+        overrides: Base URL replacing each redirected host.
+    """
+
+    def __init__(self):
+        self.connect_timeout = DEFAULT_CONNECT_TIMEOUT
+        self.read_timeout = DEFAULT_READ_TIMEOUT
+        self.max_retries = DEFAULT_MAX_RETRIES
+        self.backoff = DEFAULT_BACKOFF_SECONDS
+        self.max_backoff = DEFAULT_MAX_BACKOFF_SECONDS
+        self.pool_size = DEFAULT_POOL_SIZE
+        self.overrides = {}
+        self._metrics = collections.defaultdict(HostMetrics)
+        self._lock = threading.Lock()
+        self._session = None
+        self._adapter = None
+
+    def init_app(self, app):
+        """
+        Configures the client from the app config.
+
+        Parameters:
+            app (Flask): The application.
+        """
+        config = app.config
+        self.connect_timeout = config.get(
+            "HTTP_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT
+        )
+        self.read_timeout = config.get("HTTP_READ_TIMEOUT", DEFAULT_READ_TIMEOUT)
+        self.max_retries = config.get("HTTP_MAX_RETRIES", DEFAULT_MAX_RETRIES)
+        self.backoff = config.get("HTTP_BACKOFF_SECONDS", DEFAULT_BACKOFF_SECONDS)
+        self.pool_size = config.get("HTTP_POOL_SIZE", DEFAULT_POOL_SIZE)
+        self.overrides = parse_overrides(config.get("HTTP_HOST_OVERRIDES"))
+        self.reset()
+        app.extensions["http_client"] = self
+
+    def reset(self):
+        """
+        Drops the session and its pooled connections; the next call opens new ones.
+
+        Call this in a forked child so it never shares sockets with its parent.
+        """
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._metrics.clear()
+
+    @property
+    def session(self):
+        """requests.Session: The pooled session, created on first use."""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    adapter = HTTPAdapter(
+                        pool_connections=POOLED_HOSTS,
+                        pool_maxsize=self.pool_size,
+                        pool_block=False,
+                    )
+                    session = requests.Session()
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    session.headers["Accept-Encoding"] = "gzip, deflate"
+                    self._adapter = adapter
+                    self._session = session
+        return self._session
+
+    def _route(self, url):
+        parts = urlsplit(url)
+        base_url = self.overrides.get(parts.hostname)
+        if base_url is None:
+            return parts.hostname, url
+        base = urlsplit(base_url)
+        return parts.hostname, urlunsplit(
+            (base.scheme, base.netloc, base.path + parts.path, parts.query, "")
+        )
+
+    def _retry_delay(self, retry, response):
+        retry_after = None
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                seconds = float(retry_after)
+            except ValueError:
+                try:
+                    moment = parsedate_to_datetime(retry_after)
+                    seconds = moment.timestamp() - time.time()
+                except (TypeError, ValueError):
+                    seconds = None
+            if seconds is not None:
+                return min(self.max_backoff, max(0.0, seconds))
+        delay = min(self.max_backoff, self.backoff * 2**retry)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _record(self, host, started, failed, retry):
+        with self._lock:
+            metrics = self._metrics[host]
+            metrics.in_flight -= 1
+            metrics.requests += 1
+            metrics.retries += retry > 0
+            metrics.errors += failed
+            metrics.latencies.append(time.perf_counter() - started)
+
+    def request(self, method, url, timeout=None, retries=None, **kwargs):
+        """
+        Sends a request, retrying idempotent ones on 429, 5xx and connection errors.
+
+        Parameters:
+            method (str): HTTP method.
+            url (str): Absolute URL.
+            timeout (float or tuple): Overrides the configured (connect, read)
+                timeouts.
+            retries (int): Overrides the configured number of retries.
+            **kwargs: Passed on to ``requests.Session.request``.
+
+        Returns:
+            requests.Response: The last response; its status may still be an
+            error once the retries are spent.
+
+        Raises:
+            requests.RequestException: If the last attempt failed to get a response.
+        """
+        host, routed_url = self._route(url)
+        timeout = timeout or (self.connect_timeout, self.read_timeout)
+        if retries is None:
+            retries = self.max_retries if method.upper() in IDEMPOTENT_METHODS else 0
+
+        retry = 0
+        while True:
+            with self._lock:
+                metrics = self._metrics[host]
+                metrics.in_flight += 1
+                metrics.peak_in_flight = max(metrics.peak_in_flight, metrics.in_flight)
+            started = time.perf_counter()
+            response = None
+            try:
+                response = self.session.request(
+                    method, routed_url, timeout=timeout, **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(host, started, True, retry)
+                if retry == retries:
+                    raise
+                logger.warning("%s %s failed, retrying: %s", method, host, e)
+            else:
+                failed = response.status_code in RETRY_STATUSES
+                self._record(host, started, failed, retry)
+                if not failed or retry == retries:
+                    return response
+                logger.warning(
+                    "%s %s answered %s, retrying", method, host, response.status_code
+                )
+            time.sleep(self._retry_delay(retry, response))
+            retry += 1
+
+    def get(self, url, **kwargs):
+        """Sends a GET request; see ``request``."""
+        return self.request("GET", url, **kwargs)
+
+    def _pools(self):
+        if self._adapter is None:
+            return {}
+        pools = self._adapter.poolmanager.pools
+        # The container refuses iteration, and a pool may be evicted meanwhile
+        found = ((key.key_host, pools.get(key)) for key in pools.keys())
+        return {host: pool for host, pool in found if pool is not None}
+
+    def stats(self):
+        """
+        Reports per-host call metrics and connection pool utilization.
+
+        Returns:
+            dict: Per host: the call counters and latency percentiles, the pool
+            size, and the connections opened and currently idle.
+        """
+        pools = self._pools()
+        with self._lock:
+            report = {
+                host: metrics.as_dict() for host, metrics in self._metrics.items()
+            }
+        for host, summary in report.items():
+            routed_host = urlsplit(self.overrides.get(host, f"//{host}")).hostname
+            pool = pools.get(routed_host)
+            summary["pool_size"] = self.pool_size
+            summary["connections_opened"] = pool.num_connections if pool else 0
+            # The pool's queue holds open connections and None placeholders
+            summary["idle_connections"] = (
+                sum(1 for conn in list(pool.pool.queue) if conn is not None)
+                if pool and pool.pool
+                else 0
+            )
+        return report
+
+
+# pylint: disable=too-few-public-methods
+class Httplib2Adapter:
+    """
+    Exposes an ``HttpClient`` through the ``request`` method of ``httplib2.Http``,
+    so that googleapiclient requests share its pools, retries and metrics.
+
+    googleapiclient passes the object to ``HttpRequest.execute(http=...)``. It is
+    safe to share between threads.
+
+    Attributes:
+        client: The HttpClient requests are sent through.
+        retries: Overrides the client's number of retries, e.g. 0 for calls
+            that are charged per attempt.
+    """
+
+    def __init__(self, client, retries=None):
+        self.client = client
+        self.retries = retries
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    # pylint: disable=unused-argument
+    def request(
+        self,
+        uri,
+        method="GET",
+        body=None,
+        headers=None,
+        redirections=5,
+        connection_type=None,
+    ):
+        """
+        Sends a request the way ``httplib2.Http.request`` does.
+
+        Returns:
+            tuple: An ``httplib2.Response`` and the response body as bytes.
+        """
+        import httplib2  # pylint: disable=import-outside-toplevel
+
+        response = self.client.request(
+            method,
+            uri,
+            retries=self.retries,
+            data=body,
+            headers=headers,
+            allow_redirects=redirections > 0,
+        )
+        info = {
+            key: value
+            for key, value in response.headers.items()
+            if key.lower() not in DECODED_HEADERS
+        }
+        info["status"] = str(response.status_code)
+        return httplib2.Response(info), response.content
+
+
+http_client = HttpClient()
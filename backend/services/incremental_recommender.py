@@ -0,0 +1,505 @@
+"""
+services/incremental_recommender.py
+-----------------------------------
+
+Keeps recommendations current as reviews arrive, without a full recompute.
+
+The batch recommender in ``services.recommender`` derives every movie-movie
+similarity from the Gram matrix ``G = C^T C`` of the user-centred ratings ``C``:
+``sim(i, j) = G[i, j] / sqrt(G[i, i] * G[j, j])``. ``G`` is a sum of one outer
+product per user, so when a user's ratings change only their own term changes.
+Subtracting the user's old term and adding the new one costs the square of the
+number of movies they rated, independent of the size of the catalog. ``G`` itself
+is kept as a scipy sparse matrix, a dozen bytes per co-rated pair of movies; the
+changes of a batch of reviews are collected separately and added to it in one
+sparse addition when the batch is refreshed.
+
+After a batch of reviews has been applied, ``refresh`` recomputes the neighbour
+lists of the movies the reviewers rated and patches those movies into, or out
+of, the neighbour lists of every movie they co-occur with. A neighbour list is
+only rebuilt from scratch when a member drops below the rest of a full list,
+since the next best candidate is then unknown. Finally the reviewers' own top-K
+lists are rescored. Other users keep their stored recommendations until the
+next full run of ``recommend.py``.
+
+Edited or deleted reviews are not seen by ``poll``, which follows new review
+ids; the next full run picks them up.
+
+Classes:
+    IncrementalRecommender: Running similarity state fed with new reviews.
+"""
+import math
+from collections import defaultdict
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import func, select
+
+from models.database import Review, Trailer
+from services.recommender import (
+    DEFAULT_NEIGHBOURS,
+    DEFAULT_TOP_K,
+    MIN_DEVIATION,
+    MIN_SIMILARITY,
+    RatingMatrix,
+    item_similarities,
+    recommend,
+    write_user_recommendations,
+)
+
+POLL_BATCH_SIZE = 10000
+DEFAULT_TOLERANCE = 1e-4
+# Gram entries closer to zero than this are treated as zero
+EPSILON = 1e-9
+# Changed Gram entries collected before they are added to the matrix; bounds
+# the memory a large batch of reviews takes
+MAX_PENDING_ENTRIES = 5_000_000
+
+
+def _score_difference(expected, actual):
+    """Largest absolute difference between two best-first score lists."""
+    if len(expected) != len(actual):
+        return math.inf
+    if len(expected) == 0:
+        return 0.0
+    return float(np.max(np.abs(np.asarray(expected) - np.asarray(actual))))
+
+
+def _neighbour_difference(expected, actual):
+    """
+    Largest difference between two neighbour lists of the same movie.
+
+    A neighbour present in only one list counts as a difference of its
+    similarity to zero, or to the weakest member of the other list when it
+    merely lost a tie or a rounding-level race for the last place.
+    """
+    error = 0.0
+    for movie in expected.keys() | actual.keys():
+        if movie in expected and movie in actual:
+            error = max(error, abs(expected[movie] - actual[movie]))
+            continue
+        value, other = (
+            (expected[movie], actual) if movie in expected else (actual[movie], expected)
+        )
+        weakest = min(other.values(), default=0.0)
+        error = max(error, min(abs(value), abs(value - weakest)))
+    return error
+
+
+class _GramMatrix:
+    """
+    The Gram matrix of the centred ratings, over movie positions.
+
+    Outer products added with ``add_outer`` are collected and summed into the
+    sparse matrix by ``fold``, all at once.
+
+    Attributes:
+        movie_ids: Movie id of each position.
+        positions: Position of each movie id.
+        matrix: CSR matrix of the folded entries; the diagonal holds squared norms.
+        diagonal: The diagonal of ``matrix``.
+    """
+
+    def __init__(self, movie_ids=(), matrix=None):
+        self.movie_ids = list(movie_ids)
+        self.positions = {movie: i for i, movie in enumerate(self.movie_ids)}
+        self.matrix = (
+            matrix if matrix is not None else sp.csr_matrix((0, 0), dtype=np.float64)
+        )
+        self.diagonal = self.matrix.diagonal()
+        # (positions, signed values, values) of the centred ratings of each
+        # outer product not yet in ``matrix``
+        self._changes = []
+        self._pending_entries = 0
+
+    def position(self, movie):
+        """The position of a movie, assigning the next free one to a new movie."""
+        position = self.positions.get(movie)
+        if position is None:
+            position = self.positions[movie] = len(self.movie_ids)
+            self.movie_ids.append(movie)
+        return position
+
+    def add_outer(self, row, sign):
+        """
+        Adds, or subtracts, the outer product of one user's centred ratings.
+
+        Parameters:
+            row (dict): movie -> centred rating.
+            sign (float): 1.0 to add the product, -1.0 to subtract it.
+        """
+        if not row:
+            return
+        positions = np.array([self.position(movie) for movie in row], dtype=np.int64)
+        values = np.fromiter(row.values(), np.float64, len(row))
+        self._changes.append((positions, sign * values, values))
+        self._pending_entries += len(row) ** 2
+        if self._pending_entries > MAX_PENDING_ENTRIES:
+            self.fold()
+
+    def fold(self):
+        """Sums the outer products collected so far into the matrix."""
+        size = len(self.movie_ids)
+        if self.matrix.shape[0] < size:
+            self.matrix.resize((size, size))
+        if self._changes:
+            # Row-major outer products: entry (i, j) pairs positions[i], positions[j]
+            changes = self._changes
+            rows = np.concatenate([np.repeat(p, len(p)) for p, _, _ in changes])
+            columns = np.concatenate([np.tile(p, len(p)) for p, _, _ in changes])
+            values = np.concatenate([np.outer(a, b).ravel() for _, a, b in changes])
+            delta = sp.csr_matrix((values, (rows, columns)), shape=(size, size))
+            matrix = (self.matrix + delta).tocsr()
+            # Drop entries whose contributions cancelled out
+            matrix.data[np.abs(matrix.data) <= EPSILON] = 0
+            matrix.eliminate_zeros()
+            self.matrix = matrix
+            self._changes = []
+            self._pending_entries = 0
+        self.diagonal = self.matrix.diagonal()
+
+    def similarities(self, position):
+        """
+        Similarities of a movie to every movie it shares raters with, as of the
+        last ``fold``.
+
+        Returns:
+            tuple: Arrays of the other movies' positions and the similarities,
+            zero where they are rounding noise.
+        """
+        start, end = self.matrix.indptr[position], self.matrix.indptr[position + 1]
+        columns = self.matrix.indices[start:end]
+        values = self.matrix.data[start:end]
+        norms = self.diagonal[position] * self.diagonal[columns]
+        similarities = np.zeros_like(values)
+        valid = (np.abs(values) > EPSILON) & (norms > EPSILON)
+        similarities[valid] = values[valid] / np.sqrt(norms[valid])
+        similarities[np.abs(similarities) < MIN_SIMILARITY] = 0.0
+        return columns, similarities
+
+
+class IncrementalRecommender:
+    """
+    Running item-item similarity state, updated one review at a time.
+
+    Attributes:
+        top_k: Number of recommendations kept per user.
+        neighbours: Number of most similar movies kept per movie.
+        last_review_id: Highest review id applied so far.
+    """
+
+    def __init__(self, top_k=DEFAULT_TOP_K, neighbours=DEFAULT_NEIGHBOURS):
+        self.top_k = top_k
+        self.neighbours = neighbours
+        self._reset()
+
+    def _reset(self):
+        self.last_review_id = 0
+        # user -> movie -> [rating sum, rating count]
+        self._ratings = defaultdict(dict)
+        self._gram = _GramMatrix()
+        # movie -> neighbour movie -> similarity
+        self._lists = defaultdict(dict)
+        self._touched = set()
+        self._dirty_users = set()
+
+    @classmethod
+    def from_session(cls, session, top_k=DEFAULT_TOP_K, neighbours=DEFAULT_NEIGHBOURS):
+        """
+        Builds the state from every review currently stored.
+
+        Parameters:
+            session (Session): The SQLAlchemy session to query with.
+            top_k (int): Number of recommendations kept per user.
+            neighbours (int): Number of most similar movies kept per movie.
+
+        Returns:
+            IncrementalRecommender: The state, ready to ``poll`` for new reviews.
+        """
+        recommender = cls(top_k, neighbours)
+        last_id = session.execute(select(func.max(Review.id))).scalar() or 0
+        recommender.load(RatingMatrix.load(session, max_review_id=last_id))
+        recommender.last_review_id = last_id
+        return recommender
+
+    def load(self, matrix):
+        """
+        Replaces the state with the ratings of a matrix.
+
+        Parameters:
+            matrix (RatingMatrix): The ratings to start from.
+        """
+        self._reset()
+        coo = matrix.ratings.tocoo()
+        for row, column, rating in zip(
+            matrix.user_ids[coo.row].tolist(),
+            matrix.movie_ids[coo.col].tolist(),
+            coo.data.tolist(),
+        ):
+            self._ratings[row][column] = [rating, 1]
+
+        # Recentre in double precision, as ``apply`` does, so that later
+        # updates cancel exactly against these contributions
+        ratings = matrix.ratings.astype(np.float64)
+        counts = np.diff(ratings.indptr)
+        means = np.asarray(ratings.sum(axis=1)).ravel() / np.maximum(counts, 1)
+        centred = ratings.copy()
+        centred.data -= np.repeat(means, counts)
+        centred.data[np.abs(centred.data) < MIN_DEVIATION] = 0
+        centred.eliminate_zeros()
+
+        gram = (centred.T @ centred).tocsr()
+        gram.data[np.abs(gram.data) <= EPSILON] = 0
+        gram.eliminate_zeros()
+        self._gram = _GramMatrix(matrix.movie_ids.tolist(), gram)
+
+        similarities = item_similarities(matrix, self.neighbours).tocoo()
+        for row, column, value in zip(
+            matrix.movie_ids[similarities.row].tolist(),
+            matrix.movie_ids[similarities.col].tolist(),
+            similarities.data.tolist(),
+        ):
+            self._lists[row][column] = value
+
+    def _centred(self, user):
+        ratings = self._ratings.get(user)
+        if not ratings:
+            return {}
+        averages = {movie: total / count for movie, (total, count) in ratings.items()}
+        mean = sum(averages.values()) / len(averages)
+        return {
+            movie: value - mean
+            for movie, value in averages.items()
+            if abs(value - mean) >= MIN_DEVIATION
+        }
+
+    def apply(self, user, movie, rating):
+        """
+        Records one rating of a movie by a user.
+
+        Ratings of several trailers of the same movie are averaged, as in the
+        batch recommender. Neighbour lists are not updated until ``refresh``.
+
+        Parameters:
+            user (int): The user id.
+            movie (int): The movie id.
+            rating (float): The rating.
+        """
+        old = self._centred(user)
+        entry = self._ratings[user].setdefault(movie, [0.0, 0])
+        entry[0] += rating
+        entry[1] += 1
+        new = self._centred(user)
+
+        self._gram.add_outer(old, -1.0)
+        self._gram.add_outer(new, 1.0)
+        self._touched.update(old, new)
+        self._dirty_users.add(user)
+
+    def _rebuild(self, position, movie_ids):
+        columns, similarities = self._gram.similarities(position)
+        keep = (similarities != 0.0) & (columns != position)
+        movies, similarities = movie_ids[columns[keep]], similarities[keep]
+        order = np.lexsort((movies, -similarities))[: self.neighbours]
+        self._lists[self._gram.movie_ids[position]] = dict(
+            zip(movies[order].tolist(), similarities[order].tolist())
+        )
+
+    def _patch(self, movie, neighbour, similarity):
+        """
+        Updates one entry of a neighbour list.
+
+        Returns:
+            bool: False if the list has to be rebuilt from scratch instead.
+        """
+        members = self._lists[movie]
+        full = len(members) >= self.neighbours
+        if neighbour in members:
+            del members[neighbour]
+            if similarity == 0.0:
+                return not full
+            # Movies outside a full list are at most its old minimum, which is
+            # at most the minimum of the remaining members
+            if full and similarity < min(members.values(), default=similarity):
+                return False
+            members[neighbour] = similarity
+            return True
+
+        if similarity == 0.0:
+            return True
+        if not full:
+            members[neighbour] = similarity
+            return True
+        weakest = min(members, key=lambda j: (members[j], -j))
+        if similarity > members[weakest]:
+            del members[weakest]
+            members[neighbour] = similarity
+        return True
+
+    def refresh(self):
+        """
+        Brings neighbour lists up to date with the ratings applied so far.
+
+        Returns:
+            set of int: The users whose ratings changed since the last refresh.
+        """
+        gram = self._gram
+        gram.fold()
+        # Every changed Gram entry is between two touched movies, whose lists
+        # are rebuilt; the other movies they co-occur with only need patching
+        touched = {gram.positions[movie] for movie in self._touched}
+        self._touched = set()
+        rebuild = set(touched)
+        for i in touched:
+            columns, similarities = gram.similarities(i)
+            for j, similarity in zip(columns.tolist(), similarities.tolist()):
+                if j in rebuild:
+                    continue
+                if not self._patch(gram.movie_ids[j], gram.movie_ids[i], similarity):
+                    rebuild.add(j)
+
+        movie_ids = np.array(gram.movie_ids, dtype=np.int64)
+        for i in rebuild:
+            self._rebuild(i, movie_ids)
+
+        users, self._dirty_users = self._dirty_users, set()
+        return users
+
+    def recommendations(self, user):
+        """
+        Scores the top-K unrated movies of a user from the current neighbour lists.
+
+        Parameters:
+            user (int): The user id.
+
+        Returns:
+            tuple: Arrays of movie ids and predicted ratings, best first.
+        """
+        centred = self._centred(user)
+        if not centred:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+        ratings = self._ratings[user]
+        mean = sum(total / count for total, count in ratings.values()) / len(ratings)
+
+        # Movies rated at the user's mean add weight but no deviation
+        candidates, weights, values = [], [], []
+        for movie in ratings:
+            members = self._lists.get(movie, {})
+            candidates.extend(members)
+            weights.extend(members.values())
+            values.extend([centred.get(movie, 0.0)] * len(members))
+        if not candidates:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+
+        movies, index = np.unique(np.array(candidates, dtype=np.int64), return_inverse=True)
+        weights = np.array(weights)
+        numerator = np.bincount(index, weights=weights * np.array(values))
+        denominator = np.bincount(index, weights=np.abs(weights))
+        keep = (numerator != 0) & ~np.isin(movies, list(ratings))
+        movies, scores = movies[keep], numerator[keep] / denominator[keep] + mean
+
+        order = np.lexsort((movies, -scores))[: self.top_k]
+        return movies[order], scores[order]
+
+    def _pending_reviews(self, session, limit):
+        return session.execute(
+            select(Review.id, Review.user_id, Trailer.movie_id, Review.rating)
+            .outerjoin(Trailer, Review.trailer_id == Trailer.id)
+            .where(Review.id > self.last_review_id)
+            .order_by(Review.id)
+            .limit(limit)
+        ).all()
+
+    def poll(self, session, limit=POLL_BATCH_SIZE):
+        """
+        Applies reviews written since the last poll and stores the new top-K
+        lists of their authors.
+
+        Parameters:
+            session (Session): The SQLAlchemy session to use.
+            limit (int): Maximum number of reviews applied per call.
+
+        Returns:
+            dict: Reviews applied and users whose recommendations were replaced.
+        """
+        reviews = self._pending_reviews(session, limit)
+        for review_id, user, movie, rating in reviews:
+            if user is not None and movie is not None and rating is not None:
+                self.apply(user, movie, rating)
+            self.last_review_id = review_id
+
+        users = sorted(self.refresh())
+        if users:
+            batches = (
+                (np.full(len(movies), user), movies, scores)
+                for user in users
+                for movies, scores in [self.recommendations(user)]
+            )
+            write_user_recommendations(session, users, batches)
+        return {"reviews": len(reviews), "users": len(users)}
+
+    def _arrays(self):
+        users, movies, ratings = [], [], []
+        for user, entries in self._ratings.items():
+            for movie, (total, count) in entries.items():
+                users.append(user)
+                movies.append(movie)
+                ratings.append(total / count)
+        return users, movies, ratings
+
+    def verify(self, users=None, tolerance=DEFAULT_TOLERANCE):
+        """
+        Compares the running state with a full recompute of the same ratings.
+
+        Every movie's neighbour list is compared entry by entry, and the
+        recommendation scores of the given users best first, so ties broken
+        differently do not count as differences.
+
+        Parameters:
+            users (iterable of int): Users whose top-K lists are compared;
+                defaults to every user.
+            tolerance (float): Largest accepted absolute difference.
+
+        Returns:
+            dict: The largest similarity and score differences found, the
+            number of movies and users compared, and whether both differences
+            are within the tolerance.
+        """
+        matrix = RatingMatrix.from_arrays(*self._arrays())
+        similarities = item_similarities(matrix, self.neighbours)
+
+        similarity_error = 0.0
+        for row, movie in enumerate(matrix.movie_ids.tolist()):
+            start, end = similarities.indptr[row], similarities.indptr[row + 1]
+            expected = dict(
+                zip(
+                    matrix.movie_ids[similarities.indices[start:end]].tolist(),
+                    similarities.data[start:end].tolist(),
+                )
+            )
+            similarity_error = max(
+                similarity_error,
+                _neighbour_difference(expected, self._lists.get(movie, {})),
+            )
+
+        checked = set(self._ratings if users is None else users)
+        expected_scores = defaultdict(list)
+        for batch_users, _, scores in recommend(matrix, similarities, self.top_k):
+            for user, score in zip(batch_users.tolist(), scores.tolist()):
+                if user in checked:
+                    expected_scores[user].append(score)
+
+        score_error = 0.0
+        for user in checked:
+            _, actual = self.recommendations(user)
+            score_error = max(
+                score_error, _score_difference(expected_scores.get(user, []), actual)
+            )
+
+        return {
+            "movies": len(matrix.movie_ids),
+            "users": len(checked),
+            "max_similarity_error": similarity_error,
+            "max_score_error": score_error,
+            "ok": similarity_error <= tolerance and score_error <= tolerance,
+        }
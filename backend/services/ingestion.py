@@ -0,0 +1,162 @@
+"""
+services/ingestion.py
+---------------------
+
+Concurrent trailer lookups for the ingest path.
+
+Looking up a trailer is dominated by the YouTube round trip, so the lookups for
+one ingest run are fanned out over a bounded pool of worker threads. Results are
+handed back as they finish, each one recording whether the lookup for that
+movie succeeded.
+
+Classes:
+    TrailerLookupResult: The outcome of the trailer lookup for a single movie.
+    IngestReport: Per-movie results and totals for one ingest run.
+
+Functions:
+    lookup_trailers(movies, lookup, max_workers): Resolve trailers concurrently.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_MAX_WORKERS = 8
+
+logger = logging.getLogger(__name__)
+
+
+class TrailerLookupResult:
+    """
+    The outcome of the trailer lookup for a single movie.
+
+    Attributes:
+        movie: The movie details the lookup was made for.
+        trailer_url: URL of the trailer found, or None.
+        error: Description of the failure, or None when the lookup succeeded.
+        elapsed: Wall-clock seconds spent on the lookup.
+        cached: True when the trailer came from the lookup cache.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, movie, trailer_url=None, error=None, elapsed=0.0, cached=False):
+        self.movie = movie
+        self.trailer_url = trailer_url
+        self.error = error
+        self.elapsed = elapsed
+        self.cached = cached
+
+    @property
+    def ok(self):
+        """bool: True when the lookup completed without an error."""
+        return self.error is None
+
+    def as_dict(self):
+        """
+        Returns a JSON-serialisable summary of the result.
+
+        Returns:
+            dict: The movie id and title, the lookup status and its timing.
+        """
+        return {
+            "id": self.movie.get("id"),
+            "title": self.movie.get("title"),
+            "status": "ok" if self.ok else "failed",
+            "trailer_url": self.trailer_url,
+            "error": self.error,
+            "elapsed": round(self.elapsed, 3),
+            "cached": self.cached,
+        }
+
+
+class IngestReport:
+    """
+    Collects the per-movie results of one ingest run.
+
+    Attributes:
+        results: The TrailerLookupResult objects in completion order.
+    """
+
+    def __init__(self):
+        self.results = []
+
+    def add(self, result):
+        """
+        Records the result of a single lookup.
+
+        Parameters:
+            result (TrailerLookupResult): The result to record.
+        """
+        self.results.append(result)
+
+    @property
+    def succeeded(self):
+        """int: Number of lookups that completed without an error."""
+        return sum(1 for result in self.results if result.ok)
+
+    @property
+    def failed(self):
+        """int: Number of lookups that failed."""
+        return len(self.results) - self.succeeded
+
+    def as_dict(self):
+        """
+        Returns a JSON-serialisable summary of the run.
+
+        Returns:
+            dict: Totals plus the summary of every individual lookup.
+        """
+        return {
+            "total": len(self.results),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "movies": [result.as_dict() for result in self.results],
+        }
+
+
+def _timed_lookup(lookup, movie):
+    """
+    Runs a single lookup, turning any exception into a failed result.
+
+    Parameters:
+        lookup (callable): Called with the movie dict, returns a trailer URL or None.
+        movie (dict): The movie details to look up.
+
+    Returns:
+        TrailerLookupResult: The outcome of the lookup.
+    """
+    start = time.perf_counter()
+    try:
+        trailer_url = lookup(movie)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.warning("Trailer lookup failed for %r: %s", movie.get("title"), e)
+        return TrailerLookupResult(
+            movie, error=str(e), elapsed=time.perf_counter() - start
+        )
+    return TrailerLookupResult(
+        movie, trailer_url=trailer_url, elapsed=time.perf_counter() - start
+    )
+
+
+def lookup_trailers(movies, lookup, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Resolves a trailer for every movie using a bounded pool of worker threads.
+
+    At most ``max_workers`` lookups are in flight at once, so the run takes
+    roughly ``len(movies) / max_workers`` round trips instead of one per movie.
+    Results are yielded in the order the lookups finish, not the input order.
+
+    Parameters:
+        movies (iterable of dict): Movie details, each with at least a "title" key.
+        lookup (callable): Called with a movie dict, returns the trailer URL or None.
+            It runs on a worker thread, so it must not rely on the Flask app context.
+        max_workers (int): Upper bound on the number of concurrent lookups.
+
+    Yields:
+        TrailerLookupResult: One result per movie, as soon as it is available.
+    """
+    with ThreadPoolExecutor(
+        max_workers=max(1, max_workers), thread_name_prefix="trailer-lookup"
+    ) as executor:
+        futures = [executor.submit(_timed_lookup, lookup, movie) for movie in movies]
+        for future in as_completed(futures):
+            yield future.result()
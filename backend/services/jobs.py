@@ -0,0 +1,477 @@
+"""
+services/jobs.py
+----------------
+
+A background job queue kept in the ``jobs`` table.
+
+Routes queue work with ``enqueue`` and return straight away; worker processes
+(``worker.py``) claim queued jobs with ``SELECT ... FOR UPDATE SKIP LOCKED``, so
+any number of workers can poll the same table without ever starting a job
+twice, and run them through the handler registered for their kind.
+
+A job that raises is retried after an exponential, jittered backoff until it
+runs out of attempts. Handlers raise ``JobFailed`` for errors that retrying
+cannot fix, and ``JobDeferred`` to be run again later without spending an
+attempt, e.g. when an API quota is spent until tomorrow. Due jobs start in
+priority order, then in the order they became due.
+
+While a job runs, a heartbeat thread renews its lease several times per lease
+period from its own connection, however long the handler goes without
+reporting progress. A job whose worker stopped renewing it for longer than the
+lease is considered abandoned and is claimed again. Every write a worker makes
+to a job row is conditional on the row still being locked by that worker, so a
+worker that lost its lease cannot overwrite the outcome of the new attempt.
+
+Jobs may carry a dedupe key. A unique index over the keys of queued and running
+jobs means that while one job with a key is active, queuing another returns the
+active one instead, so concurrent triggers of the same work collapse into one
+job.
+
+Classes:
+    JobFailed: Raised by handlers to fail a job without retrying it.
+    JobDeferred: Raised by handlers to run a job again later.
+    JobProgress: Progress counters of the running attempt of a job.
+    JobHeartbeat: Thread renewing the lease of a running job.
+    JobQueue: Handler registry, producer and worker loop.
+
+Functions:
+    job_as_dict(job): JSON-serialisable status of a job.
+
+Attributes:
+    job_queue (JobQueue): The instance the app registers its handlers with.
+"""
+import logging
+import random
+import threading
+import time
+from datetime import timedelta
+
+from sqlalchemy import func, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.database import ACTIVE_JOB_PREDICATE, Job
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF_SECONDS = 30
+DEFAULT_MAX_BACKOFF_SECONDS = 3600
+# A running job whose lease was not renewed for this long is claimed again
+DEFAULT_LEASE_SECONDS = 600
+# The heartbeat renews the lease this many times per lease period
+HEARTBEATS_PER_LEASE = 3
+DEFAULT_POLL_INTERVAL = 2.0
+# Progress is written at most this often, however often handlers report it
+PROGRESS_INTERVAL = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+class JobFailed(Exception):
+    """Raised by a handler to fail its job at once instead of retrying it."""
+
+
+class JobDeferred(Exception):
+    """
+    Raised by a handler to put its job back in the queue until a given time.
+
+    Attributes:
+        run_after: When the job may run again (timezone-aware).
+    """
+
+    def __init__(self, message, run_after):
+        super().__init__(message)
+        self.run_after = run_after
+
+
+class JobProgress:
+    """
+    Progress counters of the running attempt of a job.
+
+    Handlers add to the counters as they go; the counters are written to the
+    job row at most once per ``PROGRESS_INTERVAL`` seconds, and every write
+    renews the job's lease.
+
+    Attributes:
+        counters: The counters reported so far by this attempt.
+    """
+
+    def __init__(self, session, job_id, worker):
+        self._session = session
+        self._job_id = job_id
+        self._worker = worker
+        self._written_at = time.monotonic()
+        self.counters = {}
+
+    def add(self, **deltas):
+        """
+        Adds to counters, creating the ones that do not exist yet.
+
+        Parameters:
+            **deltas (int): Amount to add to each named counter.
+        """
+        for name, delta in deltas.items():
+            self.counters[name] = self.counters.get(name, 0) + delta
+        if time.monotonic() - self._written_at >= PROGRESS_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Writes the counters to the job row and renews its lease."""
+        self._session.execute(
+            update(Job)
+            .where(Job.id == self._job_id, Job.locked_by == self._worker)
+            .values(progress=dict(self.counters), heartbeat_at=func.now())
+        )
+        self._session.commit()
+        self._written_at = time.monotonic()
+
+
+class JobHeartbeat(threading.Thread):
+    """
+    Thread renewing the lease of a running job until it is stopped.
+
+    It writes through its own connection, so the lease is renewed while the
+    handler is busy in a long statement or transaction of the worker's session.
+    It gives up once the job is no longer locked by its worker.
+
+    Attributes:
+        job_id: Id of the job.
+        worker: Name of the worker running the job.
+        interval: Seconds between renewals.
+    """
+
+    def __init__(self, engine, job_id, worker, interval):
+        super().__init__(name=f"job-{job_id}-heartbeat", daemon=True)
+        self._engine = engine
+        self._stopped = threading.Event()
+        self.job_id = job_id
+        self.worker = worker
+        self.interval = interval
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                with self._engine.begin() as connection:
+                    renewed = connection.execute(
+                        update(Job)
+                        .where(Job.id == self.job_id, Job.locked_by == self.worker)
+                        .values(heartbeat_at=func.now())
+                    ).rowcount
+            except SQLAlchemyError as e:
+                logger.warning(
+                    "Could not renew the lease of job %s: %s", self.job_id, e
+                )
+                continue
+            if not renewed:
+                logger.warning(
+                    "Job %s is no longer locked by %s", self.job_id, self.worker
+                )
+                return
+
+    def stop(self):
+        """Stops renewing the lease and waits for the thread to end."""
+        self._stopped.set()
+        self.join()
+
+
+def job_as_dict(job):
+    """
+    Returns the JSON-serialisable status of a job.
+
+    Parameters:
+        job (Job): The job.
+
+    Returns:
+        dict: Status, attempts, progress and outcome of the job.
+    """
+
+    def timestamp(value):
+        return value.isoformat() if value is not None else None
+
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "priority": job.priority,
+        "progress": job.progress or {},
+        "result": job.result,
+        "error": job.error,
+        "created_at": timestamp(job.created_at),
+        "started_at": timestamp(job.started_at),
+        "finished_at": timestamp(job.finished_at),
+        "retry_at": timestamp(job.run_after) if job.status == QUEUED else None,
+    }
+
+
+class JobQueue:
+    """
+    Registry of job handlers, plus the producer and worker sides of the queue.
+
+    Attributes:
+        handlers: Handler callable per job kind.
+        max_attempts: Default number of attempts per job.
+        backoff: Seconds before the first retry; doubled for each later one.
+        max_backoff: Upper bound of the retry delay in seconds.
+        lease: Seconds without a lease renewal after which a running job is
+            abandoned.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.max_attempts = DEFAULT_MAX_ATTEMPTS
+        self.backoff = DEFAULT_BACKOFF_SECONDS
+        self.max_backoff = DEFAULT_MAX_BACKOFF_SECONDS
+        self.lease = DEFAULT_LEASE_SECONDS
+
+    def init_app(self, app):
+        """
+        Configures the queue from the app config.
+
+        Parameters:
+            app (Flask): The application.
+        """
+        self.max_attempts = app.config.get("JOB_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+        self.backoff = app.config.get("JOB_BACKOFF_SECONDS", DEFAULT_BACKOFF_SECONDS)
+        self.max_backoff = app.config.get(
+            "JOB_MAX_BACKOFF_SECONDS", DEFAULT_MAX_BACKOFF_SECONDS
+        )
+        self.lease = app.config.get("JOB_LEASE_SECONDS", DEFAULT_LEASE_SECONDS)
+        app.extensions["job_queue"] = self
+
+    def handler(self, kind):
+        """
+        Decorator registering the handler of a kind of job.
+
+        The handler is called with the job's payload and its ``JobProgress``,
+        inside the worker's app context, and returns a JSON-serialisable result.
+
+        Parameters:
+            kind (str): The job kind.
+
+        Returns:
+            callable: The decorator.
+        """
+
+        def decorator(function):
+            self.handlers[kind] = function
+            return function
+
+        return decorator
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def enqueue(
+        self,
+        session,
+        kind,
+        payload=None,
+        dedupe_key=None,
+        max_attempts=None,
+        priority=0,
+    ):
+        """
+        Queues a job, unless an active job already has the same dedupe key.
+
+        Parameters:
+            session (Session): The SQLAlchemy session to write with.
+            kind (str): The job kind; must have a registered handler.
+            payload (dict): JSON arguments of the handler.
+            dedupe_key (str): Key collapsing concurrent jobs for the same work.
+            max_attempts (int): Attempts before the job fails, if not the default.
+            priority (int): Due jobs with lower values are started first.
+
+        Returns:
+            tuple: The id of the queued or already active job, and True when a
+            new job was queued.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"No handler is registered for jobs of kind {kind!r}.")
+
+        statement = insert(Job).values(
+            kind=kind,
+            payload=payload or {},
+            dedupe_key=dedupe_key,
+            status=QUEUED,
+            attempts=0,
+            max_attempts=max_attempts or self.max_attempts,
+            priority=priority,
+            progress={},
+        )
+        if dedupe_key is not None:
+            statement = statement.on_conflict_do_nothing(
+                index_elements=[Job.dedupe_key],
+                index_where=text(ACTIVE_JOB_PREDICATE),
+            )
+        while True:
+            job_id = session.execute(statement.returning(Job.id)).scalar()
+            if job_id is not None:
+                session.commit()
+                return job_id, True
+
+            job_id = session.execute(
+                select(Job.id).where(
+                    Job.dedupe_key == dedupe_key, Job.status.in_(ACTIVE_STATUSES)
+                )
+            ).scalar()
+            session.commit()
+            # Otherwise the conflicting job finished in between; queue again
+            if job_id is not None:
+                return job_id, False
+
+    def claim(self, session, worker):
+        """
+        Claims the next job that is due, or one whose worker was lost.
+
+        Parameters:
+            session (Session): The SQLAlchemy session to write with.
+            worker (str): Name of the claiming worker.
+
+        Returns:
+            Job: The claimed job, now running, or None if no job is due.
+        """
+        job = session.execute(
+            select(Job)
+            .where(
+                Job.kind.in_(list(self.handlers)),
+                or_(
+                    (Job.status == QUEUED) & (Job.run_after <= func.now()),
+                    (Job.status == RUNNING)
+                    & (Job.heartbeat_at < func.now() - timedelta(seconds=self.lease)),
+                ),
+            )
+            .order_by(Job.priority, Job.run_after, Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar_one_or_none()
+        if job is None:
+            session.commit()
+            return None
+
+        if job.status == RUNNING:
+            logger.warning("Job %s was abandoned by %s", job.id, job.locked_by)
+        job.status = RUNNING
+        job.attempts += 1
+        job.locked_by = worker
+        job.started_at = func.now()
+        job.heartbeat_at = func.now()
+        job.progress = {}
+        session.commit()
+        return job
+
+    def _retry_delay(self, attempts):
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _finish(self, session, job_id, worker, **values):
+        """Writes the outcome of an attempt; False if another worker took the job."""
+        finished = session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.locked_by == worker)
+            .values(locked_by=None, **values)
+        ).rowcount
+        session.commit()
+        if not finished:
+            logger.warning(
+                "Job %s was claimed again while %s ran it; its outcome is dropped",
+                job_id,
+                worker,
+            )
+        return bool(finished)
+
+    def _attempt(self, session, job, progress):
+        """Runs the handler of a job; returns its status and the values to store."""
+        attempts, max_attempts = job.attempts, job.max_attempts
+        try:
+            if attempts > max_attempts:
+                raise JobFailed("The worker running the last attempt was lost.")
+            result = self.handlers[job.kind](dict(job.payload), progress)
+        except JobDeferred as e:
+            session.rollback()
+            logger.info("Job %s deferred until %s: %s", job.id, e.run_after, e)
+            # A deferral is not a failure, so the attempt is handed back
+            return QUEUED, {
+                "attempts": Job.attempts - 1,
+                "run_after": e.run_after,
+                "error": str(e),
+            }
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            session.rollback()
+            logger.warning(
+                "Job %s failed on attempt %s/%s: %s", job.id, attempts, max_attempts, e
+            )
+            error = str(e) or type(e).__name__
+            if isinstance(e, JobFailed) or attempts >= max_attempts:
+                return FAILED, {"error": error, "finished_at": func.now()}
+            delay = timedelta(seconds=self._retry_delay(attempts))
+            return QUEUED, {"error": error, "run_after": func.now() + delay}
+        return SUCCEEDED, {"result": result, "error": None, "finished_at": func.now()}
+
+    def run(self, session, job):
+        """
+        Runs a claimed job and records its outcome.
+
+        A heartbeat thread renews the job's lease while the handler runs. If the
+        lease was lost anyway and another worker claimed the job, the outcome of
+        this attempt is dropped.
+
+        Parameters:
+            session (Session): The SQLAlchemy session handlers write with.
+            job (Job): A job returned by ``claim``.
+
+        Returns:
+            str: The status the job was left in; RUNNING when another worker
+            took it over.
+        """
+        job_id, worker = job.id, job.locked_by
+        progress = JobProgress(session, job_id, worker)
+        heartbeat = JobHeartbeat(
+            session.get_bind(), job_id, worker, self.lease / HEARTBEATS_PER_LEASE
+        )
+        heartbeat.start()
+        try:
+            status, values = self._attempt(session, job, progress)
+        finally:
+            heartbeat.stop()
+
+        if not self._finish(
+            session, job_id, worker, status=status, progress=progress.counters, **values
+        ):
+            return RUNNING
+        return status
+
+    def work(self, session, worker, poll_interval=DEFAULT_POLL_INTERVAL, stop=None):
+        """
+        Claims and runs jobs until told to stop.
+
+        Parameters:
+            session (Session): The SQLAlchemy session to use.
+            worker (str): Name of this worker.
+            poll_interval (float): Seconds to sleep when no job is due.
+            stop (callable): Returns True once the loop should end; checked
+                between jobs. When None, the loop ends as soon as no job is due.
+
+        Returns:
+            int: Number of jobs run.
+        """
+        ran = 0
+        while stop is None or not stop():
+            job = self.claim(session, worker)
+            if job is None:
+                if stop is None:
+                    break
+                time.sleep(poll_interval)
+                continue
+            logger.info("Running job %s (%s)", job.id, job.kind)
+            status = self.run(session, job)
+            logger.info("Job %s %s", job.id, status)
+            ran += 1
+        return ran
+
+
+job_queue = JobQueue()
@@ -0,0 +1,73 @@
+"""
+services/loading_profiles.py
+----------------------------
+
+Named eager-loading profiles for the model relationships.
+
+Every relationship of the models is lazy, so serializing e.g. the trailers of
+50 movies issues one query per movie. A profile names the loader options that
+fetch what a view needs up front, so endpoints share one tested choice instead
+of each assembling its own:
+
+* collections use ``selectinload``: one extra ``IN`` query per relationship,
+  however many parents, and no duplicated parent rows;
+* many-to-one references use ``joinedload``, riding along in the parent's
+  query.
+
+With ``strict=True`` every relationship the profile does not name raises on
+access instead of lazy loading, which turns a missing eager load into an error
+in tests rather than a silent N+1 in production.
+
+Functions:
+    loading_profile(name, strict): The loader options of a profile.
+"""
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+
+from models.database import (
+    Movie,
+    PlatformTrailer,
+    Recommendation,
+    Review,
+    Trailer,
+    Watchlist,
+)
+
+PROFILES = {
+    # A movie with its trailers and the platforms streaming each trailer
+    "movie_detail": (
+        selectinload(Movie.trailers)
+        .selectinload(Trailer.platform_trailers)
+        .joinedload(PlatformTrailer.platform),
+    ),
+    "movie_trailers": (selectinload(Movie.trailers),),
+    "trailer_platforms": (
+        selectinload(Trailer.platform_trailers).joinedload(PlatformTrailer.platform),
+    ),
+    "review_detail": (
+        joinedload(Review.user),
+        joinedload(Review.trailer).joinedload(Trailer.movie),
+    ),
+    "watchlist_movies": (joinedload(Watchlist.movie),),
+    "recommendation_movies": (joinedload(Recommendation.movie),),
+}
+
+
+def loading_profile(name, strict=False):
+    """
+    Returns the loader options of a profile, for ``select(...).options(...)``.
+
+    Parameters:
+        name (str): Name of the profile, a key of ``PROFILES``.
+        strict (bool): Make every relationship the profile does not load raise
+            when accessed.
+
+    Returns:
+        tuple: The loader options.
+
+    Raises:
+        KeyError: If there is no profile of that name.
+    """
+    options = PROFILES[name]
+    if strict:
+        options += (raiseload("*"),)
+    return options
@@ -0,0 +1,269 @@
+"""
+services/metrics.py
+-------------------
+
+Prometheus metrics for requests, SQL statements and provider calls.
+
+Three things are measured:
+
+* Every request: its latency per endpoint, method and status, plus how many SQL
+  statements it ran and how long they took. Whatever a slow endpoint spends
+  outside SQL went to ORM hydration and serialization.
+* Every SQL statement, as timed by ``services.statement_timing``: its latency
+  per kind (SELECT, INSERT, ...), whether or not it ran within a request.
+* Every call to an external provider (TMDB, YouTube), as reported by
+  ``services.resilience``: its latency per outcome, and the hedges sent.
+
+``/metrics`` renders them in the Prometheus text format.
+
+Gunicorn workers are separate processes, and a scrape reaches only one of them.
+When ``METRICS_MULTIPROC_DIR`` is set, every process writes its samples to files
+in that directory and ``/metrics`` sums the files of all of them, so any worker
+answers for the whole server. ``prometheus_client`` picks its storage when it is
+imported, so it is only imported once ``init_app`` has set that up.
+
+Classes:
+    Metrics: Flask extension recording and rendering the metrics.
+
+Functions:
+    prepare_multiprocess_dir(directory): Empty the directory samples go to.
+    serve_multiprocess(port, directory): Serve the summed metrics over HTTP.
+
+Attributes:
+    metrics (Metrics): The metrics the app records.
+"""
+import os
+import shutil
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+from services.statement_timing import observe_statements
+
+MULTIPROC_ENV = "PROMETHEUS_MULTIPROC_DIR"
+NAMESPACE = "scarescreen"
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+# Requests the router matched to no endpoint share one label
+UNMATCHED_ENDPOINT = "unmatched"
+
+
+def prepare_multiprocess_dir(directory):
+    """
+    Empties the directory the processes write their samples to.
+
+    Call it once before any process starts recording, so samples of an
+    earlier run are not summed with the new ones.
+
+    Parameters:
+        directory (str): The multiprocess directory.
+    """
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def serve_multiprocess(port, directory):
+    """
+    Serves the metrics summed over every process writing to ``directory``.
+
+    For processes that serve no web requests, such as the job workers.
+
+    Parameters:
+        port (int): Port to listen on.
+        directory (str): The multiprocess directory.
+    """
+    os.environ[MULTIPROC_ENV] = directory
+    # pylint: disable=import-outside-toplevel
+    from prometheus_client import CollectorRegistry, multiprocess, start_http_server
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=directory)
+    start_http_server(port, registry=registry)
+
+
+def _statement_kind(statement):
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else "OTHER"
+
+
+class Metrics:
+    """
+    Flask extension recording request, SQL and provider-call metrics.
+
+    Attributes:
+        enabled: Whether anything is recorded.
+        multiprocess_dir: Directory the samples of every process are summed
+            from, or None for this process's samples only.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.multiprocess_dir = None
+        self._instruments = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Creates the metrics and installs the request and SQL hooks.
+
+        Parameters:
+            app (Flask): The application.
+        """
+        self.enabled = app.config.get("METRICS_ENABLED", True)
+        self.multiprocess_dir = app.config.get("METRICS_MULTIPROC_DIR")
+        app.extensions["metrics"] = self
+        if not self.enabled:
+            return
+
+        if self.multiprocess_dir:
+            os.makedirs(self.multiprocess_dir, exist_ok=True)
+            os.environ[MULTIPROC_ENV] = self.multiprocess_dir
+        self._create_instruments()
+        observe_statements(self.observe_query)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def _create_instruments(self):
+        # Metrics register themselves once per process, however many apps exist
+        with self._lock:
+            if self._instruments is not None:
+                return
+            # pylint: disable=import-outside-toplevel
+            from prometheus_client import Counter, Histogram
+
+            self._instruments = {
+                "request_seconds": Histogram(
+                    "request_duration_seconds",
+                    "Time taken to serve a request.",
+                    ("endpoint", "method", "status"),
+                    namespace=NAMESPACE,
+                    buckets=LATENCY_BUCKETS,
+                ),
+                "request_queries": Histogram(
+                    "request_sql_queries",
+                    "SQL statements run while serving a request.",
+                    ("endpoint",),
+                    namespace=NAMESPACE,
+                    buckets=QUERY_COUNT_BUCKETS,
+                ),
+                "request_sql_seconds": Histogram(
+                    "request_sql_duration_seconds",
+                    "Time spent in SQL statements while serving a request.",
+                    ("endpoint",),
+                    namespace=NAMESPACE,
+                    buckets=LATENCY_BUCKETS,
+                ),
+                "query_seconds": Histogram(
+                    "sql_query_duration_seconds",
+                    "Time taken by one SQL statement.",
+                    ("statement",),
+                    namespace=NAMESPACE,
+                    buckets=LATENCY_BUCKETS,
+                ),
+                "provider_seconds": Histogram(
+                    "provider_call_duration_seconds",
+                    "Time taken by one call to an external provider.",
+                    ("provider", "outcome"),
+                    namespace=NAMESPACE,
+                    buckets=LATENCY_BUCKETS,
+                ),
+                "provider_hedges": Counter(
+                    "provider_hedged_calls",
+                    "Provider calls that sent a duplicate request.",
+                    ("provider",),
+                    namespace=NAMESPACE,
+                ),
+            }
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_sql_seconds = 0.0
+
+    def _finish_request(self, response):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return response
+        endpoint = request.endpoint or UNMATCHED_ENDPOINT
+        instruments = self._instruments
+        instruments["request_seconds"].labels(
+            endpoint, request.method, str(response.status_code)
+        ).observe(time.perf_counter() - started)
+        instruments["request_queries"].labels(endpoint).observe(g.metrics_queries)
+        instruments["request_sql_seconds"].labels(endpoint).observe(
+            g.metrics_sql_seconds
+        )
+        return response
+
+    def observe_query(self, statement, seconds):
+        """
+        Records one SQL statement, and charges it to the current request.
+
+        Parameters:
+            statement (str): The SQL text.
+            seconds (float): Time it took.
+        """
+        if self._instruments is None:
+            return
+        self._instruments["query_seconds"].labels(_statement_kind(statement)).observe(
+            seconds
+        )
+        if has_request_context() and "metrics_started" in g:
+            g.metrics_queries += 1
+            g.metrics_sql_seconds += seconds
+
+    def observe_call(self, result):
+        """
+        Records one provider call.
+
+        Parameters:
+            result (CallResult): The outcome of the call.
+        """
+        if self._instruments is None:
+            return
+        self._instruments["provider_seconds"].labels(
+            result.provider, result.status
+        ).observe(result.elapsed)
+        if result.hedged:
+            self._instruments["provider_hedges"].labels(result.provider).inc()
+
+    def render(self):
+        """
+        Renders the metrics in the Prometheus text format.
+
+        Returns:
+            tuple: The body as bytes and its content type.
+        """
+        # pylint: disable=import-outside-toplevel
+        from prometheus_client import (
+            CONTENT_TYPE_LATEST,
+            REGISTRY,
+            CollectorRegistry,
+            generate_latest,
+            multiprocess,
+        )
+
+        registry = REGISTRY
+        if self.multiprocess_dir:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry, path=self.multiprocess_dir)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+metrics = Metrics()
@@ -0,0 +1,164 @@
+"""
+services/movie_details.py
+-------------------------
+
+Movie detail documents: a movie with its trailers, the platforms streaming
+them, its review statistics and its most recent reviews.
+
+However many movies are asked for, and however many trailers and reviews they
+have, a lookup runs at most four statements:
+
+1. the movies;
+2. their trailers (``selectinload``);
+3. the platform links of those trailers, joined to the platforms, skipped
+   when none of the movies has a trailer;
+4. the first page of reviews of every movie, ranked per movie with
+   ``row_number()`` so one statement serves them all.
+
+The review statistics are the rating aggregates the triggers keep on the movie
+row (see ``services.rating_aggregates``), so they cost nothing extra. The
+relationships are loaded with the "movie_detail" profile in strict mode: a
+serializer touching anything else raises instead of issuing a query per row.
+
+Functions:
+    parse_ids(value): Read a comma-separated id list.
+    movie_details(session, movie_ids, review_limit): Build detail documents.
+"""
+from sqlalchemy import func, select
+
+from models.database import Movie, Review, Trailer, User
+from services.catalog import DEFAULT_FIELDS, CatalogQueryError
+from services.loading_profiles import loading_profile
+
+DEFAULT_REVIEW_LIMIT = 10
+MAX_REVIEW_LIMIT = 50
+MAX_BATCH_IDS = 100
+
+
+def parse_ids(value):
+    """
+    Reads the comma-separated movie ids of a batch request.
+
+    Parameters:
+        value (str): The ``ids`` query parameter, e.g. "1,2,3".
+
+    Returns:
+        list of int: The ids, without duplicates, in request order.
+
+    Raises:
+        CatalogQueryError: If the list is empty, too long or not all integers.
+    """
+    try:
+        ids = [int(part) for part in (value or "").split(",") if part.strip()]
+    except ValueError as e:
+        raise CatalogQueryError("'ids' must be comma-separated integers.") from e
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise CatalogQueryError("'ids' must list at least one movie id.")
+    if len(ids) > MAX_BATCH_IDS:
+        raise CatalogQueryError(f"'ids' may list at most {MAX_BATCH_IDS} movies.")
+    return ids
+
+
+def _recent_reviews(session, movie_ids, limit):
+    # One more than a page, to tell whether there are more
+    rank = (
+        func.row_number()
+        .over(partition_by=Trailer.movie_id, order_by=Review.id.desc())
+        .label("rank")
+    )
+    ranked = (
+        select(
+            Trailer.movie_id,
+            Review.id,
+            Review.trailer_id,
+            Review.rating,
+            Review.review_text,
+            User.username,
+            rank,
+        )
+        .join(Trailer, Trailer.id == Review.trailer_id)
+        .outerjoin(User, User.id == Review.user_id)
+        .where(Trailer.movie_id.in_(movie_ids))
+        .subquery()
+    )
+    rows = session.execute(
+        select(ranked)
+        .where(ranked.c.rank <= limit + 1)
+        .order_by(ranked.c.movie_id, ranked.c.rank)
+    ).mappings()
+
+    reviews = {}
+    for row in rows:
+        reviews.setdefault(row["movie_id"], []).append(
+            {
+                "id": row["id"],
+                "trailer_id": row["trailer_id"],
+                "rating": row["rating"],
+                "review_text": row["review_text"],
+                "username": row["username"],
+            }
+        )
+    return reviews
+
+
+def _trailer_as_dict(trailer):
+    return {
+        "id": trailer.id,
+        "url": trailer.url,
+        "duration": trailer.duration,
+        "release_date": trailer.release_date,
+        "description": trailer.description,
+        "platforms": [
+            {
+                "id": link.platform.id,
+                "name": link.platform.name,
+                "url": link.platform.url,
+            }
+            for link in sorted(trailer.platform_trailers, key=lambda link: link.id)
+        ],
+    }
+
+
+def movie_details(session, movie_ids, review_limit=DEFAULT_REVIEW_LIMIT):
+    """
+    Builds the detail documents of movies, in a fixed number of statements.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to query with.
+        movie_ids (list of int): Ids of the movies.
+        review_limit (int): Reviews included per movie, most recent first.
+
+    Returns:
+        dict: Detail document per id found. Each has the listing fields of the
+        movie, its ``trailers`` with their ``platforms``, ``review_stats``
+        (average, count and histogram), ``reviews`` and ``more_reviews``.
+    """
+    movies = session.scalars(
+        select(Movie)
+        .where(Movie.id.in_(movie_ids))
+        .options(*loading_profile("movie_detail", strict=True))
+    ).all()
+    if not movies:
+        return {}
+    reviews = _recent_reviews(session, [movie.id for movie in movies], review_limit)
+
+    details = {}
+    for movie in movies:
+        recent = reviews.get(movie.id, [])
+        details[movie.id] = {
+            **{name: getattr(movie, name) for name in DEFAULT_FIELDS},
+            "poster_url": movie.poster_url,
+            "review_stats": {
+                "average": movie.rating,
+                "count": movie.rating_count,
+                "histogram": movie.rating_histogram,
+            },
+            "trailers": [
+                _trailer_as_dict(trailer)
+                for trailer in sorted(movie.trailers, key=lambda trailer: trailer.id)
+            ],
+            "reviews": recent[:review_limit],
+            "more_reviews": len(recent) > review_limit,
+        }
+    return details
@@ -0,0 +1,204 @@
+"""
+services/notifications.py
+-------------------------
+
+Set-based fan-out of "now streaming" notifications to watchlists.
+
+When trailers become available on streaming platforms, every user with one of
+the affected movies on their watchlist gets a notification. Instead of looping
+over users and movies, a batch of availability changes is resolved to distinct
+(movie, platform) pairs with one query, and the matching watchlist entries are
+turned into notifications by ``INSERT ... SELECT`` statements, each covering
+a chunk of watchlist rows in id order. A single change reaching 100k
+watchlists therefore costs a handful of statements.
+
+Every notification carries a dedupe key naming the movie and platform, and
+``(user_id, dedupe_key)`` is unique, so a movie arriving on a platform through
+a second trailer, or a batch that is processed twice, notifies nobody twice.
+
+``add_platform_availability`` records new availability and its notifications in
+one transaction. Only newly recorded pairs fan out, so committing the links
+first would lose the notifications of a failed fan-out for good: the retry
+would find every pair already recorded.
+
+Functions:
+    add_platform_availability(session, pairs, ...): Record trailers on
+        platforms and notify the users watching their movies.
+    notify_watchers(session, pairs, ...): Notify the users watching the movies of
+        (trailer, platform) pairs.
+"""
+from sqlalchemy import Integer, String, column, func, literal, select, values
+from sqlalchemy.dialects.postgresql import insert
+
+from models.database import (
+    Movie,
+    Notification,
+    PlatformTrailer,
+    StreamingPlatform,
+    Trailer,
+    Watchlist,
+)
+
+NOTIFICATION_TYPE = "watchlist_available"
+DEFAULT_CHUNK_SIZE = 10000
+MESSAGE_LENGTH = Notification.__table__.c.message.type.length
+
+
+def _dedupe_key(movie_id, platform_id):
+    return f"{NOTIFICATION_TYPE}:{movie_id}:{platform_id}"
+
+
+def _resolve_changes(session, pairs):
+    """
+    Maps (trailer id, platform id) pairs to distinct (movie, platform) changes.
+
+    Returns:
+        list of tuple: (movie id, platform id, message, dedupe key) per change.
+    """
+    trailers = {
+        trailer_id: (movie_id, title)
+        for trailer_id, movie_id, title in session.execute(
+            select(Trailer.id, Trailer.movie_id, Movie.title)
+            .join(Movie, Movie.id == Trailer.movie_id)
+            .where(Trailer.id.in_({trailer_id for trailer_id, _ in pairs}))
+        )
+    }
+    platforms = dict(
+        session.execute(
+            select(StreamingPlatform.id, StreamingPlatform.name).where(
+                StreamingPlatform.id.in_({platform_id for _, platform_id in pairs})
+            )
+        ).all()
+    )
+
+    changes = {}
+    for trailer_id, platform_id in pairs:
+        if trailer_id not in trailers or platform_id not in platforms:
+            continue
+        movie_id, title = trailers[trailer_id]
+        message = f"{title} is now available on {platforms[platform_id]}."
+        changes[(movie_id, platform_id)] = (
+            movie_id,
+            platform_id,
+            message[:MESSAGE_LENGTH],
+            _dedupe_key(movie_id, platform_id),
+        )
+    return list(changes.values())
+
+
+def notify_watchers(session, pairs, chunk_size=DEFAULT_CHUNK_SIZE, commit=True):
+    """
+    Notifies every user whose watchlist holds the movie of a (trailer, platform) pair.
+
+    Each chunk of watchlist rows is inserted and committed on its own, so a
+    large fan-out never holds one huge transaction.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to write with.
+        pairs (iterable of tuple): (trailer id, platform id) pairs that just
+            became available.
+        chunk_size (int): Maximum number of watchlist rows per statement.
+        commit (bool): Commit after each chunk; pass False to insert every
+            chunk inside the caller's transaction.
+
+    Returns:
+        dict: Number of (movie, platform) changes, watchlist rows matched and
+        notifications created.
+    """
+    changes = _resolve_changes(session, list(pairs))
+    totals = {"changes": len(changes), "watchlist_rows": 0, "notifications": 0}
+    if not changes:
+        return totals
+
+    movie_ids = sorted({movie_id for movie_id, _, _, _ in changes})
+    change_rows = values(
+        column("movie_id", Integer),
+        column("message", String),
+        column("dedupe_key", String),
+        name="changes",
+    ).data([(movie_id, message, key) for movie_id, _, message, key in changes])
+
+    after = 0
+    while True:
+        chunk = (
+            select(Watchlist.id)
+            .where(Watchlist.movie_id.in_(movie_ids), Watchlist.id > after)
+            .order_by(Watchlist.id)
+            .limit(chunk_size)
+            .subquery()
+        )
+        last, matched = session.execute(
+            select(func.max(chunk.c.id), func.count()).select_from(chunk)
+        ).one()
+        if not matched:
+            break
+
+        notifications = (
+            select(
+                Watchlist.user_id,
+                literal(NOTIFICATION_TYPE),
+                change_rows.c.message,
+                change_rows.c.dedupe_key,
+            )
+            .join(change_rows, change_rows.c.movie_id == Watchlist.movie_id)
+            .where(
+                Watchlist.movie_id.in_(movie_ids),
+                Watchlist.id > after,
+                Watchlist.id <= last,
+                Watchlist.user_id.isnot(None),
+            )
+        )
+        inserted = session.execute(
+            insert(Notification)
+            .from_select(["user_id", "type", "message", "dedupe_key"], notifications)
+            .on_conflict_do_nothing(
+                index_elements=[Notification.user_id, Notification.dedupe_key]
+            )
+            .returning(Notification.id)
+        ).all()
+        if commit:
+            session.commit()
+
+        totals["watchlist_rows"] += matched
+        totals["notifications"] += len(inserted)
+        after = last
+
+    return totals
+
+
+def add_platform_availability(session, pairs, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Records trailers as available on platforms and notifies the watchers.
+
+    Pairs that were already recorded are skipped, so only new availability
+    fans out. The links and the notifications are committed together, so if
+    anything fails the caller rolls both back and can retry the same call.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to write with.
+        pairs (iterable of tuple): (trailer id, platform id) pairs.
+        chunk_size (int): Maximum number of watchlist rows per statement.
+
+    Returns:
+        dict: Number of pairs recorded, plus the totals of ``notify_watchers``.
+    """
+    rows = [
+        {"trailer_id": trailer_id, "platform_id": platform_id}
+        for trailer_id, platform_id in dict.fromkeys(pairs)
+    ]
+    if not rows:
+        return {"recorded": 0, **notify_watchers(session, [], chunk_size)}
+
+    recorded = session.execute(
+        insert(PlatformTrailer)
+        .values(rows)
+        .on_conflict_do_nothing(
+            index_elements=[PlatformTrailer.trailer_id, PlatformTrailer.platform_id]
+        )
+        .returning(PlatformTrailer.trailer_id, PlatformTrailer.platform_id)
+    ).all()
+    totals = notify_watchers(
+        session, [tuple(row) for row in recorded], chunk_size, commit=False
+    )
+    session.commit()
+    return {"recorded": len(recorded), **totals}
@@ -0,0 +1,309 @@
+"""
+services/query_profiler.py
+--------------------------
+
+A development and test profiler for the SQL queries each request issues.
+
+While enabled, every statement a request runs is recorded together with its
+shape: the SQL text with literals, bind parameters and ``IN`` lists folded, so
+the same query for different ids looks the same. A shape repeated many times
+within one request is the signature of an N+1 pattern, a lazy relationship
+loaded row by row; it is logged with its count so it can be replaced by an
+eager-loading profile (see ``services.loading_profiles``).
+
+Routes can declare a query budget with ``query_profiler.budget(n)``, and
+``QUERY_BUDGET`` sets one for every other route. A request over budget is
+logged, or raises ``QueryBudgetExceeded`` in strict mode, the default when the
+app is testing, so a test client request fails the test. Responses carry an
+``X-Query-Count`` header and a ``Server-Timing`` entry with the SQL time.
+
+Outside requests, ``profile_queries`` records the statements of a block, and
+``query_budget(n)`` fails a block that issues more than n of them.
+
+The profiler costs a regex per statement and is off unless
+``QUERY_PROFILER_ENABLED`` is set; keep it off in production.
+
+Classes:
+    QueryBudgetExceeded: Raised for a request or block over its query budget.
+    QueryProfile: The statements recorded for one request or block.
+    QueryProfiler: Flask extension profiling every request.
+
+Functions:
+    statement_shape(statement): Fold a statement to its shape.
+    profile_queries(): Record the statements run within a block.
+    query_budget(limit): Fail a block that runs more than ``limit`` statements.
+
+Attributes:
+    query_profiler (QueryProfiler): The profiler the app registers routes with.
+"""
+import collections
+import contextlib
+import logging
+import re
+import threading
+
+from flask import g, request
+
+from services.statement_timing import observe_statements
+
+DEFAULT_REPEAT_THRESHOLD = 5
+# Characters kept from each end of a statement shape in messages
+SHAPE_PREVIEW = 120
+
+_COMMENTS = re.compile(r"/\*.*?\*/|--[^\n]*", re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_PARAMETERS = re.compile(r"%\(\w+\)s|%s|:\w+|\$\d+|\?|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+logger = logging.getLogger(__name__)
+_local = threading.local()
+
+
+def statement_shape(statement):
+    """
+    Folds a statement to its shape, so that repeats of one query compare equal.
+
+    Parameters:
+        statement (str): The SQL text.
+
+    Returns:
+        str: The text with comments dropped, literals and bind parameters
+        replaced by ``?``, lists of them by ``(?...)``, and whitespace collapsed.
+    """
+    shape = _COMMENTS.sub(" ", statement)
+    shape = _STRINGS.sub("?", shape)
+    shape = _PARAMETERS.sub("?", shape)
+    shape = _LISTS.sub("(?...)", shape)
+    return _SPACES.sub(" ", shape).strip()
+
+
+def _preview(shape):
+    # The WHERE clause at the end tells the repeated queries apart
+    if len(shape) <= 2 * SHAPE_PREVIEW:
+        return shape
+    return f"{shape[:SHAPE_PREVIEW]} ... {shape[-SHAPE_PREVIEW:]}"
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Raised when a request or block issues more queries than its budget allows.
+
+    Attributes:
+        profile: The QueryProfile of the request or block.
+        limit: The budget.
+    """
+
+    def __init__(self, profile, limit, where="block"):
+        repeated = profile.repeated(2)
+        detail = ""
+        if repeated:
+            shape, count = repeated[0]
+            detail = f"; most repeated ({count}x): {_preview(shape)}"
+        super().__init__(
+            f"{where} ran {profile.count} queries, over its budget of {limit}{detail}"
+        )
+        self.profile = profile
+        self.limit = limit
+
+
+class QueryProfile:
+    """
+    The statements recorded for one request or block.
+
+    Attributes:
+        statements: (shape, seconds) of every statement, in order.
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def record(self, statement, seconds):
+        """Records one statement."""
+        self.statements.append((statement_shape(statement), seconds))
+
+    @property
+    def count(self):
+        """int: Number of statements."""
+        return len(self.statements)
+
+    @property
+    def seconds(self):
+        """float: Time spent in the statements."""
+        return sum(seconds for _, seconds in self.statements)
+
+    def repeated(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        """
+        Lists the shapes run at least ``threshold`` times: likely N+1 patterns.
+
+        Returns:
+            list of tuple: (shape, count) pairs, most repeated first.
+        """
+        counts = collections.Counter(shape for shape, _ in self.statements)
+        return [(shape, n) for shape, n in counts.most_common() if n >= threshold]
+
+    def as_dict(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        """
+        Summarizes the profile.
+
+        Returns:
+            dict: Statement count, SQL time in milliseconds, and the repeated
+            shapes with their counts.
+        """
+        return {
+            "queries": self.count,
+            "sql_ms": round(self.seconds * 1000, 2),
+            "repeated": [
+                {"shape": shape, "count": n} for shape, n in self.repeated(threshold)
+            ],
+        }
+
+
+def _active_profiles():
+    if not hasattr(_local, "profiles"):
+        _local.profiles = []
+    return _local.profiles
+
+
+@contextlib.contextmanager
+def profile_queries():
+    """
+    Records the statements run by this thread within the block.
+
+    Works whether or not the profiler is enabled for the app.
+
+    Yields:
+        QueryProfile: Filled in as the block runs.
+    """
+    observe_statements(_record)
+    profile = QueryProfile()
+    profiles = _active_profiles()
+    profiles.append(profile)
+    try:
+        yield profile
+    finally:
+        profiles.remove(profile)
+
+
+@contextlib.contextmanager
+def query_budget(limit):
+    """
+    Fails the block if it runs more than ``limit`` statements, e.g. in a test::
+
+        with query_budget(3):
+            client.get("/api/movies/1")
+
+    Yields:
+        QueryProfile: Filled in as the block runs.
+
+    Raises:
+        QueryBudgetExceeded: If the block ran more than ``limit`` statements.
+    """
+    with profile_queries() as profile:
+        yield profile
+    if profile.count > limit:
+        raise QueryBudgetExceeded(profile, limit)
+
+
+def _record(statement, seconds):
+    for profile in getattr(_local, "profiles", ()):
+        profile.record(statement, seconds)
+
+
+class QueryProfiler:
+    """
+    Flask extension profiling the queries of every request.
+
+    Attributes:
+        enabled: Whether requests are profiled.
+        strict: Raise, rather than log, when a request is over budget.
+        default_budget: Budget of routes that declare none, or None.
+        repeat_threshold: Repeats of one shape reported as an N+1 pattern.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.strict = False
+        self.default_budget = None
+        self.repeat_threshold = DEFAULT_REPEAT_THRESHOLD
+        self._app = None
+
+    def init_app(self, app):
+        """
+        Configures the profiler from the app config and installs its hooks.
+
+        Parameters:
+            app (Flask): The application.
+        """
+        self.enabled = app.config.get("QUERY_PROFILER_ENABLED", False)
+        self.strict = app.config.get("QUERY_PROFILER_STRICT", app.testing)
+        self.default_budget = app.config.get("QUERY_BUDGET")
+        self.repeat_threshold = app.config.get(
+            "QUERY_PROFILER_REPEAT_THRESHOLD", DEFAULT_REPEAT_THRESHOLD
+        )
+        self._app = app
+        app.extensions["query_profiler"] = self
+        if not self.enabled:
+            return
+        observe_statements(_record)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    @staticmethod
+    def budget(limit):
+        """
+        Declares the most queries a route may issue per request.
+
+        Parameters:
+            limit (int): The budget.
+
+        Returns:
+            callable: Decorator for the view function.
+        """
+
+        def decorator(view):
+            # functools.wraps in outer decorators copies the attribute along
+            view.query_budget = limit
+            return view
+
+        return decorator
+
+    def _start_request(self):
+        profile = QueryProfile()
+        _active_profiles().append(profile)
+        g.query_profile = profile
+
+    def _finish_request(self, response):
+        profile = g.pop("query_profile", None)
+        if profile is None:
+            return response
+        profiles = _active_profiles()
+        if profile in profiles:
+            profiles.remove(profile)
+
+        where = f"{request.method} {request.path}"
+        response.headers["X-Query-Count"] = str(profile.count)
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={profile.seconds * 1000:.2f};desc="{profile.count} queries"',
+        )
+        for shape, count in profile.repeated(self.repeat_threshold):
+            logger.warning(
+                "Possible N+1 in %s: %d x %s", where, count, _preview(shape)
+            )
+
+        view = self._app.view_functions.get(request.endpoint)
+        limit = getattr(view, "query_budget", self.default_budget)
+        if limit is not None and profile.count > limit:
+            if self.strict:
+                raise QueryBudgetExceeded(profile, limit, where)
+            logger.warning(
+                "%s ran %d queries, over its budget of %d",
+                where,
+                profile.count,
+                limit,
+            )
+        return response
+
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,345 @@
+"""
+services/quota.py
+-----------------
+
+Quota accounting for YouTube Data API calls.
+
+YouTube charges every call in quota units (a search costs 100) against a daily
+budget of 10,000 units that resets at midnight Pacific time. Before each call a
+worker acquires the call's cost from two places, both kept on the day's row of
+the ``api_quota_usage`` table so they hold across every process and survive
+restarts:
+
+* a token bucket, which caps the rate of spending. Background calls leave some
+  tokens in it, so interactive lookups go ahead of backfill ones;
+* the daily budget, charged with one atomic upsert. Part of the budget is
+  reserved for interactive lookups, so a backfill can never leave a
+  user-triggered search without quota.
+
+Both are taken in one transaction, so a call the budget refuses hands its
+tokens back.
+
+When the daily budget is spent, ``QuotaExhausted`` is raised with the time the
+budget resets; callers defer their work until then instead of dropping it.
+
+Classes:
+    QuotaExhausted: Raised when the daily budget cannot cover a call.
+    TokenBucket: Cost-weighted rate limiter shared through the database.
+    DailyBudget: Daily quota persisted in the database.
+    QuotaScheduler: Flask extension combining both.
+
+Attributes:
+    youtube_quota (QuotaScheduler): The scheduler YouTube calls go through.
+"""
+import time
+from datetime import datetime, time as day_start, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from extensions import db
+from models.database import ApiQuotaUsage
+
+# Priorities; lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+SEARCH_COST = 100
+DEFAULT_DAILY_LIMIT = 10000
+# Units of the daily budget only interactive calls may spend
+DEFAULT_INTERACTIVE_RESERVE = 1000
+# Units per second, and the burst every process together may spend at once
+DEFAULT_RATE = 100.0
+DEFAULT_BURST = 1000
+# Tokens background calls leave in the bucket for interactive ones
+DEFAULT_INTERACTIVE_HEADROOM = SEARCH_COST
+# The YouTube quota day starts at midnight Pacific time
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+
+class QuotaExhausted(Exception):
+    """
+    Raised when the daily budget cannot cover a call.
+
+    Attributes:
+        retry_at: When the budget resets (timezone-aware).
+    """
+
+    def __init__(self, api, retry_at):
+        super().__init__(
+            f"The daily {api} quota is spent; it resets at {retry_at.isoformat()}."
+        )
+        self.retry_at = retry_at
+
+
+class TokenBucket:
+    """
+    A token bucket shared by every process through the database.
+
+    The bucket's level and the time it was last updated are stored on the day's
+    ``api_quota_usage`` row, so each quota day starts with a full bucket. Taking
+    tokens refills the bucket for the time elapsed and spends the cost in one
+    upsert, which locks the row, so the processes together never exceed the
+    rate.
+
+    Background calls only take tokens while ``headroom`` tokens remain
+    afterwards, so an interactive call never waits behind a backlog of them.
+
+    Attributes:
+        api: Name the bucket is kept under.
+        rate: Tokens added per second.
+        capacity: Most tokens the bucket holds, i.e. the largest burst.
+        headroom: Tokens background calls must leave in the bucket.
+    """
+
+    def __init__(
+        self,
+        api,
+        rate=DEFAULT_RATE,
+        capacity=DEFAULT_BURST,
+        headroom=DEFAULT_INTERACTIVE_HEADROOM,
+    ):
+        self.api = api
+        self.rate = rate
+        self.capacity = capacity
+        self.headroom = headroom
+
+    def _floor(self, cost, priority):
+        floor = 0 if priority == INTERACTIVE else self.headroom
+        if cost + floor > self.capacity:
+            raise ValueError(f"A cost of {cost} exceeds the bucket capacity.")
+        return floor
+
+    def _level(self):
+        """SQL for the level of the stored bucket, refilled up to now."""
+        elapsed = func.greatest(
+            func.extract("epoch", func.now() - ApiQuotaUsage.bucket_updated_at), 0
+        )
+        return func.coalesce(
+            func.least(
+                self.capacity, ApiQuotaUsage.bucket_tokens + elapsed * self.rate
+            ),
+            self.capacity,
+        )
+
+    def take(self, connection, cost, priority=BACKGROUND):
+        """
+        Spends ``cost`` tokens if the bucket holds them.
+
+        Parameters:
+            connection (Connection): Connection with an open transaction.
+            cost (float): Tokens the call costs.
+            priority (int): INTERACTIVE or BACKGROUND.
+
+        Returns:
+            float: 0 if the tokens were spent, otherwise the seconds until the
+            bucket is expected to hold them.
+        """
+        floor = self._floor(cost, priority)
+        statement = insert(ApiQuotaUsage).values(
+            api=self.api,
+            quota_day=quota_day(),
+            units_used=0,
+            bucket_tokens=self.capacity - cost,
+            bucket_updated_at=func.now(),
+        )
+        taken = connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=[ApiQuotaUsage.api, ApiQuotaUsage.quota_day],
+                set_={
+                    "bucket_tokens": self._level() - cost,
+                    "bucket_updated_at": func.now(),
+                },
+                where=self._level() - cost >= floor,
+            ).returning(ApiQuotaUsage.bucket_tokens)
+        ).scalar()
+        if taken is not None:
+            return 0.0
+
+        # Another process may have refilled past the level read; wait a token
+        return max(cost + floor - self.level(connection), 1.0) / self.rate
+
+    def level(self, connection):
+        """
+        Reads how many tokens the bucket holds now.
+
+        Parameters:
+            connection (Connection or Session): Where to run the query.
+
+        Returns:
+            float: The tokens available.
+        """
+        level = connection.execute(
+            select(self._level()).where(
+                ApiQuotaUsage.api == self.api,
+                ApiQuotaUsage.quota_day == quota_day(),
+            )
+        ).scalar()
+        return self.capacity if level is None else level
+
+
+def quota_day(now=None):
+    """Returns the YouTube quota day ``now`` falls in (default: the current one)."""
+    return (now or datetime.now(QUOTA_TIMEZONE)).astimezone(QUOTA_TIMEZONE).date()
+
+
+def next_reset(now=None):
+    """Returns when the quota day after the one ``now`` falls in starts."""
+    following = quota_day(now) + timedelta(days=1)
+    return datetime.combine(following, day_start(), tzinfo=QUOTA_TIMEZONE)
+
+
+class DailyBudget:
+    """
+    A daily quota shared by every process through the database.
+
+    Each charge is a single ``INSERT ... ON CONFLICT DO UPDATE ... WHERE`` that
+    only adds the cost when the total stays within the limit, so concurrent
+    processes can never overspend.
+
+    Attributes:
+        api: Name the usage is recorded under.
+        limit: Units available per day.
+        interactive_reserve: Units background calls must leave unspent.
+    """
+
+    def __init__(
+        self,
+        api,
+        limit=DEFAULT_DAILY_LIMIT,
+        interactive_reserve=DEFAULT_INTERACTIVE_RESERVE,
+    ):
+        self.api = api
+        self.limit = limit
+        self.interactive_reserve = interactive_reserve
+
+    def charge(self, connection, cost, priority=BACKGROUND):
+        """
+        Records ``cost`` units spent today, if the budget allows.
+
+        Parameters:
+            connection (Connection): Connection with an open transaction.
+            cost (int): Units to charge.
+            priority (int): INTERACTIVE or BACKGROUND.
+
+        Returns:
+            bool: True if the units were charged.
+        """
+        limit = self.limit
+        if priority != INTERACTIVE:
+            limit -= self.interactive_reserve
+        if cost > limit:
+            return False
+
+        statement = insert(ApiQuotaUsage).values(
+            api=self.api, quota_day=quota_day(), units_used=cost
+        )
+        charged = connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=[ApiQuotaUsage.api, ApiQuotaUsage.quota_day],
+                set_={"units_used": ApiQuotaUsage.units_used + cost},
+                where=ApiQuotaUsage.units_used + cost <= limit,
+            ).returning(ApiQuotaUsage.units_used)
+        ).scalar()
+        return charged is not None
+
+    def used(self, connection):
+        """
+        Reads the units spent today.
+
+        Parameters:
+            connection (Connection or Session): Where to run the query.
+
+        Returns:
+            int: The units spent.
+        """
+        used = connection.execute(
+            select(ApiQuotaUsage.units_used).where(
+                ApiQuotaUsage.api == self.api,
+                ApiQuotaUsage.quota_day == quota_day(),
+            )
+        ).scalar()
+        return used or 0
+
+
+class QuotaScheduler:
+    """
+    Flask extension gating API calls on the token bucket and the daily budget.
+
+    ``acquire`` is called from lookup threads that have no app context, so the
+    scheduler keeps a reference to the engine and takes the quota on a
+    connection of its own.
+
+    Attributes:
+        bucket: The shared token bucket.
+        budget: The shared daily budget.
+    """
+
+    def __init__(self, api):
+        self.bucket = TokenBucket(api)
+        self.budget = DailyBudget(api)
+        self._engine = None
+
+    def init_app(self, app):
+        """
+        Configures the limits from the app config.
+
+        Parameters:
+            app (Flask): The application.
+        """
+        self.bucket = TokenBucket(
+            self.bucket.api,
+            app.config.get("YOUTUBE_QUOTA_RATE", DEFAULT_RATE),
+            app.config.get("YOUTUBE_QUOTA_BURST", DEFAULT_BURST),
+        )
+        self.budget = DailyBudget(
+            self.budget.api,
+            app.config.get("YOUTUBE_DAILY_QUOTA", DEFAULT_DAILY_LIMIT),
+            app.config.get("YOUTUBE_QUOTA_RESERVE", DEFAULT_INTERACTIVE_RESERVE),
+        )
+        with app.app_context():
+            self._engine = db.engine
+        app.extensions["youtube_quota"] = self
+
+    def acquire(self, cost, priority=BACKGROUND):
+        """
+        Waits for the rate limit, then charges the daily budget.
+
+        Parameters:
+            cost (int): Quota units the call costs.
+            priority (int): INTERACTIVE or BACKGROUND.
+
+        Raises:
+            QuotaExhausted: If the daily budget cannot cover the call.
+        """
+        while True:
+            with self._engine.begin() as connection:
+                wait = self.bucket.take(connection, cost, priority)
+                if not wait:
+                    if not self.budget.charge(connection, cost, priority):
+                        # Raising rolls back the tokens just taken
+                        raise QuotaExhausted(self.budget.api, next_reset())
+                    return
+            time.sleep(wait)
+
+    def stats(self):
+        """
+        Reports today's usage.
+
+        Returns:
+            dict: Units spent, the daily limit and the tokens in the bucket.
+        """
+        with self._engine.connect() as connection:
+            used = self.budget.used(connection)
+            tokens = self.bucket.level(connection)
+        return {
+            "quota_day": quota_day().isoformat(),
+            "units_used": used,
+            "daily_limit": self.budget.limit,
+            "interactive_reserve": self.budget.interactive_reserve,
+            "bucket_tokens": round(tokens, 1),
+        }
+
+
+youtube_quota = QuotaScheduler("youtube")
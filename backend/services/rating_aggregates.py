@@ -0,0 +1,247 @@
+"""
+services/rating_aggregates.py
+-----------------------------
+
+Running rating aggregates on ``movies``.
+
+Every movie stores the sum and count of its review ratings, a histogram of
+them, and their average in ``rating``, so reading a movie's rating never touches
+``reviews``. Statement-level triggers on ``reviews`` fold each INSERT, UPDATE
+or DELETE into the aggregates of the affected movies inside the same
+transaction, with one ``UPDATE movies`` per statement however many reviews it
+touched. Concurrent reviews of one movie serialize on that movie's row lock and
+each adds its own delta, so no update is lost.
+
+A review belongs to the movie of its trailer. Moving a trailer to another movie
+or deleting it does not fire the triggers; the reconciliation job repairs such
+drift by recomputing the aggregates from ``reviews`` one range of movie ids at a
+time. Its repairs are plain SQL, which the session hooks of
+``services.catalog_version`` do not see, so it bumps the version of ``movies``
+itself whenever it changed a row.
+
+Functions:
+    find_drift(connection, ...): Movies whose aggregates disagree with reviews.
+    reconcile(connection, ...): Recompute the aggregates and repair drift.
+
+Attributes:
+    TRIGGER_DDL (tuple of str): Statements installing the triggers.
+"""
+from sqlalchemy import text
+
+from models.database import EMPTY_HISTOGRAM
+from services.catalog_version import bump_versions, version_cache
+
+HISTOGRAM_BUCKETS = len(EMPTY_HISTOGRAM.strip("{}").split(","))
+DEFAULT_CHUNK_SIZE = 10000
+# Rating sums are floats; differences below this are rounding
+SUM_TOLERANCE = 1e-6
+
+
+def _bucket(rating):
+    """SQL for the 1-based histogram bucket of a rating: (0, 1], (1, 2], ..."""
+    return f"least(greatest(ceil({rating})::integer, 1), {HISTOGRAM_BUCKETS})"
+
+
+TRIGGER_DDL = (
+    f"""
+    CREATE OR REPLACE FUNCTION apply_movie_rating_deltas(
+        trailer_ids integer[], ratings double precision[], signs integer[]
+    ) RETURNS void LANGUAGE sql AS $$
+        WITH changes AS (
+            SELECT t.movie_id, c.rating, c.sign, {_bucket("c.rating")} AS bucket
+            FROM unnest(trailer_ids, ratings, signs) AS c(trailer_id, rating, sign)
+            JOIN trailers t ON t.id = c.trailer_id
+            WHERE c.rating IS NOT NULL AND t.movie_id IS NOT NULL
+        ),
+        buckets AS (
+            SELECT movie_id, bucket, sum(sign) AS n, sum(sign * rating) AS total
+            FROM changes
+            GROUP BY movie_id, bucket
+        ),
+        deltas AS (
+            SELECT m.movie_id,
+                   coalesce(sum(b.total), 0) AS rating_sum,
+                   coalesce(sum(b.n), 0)::integer AS rating_count,
+                   array_agg(coalesce(b.n, 0)::integer ORDER BY s.bucket) AS histogram
+            FROM (SELECT DISTINCT movie_id FROM changes) m
+            CROSS JOIN generate_series(1, {HISTOGRAM_BUCKETS}) AS s(bucket)
+            LEFT JOIN buckets b ON b.movie_id = m.movie_id AND b.bucket = s.bucket
+            GROUP BY m.movie_id
+        )
+        UPDATE movies AS m
+        SET rating_sum = m.rating_sum + d.rating_sum,
+            rating_count = m.rating_count + d.rating_count,
+            rating = (m.rating_sum + d.rating_sum)
+                / nullif(m.rating_count + d.rating_count, 0),
+            rating_histogram = ARRAY(
+                SELECT u.stored + u.delta
+                FROM unnest(m.rating_histogram, d.histogram)
+                    WITH ORDINALITY AS u(stored, delta, ordinal)
+                ORDER BY u.ordinal
+            ),
+            updated_at = now()
+        FROM deltas d
+        WHERE m.id = d.movie_id
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION reviews_rating_changed() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM apply_movie_rating_deltas(
+                array_agg(trailer_id), array_agg(rating), array_agg(1)
+            ) FROM new_reviews;
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM apply_movie_rating_deltas(
+                array_agg(trailer_id), array_agg(rating), array_agg(-1)
+            ) FROM old_reviews;
+        ELSE
+            PERFORM apply_movie_rating_deltas(
+                array_agg(c.trailer_id), array_agg(c.rating), array_agg(c.sign)
+            )
+            FROM (
+                SELECT o.trailer_id, o.rating, -1 AS sign
+                FROM old_reviews o JOIN new_reviews n USING (id)
+                WHERE (o.trailer_id, o.rating) IS DISTINCT FROM (n.trailer_id, n.rating)
+                UNION ALL
+                SELECT n.trailer_id, n.rating, 1
+                FROM old_reviews o JOIN new_reviews n USING (id)
+                WHERE (o.trailer_id, o.rating) IS DISTINCT FROM (n.trailer_id, n.rating)
+            ) c;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS reviews_rating_insert ON reviews",
+    "CREATE TRIGGER reviews_rating_insert AFTER INSERT ON reviews"
+    " REFERENCING NEW TABLE AS new_reviews"
+    " FOR EACH STATEMENT EXECUTE FUNCTION reviews_rating_changed()",
+    "DROP TRIGGER IF EXISTS reviews_rating_update ON reviews",
+    "CREATE TRIGGER reviews_rating_update AFTER UPDATE ON reviews"
+    " REFERENCING OLD TABLE AS old_reviews NEW TABLE AS new_reviews"
+    " FOR EACH STATEMENT EXECUTE FUNCTION reviews_rating_changed()",
+    "DROP TRIGGER IF EXISTS reviews_rating_delete ON reviews",
+    "CREATE TRIGGER reviews_rating_delete AFTER DELETE ON reviews"
+    " REFERENCING OLD TABLE AS old_reviews"
+    " FOR EACH STATEMENT EXECUTE FUNCTION reviews_rating_changed()",
+)
+
+# Aggregates recomputed from reviews for the movies with ids in a range, and the
+# movies whose stored aggregates differ from them
+_DRIFT_CTE = f"""
+    WITH buckets AS (
+        SELECT t.movie_id, {_bucket("r.rating")} AS bucket,
+               count(*) AS n, sum(r.rating) AS total
+        FROM reviews r JOIN trailers t ON t.id = r.trailer_id
+        WHERE r.rating IS NOT NULL AND t.movie_id BETWEEN :first AND :last
+        GROUP BY 1, 2
+    ),
+    truth AS (
+        SELECT m.id AS movie_id,
+               coalesce(sum(b.total), 0) AS rating_sum,
+               coalesce(sum(b.n), 0)::integer AS rating_count,
+               array_agg(coalesce(b.n, 0)::integer ORDER BY s.bucket) AS histogram
+        FROM movies m
+        CROSS JOIN generate_series(1, {HISTOGRAM_BUCKETS}) AS s(bucket)
+        LEFT JOIN buckets b ON b.movie_id = m.id AND b.bucket = s.bucket
+        WHERE m.id BETWEEN :first AND :last
+        GROUP BY m.id
+    ),
+    drifted AS (
+        SELECT t.*
+        FROM truth t JOIN movies m ON m.id = t.movie_id
+        WHERE m.rating_count <> t.rating_count
+           OR abs(m.rating_sum - t.rating_sum) > :tolerance
+           OR m.rating_histogram IS DISTINCT FROM t.histogram
+           OR (m.rating IS NULL) <> (t.rating_count = 0)
+           OR abs(m.rating - t.rating_sum / nullif(t.rating_count, 0)) > :tolerance
+    )
+"""
+
+_FIND_DRIFT = text(_DRIFT_CTE + "SELECT movie_id FROM drifted ORDER BY movie_id")
+
+_REPAIR_DRIFT = text(
+    _DRIFT_CTE
+    + """
+    UPDATE movies AS m
+    SET rating_sum = d.rating_sum,
+        rating_count = d.rating_count,
+        rating = d.rating_sum / nullif(d.rating_count, 0),
+        rating_histogram = d.histogram,
+        updated_at = now()
+    FROM drifted d
+    WHERE m.id = d.movie_id
+    RETURNING m.id
+    """
+)
+
+
+def _id_ranges(connection, chunk_size):
+    first, last = connection.execute(text("SELECT min(id), max(id) FROM movies")).one()
+    if first is None:
+        return
+    for start in range(first, last + 1, chunk_size):
+        yield start, min(start + chunk_size - 1, last)
+
+
+def find_drift(connection, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Lists the movies whose aggregates disagree with a recompute from reviews.
+
+    Parameters:
+        connection (Connection or Session): Where to run the queries.
+        chunk_size (int): Number of movie ids checked per query.
+
+    Returns:
+        list of int: Ids of the drifted movies.
+    """
+    drifted = []
+    for first, last in _id_ranges(connection, chunk_size):
+        drifted.extend(
+            connection.execute(
+                _FIND_DRIFT, {"first": first, "last": last, "tolerance": SUM_TOLERANCE}
+            ).scalars()
+        )
+    return drifted
+
+
+def reconcile(connection, chunk_size=DEFAULT_CHUNK_SIZE, commit=True):
+    """
+    Recomputes the aggregates from reviews and overwrites the ones that drifted.
+
+    Each range of movie ids is repaired in its own transaction while holding a
+    SHARE lock on ``reviews``, so no review can change between the recompute and
+    the repair. Writers are held up for the duration of one chunk only. A chunk
+    that repaired any movie also bumps the catalog version of ``movies`` in the
+    same transaction, so cached listings showing the old ratings go stale.
+
+    Parameters:
+        connection (Connection or Session): Where to run the statements.
+        chunk_size (int): Number of movie ids repaired per transaction.
+        commit (bool): Commit after each chunk; pass False to run everything
+            inside the caller's transaction.
+
+    Returns:
+        list of int: Ids of the repaired movies.
+    """
+    repaired = []
+    for first, last in list(_id_ranges(connection, chunk_size)):
+        connection.execute(text("LOCK TABLE reviews IN SHARE MODE"))
+        ids = (
+            connection.execute(
+                _REPAIR_DRIFT,
+                {"first": first, "last": last, "tolerance": SUM_TOLERANCE},
+            )
+            .scalars()
+            .all()
+        )
+        if ids:
+            bump_versions(connection, ["movies"])
+        repaired.extend(ids)
+        if commit:
+            connection.commit()
+            if ids:
+                version_cache.invalidate()
+    return sorted(repaired)
@@ -0,0 +1,355 @@
+"""
+services/recommender.py
+-----------------------
+
+Item-based collaborative filtering over review ratings.
+
+Reviews rate trailers; each rating is credited to the trailer's movie, and a
+user's ratings of several trailers of one movie are averaged. The ratings form a
+sparse user x movie matrix, centred on each user's mean rating so that "liked"
+and "disliked" mean above and below that user's own average.
+
+Movie-movie similarity is the cosine of the centred rating columns, computed
+with one sparse matrix product and pruned to each movie's strongest neighbours.
+The candidates for a user are the neighbours of the movies they rated, so the
+work per user is bounded by their ratings times the neighbourhood size. A
+candidate's predicted rating is the similarity-weighted average of the user's
+centred ratings of the movies it neighbours, plus the user's mean. Scoring,
+excluding movies the user already rated and picking the top K are all done on
+whole batches of users with sparse matrix operations; there is no per-user loop.
+
+Users can be split into shards (``user_id % shards == shard``) so several
+processes can score and write disjoint sets of users at the same time. Every
+shard builds the similarities from all ratings, which is the cheap part.
+
+Classes:
+    RatingMatrix: Sparse user x movie rating matrix and its id mappings.
+
+Functions:
+    item_similarities(matrix, neighbours): Pruned movie-movie cosine similarities.
+    recommend(matrix, similarities, top_k, ...): Top-K movies per user.
+    write_recommendations(session, ...): Replace the stored recommendations.
+    write_user_recommendations(session, ...): Replace those of some users.
+    refresh_recommendations(session, ...): Load, score and write in one call.
+"""
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import delete, insert, select
+
+from models.database import Recommendation, Review, Trailer
+
+DEFAULT_TOP_K = 20
+DEFAULT_NEIGHBOURS = 50
+# Users scored per sparse product; bounds the memory of one batch
+DEFAULT_BATCH_USERS = 20000
+WRITE_BATCH_SIZE = 10000
+# Smaller deviations from a user's mean, and smaller similarities, are
+# rounding noise
+MIN_DEVIATION = 1e-4
+MIN_SIMILARITY = 1e-6
+
+
+class RatingMatrix:
+    """
+    Sparse user x movie rating matrix.
+
+    Attributes:
+        user_ids: Database id of the user of each row, ascending.
+        movie_ids: Database id of the movie of each column, ascending.
+        ratings: CSR matrix of ratings, users x movies.
+        means: Mean rating of each user.
+        centred: ``ratings`` minus each user's mean, on the rated entries only;
+            ratings equal to the mean are left out.
+    """
+
+    def __init__(self, user_ids, movie_ids, ratings):
+        self.user_ids = user_ids
+        self.movie_ids = movie_ids
+        self.ratings = ratings
+
+        counts = np.diff(ratings.indptr)
+        sums = np.asarray(ratings.sum(axis=1)).ravel()
+        self.means = np.divide(
+            sums, counts, out=np.zeros_like(sums), where=counts > 0
+        ).astype(np.float32)
+        self.centred = ratings.copy()
+        self.centred.data -= np.repeat(self.means, counts)
+        self.centred.data[np.abs(self.centred.data) < MIN_DEVIATION] = 0
+        self.centred.eliminate_zeros()
+
+    @classmethod
+    def from_arrays(cls, users, movies, ratings):
+        """
+        Builds the matrix from parallel arrays of (user, movie, rating).
+
+        Parameters:
+            users (array-like): User id of each rating.
+            movies (array-like): Movie id of each rating.
+            ratings (array-like): The ratings; repeated (user, movie) pairs are
+                averaged.
+
+        Returns:
+            RatingMatrix: The matrix.
+        """
+        user_ids, rows = np.unique(np.asarray(users), return_inverse=True)
+        movie_ids, columns = np.unique(np.asarray(movies), return_inverse=True)
+        shape = (len(user_ids), len(movie_ids))
+        values = np.asarray(ratings, dtype=np.float32)
+
+        # COO -> CSR sums duplicates; divide by their count to average them
+        totals = sp.csr_matrix((values, (rows, columns)), shape=shape)
+        counts = sp.csr_matrix(
+            (np.ones_like(values), (rows, columns)), shape=shape
+        )
+        totals.sort_indices()
+        counts.sort_indices()
+        totals.data /= counts.data
+        return cls(user_ids, movie_ids, totals)
+
+    @classmethod
+    def load(cls, session, max_review_id=None):
+        """
+        Loads every rated review, credited to the movie of its trailer.
+
+        Parameters:
+            session (Session): The SQLAlchemy session to query with.
+            max_review_id (int): Only load reviews up to this id, if given.
+
+        Returns:
+            RatingMatrix: The matrix.
+        """
+        statement = (
+            select(Review.user_id, Trailer.movie_id, Review.rating)
+            .join(Trailer, Review.trailer_id == Trailer.id)
+            .where(
+                Review.user_id.isnot(None),
+                Review.rating.isnot(None),
+                Trailer.movie_id.isnot(None),
+            )
+        )
+        if max_review_id is not None:
+            statement = statement.where(Review.id <= max_review_id)
+        rows = session.execute(statement).all()
+        if not rows:
+            empty = np.array([], dtype=np.int64)
+            return cls.from_arrays(empty, empty, np.array([], dtype=np.float32))
+        users, movies, ratings = zip(*rows)
+        return cls.from_arrays(users, movies, ratings)
+
+    @property
+    def shape(self):
+        """The (users, movies) shape of the matrix."""
+        return self.ratings.shape
+
+
+def _top_per_row(matrix, k):
+    """
+    Keeps the k largest entries of every row of a sparse matrix.
+
+    Sorts all entries by (row, value descending) at once and keeps those ranked
+    below k within their row.
+
+    Returns:
+        tuple: Row indices, column indices and values of the kept entries, grouped
+        by row and best first within each row.
+    """
+    coo = matrix.tocoo()
+    order = np.lexsort((-coo.data, coo.row))
+    rows, columns, values = coo.row[order], coo.col[order], coo.data[order]
+    if rows.size == 0:
+        return rows, columns, values
+    first = np.searchsorted(rows, rows, side="left")
+    keep = np.arange(len(rows)) - first < k
+    return rows[keep], columns[keep], values[keep]
+
+
+def item_similarities(matrix, neighbours=DEFAULT_NEIGHBOURS):
+    """
+    Computes movie-movie cosine similarities of the centred ratings.
+
+    Parameters:
+        matrix (RatingMatrix): The ratings.
+        neighbours (int): Number of most similar movies kept per movie.
+
+    Returns:
+        scipy.sparse.csr_matrix: movies x movies similarities; row j holds the
+        neighbours of movie j. The diagonal is zero.
+    """
+    centred = matrix.centred.tocsc()
+    norms = np.sqrt(np.asarray(centred.multiply(centred).sum(axis=0)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized = centred @ sp.diags(inverse.astype(np.float32))
+
+    similarities = (normalized.T @ normalized).tocsr()
+    similarities = similarities - sp.diags(similarities.diagonal())
+    similarities.data[np.abs(similarities.data) < MIN_SIMILARITY] = 0
+    similarities.eliminate_zeros()
+
+    rows, columns, values = _top_per_row(similarities, neighbours)
+    return sp.csr_matrix(
+        (values, (rows, columns)), shape=similarities.shape, dtype=np.float32
+    )
+
+
+def _shard_rows(matrix, shard, shards):
+    return np.flatnonzero(matrix.user_ids % shards == shard)
+
+
+def recommend(
+    matrix,
+    similarities,
+    top_k=DEFAULT_TOP_K,
+    shard=0,
+    shards=1,
+    batch_users=DEFAULT_BATCH_USERS,
+):
+    """
+    Predicts ratings and picks the top-K unrated movies of each user.
+
+    Parameters:
+        matrix (RatingMatrix): The ratings.
+        similarities (scipy.sparse.csr_matrix): As returned by ``item_similarities``.
+        top_k (int): Number of recommendations per user.
+        shard (int): Which shard of users to score.
+        shards (int): Total number of shards.
+        batch_users (int): Users scored per batch of sparse products.
+
+    Yields:
+        tuple: Arrays of user ids, movie ids and predicted ratings, one tuple per
+        batch, grouped by user and best first.
+    """
+    rated = matrix.ratings.copy()
+    rated.data[:] = 1.0
+    weights = abs(similarities)
+
+    rows = _shard_rows(matrix, shard, shards)
+    for start in range(0, len(rows), batch_users):
+        batch = rows[start : start + batch_users]
+        numerator = matrix.centred[batch] @ similarities
+        denominator = rated[batch] @ weights
+
+        # Both products have the sparsity of the rated movies' neighbourhoods;
+        # the denominator is non-zero wherever the numerator is
+        predicted = numerator.multiply(denominator.power(-1)).tocsr()
+        # Drop movies the user already rated
+        predicted = predicted - predicted.multiply(rated[batch])
+        predicted.eliminate_zeros()
+
+        positions, columns, scores = _top_per_row(predicted, top_k)
+        users = batch[positions]
+        yield (
+            matrix.user_ids[users],
+            matrix.movie_ids[columns],
+            scores + matrix.means[users],
+        )
+
+
+def _insert_recommendations(session, batches):
+    written = 0
+    for users, movies, scores in batches:
+        for start in range(0, len(users), WRITE_BATCH_SIZE):
+            end = start + WRITE_BATCH_SIZE
+            rows = [
+                {"user_id": user, "movie_id": movie, "score": score}
+                for user, movie, score in zip(
+                    users[start:end].tolist(),
+                    movies[start:end].tolist(),
+                    scores[start:end].tolist(),
+                )
+            ]
+            session.execute(insert(Recommendation), rows)
+            written += len(rows)
+    return written
+
+
+def write_recommendations(session, batches, shard=0, shards=1):
+    """
+    Replaces the stored recommendations of a shard of users.
+
+    The old rows of the shard are deleted and the new ones inserted in batches,
+    all in one transaction, so readers switch from the old recommendations to
+    the new ones at commit.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to write with.
+        batches (iterable of tuple): (user ids, movie ids, scores) arrays as
+            yielded by ``recommend``.
+        shard (int): Which shard of users is replaced.
+        shards (int): Total number of shards.
+
+    Returns:
+        int: Number of rows written.
+    """
+    session.execute(
+        delete(Recommendation).where(Recommendation.user_id % shards == shard)
+    )
+    written = _insert_recommendations(session, batches)
+    session.commit()
+    return written
+
+
+def write_user_recommendations(session, user_ids, batches):
+    """
+    Replaces the stored recommendations of the given users, in one transaction.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to write with.
+        user_ids (iterable of int): The users whose recommendations are replaced.
+        batches (iterable of tuple): (user ids, movie ids, scores) arrays for
+            those users.
+
+    Returns:
+        int: Number of rows written.
+    """
+    session.execute(
+        delete(Recommendation).where(Recommendation.user_id.in_(list(user_ids)))
+    )
+    written = _insert_recommendations(session, batches)
+    session.commit()
+    return written
+
+
+def refresh_recommendations(
+    session,
+    top_k=DEFAULT_TOP_K,
+    neighbours=DEFAULT_NEIGHBOURS,
+    shard=0,
+    shards=1,
+):
+    """
+    Recomputes and stores the recommendations of a shard of users.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to use.
+        top_k (int): Number of recommendations per user.
+        neighbours (int): Number of most similar movies kept per movie.
+        shard (int): Which shard of users to refresh.
+        shards (int): Total number of shards.
+
+    Returns:
+        dict: Matrix size, rows written and the time spent in each step.
+    """
+    started = time.perf_counter()
+    matrix = RatingMatrix.load(session)
+    loaded = time.perf_counter()
+    similarities = item_similarities(matrix, neighbours)
+    computed = time.perf_counter()
+    written = write_recommendations(
+        session,
+        recommend(matrix, similarities, top_k, shard, shards),
+        shard,
+        shards,
+    )
+    finished = time.perf_counter()
+
+    return {
+        "users": matrix.shape[0],
+        "movies": matrix.shape[1],
+        "ratings": matrix.ratings.nnz,
+        "recommendations": written,
+        "load_seconds": round(loaded - started, 3),
+        "similarity_seconds": round(computed - loaded, 3),
+        "score_and_write_seconds": round(finished - computed, 3),
+    }
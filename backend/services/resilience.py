@@ -0,0 +1,457 @@
+"""
+services/resilience.py
+----------------------
+
+Circuit breakers and hedged requests for the external metadata providers.
+
+Every call to a provider (TMDB, YouTube) goes through its ``Provider``, which
+returns a ``CallResult`` instead of a bare value or a half-built response:
+``ok`` with the value, ``failed`` with the error, or ``rejected`` when the
+provider's circuit breaker is open.
+
+The breaker opens after a run of consecutive failures, and from then on calls
+are rejected at once instead of each waiting for a timeout. After a cool-down a
+single trial call is let through; its success closes the breaker again, its
+failure reopens it.
+
+To cut tail latency, a call that has not answered within the provider's recent
+p95 latency is hedged: an identical request is sent, and whichever answers
+first wins. Only about one call in twenty is duplicated, yet a single slow
+connection or server no longer sets the pace. Providers whose calls cost more
+than time, such as YouTube searches charged to a daily quota, are registered
+with hedging turned off.
+
+Work that must happen once per call rather than once per request, such as
+taking quota, is passed to ``Provider.call`` as ``reserve``. It runs after the
+breaker admits the call and before the call is timed, so a rejected call costs
+nothing and waiting for a rate limit does not count as provider latency.
+
+Classes:
+    CallResult: Typed outcome of one provider call.
+    ProviderError: Raised by ``CallResult.unwrap`` for unsuccessful calls.
+    CircuitBreaker: Consecutive-failure breaker with a half-open trial.
+    Provider: Breaker, latency tracking and hedging for one provider.
+    ProviderRegistry: Flask extension holding the providers.
+
+Attributes:
+    providers (ProviderRegistry): The providers outbound calls go through.
+"""
+import collections
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from services.metrics import metrics
+
+OK = "ok"
+FAILED = "failed"
+REJECTED = "rejected"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SECONDS = 30.0
+# Hedging waits for this many latency samples, and never fires sooner than this
+MIN_HEDGE_SAMPLES = 20
+MIN_HEDGE_DELAY = 0.05
+LATENCY_SAMPLES = 256
+DEFAULT_HEDGE_WORKERS = 16
+
+
+class CallResult:
+    """
+    The outcome of one provider call.
+
+    Attributes:
+        provider: Name of the provider called.
+        status: "ok", "failed" or "rejected".
+        value: What the call returned, when it succeeded.
+        error: The exception, when it failed or was rejected.
+        elapsed: Wall-clock seconds the call took.
+        hedged: True when a duplicate request was sent.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self, provider, status, value=None, error=None, elapsed=0.0, hedged=False
+    ):
+        self.provider = provider
+        self.status = status
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+        self.hedged = hedged
+
+    @property
+    def ok(self):
+        """bool: True when the call succeeded."""
+        return self.status == OK
+
+    def unwrap(self):
+        """
+        Returns the value of a successful call.
+
+        Raises:
+            ProviderError: If the call failed or was rejected.
+        """
+        if not self.ok:
+            raise ProviderError(self)
+        return self.value
+
+
+class ProviderError(Exception):
+    """
+    Raised for a call that failed or was rejected.
+
+    Attributes:
+        result: The CallResult of the call.
+    """
+
+    def __init__(self, result):
+        if result.status == REJECTED:
+            message = f"{result.provider} is unavailable; its circuit is open"
+        else:
+            message = f"{result.provider} call failed: {result.error}"
+        super().__init__(message)
+        self.result = result
+
+
+class CircuitBreaker:
+    """
+    Opens after consecutive failures and lets one trial call through per cool-down.
+
+    Attributes:
+        failure_threshold: Consecutive failures that open the breaker.
+        reset_seconds: Seconds the breaker stays open before a trial call.
+        state: "closed", "open" or "half_open".
+        opened: Number of times the breaker has opened.
+    """
+
+    def __init__(
+        self,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        reset_seconds=DEFAULT_RESET_SECONDS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.opened = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Decides whether a call may go ahead.
+
+        Returns:
+            bool: False while the breaker is open, or while its trial call is
+            still running.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if (
+                self.state == OPEN
+                and time.monotonic() - self._opened_at >= self.reset_seconds
+            ):
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        """Closes the breaker and forgets earlier failures."""
+        with self._lock:
+            self.state = CLOSED
+            self._failures = 0
+
+    def release(self):
+        """Gives back a trial call that never reached the provider."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+
+    def record_failure(self):
+        """Counts a failure, opening the breaker at the threshold or after a trial."""
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED and self._failures >= self.failure_threshold
+            ):
+                self.state = OPEN
+                self.opened += 1
+                self._opened_at = time.monotonic()
+
+
+# pylint: disable=too-many-instance-attributes
+class Provider:
+    """
+    Guards the calls to one provider with a breaker, and hedges slow ones.
+
+    Attributes:
+        name: Name of the provider.
+        breaker: The provider's CircuitBreaker.
+        hedge: Whether slow calls are hedged.
+        passthrough: Exceptions raised straight to the caller without counting
+            against the provider, because they are not its fault.
+        latencies: Seconds taken by recent successful calls.
+        counts: Calls per outcome, plus hedges sent and hedges that won.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        name,
+        breaker=None,
+        hedge=True,
+        hedge_workers=DEFAULT_HEDGE_WORKERS,
+        passthrough=(),
+    ):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_workers = hedge_workers
+        self.passthrough = tuple(passthrough)
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.counts = collections.Counter()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def hedge_delay(self):
+        """
+        Returns how long a call may take before it is hedged.
+
+        Returns:
+            float: The recent p95 latency in seconds, or None while too few
+            calls have been seen to tell.
+        """
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        return max(MIN_HEDGE_DELAY, samples[int(0.95 * (len(samples) - 1))])
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.hedge_workers,
+                    thread_name_prefix=f"{self.name}-call",
+                )
+            return self._executor
+
+    # pylint: disable=too-many-locals
+    def _attempts(self, function, args, kwargs, is_failure):
+        """Runs the call, hedged if it is slow; returns (value, error, hedged)."""
+        delay = self.hedge_delay() if self.hedge else None
+
+        def attempt():
+            value = function(*args, **kwargs)
+            if is_failure is not None and is_failure(value):
+                raise RuntimeError(f"unusable answer: {value!r}")
+            return value
+
+        if delay is None:
+            try:
+                return attempt(), None, False
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                if isinstance(e, self.passthrough):
+                    raise
+                return None, e, False
+
+        pool = self._pool()
+        pending = {pool.submit(attempt)}
+        done, pending = wait(pending, timeout=delay)
+        hedged = not done
+        if hedged:
+            with self._lock:
+                self.counts["hedges"] += 1
+            hedge = pool.submit(attempt)
+            pending.add(hedge)
+
+        error = None
+        while True:
+            for future in done:
+                try:
+                    value = future.result()
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    if isinstance(e, self.passthrough):
+                        raise
+                    error = e
+                    continue
+                if hedged and future is hedge:
+                    with self._lock:
+                        self.counts["hedge_wins"] += 1
+                return value, None, hedged
+            if not pending:
+                return None, error, hedged
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def call(self, function, *args, is_failure=None, reserve=None, **kwargs):
+        """
+        Calls the provider through the breaker, hedging the call if it is slow.
+
+        Parameters:
+            function (callable): Makes the request; raises on failure.
+            *args, **kwargs: Passed on to ``function``.
+            is_failure (callable): Given the value ``function`` returned, tells
+                whether it still counts as a failure, e.g. a 503 response.
+            reserve (callable): Called once the breaker admits the call, before
+                it is timed or hedged, e.g. to take API quota. What it raises
+                goes straight to the caller.
+
+        Returns:
+            CallResult: The typed outcome.
+        """
+        if not self.breaker.allow():
+            with self._lock:
+                self.counts[REJECTED] += 1
+            result = CallResult(self.name, REJECTED)
+            metrics.observe_call(result)
+            return result
+
+        try:
+            if reserve is not None:
+                reserve()
+            started = time.perf_counter()
+            value, error, hedged = self._attempts(function, args, kwargs, is_failure)
+        except Exception:
+            # Only reserve and passthrough errors get here; neither is the
+            # provider's fault, so a half-open trial is simply given back
+            self.breaker.release()
+            raise
+        elapsed = time.perf_counter() - started
+
+        if error is None:
+            self.breaker.record_success()
+            with self._lock:
+                self.counts[OK] += 1
+                self.latencies.append(elapsed)
+            result = CallResult(self.name, OK, value, elapsed=elapsed, hedged=hedged)
+        else:
+            self.breaker.record_failure()
+            with self._lock:
+                self.counts[FAILED] += 1
+            result = CallResult(
+                self.name, FAILED, error=error, elapsed=elapsed, hedged=hedged
+            )
+        metrics.observe_call(result)
+        return result
+
+    def stats(self):
+        """
+        Reports the breaker state and call counters.
+
+        Returns:
+            dict: Breaker state, times opened, calls per outcome, hedges and the
+            current hedge delay in milliseconds.
+        """
+        delay = self.hedge_delay()
+        with self._lock:
+            counts = dict(self.counts)
+        return {
+            "state": self.breaker.state,
+            "opened": self.breaker.opened,
+            **{key: counts.get(key, 0) for key in (OK, FAILED, REJECTED)},
+            "hedges": counts.get("hedges", 0),
+            "hedge_wins": counts.get("hedge_wins", 0),
+            "hedge_delay_ms": round(delay * 1000, 2) if delay is not None else None,
+        }
+
+
+class ProviderRegistry:
+    """
+    Flask extension holding one Provider per external service.
+
+    Attributes:
+        failure_threshold: Consecutive failures that open a breaker.
+        reset_seconds: Seconds a breaker stays open before a trial call.
+        hedge: Whether slow calls are hedged, for providers registered to
+            allow it.
+    """
+
+    def __init__(self):
+        self.failure_threshold = DEFAULT_FAILURE_THRESHOLD
+        self.reset_seconds = DEFAULT_RESET_SECONDS
+        self.hedge = True
+        self._options = {}
+        self._providers = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Configures the providers from the app config.
+
+        Parameters:
+            app (Flask): The application.
+        """
+        self.failure_threshold = app.config.get(
+            "BREAKER_FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD
+        )
+        self.reset_seconds = app.config.get(
+            "BREAKER_RESET_SECONDS", DEFAULT_RESET_SECONDS
+        )
+        self.hedge = app.config.get("HEDGE_REQUESTS", True)
+        self.reset()
+        app.extensions["providers"] = self
+
+    def reset(self):
+        """Forgets every provider, closing their breakers and latency history."""
+        with self._lock:
+            self._providers = {}
+
+    def register(self, name, hedge=True, passthrough=()):
+        """
+        Sets how the provider of a service is built.
+
+        Services that were never registered get a provider with the defaults.
+
+        Parameters:
+            name (str): Name of the service, e.g. "youtube".
+            hedge (bool): Whether slow calls may be hedged; off when each call
+                costs more than its time, e.g. quota.
+            passthrough (tuple of type): Exceptions raised straight to the
+                caller without counting against the provider.
+        """
+        with self._lock:
+            self._options[name] = {"hedge": hedge, "passthrough": tuple(passthrough)}
+            self._providers.pop(name, None)
+
+    def get(self, name):
+        """
+        Returns the provider of a service, creating it on first use.
+
+        Parameters:
+            name (str): Name of the service, e.g. "tmdb".
+
+        Returns:
+            Provider: The provider.
+        """
+        with self._lock:
+            provider = self._providers.get(name)
+            if provider is None:
+                options = self._options.get(name, {})
+                provider = Provider(
+                    name,
+                    CircuitBreaker(self.failure_threshold, self.reset_seconds),
+                    hedge=self.hedge and options.get("hedge", True),
+                    passthrough=options.get("passthrough", ()),
+                )
+                self._providers[name] = provider
+            return provider
+
+    def stats(self):
+        """
+        Reports every provider's breaker and call counters.
+
+        Returns:
+            dict: ``Provider.stats`` per provider name.
+        """
+        with self._lock:
+            registered = dict(self._providers)
+        return {name: provider.stats() for name, provider in registered.items()}
+
+
+providers = ProviderRegistry()
@@ -0,0 +1,384 @@
+"""
+services/response_cache.py
+--------------------------
+
+A two-tier cache for read endpoint responses.
+
+Responses are cached per worker in an in-process LRU tier and, when a cache
+directory is configured, in a shared file tier that every worker on the host can
+read. Each entry remembers the versions of the tables it was built from (see
+``services.catalog_version``); as soon as a commit bumps one of those versions
+the entry no longer matches and is treated as a miss, so nothing has to be
+deleted explicitly when the catalog changes.
+
+The shared tier only needs ``get``/``set`` of bytes, so a networked backend such
+as Redis can be dropped in for ``FileCacheBackend`` without touching the routes.
+Shared entries are a line of JSON holding the table versions, status and headers,
+followed by the raw body, so a file planted in the shared directory can at worst
+be served as a response, never run as code.
+
+Classes:
+    LRUCache: Thread-safe in-process LRU tier.
+    FileCacheBackend: Shared tier storing entries as files in a directory.
+    ResponseCache: Flask extension tying both tiers to routes.
+
+Functions:
+    encode_entry(entry): Serialize a cached response for the shared tier.
+    decode_entry(raw): Read a serialized response back.
+
+Attributes:
+    response_cache (ResponseCache): The instance the app registers its routes with.
+"""
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from flask import make_response, request
+
+from extensions import db
+from services.catalog_version import version_cache
+
+DEFAULT_LOCAL_ENTRIES = 1024
+DEFAULT_SHARED_ENTRIES = 10000
+
+# Response headers worth replaying from the cache
+CACHED_HEADERS = ("Content-Type", "Link", "X-Next-Cursor")
+
+
+def encode_entry(entry):
+    """
+    Serializes a cache entry for the shared tier.
+
+    Parameters:
+        entry (tuple): The (versions, status, headers, body) of a response.
+
+    Returns:
+        bytes: A JSON line with everything but the body, then the body.
+    """
+    versions, status, headers, body = entry
+    meta = json.dumps({"versions": versions, "status": status, "headers": headers})
+    return meta.encode() + b"\n" + body
+
+
+def decode_entry(raw):
+    """
+    Reads back an entry serialized by ``encode_entry``.
+
+    Parameters:
+        raw (bytes): The stored value.
+
+    Returns:
+        tuple: The (versions, status, headers, body) of the response, or None if
+        the value is not a valid entry.
+    """
+    meta, separator, body = raw.partition(b"\n")
+    try:
+        fields = json.loads(meta) if separator else None
+        versions = tuple((table, version) for table, version in fields["versions"])
+        return versions, fields["status"], fields["headers"], body
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded mapping evicting the least recently used entry.
+
+    Attributes:
+        max_entries: Maximum number of entries kept.
+        hits: Lookups that found an entry.
+        misses: Lookups that found nothing.
+        evictions: Entries dropped to stay within ``max_entries``.
+    """
+
+    def __init__(self, max_entries=DEFAULT_LOCAL_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, is_valid=None):
+        """
+        Returns the entry stored under key, or None.
+
+        Parameters:
+            key (str): The cache key.
+            is_valid (callable): Optional check of the stored value; values it
+                rejects are dropped and counted as a miss.
+
+        Returns:
+            object: The stored value, or None on a miss.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None and is_valid is not None and not is_valid(value):
+                del self._entries[key]
+                value = None
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """
+        Stores value under key, evicting the least recently used entries if needed.
+
+        Parameters:
+            key (str): The cache key.
+            value (object): The value to store.
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """
+        Reports the tier counters.
+
+        Returns:
+            dict: Entry count, hits, misses, evictions and hit ratio.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class FileCacheBackend:
+    """
+    A shared cache tier keeping one file per entry in a directory.
+
+    Writes go through a temporary file and an atomic rename, so readers in other
+    processes never see a partial entry. When the directory holds more than
+    ``max_entries`` files the oldest ones are removed.
+
+    Attributes:
+        directory: Where the entry files live.
+        max_entries: Maximum number of files kept.
+    """
+
+    def __init__(self, directory, max_entries=DEFAULT_SHARED_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.stale = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.cache")
+
+    def get(self, key):
+        """
+        Returns the bytes stored under key, or None.
+
+        Parameters:
+            key (str): The cache key; must be safe to use as a file name.
+
+        Returns:
+            bytes: The stored value, or None on a miss.
+        """
+        try:
+            with open(self._path(key), "rb") as entry:
+                value = entry.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """
+        Stores bytes under key.
+
+        Parameters:
+            key (str): The cache key; must be safe to use as a file name.
+            value (bytes): The value to store.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as entry:
+            entry.write(value)
+        os.replace(tmp_path, self._path(key))
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % 100 == 0
+        if prune:
+            self._prune()
+
+    def mark_stale(self):
+        """Records that an entry returned by ``get`` turned out to be out of date."""
+        with self._lock:
+            self.stale += 1
+
+    def _prune(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".cache"):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+        entries.sort()
+        for _, path in entries[: max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self):
+        """
+        Reports the tier counters for this process.
+
+        Returns:
+            dict: Hits, misses, entries found out of date, evictions and the
+            ratio of lookups answered with a current entry.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits - self.stale,
+                "misses": self.misses + self.stale,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits - self.stale) / lookups if lookups else 0.0,
+            }
+
+
+class ResponseCache:
+    """
+    Flask extension caching GET responses keyed on path, query and table versions.
+
+    Configuration:
+        RESPONSE_CACHE_ENABLED: Turns caching on or off (default on).
+        RESPONSE_CACHE_LOCAL_ENTRIES: Size of the per-worker LRU tier.
+        RESPONSE_CACHE_DIR: Directory of the shared file tier; no shared tier
+            when unset.
+        RESPONSE_CACHE_SHARED_ENTRIES: Size limit of the shared tier.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.local = LRUCache()
+        self.shared = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Configures the cache from the app config.
+
+        Parameters:
+            app (Flask): The application.
+        """
+        self.enabled = app.config.get("RESPONSE_CACHE_ENABLED", True)
+        self.local = LRUCache(
+            app.config.get("RESPONSE_CACHE_LOCAL_ENTRIES", DEFAULT_LOCAL_ENTRIES)
+        )
+        directory = app.config.get("RESPONSE_CACHE_DIR")
+        self.shared = (
+            FileCacheBackend(
+                directory,
+                app.config.get("RESPONSE_CACHE_SHARED_ENTRIES", DEFAULT_SHARED_ENTRIES),
+            )
+            if directory
+            else None
+        )
+        app.extensions["response_cache"] = self
+
+    def _lookup(self, key, versions):
+        entry = self.local.get(key, is_valid=lambda entry: entry[0] == versions)
+        if entry is None and self.shared is not None:
+            raw = self.shared.get(key)
+            if raw is not None:
+                entry = decode_entry(raw)
+                if entry is None or entry[0] != versions:
+                    self.shared.mark_stale()
+                    return None
+                self.local.set(key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, encode_entry(entry))
+
+    def cached(self, *tables):
+        """
+        Caches a GET route's successful responses until ``tables`` change.
+
+        Parameters:
+            *tables (str): Names of the tables the response is built from.
+
+        Returns:
+            callable: The route decorator.
+        """
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+
+                versions, _ = version_cache.get(db.session, tables)
+                key = hashlib.sha256(
+                    f"{request.endpoint}|{request.full_path}".encode()
+                ).hexdigest()
+
+                entry = self._lookup(key, versions)
+                if entry is not None:
+                    _, status, headers, body = entry
+                    return make_response(body, status, headers)
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    headers = {
+                        name: response.headers[name]
+                        for name in CACHED_HEADERS
+                        if name in response.headers
+                    }
+                    self._store(key, (versions, 200, headers, response.get_data()))
+                return response
+
+            return wrapper
+
+        return decorator
+
+    def stats(self):
+        """
+        Reports the counters of both tiers.
+
+        Returns:
+            dict: Counters of the local tier, and of the shared tier if configured.
+        """
+        return {
+            "local": self.local.stats(),
+            "shared": self.shared.stats() if self.shared is not None else None,
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,96 @@
+"""
+services/search.py
+------------------
+
+Movie search backed by PostgreSQL indexes.
+
+Full-text search runs against the generated ``movies.search_vector`` column and
+its GIN index, ranked with ``ts_rank_cd`` so title matches outrank matches in the
+cast or summary. When the words of a query match nothing — usually a typo — the
+search falls back to trigram similarity on the title, which the ``pg_trgm`` GIN
+index on ``movies.title`` answers without scanning the table. The same index
+serves title autocomplete.
+
+Functions:
+    search_movies(session, query, limit): Ranked full-text search with fuzzy fallback.
+    suggest_titles(session, prefix, limit): Title autocomplete.
+"""
+from sqlalchemy import func, select
+
+from models.database import Movie
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+SEARCH_CONFIG = "english"
+
+# Columns returned for each search hit
+RESULT_COLUMNS = (Movie.id, Movie.title, Movie.release_date, Movie.poster_url)
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_movies(session, query, limit=DEFAULT_LIMIT):
+    """
+    Searches titles, people and summaries, falling back to fuzzy title matching.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to query with.
+        query (str): The search text; quoted phrases, "or" and "-word" are
+            understood as in ``websearch_to_tsquery``.
+        limit (int): Maximum number of hits.
+
+    Returns:
+        list of dict: The hits, best first, each with the movie's id, title,
+        release date and poster URL, its score, and whether it matched by
+        "fulltext" or "fuzzy" title similarity.
+    """
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    rank = func.ts_rank_cd(Movie.search_vector, ts_query).label("score")
+    rows = session.execute(
+        select(*RESULT_COLUMNS, rank)
+        .where(Movie.search_vector.op("@@")(ts_query))
+        .order_by(rank.desc(), Movie.id)
+        .limit(limit)
+    ).mappings().all()
+    match = "fulltext"
+
+    if not rows:
+        similarity = func.similarity(Movie.title, query).label("score")
+        rows = session.execute(
+            select(*RESULT_COLUMNS, similarity)
+            # "%" is pg_trgm's indexed similarity operator
+            .where(Movie.title.op("%")(query))
+            .order_by(similarity.desc(), Movie.id)
+            .limit(limit)
+        ).mappings().all()
+        match = "fuzzy"
+
+    return [{**row, "score": float(row["score"]), "match": match} for row in rows]
+
+
+def suggest_titles(session, prefix, limit=DEFAULT_LIMIT):
+    """
+    Completes a partially typed title.
+
+    Titles starting with the prefix come first; titles that merely resemble it
+    follow, so a typo in the prefix still produces suggestions.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to query with.
+        prefix (str): What the user typed so far.
+        limit (int): Maximum number of suggestions.
+
+    Returns:
+        list of dict: The id and title of each suggestion, best first.
+    """
+    starts_with = Movie.title.ilike(_escape_like(prefix) + "%")
+    similarity = func.similarity(Movie.title, prefix)
+    rows = session.execute(
+        select(Movie.id, Movie.title)
+        .where(starts_with | Movie.title.op("%")(prefix))
+        .order_by(starts_with.desc(), similarity.desc(), Movie.title, Movie.id)
+        .limit(limit)
+    ).mappings().all()
+    return [dict(row) for row in rows]
@@ -0,0 +1,402 @@
+"""
+services/similar_movies.py
+--------------------------
+
+Content-based "more like this" over movie summaries, cast and director.
+
+Each movie is turned into a TF-IDF vector over hashed tokens: words of the
+summary, and whole names of the director and cast members, which weigh more
+than a single summary word. A fixed Gaussian random projection compresses those
+sparse vectors into short dense float32 vectors whose dot products approximate
+the TF-IDF cosine similarities.
+
+The vectors are grouped into inverted lists around spherical k-means centroids
+(an IVF index) and saved as plain ``.npy`` files. Workers open them with
+``np.load(mmap_mode="r")``, so every gunicorn worker on a host shares a single
+copy through the page cache. A query only scores the movies in the few lists
+whose centroids are closest to the query movie, which keeps it to a few
+milliseconds on half a million movies. Small catalogs are searched exhaustively.
+
+Builds write into a fresh version directory and then switch the ``CURRENT``
+pointer file atomically; running workers pick up the new version on their next
+query after ``SimilarMovieIndex.reload_interval`` seconds.
+
+Classes:
+    SimilarMovieIndex: Loads the published index and answers top-K queries.
+
+Functions:
+    movie_features(movies, batch_size): Hashed TF-IDF matrix of movie metadata.
+    build_index(session, directory, ...): Build and publish a new index.
+    with_details(session, matches): Listing details of matched movies.
+
+Attributes:
+    similar_movies (SimilarMovieIndex): The instance the app queries.
+"""
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+from sqlalchemy import select
+
+from models.database import Movie
+
+HASH_BUCKETS = 2**17
+DEFAULT_DIMENSIONS = 128
+# The lists grow as the square root of the catalog; 32 of them keep recall@10
+# near 0.94 on half a million movies (``benchmarks.similar``), 8 only near 0.7
+DEFAULT_PROBES = 32
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+# Catalogs up to this size are searched exhaustively
+EXACT_SEARCH_LIMIT = 20000
+KMEANS_ITERATIONS = 10
+BUILD_BATCH_SIZE = 5000
+PROJECTION_SEED = 20231031
+RELOAD_INTERVAL = 30.0
+# Published versions kept on disk; workers may still be reading the previous one
+KEEP_VERSIONS = 2
+
+FIELD_WEIGHTS = {"summary": 1.0, "cast": 2.0, "director": 3.0}
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has he her his in into is it its of "
+    "on or she that the their them they this to was were when where which who "
+    "will with".split()
+)
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def _tokens(movie):
+    """Yields (token, field weight) pairs of a movie's metadata."""
+    for word in WORD_PATTERN.findall((movie.get("summary") or "").lower()):
+        if len(word) > 2 and word not in STOP_WORDS:
+            yield f"w:{word}", FIELD_WEIGHTS["summary"]
+    for name in (movie.get("cast") or "").split(","):
+        if name.strip():
+            yield f"c:{name.strip().lower()}", FIELD_WEIGHTS["cast"]
+    if (movie.get("director") or "").strip():
+        yield f"d:{movie['director'].strip().lower()}", FIELD_WEIGHTS["director"]
+
+
+def _token_counts(movies):
+    """Weighted token counts of a batch of movies as a sparse matrix."""
+    # scipy is only needed to build the index; serving workers never import it
+    import scipy.sparse as sp  # pylint: disable=import-outside-toplevel
+
+    rows, columns, weights = [], [], []
+    for row, movie in enumerate(movies):
+        for token, weight in _tokens(movie):
+            # crc32 is stable across processes, unlike hash()
+            rows.append(row)
+            columns.append(zlib.crc32(token.encode()) % HASH_BUCKETS)
+            weights.append(weight)
+    return sp.csr_matrix(
+        (np.asarray(weights, dtype=np.float32), (rows, columns)),
+        shape=(len(movies), HASH_BUCKETS),
+    )
+
+
+def movie_features(movies, batch_size=BUILD_BATCH_SIZE):
+    """
+    Builds the hashed TF-IDF matrix of a sequence of movies.
+
+    Movies are tokenized ``batch_size`` at a time, so only the sparse counts of
+    the whole catalog are held in memory, never all of its text.
+
+    Parameters:
+        movies (iterable of dict): Movies with "summary", "cast" and "director".
+        batch_size (int): Movies tokenized at a time.
+
+    Returns:
+        scipy.sparse.csr_matrix: One L2-normalized row per movie, in input order.
+    """
+    import scipy.sparse as sp  # pylint: disable=import-outside-toplevel
+
+    blocks, batch = [], []
+    for movie in movies:
+        batch.append(movie)
+        if len(batch) == batch_size:
+            blocks.append(_token_counts(batch))
+            batch = []
+    blocks.append(_token_counts(batch))
+    counts = sp.vstack(blocks, format="csr")
+    counts.data = 1.0 + np.log(counts.data, dtype=np.float32)
+
+    frequencies = np.bincount(counts.indices, minlength=HASH_BUCKETS)
+    idf = np.log((1.0 + counts.shape[0]) / (1.0 + frequencies)) + 1.0
+    features = (counts @ sp.diags(idf.astype(np.float32))).tocsr()
+
+    norms = np.sqrt(np.asarray(features.multiply(features).sum(axis=1)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return (sp.diags(inverse.astype(np.float32)) @ features).tocsr()
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def _project(features, dimensions):
+    rng = np.random.default_rng(PROJECTION_SEED)
+    projection = rng.standard_normal((HASH_BUCKETS, dimensions), dtype=np.float32)
+    vectors = np.empty((features.shape[0], dimensions), dtype=np.float32)
+    for start in range(0, features.shape[0], BUILD_BATCH_SIZE):
+        end = start + BUILD_BATCH_SIZE
+        vectors[start:end] = features[start:end] @ projection
+    return _normalize(vectors)
+
+
+def _assign(vectors, centroids):
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), BUILD_BATCH_SIZE):
+        end = start + BUILD_BATCH_SIZE
+        lists[start:end] = np.argmax(vectors[start:end] @ centroids.T, axis=1)
+    return lists
+
+
+def _kmeans(vectors, clusters):
+    """Spherical k-means on a sample of the vectors."""
+    rng = np.random.default_rng(PROJECTION_SEED)
+    sample = vectors[
+        rng.choice(len(vectors), min(len(vectors), clusters * 50), replace=False)
+    ]
+    centroids = sample[rng.choice(len(sample), clusters, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        lists = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, lists, sample)
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def _stream_movies(session, ids):
+    """Streams the metadata of every movie, appending each id to ``ids``."""
+    statement = (
+        select(Movie.id, Movie.summary, Movie.cast, Movie.director)
+        .order_by(Movie.id)
+        .execution_options(yield_per=BUILD_BATCH_SIZE)
+    )
+    for row in session.execute(statement).mappings():
+        ids.append(row["id"])
+        yield row
+
+
+def _save(directory, arrays):
+    """Writes the arrays into a new version directory and publishes it."""
+    os.makedirs(directory, exist_ok=True)
+    version = tempfile.mkdtemp(prefix=time.strftime("index-%Y%m%d%H%M%S-"), dir=directory)
+    for name, array in arrays.items():
+        np.save(os.path.join(version, f"{name}.npy"), array)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as pointer:
+        pointer.write(os.path.basename(version))
+    os.replace(tmp_path, os.path.join(directory, "CURRENT"))
+
+    versions = sorted(name for name in os.listdir(directory) if name.startswith("index-"))
+    for name in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return version
+
+
+def build_index(session, directory, dimensions=DEFAULT_DIMENSIONS, lists=None):
+    """
+    Builds the similarity index of the whole catalog and publishes it.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to read movies with.
+        directory (str): Where index versions are kept.
+        dimensions (int): Length of the stored vectors.
+        lists (int): Number of inverted lists; defaults to the square root of
+            the number of movies.
+
+    Returns:
+        dict: Number of movies and lists, and the published version directory.
+    """
+    ids = []
+    features = movie_features(_stream_movies(session, ids))
+    ids = np.array(ids, dtype=np.int64)
+    vectors = _project(features, dimensions)
+
+    lists = lists or max(1, int(np.sqrt(len(ids))))
+    lists = min(lists, max(1, len(ids)))
+    if len(ids):
+        centroids = _kmeans(vectors, lists)
+        assignment = _assign(vectors, centroids)
+    else:
+        centroids = np.zeros((1, dimensions), dtype=np.float32)
+        assignment = np.zeros(0, dtype=np.int32)
+
+    # Store each inverted list as one contiguous block of rows
+    order = np.argsort(assignment, kind="stable")
+    offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+    ids = ids[order]
+
+    version = _save(
+        directory,
+        {
+            "vectors": vectors[order],
+            "ids": ids,
+            "lookup": np.argsort(ids, kind="stable"),
+            "centroids": centroids,
+            "offsets": offsets.astype(np.int64),
+        },
+    )
+    return {"movies": len(ids), "lists": len(centroids), "version": version}
+
+
+class SimilarMovieIndex:
+    """
+    Read side of the index: memory-maps the published version and answers queries.
+
+    Attributes:
+        directory: Where index versions are kept, or None if not configured.
+        probes: Number of inverted lists scanned per query.
+        reload_interval: Seconds between checks for a newer published version.
+    """
+
+    def __init__(self, directory=None, probes=DEFAULT_PROBES):
+        self.directory = directory
+        self.probes = probes
+        self.reload_interval = RELOAD_INTERVAL
+        self._arrays = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Configures the index from the app config.
+
+        Configuration:
+            SIMILAR_INDEX_DIR: Where index versions are kept.
+            SIMILAR_INDEX_PROBES: Inverted lists scanned per query.
+
+        Parameters:
+            app (Flask): The application.
+        """
+        self.directory = app.config.get("SIMILAR_INDEX_DIR")
+        self.probes = app.config.get("SIMILAR_INDEX_PROBES", DEFAULT_PROBES)
+        app.extensions["similar_movies"] = self
+
+    def _current_version(self):
+        try:
+            with open(os.path.join(self.directory, "CURRENT"), encoding="utf-8") as pointer:
+                return pointer.read().strip()
+        except OSError:
+            return None
+
+    def _load(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._arrays is not None and now - self._checked_at < self.reload_interval:
+                return self._arrays
+            self._checked_at = now
+
+            version = self._current_version() if self.directory else None
+            if version and version != self._version:
+                path = os.path.join(self.directory, version)
+                self._arrays = {
+                    name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                    for name in ("vectors", "ids", "lookup", "centroids", "offsets")
+                }
+                self._version = version
+            return self._arrays
+
+    def available(self):
+        """
+        Tells whether a published index could be loaded.
+
+        Returns:
+            bool: True if queries can be answered.
+        """
+        return self._load() is not None
+
+    def _scan(self, arrays, row):
+        """
+        Scores the movies of the inverted lists closest to a movie's vector.
+
+        Returns:
+            tuple: Rows and similarities of the scanned movies, but the movie's.
+        """
+        vectors, offsets = arrays["vectors"], arrays["offsets"]
+        query = np.asarray(vectors[row])
+        if len(vectors) <= EXACT_SEARCH_LIMIT:
+            blocks = [(0, len(vectors))]
+        else:
+            closeness = arrays["centroids"] @ query
+            probes = min(self.probes, len(closeness))
+            nearest = np.argpartition(-closeness, probes - 1)[:probes]
+            blocks = [(offsets[i], offsets[i + 1]) for i in nearest]
+
+        rows = np.concatenate([np.arange(start, end) for start, end in blocks])
+        scores = np.concatenate([vectors[start:end] @ query for start, end in blocks])
+        keep = rows != row
+        return rows[keep], scores[keep]
+
+    def similar(self, movie_id, limit=DEFAULT_LIMIT):
+        """
+        Finds the movies whose metadata is most similar to a movie's.
+
+        Parameters:
+            movie_id (int): The movie to find neighbours of.
+            limit (int): Maximum number of movies returned.
+
+        Returns:
+            list of tuple: (movie id, similarity) pairs, most similar first, or
+            None if there is no index or the movie is not in it.
+        """
+        arrays = self._load()
+        if arrays is None:
+            return None
+        ids, lookup = arrays["ids"], arrays["lookup"]
+        position = np.searchsorted(ids, movie_id, sorter=lookup)
+        if position >= len(ids) or ids[lookup[position]] != movie_id:
+            return None
+        row = int(lookup[position])
+
+        rows, scores = self._scan(arrays, row)
+        if len(scores) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            rows, scores = rows[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return [
+            (int(movie), float(score))
+            for movie, score in zip(ids[rows[order]], scores[order])
+        ]
+
+
+def with_details(session, matches):
+    """
+    Adds the listing details of each matched movie, in one query.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to query with.
+        matches (list of tuple): (movie id, similarity) pairs.
+
+    Returns:
+        list of dict: The id, title, release date, poster URL and similarity of
+        each movie still in the catalog, in the order of ``matches``.
+    """
+    rows = {
+        row["id"]: row
+        for row in session.execute(
+            select(Movie.id, Movie.title, Movie.release_date, Movie.poster_url).where(
+                Movie.id.in_([movie_id for movie_id, _ in matches])
+            )
+        ).mappings()
+    }
+    return [
+        {**rows[movie_id], "score": score}
+        for movie_id, score in matches
+        if movie_id in rows
+    ]
+
+
+similar_movies = SimilarMovieIndex()
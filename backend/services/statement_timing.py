@@ -0,0 +1,71 @@
+"""
+services/statement_timing.py
+----------------------------
+
+Times every SQL statement from SQLAlchemy engine events, for the services that
+observe statements: ``services.metrics`` and ``services.query_profiler``.
+
+One set of engine hooks times each statement once, whoever observes it. The
+start times are kept on the connection, as a stack, and a failed statement
+drops its own.
+
+Functions:
+    observe_statements(observer): Call an observer with every statement's time.
+"""
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_observers = ()
+_lock = threading.Lock()
+
+
+def observe_statements(observer):
+    """
+    Calls ``observer`` after every statement any engine runs, in the thread
+    that ran it.
+
+    The engine hooks are installed with the first observer. Registering an
+    observer again has no effect.
+
+    Parameters:
+        observer (callable): Takes the SQL text and the seconds it took.
+    """
+    global _observers  # pylint: disable=global-statement
+    with _lock:
+        if observer not in _observers:
+            # Replaced rather than appended to, so hooks iterate without the lock
+            _observers = (*_observers, observer)
+        for name, hook in (
+            ("before_cursor_execute", _before_cursor_execute),
+            ("after_cursor_execute", _after_cursor_execute),
+            ("handle_error", _handle_error),
+        ):
+            if not event.contains(Engine, name, hook):
+                # The hooks take the event's arguments by keyword
+                event.listen(Engine, name, hook, named=True)
+
+
+def _before_cursor_execute(**event_args):
+    event_args["conn"].info.setdefault("statement_started", []).append(
+        time.perf_counter()
+    )
+
+
+def _after_cursor_execute(**event_args):
+    started = event_args["conn"].info.get("statement_started")
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    for observer in _observers:
+        observer(event_args["statement"], seconds)
+
+
+def _handle_error(exception_context):
+    # The statement failed, so after_cursor_execute will not see it
+    if exception_context.connection is not None:
+        started = exception_context.connection.info.get("statement_started")
+        if started:
+            started.pop()
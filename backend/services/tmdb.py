@@ -0,0 +1,289 @@
+"""
+services/tmdb.py
+----------------
+
+Access to The Movie Database (TMDB) discover API.
+
+Requests go through the shared outbound client (``services.http_client``), so
+they reuse pooled keep-alive connections, time out, and are retried on 429 and
+5xx answers, and through TMDB's circuit breaker (``services.resilience``), so
+an unhealthy TMDB is failed fast and slow calls are hedged.
+
+Besides fetching a single page of horror movies, this module provides a streaming
+backfill: a generator that walks every page of every year in a range and hands
+each page to the caller as soon as it arrives. Progress is recorded in a small
+cursor file after each page is handled, so an interrupted backfill resumes from
+the page after the last one that was written. A page that cannot be fetched
+stops the backfill with ``TMDBError`` instead of being taken for the end of its
+year, so nothing is skipped and the saved position is kept for the retry.
+
+Classes:
+    TMDBError: Raised when a page cannot be fetched.
+    BackfillCursor: Persists the (year, page) position of a backfill per range.
+
+Functions:
+    fetch_discover_page(api_key, year, page): Fetch one page of horror movies.
+    iter_discover_pages(api_key, start_year, end_year, start_after): Stream pages.
+    backfill(api_key, start_year, end_year, handle_batch, cursor): Resumable backfill.
+"""
+import json
+import logging
+import os
+
+from services.http_client import RETRY_STATUSES, http_client
+from services.resilience import ProviderError, providers
+
+TMDB_DISCOVER_URL = "https://api.themoviedb.org/3/discover/movie"
+POSTER_BASE_URL = "https://image.tmdb.org/t/p/original"
+HORROR_GENRE_ID = 27
+MAX_DISCOVER_PAGE = 500  # TMDB refuses to serve pages past 500
+
+logger = logging.getLogger(__name__)
+
+
+class TMDBError(Exception):
+    """Raised when TMDB fails, refuses or cannot be reached for a request."""
+
+
+def parse_movie(movie):
+    """
+    Picks the fields we store from a TMDB discover result.
+
+    Parameters:
+        movie (dict): A single entry of the "results" list.
+
+    Returns:
+        dict: The TMDB id, title, poster URL, release date and summary.
+    """
+    poster_path = movie.get("poster_path")
+    return {
+        "id": movie["id"],
+        "title": movie["title"],
+        "poster_url": f"{POSTER_BASE_URL}{poster_path}" if poster_path else None,
+        "release_date": movie.get("release_date") or None,
+        "summary": movie.get("overview") or None,
+    }
+
+
+def fetch_discover_page(api_key, year, page):
+    """
+    Fetches one page of English-language horror movies released in a year.
+
+    Parameters:
+        api_key (str): TMDB API key.
+        year (int): Release year to filter on.
+        page (int): 1-based page number.
+
+    Returns:
+        tuple: The list of parsed movies and the total number of pages TMDB
+        reports for the year. The list is only empty past the last page.
+
+    Raises:
+        TMDBError: If the request failed, was answered with an error status, or
+            was rejected because TMDB's circuit is open.
+    """
+    params = {
+        "api_key": api_key,
+        "with_genres": HORROR_GENRE_ID,
+        "page": page,
+        "year": year,
+        "with_original_language": "en",
+    }
+    result = providers.get("tmdb").call(
+        http_client.get,
+        TMDB_DISCOVER_URL,
+        params=params,
+        is_failure=lambda response: response.status_code in RETRY_STATUSES,
+    )
+    try:
+        response = result.unwrap()
+    except ProviderError as e:
+        logger.error("Failed to fetch movies, TMDB %s: %s", result.status, result.error)
+        raise TMDBError(f"{year} page {page}: {e}") from e
+
+    if response.status_code != 200:
+        logger.error(
+            "Failed to fetch movies, Status Code: %s, Response: %s",
+            response.status_code,
+            response.text,
+        )
+        raise TMDBError(
+            f"{year} page {page}: TMDB answered with status {response.status_code}"
+        )
+
+    data = response.json()
+    movies = [parse_movie(movie) for movie in data.get("results", [])]
+    return movies, min(data.get("total_pages", 0), MAX_DISCOVER_PAGE)
+
+
+def iter_discover_pages(api_key, start_year, end_year, start_after=None):
+    """
+    Streams every discover page for a range of years, one page at a time.
+
+    Only the page being yielded is held in memory, however many pages there are.
+
+    Parameters:
+        api_key (str): TMDB API key.
+        start_year (int): First release year to walk (inclusive).
+        end_year (int): Last release year to walk (inclusive).
+        start_after (tuple): Optional (year, page) of the last page already handled;
+            streaming resumes with the page after it.
+
+    Yields:
+        tuple: (year, page, movies) for every non-empty page.
+
+    Raises:
+        TMDBError: If a page cannot be fetched; the pages yielded so far stand.
+    """
+    for year in range(start_year, end_year + 1):
+        page = 1
+        if start_after is not None:
+            last_year, last_page = start_after
+            if year < last_year:
+                continue
+            if year == last_year:
+                page = last_page + 1
+
+        while page <= MAX_DISCOVER_PAGE:
+            movies, total_pages = fetch_discover_page(api_key, year, page)
+            if not movies:
+                break
+            yield year, page, movies
+            if page >= total_pages:
+                break
+            page += 1
+
+
+class BackfillCursor:
+    """
+    Persists the positions of backfills in a small JSON file.
+
+    For each year range, the cursor names the last (year, page) that was fully
+    handled, so a backfill of one range never resumes from the position of
+    another. The file is written atomically so a crash never leaves a
+    half-written file behind.
+
+    Attributes:
+        path: Location of the cursor file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def _key(start_year, end_year):
+        return f"{start_year}-{end_year}"
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as cursor_file:
+                data = json.load(cursor_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable backfill cursor %s: %s", self.path, e)
+            return {}
+        if not isinstance(data.get("ranges"), dict):
+            logger.warning("Ignoring backfill cursor %s without ranges", self.path)
+            return {}
+        return data["ranges"]
+
+    def _write(self, ranges):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as cursor_file:
+            json.dump({"ranges": ranges}, cursor_file)
+        os.replace(tmp_path, self.path)
+
+    def load(self, start_year, end_year):
+        """
+        Reads the saved position of a year range.
+
+        Parameters:
+            start_year (int): First release year of the range.
+            end_year (int): Last release year of the range.
+
+        Returns:
+            tuple: The (year, page) of the last handled page, or None if there is
+            no saved position for this range.
+        """
+        position = self._read().get(self._key(start_year, end_year))
+        if position is None:
+            return None
+        return position["year"], position["page"]
+
+    def save(self, start_year, end_year, year, page):
+        """
+        Records that the given page of a year range has been handled.
+
+        Parameters:
+            start_year (int): First release year of the range.
+            end_year (int): Last release year of the range.
+            year (int): Release year of the page.
+            page (int): Page number.
+        """
+        ranges = self._read()
+        ranges[self._key(start_year, end_year)] = {"year": year, "page": page}
+        self._write(ranges)
+
+    def clear(self, start_year, end_year):
+        """
+        Removes the saved position of a year range, so that its next backfill
+        starts from scratch.
+
+        Parameters:
+            start_year (int): First release year of the range.
+            end_year (int): Last release year of the range.
+        """
+        ranges = self._read()
+        if ranges.pop(self._key(start_year, end_year), None) is None:
+            return
+        if ranges:
+            self._write(ranges)
+        else:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def backfill(api_key, start_year, end_year, handle_batch, cursor):
+    """
+    Walks every page of a year range, handing each page to ``handle_batch``.
+
+    The cursor is saved after each batch has been handled, and a backfill of
+    the same range that is started again continues after the last saved page.
+    Once the whole range has been walked its position is cleared; a backfill
+    stopped by an error keeps it.
+
+    Parameters:
+        api_key (str): TMDB API key.
+        start_year (int): First release year to walk (inclusive).
+        end_year (int): Last release year to walk (inclusive).
+        handle_batch (callable): Called with the list of movies of each page.
+        cursor (BackfillCursor): Where progress is persisted.
+
+    Returns:
+        int: Number of pages handled by this call.
+
+    Raises:
+        TMDBError: If a page cannot be fetched. Exceptions raised by
+            ``handle_batch`` propagate as well; in both cases the cursor stays
+            on the last page that was handled.
+    """
+    start_after = cursor.load(start_year, end_year)
+    if start_after is not None:
+        logger.info("Resuming backfill after year %s page %s", *start_after)
+
+    pages = 0
+    for year, page, movies in iter_discover_pages(
+        api_key, start_year, end_year, start_after=start_after
+    ):
+        handle_batch(movies)
+        cursor.save(start_year, end_year, year, page)
+        pages += 1
+
+    cursor.clear(start_year, end_year)
+    return pages
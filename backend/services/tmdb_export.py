@@ -0,0 +1,356 @@
+"""
+services/tmdb_export.py
+-----------------------
+
+Bulk import of movies from a TMDB daily ID export.
+
+TMDB publishes a gzipped file listing every movie each day
+(``movie_ids_MM_DD_YYYY.json.gz``), one JSON object per line, e.g.
+``{"adult": false, "id": 3924, "original_title": "Blondie", "popularity": 2.4,
+"video": false}``. Seeding the catalog from it takes no API calls at all.
+
+The file is streamed through a pipeline of generators:
+
+1. ``read_export`` decompresses and parses it line by line;
+2. ``select_movies`` drops adult titles, videos, unpopular titles and titles
+   missing from the allow-list;
+3. ``export_rows`` turns each remaining object into a ``(tmdb_id, title)`` row.
+
+The rows are loaded in batches. Each batch is streamed with ``COPY`` into a
+temporary staging table, then merged into ``movies`` with a single
+``INSERT ... SELECT ... ON CONFLICT (tmdb_id) DO NOTHING``, and committed. No
+stage holds more than one line and the COPY buffer, so memory stays flat
+however long the file is.
+
+The export has no genres, dates or posters, so it cannot pick out horror movies
+by itself, and unfiltered it holds about a million titles. An import therefore
+needs a popularity threshold, an allow-list of TMDB ids (``read_ids``), or both.
+Imported movies have their ``source`` set to "tmdb_export". Movies already in
+the catalog are left as they are, since the API ingest stores richer, localized
+details; it fills those in for imported movies by their TMDB id.
+
+Classes:
+    ImportStats: Counters of an import.
+
+Functions:
+    read_export(path, stats): Parse an export file line by line.
+    read_ids(path): Read an allow-list of TMDB ids.
+    select_movies(movies, stats, ...): Filter parsed export objects.
+    export_rows(movies, stats): Turn export objects into ``movies`` rows.
+    import_export(connection, path, ...): Load an export into ``movies``.
+"""
+import gzip
+import itertools
+import json
+import logging
+import time
+
+from sqlalchemy import text
+
+from services.catalog_version import bump_versions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 50000
+TITLE_LENGTH = 200  # Length of movies.title
+SOURCE = "tmdb_export"  # movies.source of imported movies
+
+_CREATE_STAGING = text(
+    "CREATE TEMPORARY TABLE IF NOT EXISTS movie_import"
+    " (tmdb_id integer NOT NULL, title text NOT NULL)"
+)
+_COPY_STAGING = "COPY movie_import (tmdb_id, title) FROM STDIN"
+_MERGE_STAGING = text(
+    f"""
+    WITH inserted AS (
+        INSERT INTO movies (tmdb_id, title, source)
+        SELECT tmdb_id, left(title, {TITLE_LENGTH}), '{SOURCE}' FROM movie_import
+        ON CONFLICT (tmdb_id) DO NOTHING
+        RETURNING 1
+    )
+    SELECT count(*) FROM inserted
+    """
+)
+
+# Characters with a meaning in COPY's text format; NUL cannot be stored at all
+_COPY_ESCAPES = str.maketrans(
+    {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\x00": ""}
+)
+
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
+class ImportStats:
+    """
+    Counters of an import, filled in as the pipeline runs.
+
+    Attributes:
+        lines: Non-blank lines read from the file.
+        malformed: Lines that were not a movie object with an id and a title.
+        filtered: Movies dropped by ``select_movies``.
+        staged: Rows copied into the staging table.
+        inserted: Movies added to the catalog.
+        existing: Staged rows whose TMDB id was already in the catalog.
+        batches: Batches merged and committed.
+        seconds: Time taken so far.
+    """
+
+    def __init__(self):
+        self.lines = 0
+        self.malformed = 0
+        self.filtered = 0
+        self.staged = 0
+        self.inserted = 0
+        self.existing = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    def as_dict(self):
+        """
+        Converts the counters to a dictionary.
+
+        Returns:
+            dict: The counters, with the lines and rows read per second.
+        """
+        seconds = self.seconds or float("inf")
+        return {
+            "lines": self.lines,
+            "malformed": self.malformed,
+            "filtered": self.filtered,
+            "staged": self.staged,
+            "inserted": self.inserted,
+            "existing": self.existing,
+            "batches": self.batches,
+            "seconds": round(self.seconds, 2),
+            "lines_per_second": round(self.lines / seconds),
+            "rows_per_second": round(self.staged / seconds),
+        }
+
+
+def read_export(path, stats):
+    """
+    Parses an export file one line at a time.
+
+    Parameters:
+        path (str): The export; gzipped if the name ends with ".gz".
+        stats (ImportStats): Counts the lines and the unparsable ones.
+
+    Yields:
+        dict: The object on each line.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            stats.lines += 1
+            try:
+                movie = json.loads(line)
+            except ValueError:
+                stats.malformed += 1
+                continue
+            if isinstance(movie, dict):
+                yield movie
+            else:
+                stats.malformed += 1
+
+
+def read_ids(path):
+    """
+    Reads an allow-list of TMDB ids, one per line.
+
+    Blank lines and lines starting with "#" are skipped.
+
+    Parameters:
+        path (str): The allow-list file.
+
+    Returns:
+        frozenset of int: The ids listed.
+
+    Raises:
+        ValueError: If a line is not an integer.
+    """
+    with open(path, encoding="utf-8") as file:
+        lines = (line.strip() for line in file)
+        return frozenset(int(line) for line in lines if line and line[0] != "#")
+
+
+# pylint: disable=too-many-arguments,too-many-positional-arguments
+def select_movies(
+    movies,
+    stats,
+    min_popularity=None,
+    ids=None,
+    include_adult=False,
+    include_video=False,
+):
+    """
+    Filters export objects.
+
+    Parameters:
+        movies (iterable of dict): Parsed export objects.
+        stats (ImportStats): Counts the dropped movies.
+        min_popularity (float): Lowest TMDB popularity kept; None keeps any.
+        ids (set of int): TMDB ids kept; None keeps any.
+        include_adult (bool): Keep movies flagged as adult.
+        include_video (bool): Keep entries flagged as videos rather than films.
+
+    Yields:
+        dict: The movies kept.
+    """
+    for movie in movies:
+        excluded = (movie.get("adult") and not include_adult) or (
+            movie.get("video") and not include_video
+        )
+        obscure = (
+            min_popularity is not None
+            and (movie.get("popularity") or 0) < min_popularity
+        )
+        unlisted = ids is not None and movie.get("id") not in ids
+        if excluded or obscure or unlisted:
+            stats.filtered += 1
+            continue
+        yield movie
+
+
+def export_rows(movies, stats):
+    """
+    Turns export objects into ``movies`` rows.
+
+    Parameters:
+        movies (iterable of dict): Export objects.
+        stats (ImportStats): Counts the objects without a usable id or title.
+
+    Yields:
+        tuple: The TMDB id and title of each movie.
+    """
+    for movie in movies:
+        tmdb_id = movie.get("id")
+        title = movie.get("title") or movie.get("original_title")
+        if (
+            not isinstance(tmdb_id, int)
+            or isinstance(tmdb_id, bool)
+            or not isinstance(title, str)
+            or not title.strip()
+        ):
+            stats.malformed += 1
+            continue
+        yield tmdb_id, title.strip()
+
+
+# pylint: disable=too-few-public-methods
+class _CopyStream:
+    """A file ``copy_expert`` reads from, rendering rows as COPY text on demand."""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = bytearray()
+        self.rows = 0
+
+    def read(self, size=-1):
+        """
+        Renders rows until ``size`` bytes are buffered, and hands them out.
+
+        Parameters:
+            size (int): Bytes wanted; negative for all remaining rows.
+
+        Returns:
+            bytes: At most ``size`` bytes of COPY text; empty once exhausted.
+        """
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            tmdb_id, title = row
+            self._buffer += f"{tmdb_id}\t{title.translate(_COPY_ESCAPES)}\n".encode()
+            self.rows += 1
+        if size < 0:
+            size = len(self._buffer)
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return chunk
+
+
+# pylint: disable=too-many-arguments,too-many-positional-arguments
+def import_export(
+    connection,
+    path,
+    min_popularity=None,
+    ids=None,
+    include_adult=False,
+    include_video=False,
+    batch_size=DEFAULT_BATCH_SIZE,
+):
+    """
+    Loads the movies of an export file into ``movies``, one batch at a time.
+
+    Each batch is copied into the staging table, merged and committed on its
+    own, so an interrupted import keeps the batches already done and can simply
+    be run again. At least one of ``min_popularity`` and ``ids`` is required,
+    so a missing filter cannot load the whole export.
+
+    Parameters:
+        connection (Connection): A SQLAlchemy connection to PostgreSQL; the
+            staging table lives as long as it does.
+        path (str): The export file.
+        min_popularity (float): Lowest TMDB popularity imported.
+        ids (set of int): Allow-list of the TMDB ids imported.
+        include_adult (bool): Import movies flagged as adult.
+        include_video (bool): Import entries flagged as videos.
+        batch_size (int): Rows copied and merged per transaction.
+
+    Returns:
+        ImportStats: What was read, dropped and written.
+
+    Raises:
+        ValueError: If neither ``min_popularity`` nor ``ids`` is given.
+    """
+    if min_popularity is None and ids is None:
+        raise ValueError("A minimum popularity or an allow-list of ids is required")
+
+    stats = ImportStats()
+    started = time.perf_counter()
+    rows = export_rows(
+        select_movies(
+            read_export(path, stats),
+            stats,
+            min_popularity,
+            ids,
+            include_adult,
+            include_video,
+        ),
+        stats,
+    )
+
+    connection.execute(_CREATE_STAGING)
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        while True:
+            connection.execute(text("TRUNCATE movie_import"))
+            stream = _CopyStream(itertools.islice(rows, batch_size))
+            cursor.copy_expert(_COPY_STAGING, stream)
+            if not stream.rows:
+                break
+            inserted = connection.execute(_MERGE_STAGING).scalar()
+            if inserted:
+                bump_versions(connection, ["movies"])
+            connection.commit()
+
+            stats.batches += 1
+            stats.staged += stream.rows
+            stats.inserted += inserted
+            stats.existing += stream.rows - inserted
+            stats.seconds = time.perf_counter() - started
+            logger.info(
+                "Imported %s rows (%s new), %s rows/s",
+                stats.staged,
+                stats.inserted,
+                round(stats.staged / stats.seconds),
+            )
+    finally:
+        cursor.close()
+
+    if stats.inserted:
+        connection.execute(text("ANALYZE movies"))
+    connection.commit()
+    stats.seconds = time.perf_counter() - started
+    return stats
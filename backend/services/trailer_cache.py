@@ -0,0 +1,285 @@
+"""
+services/trailer_cache.py
+-------------------------
+
+A two-tier cache in front of the YouTube trailer search.
+
+Every ``search().list`` call costs 100 units of YouTube quota and a network round
+trip, while most ingest runs ask for titles that were already resolved. Searches
+name the release year next to the title, so a remake and the original find their
+own trailers, and results are keyed on the normalized title plus that year and
+kept in:
+
+* an in-memory LRU tier, private to the worker process, and
+* the ``trailer_lookups`` table, shared by every worker and surviving restarts.
+
+Searches that found nothing are cached too ("negative caching"), with a shorter
+time-to-live so a trailer published later is still picked up.
+
+Classes:
+    TrailerCache: The cache itself, with hit/miss counters.
+
+Functions:
+    lookup_key(title, release_date): Build the cache key for a movie.
+    search_query(title, release_date): Build the YouTube search text for a movie.
+    video_id_from_url(url): Extract the video id from a YouTube watch URL.
+    watch_url(video_id): Build the YouTube watch URL for a video id.
+
+Attributes:
+    trailer_cache (TrailerCache): The instance ingest jobs look trailers up in.
+"""
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlparse
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from extensions import db
+from models.database import TrailerLookup
+
+SEARCH_QUOTA_COST = 100  # YouTube quota units per search().list call
+DEFAULT_TTL = timedelta(days=30)
+DEFAULT_NEGATIVE_TTL = timedelta(days=1)
+DEFAULT_MAX_ENTRIES = 10000
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def lookup_key(title, release_date=None):
+    """
+    Builds the cache key for a movie from its title and release year.
+
+    Case, punctuation and repeated whitespace are ignored, so "The Nun II" and
+    "the nun ii!" share an entry.
+
+    Parameters:
+        title (str): Title of the movie.
+        release_date (str): Optional ISO release date; only the year is used.
+
+    Returns:
+        str: The cache key.
+    """
+    normalized = _NON_WORD.sub(" ", title.casefold()).strip()
+    year = (release_date or "")[:4]
+    return f"{normalized}|{year}"
+
+
+def search_query(title, release_date=None):
+    """
+    Builds the YouTube search text for a movie from its title and release year.
+
+    The query holds what ``lookup_key`` is built from, so every search answers
+    for exactly one cache entry.
+
+    Parameters:
+        title (str): Title of the movie.
+        release_date (str): Optional ISO release date; only the year is used.
+
+    Returns:
+        str: The search text, e.g. "Halloween 1978 trailer".
+    """
+    year = (release_date or "")[:4]
+    return " ".join(part for part in (title, year, "trailer") if part)
+
+
+def video_id_from_url(url):
+    """
+    Extracts the video id from a YouTube watch URL.
+
+    Parameters:
+        url (str): A URL of the form https://www.youtube.com/watch?v=<id>.
+
+    Returns:
+        str: The video id, or None if the URL has none.
+    """
+    return parse_qs(urlparse(url).query).get("v", [None])[0]
+
+
+def watch_url(video_id):
+    """
+    Builds the YouTube watch URL for a video id.
+
+    Parameters:
+        video_id (str): The YouTube video id.
+
+    Returns:
+        str: The watch URL.
+    """
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+# pylint: disable=too-many-instance-attributes
+class TrailerCache:
+    """
+    Maps lookup keys to YouTube video ids, with TTL expiry and LRU eviction.
+
+    The in-memory tier is guarded by a lock so it can be shared between threads;
+    the database tier goes through the Flask-SQLAlchemy session and therefore has
+    to be used from a thread with an app context.
+
+    Attributes:
+        ttl: How long a found trailer stays valid.
+        negative_ttl: How long a "no trailer found" result stays valid.
+        max_entries: Size limit of the in-memory tier.
+    """
+
+    def __init__(
+        self,
+        ttl=DEFAULT_TTL,
+        negative_ttl=DEFAULT_NEGATIVE_TTL,
+        max_entries=DEFAULT_MAX_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        """
+        Configures the expiry and size of the cache from the app config.
+
+        Configuration:
+            TRAILER_CACHE_TTL_DAYS: Days a found trailer stays valid.
+            TRAILER_CACHE_NEGATIVE_TTL_HOURS: Hours a "no trailer found" result
+                stays valid.
+            TRAILER_CACHE_SIZE: Size limit of the in-memory tier.
+
+        Parameters:
+            app (Flask): The application.
+        """
+        self.ttl = timedelta(
+            days=app.config.get("TRAILER_CACHE_TTL_DAYS", DEFAULT_TTL.days)
+        )
+        self.negative_ttl = timedelta(
+            hours=app.config.get(
+                "TRAILER_CACHE_NEGATIVE_TTL_HOURS",
+                DEFAULT_NEGATIVE_TTL // timedelta(hours=1),
+            )
+        )
+        self.max_entries = app.config.get("TRAILER_CACHE_SIZE", DEFAULT_MAX_ENTRIES)
+        app.extensions["trailer_cache"] = self
+
+    def _is_fresh(self, video_id, fetched_at, now):
+        if fetched_at.tzinfo is None:
+            fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+        ttl = self.ttl if video_id is not None else self.negative_ttl
+        return fetched_at + ttl > now
+
+    def _remember(self, key, video_id, fetched_at):
+        self._memory[key] = (video_id, fetched_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get_many(self, keys):
+        """
+        Looks up many keys at once, memory first and then a single database query.
+
+        Parameters:
+            keys (iterable of str): Keys built with ``lookup_key``.
+
+        Returns:
+            dict: Key to video id for every fresh entry. A value of None means the
+            search is known to find nothing; keys that are absent are misses.
+        """
+        now = datetime.now(timezone.utc)
+        found = {}
+        remaining = []
+
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._memory.get(key)
+                if entry is not None and self._is_fresh(*entry, now):
+                    self._memory.move_to_end(key)
+                    found[key] = entry[0]
+                else:
+                    remaining.append(key)
+
+        if remaining:
+            rows = db.session.execute(
+                select(
+                    TrailerLookup.lookup_key,
+                    TrailerLookup.video_id,
+                    TrailerLookup.fetched_at,
+                ).where(TrailerLookup.lookup_key.in_(remaining))
+            )
+            with self._lock:
+                for key, video_id, fetched_at in rows:
+                    if self._is_fresh(video_id, fetched_at, now):
+                        self._remember(key, video_id, fetched_at)
+                        found[key] = video_id
+
+        with self._lock:
+            self.misses += len(remaining) - sum(1 for key in remaining if key in found)
+            for video_id in found.values():
+                if video_id is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+        return found
+
+    def put_many(self, entries):
+        """
+        Stores the outcome of fresh searches in both tiers.
+
+        Parameters:
+            entries (dict): Key to video id, with None for searches that found nothing.
+        """
+        if not entries:
+            return
+
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for key, video_id in entries.items():
+                self._remember(key, video_id, now)
+
+        statement = insert(TrailerLookup).values(
+            [
+                {"lookup_key": key, "video_id": video_id, "fetched_at": now}
+                for key, video_id in entries.items()
+            ]
+        )
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[TrailerLookup.lookup_key],
+                set_={
+                    "video_id": statement.excluded.video_id,
+                    "fetched_at": statement.excluded.fetched_at,
+                },
+            )
+        )
+        db.session.commit()
+
+    def stats(self):
+        """
+        Reports the cache counters.
+
+        Returns:
+            dict: Hits, negative hits, misses, evictions, the hit ratio, the size
+            of the in-memory tier and the YouTube quota the hits saved.
+        """
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (
+                    (self.hits + self.negative_hits) / lookups if lookups else 0.0
+                ),
+                "memory_entries": len(self._memory),
+                "quota_saved": (self.hits + self.negative_hits) * SEARCH_QUOTA_COST,
+            }
+
+
+trailer_cache = TrailerCache()
@@ -0,0 +1,233 @@
+"""
+services/writer.py
+------------------
+
+Set-based writer for ingested movies and trailers.
+
+Instead of adding and committing one ``Movie`` at a time, movies are written in
+batches with a single PostgreSQL ``INSERT ... ON CONFLICT`` per batch, keyed on
+the TMDB id. Rows whose values did not change are left untouched, which lets the
+writer report how many rows were inserted, updated or already up to date.
+Trailers found for the movies are written into ``trailers`` the same way.
+
+Classes:
+    WriteCounts: Inserted/updated/unchanged totals of a write.
+
+Functions:
+    movie_row(movie): Convert ingested movie details into a ``movies`` row.
+    upsert_movies(session, movies, batch_size): Write movies and their trailers.
+"""
+from datetime import date
+
+from sqlalchemy import func, literal_column, or_, select
+from sqlalchemy.dialects.postgresql import insert
+
+from models.database import Movie, Trailer
+from services.catalog_version import discard_table_changes
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Columns the ingest path owns; everything else on a movie is left alone
+UPSERT_COLUMNS = ("title", "poster_url", "trailer_url", "release_date", "summary")
+
+
+class WriteCounts:
+    """
+    Totals of a write, split by what happened to each row.
+
+    Attributes:
+        inserted: Movies that did not exist yet.
+        updated: Existing movies whose values changed.
+        unchanged: Existing movies that were already up to date.
+        trailers_inserted: Trailers that did not exist yet.
+        trailers_unchanged: Trailers that were already stored.
+    """
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.trailers_inserted = 0
+        self.trailers_unchanged = 0
+
+    def add(self, other):
+        """
+        Adds the totals of another write to this one.
+
+        Parameters:
+            other (WriteCounts): The totals to add.
+        """
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.trailers_inserted += other.trailers_inserted
+        self.trailers_unchanged += other.trailers_unchanged
+
+    def as_dict(self):
+        """
+        Returns the totals as a JSON-serialisable dict.
+
+        Returns:
+            dict: The totals, keyed by attribute name.
+        """
+        return {
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "trailers_inserted": self.trailers_inserted,
+            "trailers_unchanged": self.trailers_unchanged,
+        }
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def movie_row(movie):
+    """
+    Converts ingested movie details into a row for the ``movies`` table.
+
+    Parameters:
+        movie (dict): Movie details as built by ``services.tmdb.parse_movie``,
+            optionally with a "trailer_url".
+
+    Returns:
+        dict: Column values keyed by column name.
+    """
+    return {
+        "tmdb_id": movie["id"],
+        "title": movie["title"],
+        "poster_url": movie.get("poster_url"),
+        "trailer_url": movie.get("trailer_url"),
+        "release_date": _parse_date(movie.get("release_date")),
+        "summary": movie.get("summary"),
+    }
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _upsert_movie_batch(session, rows):
+    """
+    Writes one batch of movie rows with a single statement.
+
+    Returns:
+        tuple: The WriteCounts of the batch and a dict of TMDB id to movie id for
+        the rows that were inserted or updated.
+    """
+    # A Core insert: an ORM one cannot return the literal xmax column below
+    columns = Movie.__table__.c
+    statement = insert(Movie.__table__).values(rows)
+    excluded = statement.excluded
+
+    # A missing trailer never clears one found by an earlier ingest
+    values = {name: excluded[name] for name in UPSERT_COLUMNS}
+    values["trailer_url"] = func.coalesce(excluded.trailer_url, columns.trailer_url)
+    changed = or_(
+        *(columns[name].is_distinct_from(value) for name, value in values.items())
+    )
+
+    written = session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[columns.tmdb_id],
+            # ON CONFLICT updates skip Column.onupdate, so set updated_at here
+            set_={**values, "updated_at": func.now()},
+            where=changed,
+        ).returning(
+            columns.id,
+            columns.tmdb_id,
+            # xmax is only zero for rows this statement inserted
+            literal_column("xmax = 0").label("inserted"),
+        )
+    ).all()
+
+    counts = WriteCounts()
+    counts.inserted = sum(1 for row in written if row.inserted)
+    counts.updated = len(written) - counts.inserted
+    counts.unchanged = len(rows) - len(written)
+    return counts, {row.tmdb_id: row.id for row in written}
+
+
+def _insert_trailer_batch(session, rows, movie_ids):
+    """
+    Writes the trailers of one batch, skipping the ones already stored.
+
+    Returns:
+        WriteCounts: Counts with only the trailer totals filled in.
+    """
+    trailers = [
+        {"movie_id": movie_ids[row["tmdb_id"]], "url": row["trailer_url"]}
+        for row in rows
+        if row["trailer_url"] and row["tmdb_id"] in movie_ids
+    ]
+    counts = WriteCounts()
+    if not trailers:
+        return counts
+
+    inserted = session.execute(
+        insert(Trailer)
+        .values(trailers)
+        .on_conflict_do_nothing(index_elements=[Trailer.movie_id, Trailer.url])
+        .returning(Trailer.id)
+    ).all()
+    counts.trailers_inserted = len(inserted)
+    counts.trailers_unchanged = len(trailers) - len(inserted)
+    return counts
+
+
+def upsert_movies(session, movies, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Inserts or updates movies, and their trailers, in set-based batches.
+
+    Each batch is written with one statement for the movies and one for their
+    trailers, and committed on its own. Duplicate TMDB ids within the input are
+    collapsed, keeping the last occurrence.
+
+    Parameters:
+        session (Session): The SQLAlchemy session to write with.
+        movies (iterable of dict): Movie details as built by
+            ``services.tmdb.parse_movie``, optionally with a "trailer_url".
+        batch_size (int): Maximum number of movies per statement.
+
+    Returns:
+        WriteCounts: Totals over all batches.
+    """
+    rows = list({row["tmdb_id"]: row for row in map(movie_row, movies)}.values())
+    totals = WriteCounts()
+
+    for batch in _chunks(rows, batch_size):
+        counts, movie_ids = _upsert_movie_batch(session, batch)
+
+        # Unchanged rows are not returned by the upsert; look up the ids of the
+        # ones that still need a trailer written
+        missing = [
+            row["tmdb_id"]
+            for row in batch
+            if row["trailer_url"] and row["tmdb_id"] not in movie_ids
+        ]
+        if missing:
+            movie_ids.update(
+                session.execute(
+                    select(Movie.tmdb_id, Movie.id).where(Movie.tmdb_id.in_(missing))
+                ).all()
+            )
+
+        counts.add(_insert_trailer_batch(session, batch, movie_ids))
+
+        unchanged_tables = []
+        if not (counts.inserted or counts.updated):
+            unchanged_tables.append(Movie.__tablename__)
+        if not counts.trailers_inserted:
+            unchanged_tables.append(Trailer.__tablename__)
+        discard_table_changes(session, unchanged_tables)
+        session.commit()
+        totals.add(counts)
+
+    return totals
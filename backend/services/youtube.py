@@ -0,0 +1,120 @@
+"""
+services/youtube.py
+-------------------
+
+Lazily built YouTube Data API client.
+
+Building the client used to happen in ``create_app``: every worker imported
+``googleapiclient``, then read and parsed the discovery document, even when it
+only ever served catalog reads. Now nothing is imported or parsed until the first
+trailer search, and the client is built from a discovery document on disk
+(``YOUTUBE_DISCOVERY_PATH`` if set, else the copy shipped with
+``google-api-python-client``), never fetched over the network.
+
+Under ``gunicorn --preload`` the master calls ``preload`` once, so the library
+and the parsed document are inherited by every forked worker. Each worker still
+builds its own client, since the client's HTTP connections must not be shared
+across a fork.
+
+Classes:
+    LazyYouTubeClient: Flask extension building the client on first use.
+
+Attributes:
+    youtube_client (LazyYouTubeClient): The client the app searches with.
+"""
+import json
+import threading
+
+API_NAME = "youtube"
+API_VERSION = "v3"
+
+
+class LazyYouTubeClient:
+    """
+    Builds the YouTube client on first use, from a discovery document on disk.
+
+    Attributes:
+        api_key: The YouTube Data API key.
+        discovery_path: Discovery document to build from, or None for the copy
+            packaged with the client library.
+    """
+
+    def __init__(self):
+        self.api_key = None
+        self.discovery_path = None
+        self._document = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Configures the client from the app config; nothing is built yet.
+
+        Parameters:
+            app (Flask): The application.
+        """
+        self.api_key = app.config.get("YOUTUBE_API_KEY")
+        self.discovery_path = app.config.get("YOUTUBE_DISCOVERY_PATH")
+        self._document = None
+        self._client = None
+        app.extensions["youtube_client"] = self
+
+    def _load_document(self):
+        if self.discovery_path:
+            with open(self.discovery_path, encoding="utf-8") as document:
+                return json.load(document)
+
+        # pylint: disable=import-outside-toplevel
+        from googleapiclient.discovery_cache import get_static_doc
+
+        document = get_static_doc(API_NAME, API_VERSION)
+        if document is None:
+            raise RuntimeError(
+                f"No discovery document is packaged for {API_NAME} {API_VERSION}; "
+                "set youtube_discovery_path."
+            )
+        return json.loads(document)
+
+    def preload(self):
+        """
+        Imports the client library and parses the discovery document now.
+
+        Meant for the gunicorn master under ``--preload``, so that forked
+        workers inherit both instead of each doing the work again.
+        """
+        # pylint: disable=import-outside-toplevel,unused-import
+        import googleapiclient.discovery  # noqa: F401
+
+        with self._lock:
+            if self._document is None:
+                self._document = self._load_document()
+
+    def get(self):
+        """
+        Returns the client, building it on the first call.
+
+        Safe to call from several threads; the client is built once.
+
+        Returns:
+            googleapiclient.discovery.Resource: The YouTube client.
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    # pylint: disable=import-outside-toplevel
+                    from googleapiclient.discovery import build_from_document
+
+                    if self._document is None:
+                        self._document = self._load_document()
+                    self._client = build_from_document(
+                        self._document, developerKey=self.api_key
+                    )
+        return self._client
+
+    @property
+    def built(self):
+        """bool: True once the client has been built in this process."""
+        return self._client is not None
+
+
+youtube_client = LazyYouTubeClient()
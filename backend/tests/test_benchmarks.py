@@ -0,0 +1,82 @@
+"""
+tests/test_benchmarks.py
+------------------------
+
+Tests of the load-test tooling in ``benchmarks``: the fake upstreams, the load
+generator and the comparison of results.
+"""
+import threading
+
+import pytest
+import requests
+from werkzeug.serving import make_server
+
+from benchmarks.compare import compare
+from benchmarks.load import percentiles, run_load
+from models.database import Movie
+
+
+@pytest.fixture(name="live_server")
+def live_server_fixture(app, session):
+    """The app served over HTTP on a free port, with three movies; its base URL."""
+    session.add_all(Movie(title=f"Movie {number}") for number in range(1, 4))
+    session.commit()
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    thread.join()
+
+
+def test_fake_upstreams_inject_faults(fake_upstream):
+    """Faults set over HTTP shape the answers, and every answer is counted."""
+    _, base_url = fake_upstream
+    discover = f"{base_url}/3/discover/movie"
+
+    assert requests.get(discover, timeout=5).status_code == 200
+    faults = {"tmdb": {"error_rate": 1, "error_status": 502}}
+    assert requests.post(f"{base_url}/_faults", json=faults, timeout=5).ok
+    assert requests.get(discover, timeout=5).status_code == 502
+    unknown = {"tmdb": {"boom": 1}}
+    answer = requests.post(f"{base_url}/_faults", json=unknown, timeout=5)
+    assert answer.status_code == 400
+
+    served = requests.get(f"{base_url}/_stats", timeout=5).json()
+    assert served == {"tmdb:200": 1, "tmdb:502": 1}
+
+
+def test_load_reports_every_route_of_a_mix(live_server):
+    """A short run of the detail mix hits both of its routes without errors."""
+    report = run_load(live_server, "detail", concurrency=2, duration=0.5)
+
+    assert set(report["routes"]) == {"detail", "details_batch"}
+    assert report["overall"]["requests"] > 0
+    assert report["overall"]["errors"] == 0
+    assert report["overall"]["statuses"] == {"200": report["overall"]["requests"]}
+
+
+def test_percentiles_in_milliseconds():
+    """Percentiles index the sorted samples; an empty run reports None."""
+    latencies = [index / 1000 for index in range(100, 0, -1)]
+
+    assert percentiles(latencies) == {
+        "p50_ms": 51.0,
+        "p95_ms": 96.0,
+        "p99_ms": 100.0,
+        "max_ms": 100.0,
+    }
+    assert set(percentiles([]).values()) == {None}
+
+
+def test_compare_flags_changes_in_the_wrong_direction():
+    """Slower latencies and lower throughput beyond the threshold are regressions."""
+    baseline = {"load": {"p95_ms": 10.0, "throughput_rps": 100.0, "requests": 5}}
+    current = {"load": {"p95_ms": 10.5, "throughput_rps": 80.0, "requests": 9}}
+
+    rows = {row["path"]: row for row in compare(baseline, current)}
+
+    assert set(rows) == {"load.p95_ms", "load.throughput_rps"}
+    assert rows["load.p95_ms"]["change_pct"] == 5.0
+    assert not rows["load.p95_ms"]["regression"]
+    assert rows["load.throughput_rps"]["regression"]
@@ -0,0 +1,138 @@
+"""
+tests/test_catalog.py
+---------------------
+
+Tests of the keyset-paginated movie listing in ``services.catalog``, on
+PostgreSQL.
+"""
+import base64
+from datetime import date
+
+import pytest
+
+from models.database import Movie
+from services.catalog import CatalogQueryError, MovieListing, encode_cursor
+
+# Repeated values and NULLs in every sort key, so pages end inside ties and
+# inside the NULL segment
+MOVIES = [
+    ("Alien", "Scott", date(1979, 5, 25), 8.5),
+    ("Halloween", "Carpenter", date(1978, 10, 25), 7.7),
+    ("Halloween", "Green", date(2018, 10, 19), None),
+    ("The Thing", "Carpenter", date(1982, 6, 25), 8.2),
+    ("The Fog", "Carpenter", None, 6.8),
+    ("Hereditary", "Aster", date(2018, 6, 8), 7.3),
+    ("Midsommar", "Aster", None, None),
+    ("Scream", "Craven", date(1996, 12, 20), 7.4),
+    ("Suspiria", "Argento", date(1977, 2, 1), 7.4),
+    ("Us", "Peele", date(2019, 3, 22), None),
+    ("Get Out", "Peele", None, 7.8),
+    ("Nope", "Peele", date(2022, 7, 22), 6.8),
+    ("It", "Muschietti", None, None),
+]
+SORTS = ("id", "title", "release_date", "rating")
+PAGE_SIZE = 3
+
+
+@pytest.fixture(name="movies")
+def movies_fixture(session):
+    """Stores ``MOVIES``; returns them as dicts with their ids."""
+    stored = [
+        Movie(title=title, director=director, release_date=released, rating=rating)
+        for title, director, released, rating in MOVIES
+    ]
+    session.add_all(stored)
+    session.commit()
+    return [
+        {
+            "id": movie.id,
+            "title": movie.title,
+            "director": movie.director,
+            "release_date": movie.release_date,
+            "rating": movie.rating,
+        }
+        for movie in stored
+    ]
+
+
+def expected_ids(movies, sort, descending):
+    """Ids in listing order: NULLs last ascending, first descending."""
+    ordered = sorted(
+        movies,
+        key=lambda movie: (
+            (movie[sort] is None, movie[sort] or 0, movie["id"])
+            if sort != "title"
+            else (movie["title"], movie["id"])
+        ),
+    )
+    if descending:
+        ordered.reverse()
+    return [movie["id"] for movie in ordered]
+
+
+def walk(session, **args):
+    """Fetches every page of a listing; returns the ids and the page count."""
+    args = {"fields": "id", "limit": str(PAGE_SIZE), **args}
+    ids, pages = [], 0
+    while True:
+        rows, cursor = MovieListing(args).fetch(session)
+        ids.extend(row["id"] for row in rows)
+        pages += 1
+        if cursor is None:
+            return ids, pages
+        args["cursor"] = cursor
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("sort", SORTS)
+def test_pages_cover_every_movie_once_in_order(session, movies, sort, descending):
+    """Walking the cursors visits every movie once, in the sort order."""
+    ids, pages = walk(session, sort=f"-{sort}" if descending else sort)
+
+    assert ids == expected_ids(movies, sort, descending)
+    assert pages == -(-len(MOVIES) // PAGE_SIZE)
+
+
+@pytest.mark.parametrize(
+    "args, keep",
+    [
+        ({"title": "hal"}, lambda movie: movie["title"].startswith("Hal")),
+        ({"director": "Carpenter"}, lambda movie: movie["director"] == "Carpenter"),
+        (
+            {"year": "2018"},
+            lambda movie: movie["release_date"] is not None
+            and movie["release_date"].year == 2018,
+        ),
+        (
+            {"min_rating": "7.4"},
+            lambda movie: movie["rating"] is not None and movie["rating"] >= 7.4,
+        ),
+    ],
+)
+def test_filters_apply_to_every_page(session, movies, args, keep):
+    """A filtered walk lists exactly the matching movies, in order."""
+    for sort in ("-release_date", "rating"):
+        ids, _ = walk(session, sort=sort, limit="1", **args)
+        kept = [movie for movie in movies if keep(movie)]
+
+        assert ids == expected_ids(kept, sort.lstrip("-"), sort.startswith("-"))
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        {"cursor": "not a cursor!"},
+        {"cursor": base64.urlsafe_b64encode(b'{"id": 1}').decode()},
+        {"cursor": encode_cursor([1])},
+        {"sort": "rating", "cursor": encode_cursor([1, 2, 3])},
+        {"sort": "release_date", "cursor": encode_cursor(["yesterday", 1])},
+        {"sort": "length"},
+        {"limit": "0"},
+        {"fields": "id,password_hash"},
+    ],
+)
+def test_invalid_parameters_are_rejected(args):
+    """Malformed or mismatched cursors and unknown options raise."""
+    args = {"sort": "title", **args}
+    with pytest.raises(CatalogQueryError):
+        MovieListing(args)
@@ -0,0 +1,96 @@
+"""
+tests/test_conditional_get.py
+-----------------------------
+
+Tests of the ETag / Last-Modified validation ``services.catalog_version`` adds to
+``/api/movies``, on PostgreSQL.
+"""
+from datetime import timedelta
+
+import pytest
+
+from models.database import Movie, Review, Trailer, User
+
+
+@pytest.fixture(name="client")
+def client_fixture(app, session):
+    """A test client of the app, with one movie stored."""
+    session.add(Movie(title="Alien"))
+    session.commit()
+    return app.test_client()
+
+
+def test_matching_etag_is_not_modified(client):
+    """A request naming the current ETag gets an empty 304 with the same ETag."""
+    first = client.get("/api/movies")
+
+    again = client.get("/api/movies", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert first.status_code == 200
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+
+def test_unchanged_since_is_not_modified(client):
+    """Last-Modified as If-Modified-Since is a 304; an earlier date is not."""
+    first = client.get("/api/movies")
+    last_modified = first.last_modified
+
+    unchanged = client.get(
+        "/api/movies", headers={"If-Modified-Since": first.headers["Last-Modified"]}
+    )
+    earlier = client.get(
+        "/api/movies", headers={"If-Modified-Since": last_modified - timedelta(1)}
+    )
+
+    assert unchanged.status_code == 304
+    assert earlier.status_code == 200
+
+
+def test_if_none_match_takes_precedence(client):
+    """A stale ETag gets the full response even with a current date."""
+    first = client.get("/api/movies")
+
+    response = client.get(
+        "/api/movies",
+        headers={
+            "If-None-Match": '"stale"',
+            "If-Modified-Since": first.headers["Last-Modified"],
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.get_json() == first.get_json()
+
+
+def test_etag_changes_once_a_movie_is_committed(client, session):
+    """A committed change to movies makes the held ETag stale."""
+    first = client.get("/api/movies")
+    session.add(Movie(title="Aliens"))
+    session.commit()
+
+    response = client.get(
+        "/api/movies", headers={"If-None-Match": first.headers["ETag"]}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != first.headers["ETag"]
+    assert [movie["title"] for movie in response.get_json()] == ["Alien", "Aliens"]
+
+
+def test_review_changes_bump_the_movies_version(client, session):
+    """Reviews change movie ratings through a trigger, so they bump movies too."""
+    session.add(User(username="viewer", email="viewer@example.com", password_hash="x"))
+    session.add(Trailer(movie_id=1, url="t/1"))
+    session.commit()
+    first = client.get("/api/movies")
+
+    session.add(Review(user_id=1, trailer_id=1, rating=8.0))
+    session.commit()
+    response = client.get(
+        "/api/movies", headers={"If-None-Match": first.headers["ETag"]}
+    )
+
+    assert response.status_code == 200
+    assert response.get_json()[0]["rating"] == 8.0
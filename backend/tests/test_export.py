@@ -0,0 +1,57 @@
+"""
+tests/test_export.py
+--------------------
+
+Tests of the streaming catalog export at ``/api/movies/export``, on PostgreSQL.
+"""
+import itertools
+import json
+
+from sqlalchemy.exc import OperationalError
+
+from models.database import Movie
+from services.catalog import MovieListing
+
+
+def add_movies(session, count):
+    """Stores ``count`` movies titled "Movie 1", "Movie 2", ..."""
+    session.add_all(Movie(title=f"Movie {number}") for number in range(1, count + 1))
+    session.commit()
+
+
+def export_lines(app, query=""):
+    """Fetches the export; returns the status and its lines, parsed."""
+    response = app.test_client().get(f"/api/movies/export{query}")
+    lines = response.text.splitlines()
+    return response.status_code, [json.loads(line) for line in lines]
+
+
+def test_export_streams_every_movie(app, session):
+    """Every movie is one line, with only the requested fields, in id order."""
+    add_movies(session, 3)
+
+    status, lines = export_lines(app, "?fields=title")
+
+    assert status == 200
+    assert lines == [{"title": "Movie 1"}, {"title": "Movie 2"}, {"title": "Movie 3"}]
+
+
+def test_failure_mid_stream_ends_with_an_error_line(app, session, monkeypatch):
+    """A database error after the 200 went out ends the body with an error line."""
+    add_movies(session, 3)
+
+    stream = MovieListing.stream
+
+    def failing_stream(listing, db_session):
+        yield from itertools.islice(stream(listing, db_session), 1)
+        raise OperationalError("FETCH", {}, Exception("connection lost"))
+
+    monkeypatch.setattr(MovieListing, "stream", failing_stream)
+
+    status, lines = export_lines(app, "?fields=title")
+
+    assert status == 200
+    assert lines == [
+        {"title": "Movie 1"},
+        {"error": "An error occurred exporting movies"},
+    ]
@@ -0,0 +1,131 @@
+"""
+tests/test_http_client.py
+-------------------------
+
+Tests of the pooled, retrying outbound client in ``services.http_client``,
+against the fake upstreams of ``benchmarks.fake_upstreams``.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import requests
+
+from services.http_client import Httplib2Adapter, HttpClient, http_client
+
+TMDB = "https://api.themoviedb.org/3/discover/movie"
+YOUTUBE = "https://youtube.googleapis.com/youtube/v3/search"
+
+
+def answer(headers):
+    """A response carrying ``headers``, to compute a retry delay from."""
+    response = requests.Response()
+    response.headers.update(headers)
+    return response
+
+
+def test_idempotent_requests_retry_until_the_retries_are_spent(outbound):
+    """A GET answered 503 is sent 1 + retries times and the last answer returned."""
+    upstreams = outbound(HTTP_MAX_RETRIES=2, HTTP_BACKOFF_SECONDS=0.01)
+    upstreams.set_faults({"tmdb": {"error_rate": 1}})
+
+    response = http_client.get(TMDB)
+    stats = http_client.stats()["api.themoviedb.org"]
+
+    assert response.status_code == 503
+    assert upstreams.served == {"tmdb:503": 3}
+    assert (stats["requests"], stats["retries"], stats["errors"]) == (3, 2, 3)
+
+
+def test_retries_stop_at_the_first_good_answer(outbound):
+    """Once the upstream recovers, the retry's answer is returned."""
+    upstreams = outbound(HTTP_BACKOFF_SECONDS=1.0)
+    upstreams.set_faults({"tmdb": {"error_rate": 1}})
+    # The first retry waits at least half the backoff
+    threading.Timer(0.2, upstreams.set_faults, [{"tmdb": {}}]).start()
+
+    response = http_client.get(TMDB, params={"year": 1978})
+
+    assert response.status_code == 200
+    assert response.json()["results"][0]["release_date"] == "1978-10-31"
+    assert upstreams.served == {"tmdb:503": 1, "tmdb:200": 1}
+
+
+def test_non_idempotent_requests_are_sent_once(outbound):
+    """A POST is not retried on an error status, unless retries are asked for."""
+    upstreams = outbound(HTTP_BACKOFF_SECONDS=0.01)
+    upstreams.set_faults({"tmdb": {"error_rate": 1}})
+
+    assert http_client.request("POST", TMDB).status_code == 503
+    assert upstreams.served == {"tmdb:503": 1}
+    assert http_client.request("POST", TMDB, retries=1).status_code == 503
+    assert upstreams.served == {"tmdb:503": 3}
+
+
+def test_retry_after_seconds_replace_the_backoff(outbound):
+    """``Retry-After: 0`` retries at once, however long the backoff would be."""
+    upstreams = outbound(HTTP_MAX_RETRIES=1, HTTP_BACKOFF_SECONDS=30)
+    upstreams.set_faults(
+        {"youtube": {"error_rate": 1, "error_status": 429, "retry_after": "0"}}
+    )
+
+    started = time.monotonic()
+    response = http_client.get(YOUTUBE)
+
+    assert response.status_code == 429
+    assert upstreams.served == {"youtube:429": 2}
+    assert time.monotonic() - started < 5
+
+
+def test_retry_delays():
+    """Delays double and are jittered, and Retry-After wins, up to the cap."""
+    client = HttpClient()
+    client.backoff, client.max_backoff = 1.0, 20.0
+    later = datetime.now(timezone.utc) + timedelta(seconds=12)
+    earlier = datetime.now(timezone.utc) - timedelta(seconds=12)
+
+    delay = client._retry_delay  # pylint: disable=protected-access
+
+    for retry in range(4):
+        assert 2**retry / 2 <= delay(retry, None) <= 2**retry
+    assert 10.0 <= delay(9, None) <= 20.0
+    assert delay(0, answer({"Retry-After": "7"})) == 7.0
+    assert delay(0, answer({"Retry-After": "600"})) == 20.0
+    assert 10 < delay(0, answer({"Retry-After": format_datetime(later, True)})) <= 12
+    assert delay(0, answer({"Retry-After": format_datetime(earlier, True)})) == 0.0
+    assert 0.5 <= delay(0, answer({"Retry-After": "soon"})) <= 1.0
+
+
+def test_httplib2_adapter_drops_the_headers_of_the_encoded_body(outbound):
+    """googleapiclient gets the decoded body without headers describing the encoding."""
+    outbound()
+
+    info, content = Httplib2Adapter(http_client).request(f"{YOUTUBE}?q=Alien")
+
+    assert info.status == 200
+    assert info["content-type"] == "application/json"
+    assert not {"content-length", "content-encoding"} & set(info)
+    assert content.startswith(b'{"items"')
+
+
+def test_pool_stats_count_opened_and_idle_connections(outbound):
+    """Sequential calls reuse one connection; a burst opens more than the pool keeps."""
+    upstreams = outbound(HTTP_POOL_SIZE=2)
+    for _ in range(3):
+        http_client.get(TMDB)
+    sequential = http_client.stats()["api.themoviedb.org"]
+
+    upstreams.set_faults({"tmdb": {"latency_ms": 300}})
+    burst = [threading.Thread(target=http_client.get, args=(TMDB,)) for _ in range(4)]
+    for thread in burst:
+        thread.start()
+    for thread in burst:
+        thread.join()
+    stats = http_client.stats()["api.themoviedb.org"]
+
+    assert sequential["connections_opened"] == sequential["idle_connections"] == 1
+    assert stats["pool_size"] == 2
+    assert stats["peak_in_flight"] == 4
+    assert stats["connections_opened"] == 4
+    assert stats["idle_connections"] == 2
@@ -0,0 +1,67 @@
+"""
+tests/test_incremental_recommender.py
+-------------------------------------
+
+Tests of ``services.incremental_recommender`` against a full recompute with
+``services.recommender``.
+"""
+import numpy as np
+
+from services.incremental_recommender import IncrementalRecommender
+from services.recommender import RatingMatrix
+
+USERS = 60
+MOVIES = 40
+
+
+def random_reviews(rng, count, users=USERS, movies=MOVIES):
+    """(user, movie, rating) triples, with ratings on the 0.5 to 10 scale."""
+    return list(
+        zip(
+            rng.integers(1, users + 1, count).tolist(),
+            rng.integers(1, movies + 1, count).tolist(),
+            (rng.integers(1, 21, count) / 2).tolist(),
+        )
+    )
+
+
+def loaded(reviews, neighbours=10, top_k=5):
+    """A recommender started from a full load of ``reviews``."""
+    recommender = IncrementalRecommender(top_k=top_k, neighbours=neighbours)
+    recommender.load(RatingMatrix.from_arrays(*zip(*reviews)))
+    return recommender
+
+
+def apply_batch(recommender, reviews):
+    """Applies reviews as ``poll`` does; returns the users it refreshed."""
+    for user, movie, rating in reviews:
+        recommender.apply(user, movie, rating)
+    return recommender.refresh()
+
+
+def test_batches_match_a_full_recompute():
+    """After every batch, neighbours and top-K lists equal a full recompute."""
+    rng = np.random.default_rng(12)
+    recommender = loaded(random_reviews(rng, 400))
+
+    # Later batches bring new users and movies, and ratings of rated movies
+    for batch in range(8):
+        reviews = random_reviews(rng, 50, USERS + 5 * batch, MOVIES + 3 * batch)
+        users = apply_batch(recommender, reviews)
+        report = recommender.verify()
+
+        assert users == {user for user, _, _ in reviews}
+        assert report["ok"], report
+
+
+def test_cancelled_deviations_leave_the_neighbour_lists():
+    """Movies stop being neighbours when their only co-rater's deviations vanish."""
+    recommender = loaded([(1, 1, 9.0), (1, 2, 1.0), (2, 1, 8.0), (2, 3, 4.0)])
+    assert recommender.verify()["ok"]
+
+    # User 1 now averages 5 on both movies, their own mean
+    apply_batch(recommender, [(1, 1, 1.0), (1, 2, 9.0)])
+    report = recommender.verify()
+
+    assert report["ok"], report
+    assert recommender.recommendations(2)[0].size == 0
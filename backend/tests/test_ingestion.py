@@ -0,0 +1,92 @@
+"""
+tests/test_ingestion.py
+-----------------------
+
+Tests of the concurrent trailer lookups in ``services.ingestion``, against the
+fake YouTube API with injected latency.
+"""
+import threading
+import time
+
+import requests
+
+from services.ingestion import IngestReport, lookup_trailers
+
+LATENCY_MS = 100
+MOVIES = [{"id": number, "title": f"Movie {number}"} for number in range(32)]
+
+
+def youtube_lookup(base_url, in_flight=None):
+    """A lookup searching the fake YouTube API, counting concurrent calls."""
+    lock = threading.Lock()
+
+    def lookup(movie):
+        if in_flight is not None:
+            with lock:
+                in_flight["now"] += 1
+                in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        try:
+            response = requests.get(
+                f"{base_url}/youtube/v3/search",
+                params={"q": f"{movie['title']} trailer"},
+                timeout=5,
+            )
+            response.raise_for_status()
+            video_id = response.json()["items"][0]["id"]["videoId"]
+            return f"https://www.youtube.com/watch?v={video_id}"
+        finally:
+            if in_flight is not None:
+                with lock:
+                    in_flight["now"] -= 1
+
+    return lookup
+
+
+def timed_run(lookup, max_workers):
+    """Runs every lookup; returns the results and the seconds taken."""
+    started = time.perf_counter()
+    results = list(lookup_trailers(MOVIES, lookup, max_workers=max_workers))
+    return results, time.perf_counter() - started
+
+
+def test_lookups_speed_up_near_linearly_with_workers(fake_upstream):
+    """Eight workers are close to eight times as fast as one."""
+    upstreams, base_url = fake_upstream
+    upstreams.set_faults({"youtube": {"latency_ms": LATENCY_MS}})
+    lookup = youtube_lookup(base_url)
+
+    serial, serial_seconds = timed_run(lookup, max_workers=1)
+    pooled, pooled_seconds = timed_run(lookup, max_workers=8)
+
+    assert all(result.ok for result in serial + pooled)
+    # One round trip per movie, against one per eight movies
+    assert serial_seconds >= len(MOVIES) * LATENCY_MS / 1000
+    assert serial_seconds / pooled_seconds > 5
+
+
+def test_lookups_never_exceed_max_workers(fake_upstream):
+    """No more lookups than ``max_workers`` are ever in flight."""
+    upstreams, base_url = fake_upstream
+    upstreams.set_faults({"youtube": {"latency_ms": 20}})
+    in_flight = {"now": 0, "max": 0}
+
+    results, _ = timed_run(youtube_lookup(base_url, in_flight), max_workers=4)
+
+    assert len(results) == len(MOVIES)
+    assert in_flight["max"] == 4
+
+
+def test_failed_lookups_are_reported_without_stopping_the_others(fake_upstream):
+    """A failing lookup becomes a failed result; the rest still succeed."""
+    upstreams, base_url = fake_upstream
+    upstreams.set_faults({"youtube": {"error_rate": 0.5}})
+    report = IngestReport()
+
+    results, _ = timed_run(youtube_lookup(base_url), max_workers=8)
+    for result in results:
+        report.add(result)
+
+    assert report.as_dict()["total"] == len(MOVIES)
+    assert 0 < report.failed < len(MOVIES)
+    assert all("503" in result.error for result in results if not result.ok)
+    assert all(result.trailer_url for result in results if result.ok)
@@ -0,0 +1,73 @@
+"""
+tests/test_jobs.py
+------------------
+
+Tests of the job leases in ``services.jobs``, on PostgreSQL.
+"""
+import time
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models.database import Job
+from services.jobs import RUNNING, SUCCEEDED, job_queue
+
+KIND = "test_job"
+LEASE = 0.6
+
+
+@pytest.fixture(name="handle")
+def handle_fixture(monkeypatch):
+    """Registers a handler for ``KIND`` jobs for one test, with a short lease."""
+    monkeypatch.setattr(job_queue, "lease", LEASE)
+
+    def register(handler):
+        monkeypatch.setitem(job_queue.handlers, KIND, handler)
+
+    return register
+
+
+def test_heartbeat_keeps_a_silent_job_leased(session, handle):
+    """A handler reporting no progress for several leases is not claimed again."""
+    claimed_meanwhile = []
+
+    def silent(options, progress):  # pylint: disable=unused-argument
+        time.sleep(3 * LEASE)
+        with Session(db.engine) as other:
+            claimed_meanwhile.append(job_queue.claim(other, "other-worker"))
+        return {"ok": True}
+
+    handle(silent)
+    job_id, _ = job_queue.enqueue(session, KIND)
+
+    assert job_queue.work(session, "worker") == 1
+    assert claimed_meanwhile == [None]
+    assert session.get(Job, job_id).status == SUCCEEDED
+
+
+def test_a_worker_that_lost_its_lease_keeps_its_hands_off(session, handle):
+    """Once another worker holds the job, the first one writes nothing to it."""
+
+    def overtaken(options, progress):  # pylint: disable=unused-argument
+        with Session(db.engine) as other:
+            other.execute(update(Job).values(locked_by="other-worker", attempts=2))
+            other.commit()
+        progress.add(steps=1)
+        progress.flush()
+        return {"ok": True}
+
+    handle(overtaken)
+    job_id, _ = job_queue.enqueue(session, KIND)
+    job = job_queue.claim(session, "worker")
+
+    assert job_queue.run(session, job) == RUNNING
+    session.expire_all()
+    job = session.get(Job, job_id)
+    assert (job.status, job.locked_by, job.progress, job.result) == (
+        RUNNING,
+        "other-worker",
+        {},
+        None,
+    )
@@ -0,0 +1,90 @@
+"""
+tests/test_metrics.py
+---------------------
+
+Tests of the Prometheus metrics of ``services.metrics`` and their ``/metrics``
+route, on PostgreSQL.
+"""
+import os
+import subprocess
+import sys
+
+from prometheus_client.parser import text_string_to_metric_families
+
+from models.database import Movie
+from services.metrics import Metrics
+from services.resilience import providers
+
+REQUESTS = "scarescreen_request_duration_seconds_count"
+REQUEST_QUERIES = "scarescreen_request_sql_queries_count"
+SQL_STATEMENTS = "scarescreen_sql_query_duration_seconds_count"
+PROVIDER_CALLS = "scarescreen_provider_call_duration_seconds_count"
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKERS = 2
+
+# Records one provider call in a process of its own, writing its samples to the
+# multiprocess directory given as its argument, as a gunicorn worker would
+WORKER = """
+import sys
+from flask import Flask
+from services.metrics import metrics
+from services.resilience import CallResult
+app = Flask("worker")
+app.config["METRICS_MULTIPROC_DIR"] = sys.argv[1]
+metrics.init_app(app)
+metrics.observe_call(CallResult("tmdb", "ok", elapsed=0.01))
+"""
+
+
+def sample(body, name, **labels):
+    """The value of the ``name`` sample with ``labels`` in a scrape, or 0."""
+    for family in text_string_to_metric_families(body.decode()):
+        for found in family.samples:
+            if found.name == name and labels.items() <= found.labels.items():
+                return found.value
+    return 0.0
+
+
+def scrape(client):
+    """Scrapes ``/metrics``, checking it answered in the Prometheus format."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    return response.data
+
+
+def test_scrape_reports_requests_sql_and_provider_calls(app, session):
+    """A request, its SQL and a provider call each show up in the next scrape."""
+    session.add(Movie(title="Alien"))
+    session.commit()
+    client = app.test_client()
+    endpoint = {"endpoint": "catalog.get_movies"}
+    before = scrape(client)
+
+    assert client.get("/api/movies").status_code == 200
+    providers.get("tmdb").call(lambda: "page")
+    after = scrape(client)
+
+    def increase(name, **labels):
+        return sample(after, name, **labels) - sample(before, name, **labels)
+
+    assert increase(REQUESTS, method="GET", status="200", **endpoint) == 1
+    assert increase(REQUEST_QUERIES, **endpoint) == 1
+    assert sample(after, "scarescreen_request_sql_queries_sum", **endpoint) >= 1
+    assert increase(SQL_STATEMENTS, statement="SELECT") >= 1
+    assert increase(PROVIDER_CALLS, provider="tmdb", outcome="ok") == 1
+
+
+def test_multiprocess_scrape_sums_every_process(tmp_path):
+    """With a multiprocess directory, a scrape sums the samples of every worker."""
+    directory = str(tmp_path / "metrics")
+    for _ in range(WORKERS):
+        subprocess.run(
+            [sys.executable, "-c", WORKER, directory], cwd=BACKEND, check=True
+        )
+
+    scraper = Metrics()
+    scraper.multiprocess_dir = directory
+    body, _ = scraper.render()
+
+    assert sample(body, PROVIDER_CALLS, provider="tmdb", outcome="ok") == WORKERS
@@ -0,0 +1,111 @@
+"""
+tests/test_migrations.py
+------------------------
+
+Tests of the migrations in ``migrations``, on PostgreSQL: they build the schema
+the models describe, and every hot query in ``migrations.check_plans`` is
+answered by an index.
+"""
+import logging
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from extensions import db
+from migrations import MIGRATIONS, applied_versions, upgrade
+from migrations.check_plans import check_plans
+
+SCHEMA = "migrations_test"
+
+# Rows written by the application before m0005 and m0006 existed
+EARLY_ROWS = (
+    "INSERT INTO users (username, email, password_hash)"
+    " VALUES ('viewer', 'viewer@example.com', 'x')",
+    "INSERT INTO movies (title, trailer_url, rating)"
+    " VALUES ('Reviewed', 't/1', NULL), ('Rated by hand', 't/2', 9.0)",
+    "INSERT INTO trailers (movie_id, url) VALUES (1, 't/1')",
+    "INSERT INTO reviews (user_id, trailer_id, rating) VALUES (1, 1, 4.0), (1, 1, 9.5)",
+    "INSERT INTO watchlists (user_id, movie_id) VALUES (1, 1), (1, 1), (1, 2)",
+)
+
+
+@pytest.fixture(name="fresh_engine")
+def fresh_engine_fixture(app):
+    """An engine whose tables go to a new, empty schema; dropped afterwards."""
+    with app.app_context():
+        url = db.engine.url
+    engine = create_engine(
+        url, connect_args={"options": f"-csearch_path={SCHEMA},public"}
+    )
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    yield engine
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+    engine.dispose()
+
+
+def test_migrations_build_the_schema_of_the_models(fresh_engine):
+    """Every table, column and named index of the models exists after migrating."""
+    upgrade(fresh_engine)
+    inspector = inspect(fresh_engine)
+
+    assert set(db.metadata.tables) <= set(inspector.get_table_names(schema=SCHEMA))
+    for table in db.metadata.sorted_tables:
+        columns = {
+            column["name"]: column["nullable"]
+            for column in inspector.get_columns(table.name, schema=SCHEMA)
+        }
+        assert columns == {
+            column.name: column.nullable for column in table.columns
+        }, table.name
+        indexes = {index["name"] for index in inspector.get_indexes(table.name, SCHEMA)}
+        assert {index.name for index in table.indexes} <= indexes, table.name
+
+
+def test_migrations_apply_once(fresh_engine):
+    """A second run finds nothing to do."""
+    assert upgrade(fresh_engine)
+    assert not upgrade(fresh_engine)
+
+
+def test_hot_queries_use_indexes(app):
+    """No hot query needs a sequential scan once the migrations are applied."""
+    with app.app_context(), db.engine.connect() as connection:
+        assert not check_plans(connection)
+
+
+def test_migrations_carry_existing_rows_forward(fresh_engine, caplog):
+    """
+    Duplicate watchlist entries are removed and logged, and existing reviews are
+    folded into the new rating aggregates.
+    """
+    with fresh_engine.begin() as connection:
+        applied_versions(connection)
+        for migration in MIGRATIONS[:4]:
+            migration.upgrade(connection)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, name) VALUES (:v, '')"),
+                {"v": migration.VERSION},
+            )
+        for statement in EARLY_ROWS:
+            connection.execute(text(statement))
+
+    with caplog.at_level(logging.WARNING):
+        upgrade(fresh_engine)
+
+    with fresh_engine.connect() as connection:
+        movies = connection.execute(
+            text(
+                "SELECT rating_sum, rating_count, rating, rating_histogram"
+                " FROM movies ORDER BY id"
+            )
+        ).all()
+        watchlists = connection.execute(text("SELECT count(*) FROM watchlists"))
+        assert watchlists.scalar() == 2
+    assert movies == [
+        (13.5, 2, 6.75, [0, 0, 0, 1, 0, 0, 0, 0, 0, 1]),
+        (0.0, 0, None, [0] * 10),
+    ]
+    assert "Removed 1 duplicate watchlists rows" in caplog.text
@@ -0,0 +1,112 @@
+"""
+tests/test_movie_details.py
+---------------------------
+
+Tests of the movie detail routes built by ``services.movie_details``, on
+PostgreSQL.
+"""
+import pytest
+
+from models.database import (
+    Movie,
+    PlatformTrailer,
+    Review,
+    StreamingPlatform,
+    Trailer,
+    User,
+)
+from services.movie_details import DEFAULT_REVIEW_LIMIT
+from services.query_profiler import query_budget
+
+# Trailers and reviews of the movies stored: none, one and many of each
+ROWS = {"none": 0, "one": 1, "many": 12}
+STATEMENTS = 4
+# Without any trailer there are no platform links to load
+STATEMENTS_WITHOUT_TRAILERS = 3
+
+
+@pytest.fixture(name="movies")
+def movies_fixture(session):
+    """
+    Stores a movie per entry of ``ROWS``, with that many trailers, each on two
+    platforms, and that many reviews.
+
+    Returns:
+        dict: Movie id per entry of ``ROWS``.
+    """
+    platforms = [StreamingPlatform(name="Shudder"), StreamingPlatform(name="Mubi")]
+    users = [
+        User(username=f"viewer{n}", email=f"viewer{n}@example.com", password_hash="x")
+        for n in range(max(ROWS.values()))
+    ]
+    session.add_all([*platforms, *users])
+    movies = {name: Movie(title=name.title()) for name in ROWS}
+    session.add_all(movies.values())
+    session.flush()
+
+    for name, count in ROWS.items():
+        trailers = [
+            Trailer(movie_id=movies[name].id, url=f"{name}/{n}") for n in range(count)
+        ]
+        session.add_all(trailers)
+        session.flush()
+        for trailer in trailers:
+            session.add_all(
+                PlatformTrailer(trailer_id=trailer.id, platform_id=platform.id)
+                for platform in platforms
+            )
+        session.add_all(
+            Review(user_id=user.id, trailer_id=trailers[0].id, rating=4.0)
+            for user in users[:count]
+        )
+    session.commit()
+    return {name: movie.id for name, movie in movies.items()}
+
+
+def statements(client, url):
+    """Requests ``url`` within the detail budget; returns the statement count."""
+    with query_budget(STATEMENTS) as profile:
+        response = client.get(url)
+    assert response.status_code == 200
+    return profile.count
+
+
+def test_movie_detail_statements_do_not_grow_with_its_rows(app, movies):
+    """A movie with many trailers and reviews costs what one with one of each does."""
+    client = app.test_client()
+    # Loads the catalog versions, which later requests read from memory
+    client.get(f"/api/movies/{movies['none']}")
+
+    counts = {
+        name: statements(client, f"/api/movies/{movie_id}")
+        for name, movie_id in movies.items()
+    }
+    many = client.get(f"/api/movies/{movies['many']}").get_json()
+
+    assert counts == {
+        "none": STATEMENTS_WITHOUT_TRAILERS,
+        "one": STATEMENTS,
+        "many": STATEMENTS,
+    }
+    assert len(many["trailers"]) == ROWS["many"]
+    assert all(len(trailer["platforms"]) == 2 for trailer in many["trailers"])
+    assert len(many["reviews"]) == DEFAULT_REVIEW_LIMIT
+    assert many["more_reviews"]
+
+
+def test_batch_detail_statements_do_not_grow_with_the_batch(app, movies):
+    """A batch of movies costs what one movie does, whatever rows they have."""
+    client = app.test_client()
+    client.get(f"/api/movies/details?ids={movies['none']}")
+    batches = [
+        [movies["none"]],
+        [movies["one"]],
+        [movies["none"], movies["one"], movies["many"]],
+    ]
+
+    counts = [
+        statements(client, f"/api/movies/details?ids={','.join(map(str, ids))}")
+        for ids in batches
+    ]
+
+    assert counts == [STATEMENTS_WITHOUT_TRAILERS, STATEMENTS, STATEMENTS]
@@ -0,0 +1,94 @@
+"""
+tests/test_notifications.py
+---------------------------
+
+Tests of the "now streaming" fan-out in ``services.notifications``, on
+PostgreSQL.
+"""
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+from models.database import (
+    Movie,
+    Notification,
+    PlatformTrailer,
+    StreamingPlatform,
+    Trailer,
+    User,
+    Watchlist,
+)
+from services import notifications
+from services.jobs import SUCCEEDED, job_queue
+from services.notifications import add_platform_availability
+
+WATCHERS = 3
+
+
+def add_watched_trailer(session):
+    """Stores a trailer, a platform and three users watching the movie."""
+    movie = Movie(title="Dead Hollow")
+    session.add_all([movie, StreamingPlatform(name="Shudder")])
+    session.flush()
+    session.add(Trailer(movie_id=movie.id, url="t/1"))
+    for number in range(1, WATCHERS + 1):
+        user = User(
+            username=f"user{number}", email=f"{number}@example.com", password_hash="x"
+        )
+        session.add(user)
+        session.flush()
+        session.add(Watchlist(user_id=user.id, movie_id=movie.id))
+    session.commit()
+
+
+def count(session, model):
+    """Number of stored rows of a model."""
+    return session.scalar(select(func.count()).select_from(model))
+
+
+def test_failed_fan_out_is_retried_with_its_links(session, monkeypatch):
+    """A fan-out failing midway records nothing, so the retry notifies everyone."""
+    add_watched_trailer(session)
+    notify_watchers = notifications.notify_watchers
+
+    def failing_notify_watchers(*args, **kwargs):
+        notify_watchers(*args, **kwargs)
+        raise OperationalError("INSERT", {}, Exception("connection lost"))
+
+    monkeypatch.setattr(notifications, "notify_watchers", failing_notify_watchers)
+    with pytest.raises(OperationalError):
+        add_platform_availability(session, [(1, 1)], chunk_size=1)
+    session.rollback()
+    assert count(session, PlatformTrailer) == 0
+    assert count(session, Notification) == 0
+
+    monkeypatch.undo()
+    totals = add_platform_availability(session, [(1, 1)], chunk_size=1)
+    again = add_platform_availability(session, [(1, 1)], chunk_size=1)
+
+    assert totals == {
+        "recorded": 1,
+        "changes": 1,
+        "watchlist_rows": WATCHERS,
+        "notifications": WATCHERS,
+    }
+    assert again["recorded"] == again["notifications"] == 0
+    assert count(session, Notification) == WATCHERS
+
+
+def test_platform_route_queues_the_fan_out(app, session):
+    """Posting platforms queues a job that records them and notifies watchers."""
+    add_watched_trailer(session)
+    client = app.test_client()
+
+    response = client.post("/api/trailers/1/platforms", json={"platform_ids": [1]})
+    assert response.status_code == 202
+    assert client.post("/api/trailers/1/platforms", json={}).status_code == 400
+
+    assert job_queue.work(db.session, "test-worker") == 1
+    job = client.get(response.headers["Location"]).get_json()
+
+    assert job["status"] == SUCCEEDED
+    assert job["result"]["notifications"] == WATCHERS
+    assert count(session, Notification) == WATCHERS
@@ -0,0 +1,149 @@
+"""
+tests/test_query_profiler.py
+----------------------------
+
+Tests of the statement shapes, query budgets and N+1 reports of
+``services.query_profiler``, on PostgreSQL.
+"""
+import logging
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+from services.query_profiler import (
+    QueryBudgetExceeded,
+    QueryProfiler,
+    profile_queries,
+    query_budget,
+    statement_shape,
+)
+
+LOOKUP = "SELECT title FROM movies WHERE id = :id"
+
+
+def run(engine, times):
+    """Runs the lookup of one movie ``times`` times, for a different id each."""
+    with engine.connect() as connection:
+        for movie_id in range(times):
+            connection.execute(text(LOOKUP), {"id": movie_id})
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(session):
+    """The engine of the test database."""
+    return session.get_bind()
+
+
+@pytest.fixture(name="profiled_app")
+def profiled_app_fixture(engine):
+    """
+    Builds an app with the profiler enabled and three routes: one lookup within
+    a budget of 1, three lookups within the same budget, and three lookups with
+    no budget declared.
+
+    Returns:
+        callable: Takes config overrides and returns the app.
+    """
+
+    def build(**config):
+        app = Flask("test")
+        app.testing = True
+        app.config.update(QUERY_PROFILER_ENABLED=True, **config)
+        profiler = QueryProfiler()
+        profiler.init_app(app)
+
+        @app.route("/one")
+        @profiler.budget(1)
+        def one():
+            run(engine, 1)
+            return "one"
+
+        @app.route("/three")
+        @profiler.budget(1)
+        def three():
+            run(engine, 3)
+            return "three"
+
+        @app.route("/undeclared")
+        def undeclared():
+            run(engine, 3)
+            return "undeclared"
+
+        return app
+
+    return build
+
+
+def test_shapes_fold_literals_parameters_lists_and_comments():
+    """Statements differing only in their values have one shape."""
+    first = statement_shape(
+        "SELECT *  FROM movies /* detail */\n WHERE id IN (1, 2, 3) AND title = 'It'"
+    )
+    second = statement_shape(
+        "SELECT * FROM movies WHERE id IN (%(id_1)s, %(id_2)s) AND title = 'O''Hara'"
+    )
+
+    assert first == second == "SELECT * FROM movies WHERE id IN (?...) AND title = ?"
+    assert statement_shape("SELECT $1 -- one\n") == "SELECT ?"
+
+
+def test_repeated_shapes_are_reported_as_n_plus_one(engine):
+    """A lookup run row by row shows up as one shape with its repeat count."""
+    with profile_queries() as profile:
+        run(engine, 6)
+        run(engine, 1)
+
+    assert profile.count == 7
+    assert profile.repeated() == [(statement_shape(LOOKUP), 7)]
+    assert profile.as_dict(threshold=8)["repeated"] == []
+
+
+def test_query_budget_fails_a_block_over_it(engine):
+    """A block over its budget raises, naming the most repeated shape."""
+    with query_budget(2) as profile:
+        run(engine, 2)
+    assert profile.count == 2
+
+    with pytest.raises(QueryBudgetExceeded, match=r"ran 3 queries.*\(3x\)") as error:
+        with query_budget(2):
+            run(engine, 3)
+    assert error.value.limit == 2
+    assert error.value.profile.count == 3
+
+
+def test_view_within_its_budget_reports_its_queries(profiled_app):
+    """Responses carry the statement count and SQL time of the request."""
+    response = profiled_app().test_client().get("/one")
+
+    assert response.status_code == 200
+    assert response.headers["X-Query-Count"] == "1"
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+
+
+def test_view_over_its_budget_fails_when_testing(profiled_app):
+    """Strict mode, on by default in tests, raises for a view over its budget."""
+    client = profiled_app().test_client()
+
+    with pytest.raises(QueryBudgetExceeded, match="GET /three ran 3 queries"):
+        client.get("/three")
+
+
+def test_default_budget_covers_undeclared_views(profiled_app):
+    """``QUERY_BUDGET`` applies to views that declare no budget of their own."""
+    assert profiled_app().test_client().get("/undeclared").status_code == 200
+
+    with pytest.raises(QueryBudgetExceeded):
+        profiled_app(QUERY_BUDGET=2).test_client().get("/undeclared")
+
+
+def test_lenient_mode_logs_budgets_and_n_plus_one(profiled_app, caplog):
+    """Without strict mode the response goes out and the overruns are logged."""
+    app = profiled_app(QUERY_PROFILER_STRICT=False, QUERY_PROFILER_REPEAT_THRESHOLD=3)
+
+    with caplog.at_level(logging.WARNING, "services.query_profiler"):
+        response = app.test_client().get("/three")
+
+    assert response.status_code == 200
+    assert "Possible N+1 in GET /three: 3 x SELECT title" in caplog.text
+    assert "GET /three ran 3 queries, over its budget of 1" in caplog.text
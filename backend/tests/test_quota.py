@@ -0,0 +1,87 @@
+"""
+tests/test_quota.py
+-------------------
+
+Tests of the shared rate limit and daily budget in ``services.quota``, on
+PostgreSQL.
+"""
+import pytest
+
+from extensions import db
+from routes.jobs import fetch_youtube_trailer
+from services.quota import (
+    BACKGROUND,
+    INTERACTIVE,
+    SEARCH_COST,
+    DailyBudget,
+    QuotaExhausted,
+    QuotaScheduler,
+    TokenBucket,
+    youtube_quota,
+)
+from services.resilience import ProviderError
+
+API = "test_api"
+COST = 100
+# Slow enough that no test waits long enough for a refill to matter
+RATE = 10.0
+
+
+def take(bucket, priority=INTERACTIVE):
+    """Takes ``COST`` tokens in a transaction of its own; returns the wait."""
+    with db.engine.begin() as connection:
+        return bucket.take(connection, COST, priority)
+
+
+@pytest.mark.usefixtures("session")
+def test_processes_share_one_bucket():
+    """Two processes' buckets draw on the same stored tokens."""
+    first = TokenBucket(API, RATE, 2 * COST)
+    second = TokenBucket(API, RATE, 2 * COST)
+
+    assert take(first) == 0
+    assert take(second) == 0
+    assert take(first) == pytest.approx(COST / RATE, rel=0.05)
+
+
+@pytest.mark.usefixtures("session")
+def test_background_calls_leave_headroom():
+    """Background calls stop short of the headroom; interactive ones use it."""
+    bucket = TokenBucket(API, RATE, 2 * COST, headroom=COST)
+
+    assert take(bucket, BACKGROUND) == 0
+    assert take(bucket, BACKGROUND) > 0
+    assert take(bucket, INTERACTIVE) == 0
+    with pytest.raises(ValueError):
+        bucket.take(None, 2 * COST, BACKGROUND)
+
+
+@pytest.mark.usefixtures("session")
+def test_refused_calls_hand_their_tokens_back(app, monkeypatch):
+    """A call the daily budget refuses takes no tokens from the bucket."""
+    monkeypatch.setitem(app.extensions, "youtube_quota", None)
+    scheduler = QuotaScheduler(API)
+    scheduler.init_app(app)
+    scheduler.bucket = TokenBucket(API, RATE, 3 * COST)
+    scheduler.budget = DailyBudget(API, limit=COST, interactive_reserve=0)
+
+    scheduler.acquire(COST, INTERACTIVE)
+    with pytest.raises(QuotaExhausted):
+        scheduler.acquire(COST, INTERACTIVE)
+
+    stats = scheduler.stats()
+    assert stats["units_used"] == COST
+    assert stats["bucket_tokens"] == pytest.approx(2 * COST, abs=5)
+
+
+@pytest.mark.usefixtures("session")
+def test_failed_youtube_searches_are_charged_once(outbound):
+    """A search answered 503 is not retried, so it spends one search's quota."""
+    upstreams = outbound(HTTP_MAX_RETRIES=3, HTTP_BACKOFF_SECONDS=0.01)
+    upstreams.set_faults({"youtube": {"error_rate": 1}})
+
+    with pytest.raises(ProviderError):
+        fetch_youtube_trailer("Alien", "1979-05-25")
+
+    assert upstreams.served == {"youtube:503": 1}
+    assert youtube_quota.stats()["units_used"] == SEARCH_COST
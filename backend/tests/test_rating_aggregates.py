@@ -0,0 +1,105 @@
+"""
+tests/test_rating_aggregates.py
+-------------------------------
+
+Tests of the rating aggregate triggers and reconciliation in
+``services.rating_aggregates``, on PostgreSQL.
+"""
+from sqlalchemy import select, text
+
+from models.database import Movie, Review, Trailer, User
+from services.rating_aggregates import find_drift, reconcile
+
+
+def add_catalog(session):
+    """Stores a user and two movies with one trailer each; returns the trailers."""
+    session.add(User(username="viewer", email="viewer@example.com", password_hash="x"))
+    movies = [Movie(title="First"), Movie(title="Second")]
+    session.add_all(movies)
+    session.flush()
+    trailers = [Trailer(movie_id=movie.id, url=f"t/{movie.id}") for movie in movies]
+    session.add_all(trailers)
+    session.commit()
+    return trailers
+
+
+def aggregates(session, movie_id):
+    """The stored (rating_sum, rating_count, rating, rating_histogram) of a movie."""
+    session.expire_all()
+    movie = session.get(Movie, movie_id)
+    return movie.rating_sum, movie.rating_count, movie.rating, movie.rating_histogram
+
+
+def movies_version(session):
+    """The catalog version of ``movies``."""
+    return session.execute(
+        text("SELECT version FROM catalog_versions WHERE table_name = 'movies'")
+    ).scalar()
+
+
+def test_triggers_fold_every_review_change_into_the_movie(session):
+    """Inserts, updates and deletes of reviews keep the aggregates exact."""
+    trailer, _ = add_catalog(session)
+    session.add_all(
+        Review(user_id=1, trailer_id=trailer.id, rating=rating)
+        for rating in (2.5, 8.0, 9.5)
+    )
+    session.commit()
+    assert aggregates(session, trailer.movie_id) == (
+        20.0,
+        3,
+        20.0 / 3,
+        [0, 0, 1, 0, 0, 0, 0, 1, 0, 1],
+    )
+
+    session.execute(text("UPDATE reviews SET rating = 4.0 WHERE rating = 9.5"))
+    session.execute(text("DELETE FROM reviews WHERE rating = 2.5"))
+    session.commit()
+    assert aggregates(session, trailer.movie_id) == (
+        12.0,
+        2,
+        6.0,
+        [0, 0, 0, 1, 0, 0, 0, 1, 0, 0],
+    )
+
+    session.execute(text("DELETE FROM reviews"))
+    session.commit()
+    assert aggregates(session, trailer.movie_id) == (0.0, 0, None, [0] * 10)
+
+
+def test_reconcile_repairs_drift_and_bumps_the_movies_version(session):
+    """Moving a trailer drifts both movies; reconcile repairs them visibly."""
+    first, second = add_catalog(session)
+    session.add(Review(user_id=1, trailer_id=first.id, rating=7.0))
+    session.commit()
+
+    movie_ids = [first.movie_id, second.movie_id]
+
+    # Triggers watch reviews only, so moving the trailer leaves the ratings behind
+    session.execute(
+        text("UPDATE trailers SET movie_id = :movie WHERE id = :trailer"),
+        {"movie": second.movie_id, "trailer": first.id},
+    )
+    session.commit()
+    assert find_drift(session) == movie_ids
+
+    before = movies_version(session)
+    assert reconcile(session, chunk_size=1) == movie_ids
+    after = movies_version(session)
+
+    assert not find_drift(session)
+    assert aggregates(session, movie_ids[0])[:3] == (0.0, 0, None)
+    assert aggregates(session, movie_ids[1])[:3] == (7.0, 1, 7.0)
+    # One bump per chunk that repaired a movie
+    assert after == before + 2
+
+
+def test_reconcile_without_drift_leaves_the_version(session):
+    """Nothing to repair means no bump, so cached listings stay valid."""
+    add_catalog(session)
+    before = movies_version(session)
+
+    assert not reconcile(session)
+
+    assert movies_version(session) == before
+    assert session.scalars(select(Movie.rating)).all() == [None, None]
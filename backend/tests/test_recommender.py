@@ -0,0 +1,155 @@
+"""
+tests/test_recommender.py
+-------------------------
+
+Tests of the batched sparse scoring in ``services.recommender`` against a dense
+reference, and of the stored refresh on PostgreSQL.
+"""
+import numpy as np
+from sqlalchemy import insert, select
+
+from models.database import Movie, Recommendation, Review, Trailer, User
+from services.recommender import (
+    MIN_DEVIATION,
+    MIN_SIMILARITY,
+    RatingMatrix,
+    item_similarities,
+    recommend,
+    refresh_recommendations,
+)
+
+USERS = 80
+MOVIES = 30
+REVIEWS = 900
+NEIGHBOURS = 8
+TOP_K = 5
+
+
+def random_reviews(seed):
+    """(user, movie, rating) arrays; continuous ratings keep scores untied."""
+    rng = np.random.default_rng(seed)
+    return (
+        rng.integers(1, USERS + 1, REVIEWS),
+        rng.integers(1, MOVIES + 1, REVIEWS),
+        rng.uniform(0.5, 10, REVIEWS),
+    )
+
+
+def dense_predictions(matrix, neighbours):
+    """
+    Predicted ratings of every (user, movie), computed on dense arrays.
+
+    Returns:
+        numpy.ndarray: users x movies predictions; NaN where the movie is rated
+        or has no rated neighbour.
+    """
+    ratings = matrix.ratings.toarray().astype(np.float64)
+    rated = ratings != 0
+    means = ratings.sum(axis=1) / np.maximum(rated.sum(axis=1), 1)
+    centred = np.where(rated, ratings - means[:, None], 0)
+    centred[np.abs(centred) < MIN_DEVIATION] = 0
+
+    norms = np.linalg.norm(centred, axis=0)
+    normalized = np.divide(centred, norms, out=np.zeros_like(centred), where=norms > 0)
+    similarities = normalized.T @ normalized
+    np.fill_diagonal(similarities, 0)
+    similarities[np.abs(similarities) < MIN_SIMILARITY] = 0
+    for row in similarities:
+        row[np.argsort(-row)[neighbours:]] = 0
+
+    numerator = centred @ similarities
+    denominator = rated @ np.abs(similarities)
+    predicted = np.divide(
+        numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0
+    )
+    return np.where(rated | (numerator == 0), np.nan, predicted + means[:, None])
+
+
+def sparse_recommendations(matrix, **options):
+    """Runs ``recommend``; returns {user id: [(movie id, score), ...]}."""
+    similarities = item_similarities(matrix, NEIGHBOURS)
+    found = {}
+    for users, movies, scores in recommend(matrix, similarities, TOP_K, **options):
+        for user, movie, score in zip(users, movies, scores):
+            found.setdefault(user, []).append((movie, score))
+    return found
+
+
+def test_batched_sparse_scores_match_a_dense_reference():
+    """Every user gets the dense top-K, with the dense predicted ratings."""
+    matrix = RatingMatrix.from_arrays(*random_reviews(3))
+    dense = dense_predictions(matrix, NEIGHBOURS)
+
+    found = sparse_recommendations(matrix, batch_users=7)
+
+    for row, user in enumerate(matrix.user_ids):
+        scores = dense[row][~np.isnan(dense[row])]
+        expected = np.sort(scores)[::-1][:TOP_K]
+        movies = [np.searchsorted(matrix.movie_ids, movie) for movie, _ in found[user]]
+        got = np.array([score for _, score in found[user]])
+
+        np.testing.assert_allclose(got, expected, rtol=1e-4)
+        np.testing.assert_allclose(got, dense[row, movies], rtol=1e-4)
+
+
+def test_shards_and_batches_partition_the_users():
+    """Shards score disjoint users and together equal one unsharded run."""
+    matrix = RatingMatrix.from_arrays(*random_reviews(4))
+    whole = sparse_recommendations(matrix)
+
+    merged = {}
+    for shard in range(3):
+        part = sparse_recommendations(matrix, shard=shard, shards=3, batch_users=5)
+        assert all(user % 3 == shard for user in part)
+        assert not merged.keys() & part.keys()
+        merged.update(part)
+
+    assert merged.keys() == whole.keys()
+    for user, recommendations in whole.items():
+        assert [movie for movie, _ in merged[user]] == [
+            movie for movie, _ in recommendations
+        ]
+
+
+def test_refresh_stores_the_recommendations_of_its_shard(session):
+    """Loading reviews from the database and scoring them stores the same top-K."""
+    users, movies, ratings = random_reviews(5)
+    session.execute(
+        insert(User),
+        [
+            {"username": f"u{user}", "email": f"u{user}@x.org", "password_hash": "x"}
+            for user in range(1, USERS + 1)
+        ],
+    )
+    session.execute(insert(Movie), [{"title": f"m{movie}"} for movie in range(MOVIES)])
+    session.execute(
+        insert(Trailer),
+        [{"movie_id": movie, "url": f"t/{movie}"} for movie in range(1, MOVIES + 1)],
+    )
+    session.execute(
+        insert(Review),
+        [
+            {"user_id": user, "trailer_id": movie, "rating": rating}
+            for user, movie, rating in zip(
+                users.tolist(), movies.tolist(), ratings.tolist()
+            )
+        ],
+    )
+    session.commit()
+    matrix = RatingMatrix.from_arrays(users, movies, ratings)
+    expected = sparse_recommendations(matrix)
+
+    stats = refresh_recommendations(session, TOP_K, NEIGHBOURS, shard=1, shards=2)
+    rows = session.execute(
+        select(Recommendation.user_id, Recommendation.movie_id).order_by(
+            Recommendation.user_id, Recommendation.score.desc()
+        )
+    ).all()
+
+    assert stats["ratings"] == matrix.ratings.nnz
+    assert rows == [
+        (user, movie)
+        for user, recommendations in sorted(expected.items())
+        if user % 2 == 1
+        for movie, _ in recommendations
+    ]
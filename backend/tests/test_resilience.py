@@ -0,0 +1,93 @@
+"""
+tests/test_resilience.py
+------------------------
+
+Tests of the breakers, hedging and registry in ``services.resilience``.
+"""
+import time
+
+import pytest
+
+from services.resilience import (
+    MIN_HEDGE_SAMPLES,
+    OPEN,
+    REJECTED,
+    CircuitBreaker,
+    Provider,
+    ProviderRegistry,
+)
+
+
+class Calls:
+    """Counts the calls to a fake request and to its reserve step."""
+
+    def __init__(self):
+        self.requests = 0
+        self.reserved = 0
+
+    def request(self, delay=0.0):
+        """A fake request taking ``delay`` seconds."""
+        self.requests += 1
+        time.sleep(delay)
+        return "answer"
+
+    def reserve(self):
+        """A fake quota step."""
+        self.reserved += 1
+
+
+def test_hedged_calls_reserve_once():
+    """A hedge duplicates the request but not the quota it is charged."""
+    provider = Provider("test")
+    calls = Calls()
+    for _ in range(MIN_HEDGE_SAMPLES):
+        provider.call(calls.request)
+
+    result = provider.call(calls.request, 0.3, reserve=calls.reserve)
+
+    assert result.ok and result.hedged
+    assert calls.reserved == 1
+    assert calls.requests == MIN_HEDGE_SAMPLES + 2
+
+
+def test_reserve_errors_pass_through_and_release_the_trial():
+    """An error taking quota is raised as is and does not count against the provider."""
+    provider = Provider("test", CircuitBreaker(failure_threshold=1, reset_seconds=0))
+    calls = Calls()
+    provider.breaker.record_failure()
+
+    def exhausted():
+        raise LookupError("quota spent")
+
+    with pytest.raises(LookupError):
+        provider.call(calls.request, reserve=exhausted)
+
+    assert calls.requests == 0
+    assert provider.breaker.state == OPEN
+    assert provider.call(calls.request).ok
+
+
+def test_rejected_calls_reserve_nothing():
+    """An open breaker rejects the call before anything is reserved."""
+    provider = Provider("test", CircuitBreaker(failure_threshold=1, reset_seconds=60))
+    calls = Calls()
+    provider.breaker.record_failure()
+
+    result = provider.call(calls.request, reserve=calls.reserve)
+
+    assert result.status == REJECTED
+    assert calls.reserved == calls.requests == 0
+
+
+def test_registered_options_stay_with_their_provider():
+    """Registration options apply to one provider, whoever gets it first."""
+    registry = ProviderRegistry()
+    registry.register("youtube", hedge=False, passthrough=(LookupError,))
+
+    youtube, tmdb = registry.get("youtube"), registry.get("tmdb")
+
+    assert (youtube.hedge, youtube.passthrough) == (False, (LookupError,))
+    assert (tmdb.hedge, tmdb.passthrough) == (True, ())
+    with pytest.raises(LookupError):
+        youtube.call(lambda: {}["missing"])
+    assert not tmdb.call(lambda: {}["missing"]).ok
@@ -0,0 +1,105 @@
+"""
+tests/test_response_cache.py
+----------------------------
+
+Tests of ``services.response_cache``: the shared file tier, and invalidation of
+cached ``/api/movies`` responses by commits, on PostgreSQL.
+"""
+import pickle
+
+import pytest
+from flask import Flask
+
+from models.database import Movie
+from services.response_cache import (
+    FileCacheBackend,
+    LRUCache,
+    ResponseCache,
+    decode_entry,
+    encode_entry,
+    response_cache,
+)
+
+VERSIONS = (("movies", 3), ("trailers", 1))
+ENTRY = (VERSIONS, 200, {"Content-Type": "application/json"}, b'[{"id": 1}]\n')
+
+
+class Planted:  # pylint: disable=too-few-public-methods
+    """An object whose unpickling creates a file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return (open, (self.path, "w"))
+
+
+@pytest.fixture(name="cache_dir")
+def cache_dir_fixture(tmp_path):
+    """The directory of the shared tier."""
+    return str(tmp_path / "cache")
+
+
+def worker_cache(cache_dir):
+    """A response cache as one worker process configures it."""
+    app = Flask("test")
+    app.config.update(RESPONSE_CACHE_DIR=cache_dir)
+    return ResponseCache(app)
+
+
+def test_entries_round_trip_as_json_and_raw_body():
+    """Versions, status, headers and body all come back unchanged."""
+    raw = encode_entry(ENTRY)
+
+    assert raw.startswith(b'{"versions": [["movies", 3], ["trailers", 1]]')
+    assert decode_entry(raw) == ENTRY
+
+
+@pytest.mark.parametrize("raw", [b"", b"not json\nbody", b'{"status": 200}\nbody'])
+def test_invalid_entries_decode_to_none(raw):
+    """Anything that is not an encoded entry is a miss, not an error."""
+    assert decode_entry(raw) is None
+
+
+def test_another_worker_reads_the_shared_entry(cache_dir):
+    """An entry stored by one worker is found by another."""
+    # pylint: disable=protected-access
+    worker_cache(cache_dir)._store("key", ENTRY)
+
+    assert worker_cache(cache_dir)._lookup("key", VERSIONS) == ENTRY
+    assert worker_cache(cache_dir)._lookup("key", (("movies", 4),)) is None
+
+
+def test_pickled_files_are_never_loaded(cache_dir, tmp_path):
+    """A pickle planted in the shared directory is a miss and runs nothing."""
+    cache = worker_cache(cache_dir)
+    planted = tmp_path / "planted"
+    cache.shared.set("key", pickle.dumps(Planted(str(planted))))
+
+    assert cache._lookup("key", VERSIONS) is None  # pylint: disable=protected-access
+    assert not planted.exists()
+    assert cache.shared.stats()["stale"] == 1
+
+
+def test_commits_invalidate_cached_responses(app, session, monkeypatch, cache_dir):
+    """A repeated GET is served from the cache until a movie is committed."""
+    monkeypatch.setattr(response_cache, "enabled", True)
+    monkeypatch.setattr(response_cache, "local", LRUCache())
+    monkeypatch.setattr(response_cache, "shared", FileCacheBackend(cache_dir))
+    session.add(Movie(title="Alien"))
+    session.commit()
+    client = app.test_client()
+
+    first = client.get("/api/movies?fields=title")
+    again = client.get("/api/movies?fields=title")
+    assert again.data == first.data
+    assert response_cache.local.stats()["hits"] == 1
+
+    session.add(Movie(title="Aliens"))
+    session.commit()
+    fresh = client.get("/api/movies?fields=title")
+
+    assert fresh.get_json() == [{"title": "Alien"}, {"title": "Aliens"}]
+    stats = response_cache.stats()
+    assert (stats["local"]["hits"], stats["local"]["misses"]) == (1, 2)
+    assert stats["shared"]["stale"] == 1
@@ -0,0 +1,122 @@
+"""
+tests/test_similar_movies.py
+----------------------------
+
+Tests of the IVF "more like this" index in ``services.similar_movies`` and of
+``/api/movies/<id>/similar``, on PostgreSQL.
+"""
+import os
+
+import numpy as np
+import pytest
+from sqlalchemy import insert
+
+from models.database import Movie
+from services import similar_movies as module
+from services.similar_movies import SimilarMovieIndex, build_index, similar_movies
+
+TOPICS = 12
+MOVIES = 600
+LIMIT = 10
+
+
+def random_movies(seed):
+    """Movies drawn from topics, each with its own words, director and cast."""
+    rng = np.random.default_rng(seed)
+    movies = []
+    for _ in range(MOVIES):
+        topic = rng.integers(TOPICS)
+        words = [f"topic{topic}word{n}" for n in rng.integers(0, 15, 8)]
+        words += [f"common{n}" for n in rng.integers(0, 40, 4)]
+        movies.append(
+            {
+                "title": f"Movie {len(movies)}",
+                "summary": " ".join(words),
+                "cast": ", ".join(f"Actor {topic} {n}" for n in rng.integers(0, 6, 3)),
+                "director": f"Director {topic} {rng.integers(3)}",
+            }
+        )
+    return movies
+
+
+@pytest.fixture(name="index_dir")
+def index_dir_fixture(session, tmp_path):
+    """An index of ``random_movies`` built into a temporary directory; its path."""
+    session.execute(insert(Movie), random_movies(7))
+    session.commit()
+    build_index(session, str(tmp_path))
+    return str(tmp_path)
+
+
+def load_arrays(directory):
+    """The arrays of the published index version."""
+    with open(os.path.join(directory, "CURRENT"), encoding="utf-8") as pointer:
+        version = os.path.join(directory, pointer.read().strip())
+    return {
+        name: np.load(os.path.join(version, f"{name}.npy"))
+        for name in ("vectors", "ids", "centroids")
+    }
+
+
+def brute_force(arrays, movie_id):
+    """The top ``LIMIT`` similarities of a movie, scored against every movie."""
+    row = int(np.flatnonzero(arrays["ids"] == movie_id)[0])
+    scores = np.delete(arrays["vectors"] @ arrays["vectors"][row], row)
+    return np.sort(scores)[::-1][:LIMIT]
+
+
+def test_probing_every_list_is_exact(index_dir, monkeypatch):
+    """Scanning all inverted lists returns the brute-force neighbours."""
+    monkeypatch.setattr(module, "EXACT_SEARCH_LIMIT", 0)
+    arrays = load_arrays(index_dir)
+    index = SimilarMovieIndex(index_dir, probes=len(arrays["centroids"]))
+
+    for movie_id in arrays["ids"][::25].tolist():
+        matches = index.similar(movie_id, LIMIT)
+        scores = np.array([score for _, score in matches])
+
+        assert movie_id not in {match for match, _ in matches}
+        np.testing.assert_allclose(scores, brute_force(arrays, movie_id), atol=1e-5)
+
+
+def test_probing_a_few_lists_keeps_recall_high(index_dir, monkeypatch):
+    """Probing a few of the closest lists finds nine in ten true neighbours."""
+    monkeypatch.setattr(module, "EXACT_SEARCH_LIMIT", 0)
+    arrays = load_arrays(index_dir)
+    index = SimilarMovieIndex(index_dir, probes=len(arrays["centroids"]) // 6)
+
+    found = total = 0
+    for movie_id in arrays["ids"].tolist():
+        expected = brute_force(arrays, movie_id)
+        # Ties at the cut-off make any of the tied movies a true neighbour
+        scores = np.array([score for _, score in index.similar(movie_id, LIMIT)])
+        found += np.count_nonzero(scores >= expected[-1] - 1e-5)
+        total += len(expected)
+
+    assert found / total >= 0.9
+
+
+def test_similar_route(app, session, index_dir, monkeypatch, tmp_path):
+    """The route answers from the index, with the listing details of each match."""
+    client = app.test_client()
+    monkeypatch.setattr(similar_movies, "directory", str(tmp_path / "unbuilt"))
+    monkeypatch.setattr(similar_movies, "reload_interval", 0)
+    monkeypatch.setattr(similar_movies, "_arrays", None)
+    monkeypatch.setattr(similar_movies, "_version", None)
+
+    assert client.get("/api/movies/1/similar").status_code == 503
+
+    monkeypatch.setattr(similar_movies, "directory", index_dir)
+    response = client.get("/api/movies/1/similar?limit=3")
+    movies = response.get_json()
+    missing = client.get(f"/api/movies/{MOVIES + 1}/similar")
+    too_many = client.get("/api/movies/1/similar?limit=101")
+
+    assert response.status_code == 200
+    assert [movie["id"] for movie in movies] == [
+        movie_id for movie_id, _ in similar_movies.similar(1, 3)
+    ]
+    assert movies[0]["title"] == session.get(Movie, movies[0]["id"]).title
+    assert movies[0]["score"] >= movies[-1]["score"]
+    assert missing.status_code == 404
+    assert too_many.status_code == 400
@@ -0,0 +1,76 @@
+"""
+tests/test_tmdb.py
+------------------
+
+Tests of the resumable TMDB backfill in ``services.tmdb``, against the fake
+TMDB API.
+"""
+import pytest
+
+from benchmarks import fake_upstreams
+from models.database import Job
+from services.tmdb import BackfillCursor, TMDBError, backfill, fetch_discover_page
+
+PAGES = fake_upstreams.TOTAL_PAGES
+
+
+@pytest.fixture(name="tmdb")
+def tmdb_fixture(outbound):
+    """Points the outbound client at the fake TMDB API, without retries."""
+    return outbound(HTTP_MAX_RETRIES=0, HEDGE_REQUESTS=False)
+
+
+def test_failed_page_raises_instead_of_ending_the_year(tmdb):
+    """A 503 is an error, not an empty last page."""
+    tmdb.set_faults({"tmdb": {"error_rate": 1.0}})
+    with pytest.raises(TMDBError):
+        fetch_discover_page("key", 2000, 1)
+
+
+def test_backfill_keeps_its_position_when_a_page_fails(tmp_path, tmdb):
+    """A failure stops the backfill on the last handled page; a rerun resumes."""
+    cursor = BackfillCursor(str(tmp_path / "cursor.json"))
+    handled = []
+
+    def fail_after_three_pages(movies):
+        handled.append(movies[0]["id"])
+        if len(handled) == 3:
+            tmdb.set_faults({"tmdb": {"error_rate": 1.0}})
+
+    with pytest.raises(TMDBError):
+        backfill("key", 2000, 2001, fail_after_three_pages, cursor)
+    assert cursor.load(2000, 2001) == (2000, 3)
+
+    tmdb.set_faults({"tmdb": {}})
+    pages = backfill("key", 2000, 2001, handled.append, cursor)
+
+    assert pages == 2 * PAGES - 3
+    assert len(handled) == 2 * PAGES
+    assert cursor.load(2000, 2001) is None
+    assert not (tmp_path / "cursor.json").exists()
+
+
+def test_backfill_ignores_the_position_of_another_range(tmp_path, tmdb):
+    """A position saved for one range is neither used nor lost by another."""
+    cursor = BackfillCursor(str(tmp_path / "cursor.json"))
+    cursor.save(1990, 2000, 1995, 7)
+    handled = []
+
+    pages = backfill("key", 2005, 2005, handled.append, cursor)
+
+    assert tmdb.served["tmdb:200"] == PAGES
+    assert pages == PAGES
+    assert cursor.load(1990, 2000) == (1995, 7)
+
+
+def test_search_trigger_passes_its_year_and_page_on(app, session):
+    """A triggered search ingests the page it was asked for, not a fixed one."""
+    client = app.test_client()
+
+    response = client.post("/trigger_search", json={"year": 1985, "page": 2})
+    assert client.post("/trigger_search", json={"page": 0}).status_code == 400
+    assert client.post("/trigger_search", json={"year": "x"}).status_code == 400
+
+    assert response.status_code == 202
+    job = session.get(Job, response.get_json()["job_id"])
+    assert job.payload == {"mode": "search", "year": 1985, "page": 2}
@@ -0,0 +1,75 @@
+"""
+tests/test_tmdb_export.py
+-------------------------
+
+Tests of the bulk import of TMDB daily ID exports in ``services.tmdb_export``,
+on PostgreSQL.
+"""
+import gzip
+import json
+
+import pytest
+from sqlalchemy import select
+
+from extensions import db
+from models.database import Movie
+from services.tmdb_export import SOURCE, import_export, read_ids
+
+EXPORT = [
+    {"id": 1, "original_title": "Popular", "popularity": 9.5, "video": False},
+    {"id": 2, "original_title": "Obscure", "popularity": 0.6, "video": False},
+    {"id": 3, "original_title": "Adult", "popularity": 9.5, "adult": True},
+    {"id": 4, "original_title": "Known", "popularity": 9.5, "video": False},
+]
+
+
+@pytest.fixture(name="export_path")
+def export_path_fixture(tmp_path):
+    """The ``EXPORT`` objects written as a gzipped export; its path."""
+    path = tmp_path / "movie_ids_05_15_2024.json.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as file:
+        file.writelines(json.dumps(movie) + "\n" for movie in EXPORT)
+    return str(path)
+
+
+def imported(session):
+    """TMDB id, title and source of every stored movie."""
+    session.expire_all()
+    rows = session.execute(select(Movie.tmdb_id, Movie.title, Movie.source))
+    return sorted(tuple(row) for row in rows)
+
+
+def test_import_needs_a_filter(session, export_path):
+    """Without a threshold or an allow-list nothing is read or written."""
+    with db.engine.connect() as connection, pytest.raises(ValueError):
+        import_export(connection, export_path)
+
+    assert imported(session) == []
+
+
+def test_import_tags_new_movies_and_keeps_existing_ones(session, export_path):
+    """Popular movies are imported with their source; stored ones are untouched."""
+    session.add(Movie(tmdb_id=4, title="Known, localized"))
+    session.commit()
+
+    with db.engine.connect() as connection:
+        stats = import_export(connection, export_path, min_popularity=1.0)
+
+    assert (stats.filtered, stats.inserted, stats.existing) == (2, 1, 1)
+    assert imported(session) == [
+        (1, "Popular", SOURCE),
+        (4, "Known, localized", None),
+    ]
+
+
+def test_import_of_an_allow_list(session, export_path, tmp_path):
+    """An allow-list on its own keeps exactly the listed movies."""
+    ids_path = tmp_path / "ids.txt"
+    ids_path.write_text("# horror\n2\n\n3\n", encoding="utf-8")
+    ids = read_ids(str(ids_path))
+
+    with db.engine.connect() as connection:
+        import_export(connection, export_path, ids=ids)
+
+    assert ids == {2, 3}
+    assert imported(session) == [(2, "Obscure", SOURCE)]
@@ -0,0 +1,86 @@
+"""
+tests/test_trailer_cache.py
+---------------------------
+
+Tests of the two-tier YouTube trailer lookup cache in ``services.trailer_cache``,
+on PostgreSQL.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select
+
+from models.database import TrailerLookup
+from services.trailer_cache import TrailerCache, lookup_key, search_query
+
+
+def store(session, key, video_id, age):
+    """Stores a database entry made ``age`` ago."""
+    fetched_at = datetime.now(timezone.utc) - age
+    session.add(TrailerLookup(lookup_key=key, video_id=video_id, fetched_at=fetched_at))
+    session.commit()
+
+
+def test_keys_and_queries_name_the_same_year():
+    """A remake and its original are searched and cached apart."""
+    assert lookup_key("Halloween!", "1978-10-25") == "halloween|1978"
+    assert lookup_key("halloween", "2018-10-19") == "halloween|2018"
+    assert search_query("Halloween", "1978-10-25") == "Halloween 1978 trailer"
+    assert search_query("Halloween") == "Halloween trailer"
+
+
+def test_found_and_not_found_entries_expire_after_their_own_ttl(session):
+    """An empty search result goes stale sooner than a found trailer."""
+    cache = TrailerCache(ttl=timedelta(days=30), negative_ttl=timedelta(hours=1))
+    store(session, "found|", "abc", timedelta(hours=2))
+    store(session, "nothing|", None, timedelta(hours=2))
+    store(session, "old|", "def", timedelta(days=31))
+
+    found = cache.get_many(["found|", "nothing|", "old|"])
+
+    assert found == {"found|": "abc"}
+    assert cache.stats()["misses"] == 2
+
+
+def test_counters_split_hits_negative_hits_and_misses(session):
+    """Every looked-up key counts once, and hits are counted as quota saved."""
+    cache = TrailerCache()
+    cache.put_many({"found|": "abc", "nothing|": None})
+
+    found = cache.get_many(["found|", "nothing|", "unknown|", "found|"])
+    stats = cache.stats()
+
+    assert found == {"found|": "abc", "nothing|": None}
+    assert (stats["hits"], stats["negative_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["hit_ratio"] == 2 / 3
+    assert stats["quota_saved"] == 200
+    assert session.scalar(select(TrailerLookup.video_id).filter_by(lookup_key="found|"))
+
+
+def test_memory_tier_evicts_the_least_recently_used_key(session):
+    """A key read since it was stored outlives one that was not."""
+    cache = TrailerCache(max_entries=2)
+    cache.put_many({"first|": "a", "second|": "b"})
+    cache.get_many(["first|"])
+    cache.put_many({"third|": "c"})
+
+    # Only the memory tier can answer now
+    session.execute(delete(TrailerLookup))
+    session.commit()
+
+    assert cache.get_many(["first|", "second|", "third|"]) == {
+        "first|": "a",
+        "third|": "c",
+    }
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_put_many_overwrites_an_earlier_result(session):
+    """A new search result replaces the stored one for every worker."""
+    cache = TrailerCache()
+    cache.put_many({"late|": None})
+    cache.put_many({"late|": "abc"})
+
+    rows = session.execute(select(TrailerLookup.lookup_key, TrailerLookup.video_id))
+    assert rows.all() == [("late|", "abc")]
+    assert TrailerCache().get_many(["late|"]) == {"late|": "abc"}
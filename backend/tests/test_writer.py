@@ -0,0 +1,79 @@
+"""
+tests/test_writer.py
+--------------------
+
+Tests of the set-based movie writer in ``services.writer``, on PostgreSQL.
+"""
+from sqlalchemy import func, select
+
+from models.database import CatalogVersion, Movie, Trailer
+from services.writer import upsert_movies
+
+
+def tmdb_movie(tmdb_id, title=None, trailer_url=None):
+    """Movie details as ``services.tmdb.parse_movie`` builds them."""
+    return {
+        "id": tmdb_id,
+        "title": title or f"Movie {tmdb_id}",
+        "poster_url": None,
+        "release_date": "1999-10-31",
+        "summary": None,
+        "trailer_url": trailer_url,
+    }
+
+
+def movies_version(session):
+    """The catalog version of the movies table."""
+    return session.scalar(
+        select(CatalogVersion.version).where(CatalogVersion.table_name == "movies")
+    )
+
+
+def test_upsert_splits_inserted_updated_and_unchanged(session):
+    """Counts come from one statement per batch, on a real database."""
+    movies = [tmdb_movie(tmdb_id) for tmdb_id in range(1, 6)]
+
+    first = upsert_movies(session, movies, batch_size=2)
+    again = upsert_movies(session, movies, batch_size=2)
+    movies[0] = tmdb_movie(1, title="Renamed")
+    changed = upsert_movies(session, movies, batch_size=2)
+
+    assert (first.inserted, first.updated, first.unchanged) == (5, 0, 0)
+    assert (again.inserted, again.updated, again.unchanged) == (0, 0, 5)
+    assert (changed.inserted, changed.updated, changed.unchanged) == (0, 1, 4)
+    assert session.scalar(select(Movie.title).where(Movie.tmdb_id == 1)) == "Renamed"
+    assert session.scalar(select(func.count()).select_from(Movie)) == 5
+
+
+def test_missing_trailer_keeps_the_one_found_earlier(session):
+    """A later ingest without a trailer neither clears nor duplicates it."""
+    url = "https://www.youtube.com/watch?v=abc"
+    first = upsert_movies(session, [tmdb_movie(7, trailer_url=url)])
+    again = upsert_movies(session, [tmdb_movie(7)])
+    same = upsert_movies(session, [tmdb_movie(7, trailer_url=url)])
+
+    assert first.trailers_inserted == 1
+    assert again.unchanged == 1
+    assert same.trailers_unchanged == 1
+    assert session.scalar(select(Movie.trailer_url)) == url
+    assert session.scalar(select(func.count()).select_from(Trailer)) == 1
+
+
+def test_duplicate_tmdb_ids_keep_the_last_occurrence(session):
+    """One statement cannot update a row twice, so duplicates are collapsed."""
+    counts = upsert_movies(session, [tmdb_movie(3, "First"), tmdb_movie(3, "Last")])
+
+    assert counts.inserted == 1
+    assert session.scalar(select(Movie.title)) == "Last"
+
+
+def test_catalog_version_moves_only_when_movies_change(session):
+    """Rewriting unchanged movies keeps cached listings valid."""
+    upsert_movies(session, [tmdb_movie(1)])
+    version = movies_version(session)
+
+    upsert_movies(session, [tmdb_movie(1)])
+    assert movies_version(session) == version
+
+    upsert_movies(session, [tmdb_movie(1, title="Changed")])
+    assert movies_version(session) == version + 1
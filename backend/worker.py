@@ -0,0 +1,81 @@
+"""
+worker.py
+------
+
+A Python script running background jobs, such as the ingest queued by
+``/trigger_search``.
+
+Every process polls the ``jobs`` table and runs one job at a time; start several
+with ``--processes`` (or several containers) to run jobs in parallel. SIGTERM
+and SIGINT let the current job finish before the process exits. With ``--burst``
+the workers exit as soon as no job is due, which is handy when testing locally.
+With ``--metrics-port`` the metrics of all the processes, such as the latency
+of TMDB and YouTube calls, are served for Prometheus on that port.
+
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+
+from app import create_app
+from extensions import db
+from services.jobs import DEFAULT_POLL_INTERVAL, job_queue
+from services.metrics import prepare_multiprocess_dir, serve_multiprocess
+
+
+def run_worker(poll_interval, burst):
+    """
+    Runs jobs in this process until it is told to stop.
+
+    Parameters:
+        poll_interval (float): Seconds to sleep when no job is due.
+        burst (bool): Exit once no job is due instead of polling.
+    """
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+
+    app = create_app()
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    with app.app_context():
+        ran = job_queue.work(
+            db.session,
+            name,
+            poll_interval,
+            stop=None if burst else lambda: bool(stopping),
+        )
+    print(f"Worker {name} ran {ran} job(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    parser.add_argument("--burst", action="store_true")
+    parser.add_argument("--metrics-port", type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.metrics_port:
+        # Set before the workers start, so they record into this directory
+        metrics_dir = os.environ.setdefault(
+            "metrics_multiproc_dir", "/tmp/scarescreen-worker-metrics"
+        )
+        prepare_multiprocess_dir(metrics_dir)
+        serve_multiprocess(args.metrics_port, metrics_dir)
+
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(args.poll_interval, args.burst))
+        for _ in range(max(1, args.processes))
+    ]
+    for worker in workers:
+        worker.start()
+    # Pass SIGTERM on, so every worker finishes its current job before exiting
+    signal.signal(
+        signal.SIGTERM, lambda *_: [worker.terminate() for worker in workers]
+    )
+    for worker in workers:
+        worker.join()
@@ -61,8 +61,9 @@ def add_movie(url):
     - url (str): URL to which the POST request will be made.
 
     Returns:
-    - str: The response text from the POST request, typically a confirmation message or
-           details of the added movie/trailer.
+    - str: The response text from the POST request. For '/trigger_search' this names
+           the queued ingest job and the URL reporting its progress; the ingest itself
+           runs on the job workers, so the request returns well within the timeout.
 
     If the request encounters an exception, it will return a descriptive error message.
     """